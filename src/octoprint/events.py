@@ -74,6 +74,28 @@ class Events(object):
 	SLICING_FAILED = "SlicingFailed"
 
 
+def eventPayload(payload, printerId):
+	"""
+	Returns ``payload`` tagged with the id of the printer the event originates from as ``printer``, so consumers of the
+	event bus shared by all printers can tell the events of the printers apart. Returns ``payload`` as it is if
+	``printerId`` is None.
+	"""
+	if printerId is None:
+		return payload
+	result = dict(payload) if payload is not None else dict()
+	result["printer"] = printerId
+	return result
+
+
+def getEventPrinter(payload):
+	"""
+	Returns the id of the printer the event with ``payload`` originates from, None if it's not from a printer.
+	"""
+	if isinstance(payload, dict):
+		return payload.get("printer")
+	return None
+
+
 def eventManager():
 	global _instance
 	if _instance is None:
@@ -203,9 +225,14 @@ class DebugEventListener(GenericEventListener):
 
 
 class CommandTrigger(GenericEventListener):
-	def __init__(self, printer):
+	"""
+	Executes the commands configured for events. Gcode commands go to the printer the event originates from, or to the
+	default printer of ``printerRegistry`` if the event isn't from a printer.
+	"""
+
+	def __init__(self, printerRegistry):
 		GenericEventListener.__init__(self)
-		self._printer = printer
+		self._printerRegistry = printerRegistry
 		self._subscriptions = {}
 
 		self._initSubscriptions()
@@ -256,23 +283,27 @@ class CommandTrigger(GenericEventListener):
 		if not event in self._subscriptions:
 			return
 
+		printer = self._printerRegistry.get(getEventPrinter(payload))
+		if printer is None:
+			printer = self._printerRegistry.getDefault()
+
 		for command, commandType in self._subscriptions[event]:
 			try:
 				if isinstance(command, (tuple, list, set)):
 					processedCommand = []
 					for c in command:
-						processedCommand.append(self._processCommand(c, payload))
+						processedCommand.append(self._processCommand(c, payload, printer))
 				else:
-					processedCommand = self._processCommand(command, payload)
-				self.executeCommand(processedCommand, commandType)
+					processedCommand = self._processCommand(command, payload, printer)
+				self.executeCommand(processedCommand, commandType, printer)
 			except KeyError, e:
 				self._logger.warn("There was an error processing one or more placeholders in the following command: %s" % command)
 
-	def executeCommand(self, command, commandType):
+	def executeCommand(self, command, commandType, printer=None):
 		if commandType == "system":
 			self._executeSystemCommand(command)
 		elif commandType == "gcode":
-			self._executeGcodeCommand(command)
+			self._executeGcodeCommand(command, printer if printer is not None else self._printerRegistry.getDefault())
 
 	def _executeSystemCommand(self, command):
 		def commandExecutioner(command):
@@ -290,16 +321,16 @@ class CommandTrigger(GenericEventListener):
 		except Exception, ex:
 			self._logger.exception("Command failed")
 
-	def _executeGcodeCommand(self, command):
+	def _executeGcodeCommand(self, command, printer):
 		commands = [command]
 		if isinstance(command, (list, tuple, set)):
 			self.logger.debug("Executing GCode commands: %r" % command)
 			commands = list(command)
 		else:
 			self._logger.debug("Executing GCode command: %s" % command)
-		self._printer.commands(commands)
+		printer.commands(commands)
 
-	def _processCommand(self, command, payload):
+	def _processCommand(self, command, payload, printer):
 		"""
 		Performs string substitutions in the command string based on a couple of current parameters.
 
@@ -322,7 +353,7 @@ class CommandTrigger(GenericEventListener):
 			"__now": datetime.datetime.now().isoformat()
 		}
 
-		currentData = self._printer.getCurrentData()
+		currentData = printer.getCurrentData()
 
 		if "currentZ" in currentData.keys() and currentData["currentZ"] is not None:
 			params["__currentZ"] = str(currentData["currentZ"])
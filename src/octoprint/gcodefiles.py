@@ -10,8 +10,17 @@ import threading
 import yaml
 import time
 import logging
+import hashlib
+import tempfile
+import struct
+import math
+import bisect
 import octoprint.util as util
 import octoprint.util.gcodeInterpreter as gcodeInterpreter
+import octoprint.util.gcodeCompactor as gcodeCompactor
+import octoprint.util.arcFitter as arcFitter
+
+from octoprint.history import PrintHistory
 
 from octoprint.settings import settings
 from octoprint.events import eventManager, Events
@@ -76,6 +85,11 @@ class GcodeManager:
 		self._metadataFileAccessMutex = threading.Lock()
 
 		self._metadataAnalyzer = MetadataAnalyzer(getPathCallback=self.getAbsolutePath, loadedCallback=self._onMetadataAnalysisFinished)
+		self._analysisPauses = 0
+		self._analysisPausesMutex = threading.Lock()
+		self._verification = None
+
+		self._history = PrintHistory()
 
 		self._loadMetadata(migrate=True)
 		self._processAnalysisBacklog()
@@ -91,7 +105,9 @@ class GcodeManager:
 				continue
 
 			fileData = self.getFileData(filename)
-			if fileData is not None and "gcodeAnalysis" in fileData.keys():
+			if fileData is not None and "gcodeAnalysis" in fileData.keys() \
+					and self.getLayerIndex(filename) is not None and self.getPrintTimeIndex(filename) is not None \
+					and (not self._isCompactionCheckNeeded() or "compaction" in fileData.keys()):
 				continue
 
 			self._metadataAnalyzer.addFileToBacklog(filename)
@@ -106,6 +122,14 @@ class GcodeManager:
 		if absolutePath is None:
 			return
 
+		arcFitting = None
+		if self._isArcFittingNeeded(basename):
+			arcFitting = self._fitArcs(basename, absolutePath, gcode)
+			if arcFitting is None:
+				# postponed, the file will be analysed again
+				return
+			gcode = arcFitting.pop("gcode")
+
 		analysisResult = {}
 		dirty = False
 		if gcode.totalMoveTimeMinute:
@@ -120,14 +144,141 @@ class GcodeManager:
 				}
 			dirty = True
 
-		if dirty:
+		if gcode.layerList is not None:
+			try:
+				LayerIndex.fromGcode(gcode).write(LayerIndex.getPath(absolutePath), absolutePath)
+			except:
+				self._logger.exception("Could not write layer index for %s" % basename)
+
+		if gcode.timeline is not None:
+			try:
+				PrintTimeIndex.fromGcode(gcode).write(PrintTimeIndex.getPath(absolutePath), absolutePath)
+			except:
+				self._logger.exception("Could not write print time index for %s" % basename)
+
+		if gcode.toolpath is not None and gcode.layerList:
+			try:
+				preview = ToolpathPreview.fromGcode(gcode)
+				preview.write(ToolpathPreview.getPath(absolutePath))
+				analysisResult["preview"] = {
+					"layers": preview.getLayerCount(),
+					"vertices": preview.getVertexCount()
+				}
+				dirty = True
+			except:
+				self._logger.exception("Could not write toolpath preview for %s" % basename)
+
+		compaction = None
+		if self._isCompactionCheckNeeded():
+			compaction = self._checkCompaction(basename, absolutePath, gcode)
+
+		if dirty or compaction is not None or arcFitting is not None:
 			metadata = self.getFileMetadata(basename)
-			metadata["gcodeAnalysis"] = analysisResult
+			if dirty:
+				metadata["gcodeAnalysis"] = analysisResult
+			if compaction is not None:
+				metadata["compaction"] = compaction
+			if arcFitting is not None:
+				hash = arcFitting.pop("hash", None)
+				if hash is not None and "hash" in metadata:
+					metadata["hash"] = hash
+				metadata["arcFitting"] = arcFitting
 			self._metadata[basename] = metadata
 			self._metadataDirty = True
 			self._saveMetadata()
+
 		eventManager().fire(Events.METADATA_ANALYSIS_FINISHED, {"file": basename, "result": analysisResult})
 
+	def _isCompactionCheckNeeded(self):
+		return self._settings.getBoolean(["gcodeCompaction", "enabled"]) and self._settings.getBoolean(["gcodeCompaction", "verify"])
+
+	def _checkCompaction(self, basename, absolutePath, gcode):
+		"""
+		Verifies that the compacted version of the file drives the printer just like the original one, see
+		:func:`octoprint.util.gcodeCompactor.verify`. Like the analysis this is postponed while printing.
+		"""
+		interpreter = gcodeInterpreter.gcode()
+		with self._analysisPausesMutex:
+			if self._analysisPauses:
+				self._metadataAnalyzer.addFileToBacklog(basename)
+				return None
+			self._verification = interpreter
+
+		try:
+			compaction = gcodeCompactor.verify(absolutePath, original=gcode, interpreter=interpreter)
+		except gcodeInterpreter.AnalysisAborted:
+			self._metadataAnalyzer.addFileToBacklog(basename)
+			return None
+		except:
+			self._logger.exception("Could not verify the compaction of %s" % basename)
+			return None
+		finally:
+			with self._analysisPausesMutex:
+				self._verification = None
+
+		if not compaction["identical"]:
+			self._logger.warn("Compaction of %s changes its %s, it won't be compacted" % (basename, ", ".join(compaction["differences"])))
+		return compaction
+
+	def _isArcFittingNeeded(self, basename):
+		if not self._settings.getBoolean(["gcodeArcFitting", "enabled"]):
+			return False
+
+		# only files that are new, existing ones stay as they are
+		metadata = self.getFileMetadata(basename)
+		return not "gcodeAnalysis" in metadata and not "arcFitting" in metadata
+
+	def _fitArcs(self, basename, absolutePath, gcode):
+		"""
+		Replaces runs of moves in the file with arcs, see :class:`octoprint.util.arcFitter.ArcFitter`. The fitted
+		version is analysed and only replaces the file if that analysis matches the one of the original (``gcode``).
+		Returns the statistics and the analysis of the file as it is now in ``gcode``, None if the fitting had to be
+		postponed because of a print.
+		"""
+		tolerance = self._settings.getFloat(["gcodeArcFitting", "tolerance"])
+
+		interpreter = gcodeInterpreter.gcode()
+		with self._analysisPausesMutex:
+			if self._analysisPauses:
+				self._metadataAnalyzer.addFileToBacklog(basename)
+				return None
+			self._verification = interpreter
+
+		fh, fittedPath = tempfile.mkstemp(prefix=basename + ".", suffix=".tmp", dir=self._uploadFolder)
+		os.close(fh)
+		try:
+			result = arcFitter.fitFile(absolutePath, fittedPath, tolerance=tolerance)
+			if result["arcs"]:
+				interpreter.load(fittedPath)
+				result.update(arcFitter.validate(gcode, interpreter, tolerance=tolerance))
+		except gcodeInterpreter.AnalysisAborted:
+			self._metadataAnalyzer.addFileToBacklog(basename)
+			util.silentRemove(fittedPath)
+			return None
+		except:
+			self._logger.exception("Could not fit arcs into %s" % basename)
+			util.silentRemove(fittedPath)
+			return dict(fitted=False, gcode=gcode)
+		finally:
+			with self._analysisPausesMutex:
+				self._verification = None
+
+		hash = result.pop("hash")
+		result["fitted"] = result.pop("valid", False)
+		if not result["fitted"]:
+			if result["arcs"]:
+				self._logger.warn("Fitting arcs into %s changes its %s, it stays as it is" % (basename, ", ".join(result["differences"])))
+			util.silentRemove(fittedPath)
+			result["gcode"] = gcode
+			return result
+
+		os.chmod(fittedPath, os.stat(absolutePath).st_mode & 0777)
+		util.safeRename(fittedPath, absolutePath)
+		self._logger.info("Fitted %d arcs into %s, %d of %d lines left" % (result["arcs"], basename, result["fittedLines"], result["lines"]))
+		result["hash"] = hash
+		result["gcode"] = interpreter
+		return result
+
 	def _loadMetadata(self, migrate=False):
 		if os.path.exists(self._metadataFile) and os.path.isfile(self._metadataFile):
 			with self._metadataFileAccessMutex:
@@ -320,6 +471,47 @@ class GcodeManager:
 		else:
 			return filename
 
+	def createUpload(self, filename):
+		"""
+		Creates a StreamingUpload for a file with the given name, to be added via addUpload once it has been completely
+		received. Returns None if the file can't be uploaded.
+		"""
+		absolutePath = self.getAbsolutePath(filename, mustExist=False)
+		if absolutePath is None or not isGcodeFileName(filename):
+			return None
+
+		# don't analyse on the fly if analysis has been paused (e.g. while printing), the file will be queued instead
+		return StreamingUpload(absolutePath, analyze=self._metadataAnalyzer.isActive())
+
+	def addUpload(self, upload, destination, uploadCallback=None):
+		"""
+		Counterpart of addFile for a completely received StreamingUpload. Moves the upload to its final location
+		and records its hash. If the upload has been analysed while it was received, the analysis result will
+		be available right away or shortly after, otherwise the file is queued for analysis.
+		"""
+		absolutePath = upload.getAbsolutePath()
+		filename = self._getBasicFilename(absolutePath)
+
+		# existing metadata is obsolete since the file is going to get overwritten
+		if filename in self._metadata.keys():
+			del self._metadata[filename]
+		metadata = self.getFileMetadata(filename)
+		metadata["hash"] = upload.getHash()
+		self.setFileMetadata(filename, metadata)
+		self._saveMetadata()
+
+		if upload.isAnalyzing():
+			eventManager().fire(Events.METADATA_ANALYSIS_STARTED, {"file": filename})
+			upload.finish(analysisCallback=lambda gcode: self._onMetadataAnalysisFinished(filename, gcode))
+		else:
+			upload.finish()
+			self._metadataAnalyzer.addFileToQueue(filename)
+
+		if uploadCallback is not None:
+			return uploadCallback(filename, absolutePath, destination)
+		else:
+			return filename
+
 	def getFutureFilename(self, file):
 		if not file:
 			return None
@@ -341,12 +533,51 @@ class GcodeManager:
 		os.remove(absolutePath)
 		if os.path.exists(stlPath):
 			os.remove(stlPath)
+		util.silentRemove(LayerIndex.getPath(absolutePath))
+		util.silentRemove(ToolpathPreview.getPath(absolutePath))
+		util.silentRemove(PrintTimeIndex.getPath(absolutePath))
 
 		if filename in self._metadata.keys():
 			del self._metadata[filename]
 			self._metadataDirty = True
 			self._saveMetadata()
 
+	def getLayerIndex(self, filename):
+		"""
+		Returns the LayerIndex of the given file, or None if the file doesn't exist or hasn't been indexed (yet).
+		"""
+		absolutePath = self.getAbsolutePath(filename)
+		if absolutePath is None:
+			return None
+		return LayerIndex.read(LayerIndex.getPath(absolutePath), absolutePath)
+
+	def getPrintTimeIndex(self, filename):
+		"""
+		Returns the PrintTimeIndex of the given file, or None if the file doesn't exist or hasn't been analysed (yet).
+		"""
+		absolutePath = self.getAbsolutePath(filename)
+		if absolutePath is None:
+			return None
+		return PrintTimeIndex.read(PrintTimeIndex.getPath(absolutePath), absolutePath)
+
+	def getToolpathPreviewPath(self, filename):
+		"""
+		Returns the path of the toolpath preview of the given file, or None if the file doesn't exist or hasn't been
+		analysed (yet).
+		"""
+		absolutePath = self.getAbsolutePath(filename)
+		if absolutePath is None:
+			return None
+
+		metadata = self.getFileMetadata(filename)
+		if not "gcodeAnalysis" in metadata or not "preview" in metadata["gcodeAnalysis"]:
+			return None
+
+		path = ToolpathPreview.getPath(absolutePath)
+		if not os.path.exists(path):
+			return None
+		return path
+
 	def getAbsolutePath(self, filename, mustExist=True):
 		"""
 		Returns the absolute path of the given filename in the correct upload folder.
@@ -376,15 +607,19 @@ class GcodeManager:
 	def getAllFilenames(self):
 		return map(lambda x: x["name"], self.getAllFileData())
 
-	def getAllFileData(self):
+	def getAllFileData(self, printer=None):
 		files = []
 		for osFile in os.listdir(self._uploadFolder):
-			fileData = self.getFileData(osFile)
+			fileData = self.getFileData(osFile, printer=printer)
 			if fileData is not None:
 				files.append(fileData)
 		return files
 
-	def getFileData(self, filename):
+	def getFileData(self, filename, printer=None):
+		"""
+		Returns the data of ``filename``, with its estimated print time calibrated by how long past jobs on ``printer``
+		actually took (on any printer if None).
+		"""
 		if not filename:
 			return
 
@@ -426,6 +661,14 @@ class GcodeManager:
 				else:
 					fileData[key] = self._metadata[filename][key]
 
+		# calibrate the estimated print time by how long past print jobs actually took
+		if "gcodeAnalysis" in fileData and fileData["gcodeAnalysis"].get("estimatedPrintTime"):
+			ratio = self._history.getEstimateRatio(filename, printer)
+			if ratio is not None:
+				gcodeAnalysis = dict(fileData["gcodeAnalysis"])
+				gcodeAnalysis["estimatedPrintTime"] = gcodeAnalysis["estimatedPrintTime"] * ratio
+				fileData["gcodeAnalysis"] = gcodeAnalysis
+
 		return fileData
 
 	def getFileMetadata(self, filename):
@@ -448,7 +691,7 @@ class GcodeManager:
 
 	#~~ print job data
 
-	def printSucceeded(self, filename):
+	def printSucceeded(self, filename, printTime=None, printer=None):
 		filename = self._getBasicFilename(filename)
 		absolutePath = self.getAbsolutePath(filename)
 		if absolutePath is None:
@@ -463,7 +706,9 @@ class GcodeManager:
 		self.setFileMetadata(filename, metadata)
 		self._saveMetadata()
 
-	def printFailed(self, filename):
+		self._recordPrint(filename, metadata, True, printTime, 1.0, printer)
+
+	def printFailed(self, filename, printTime=None, progress=None, printer=None):
 		filename = self._getBasicFilename(filename)
 		absolutePath = self.getAbsolutePath(filename)
 		if absolutePath is None:
@@ -478,6 +723,24 @@ class GcodeManager:
 		self.setFileMetadata(filename, metadata)
 		self._saveMetadata()
 
+		self._recordPrint(filename, metadata, False, printTime, progress, printer)
+
+	def _recordPrint(self, filename, metadata, success, printTime, progress, printer):
+		estimatedPrintTime = None
+		filament = None
+		if "gcodeAnalysis" in metadata:
+			estimatedPrintTime = metadata["gcodeAnalysis"].get("estimatedPrintTime")
+			if "filament" in metadata["gcodeAnalysis"] and progress is not None and progress >= 0:
+				filament = sum(tool["length"] for tool in metadata["gcodeAnalysis"]["filament"].values()) * progress
+
+		try:
+			self._history.record(filename, success, printTime=printTime, estimatedPrintTime=estimatedPrintTime, filament=filament, origin=FileDestinations.LOCAL, printer=printer)
+		except:
+			self._logger.exception("Could not record print of %s in the print history" % filename)
+
+	def getHistory(self):
+		return self._history
+
 	def changeLastPrintSuccess(self, filename, succeeded):
 		filename = self._getBasicFilename(filename)
 		absolutePath = self.getAbsolutePath(filename)
@@ -503,14 +766,517 @@ class GcodeManager:
 						metadata["prints"]["failure"] -= 1
 					self.setFileMetadata(filename, metadata)
 					self._saveMetadata()
+					self._history.changeLastOutcome(filename, succeeded)
 
 	#~~ analysis control
 
 	def pauseAnalysis(self):
-		self._metadataAnalyzer.pause()
+		"""
+		Pauses the analysis until :meth:`resumeAnalysis` has been called as often as this, so that with several
+		printers sharing this manager the analysis only resumes once none of them is printing anymore.
+		"""
+		with self._analysisPausesMutex:
+			self._analysisPauses += 1
+			if self._analysisPauses == 1:
+				self._metadataAnalyzer.pause()
+				if self._verification is not None:
+					self._verification.abort()
 
 	def resumeAnalysis(self):
-		self._metadataAnalyzer.resume()
+		with self._analysisPausesMutex:
+			if self._analysisPauses == 0:
+				return
+			self._analysisPauses -= 1
+			if self._analysisPauses == 0:
+				self._metadataAnalyzer.resume()
+
+class LayerIndex(object):
+	"""
+	Index of the layers of a gcode file, as determined by its analysis. Stored as compact binary sidecar file next to
+	the gcode file, which allows to serve single layers via byte ranges instead of the whole file.
+
+	The sidecar consists of a header (magic, version, size and modification time of the indexed file, number of
+	layers) followed by a record per layer (byte offset, length in bytes, first line, number of lines, Z height),
+	all little endian. An index whose recorded size or modification time doesn't match the file anymore is considered
+	stale and ignored.
+	"""
+
+	MAGIC = "OPLI"
+	VERSION = 1
+
+	_header = struct.Struct("<4sBQdI")
+	_record = struct.Struct("<QQIIf")
+
+	def __init__(self, layers):
+		self._layers = layers
+
+	@staticmethod
+	def getPath(absolutePath):
+		path, name = os.path.split(absolutePath)
+		return os.path.join(path, "." + name + ".layers")
+
+	@staticmethod
+	def fromGcode(gcode):
+		"""
+		Creates the index from the layerList of a finished gcodeInterpreter.gcode analysis.
+		"""
+		layers = []
+		starts = gcode.layerList
+		for i in range(len(starts)):
+			offset, line, z = starts[i]
+			if i + 1 < len(starts):
+				nextOffset, nextLine, _ = starts[i + 1]
+			else:
+				nextOffset, nextLine = gcode.totalBytes, gcode.totalLines
+			layers.append((offset, nextOffset - offset, line, nextLine - line, z))
+		return LayerIndex(layers)
+
+	@staticmethod
+	def read(indexPath, absolutePath):
+		if not os.path.exists(indexPath) or not os.path.exists(absolutePath):
+			return None
+
+		with open(indexPath, "rb") as f:
+			data = f.read()
+
+		try:
+			magic, version, size, mtime, count = LayerIndex._header.unpack_from(data)
+			if magic != LayerIndex.MAGIC or version != LayerIndex.VERSION:
+				return None
+			if len(data) != LayerIndex._header.size + count * LayerIndex._record.size:
+				return None
+		except struct.error:
+			return None
+
+		stat = os.stat(absolutePath)
+		if size != stat.st_size or mtime != stat.st_mtime:
+			return None
+
+		layers = []
+		for i in range(count):
+			layers.append(LayerIndex._record.unpack_from(data, LayerIndex._header.size + i * LayerIndex._record.size))
+		return LayerIndex(layers)
+
+	def write(self, indexPath, absolutePath):
+		stat = os.stat(absolutePath)
+		data = [LayerIndex._header.pack(LayerIndex.MAGIC, LayerIndex.VERSION, stat.st_size, stat.st_mtime, len(self._layers))]
+		for layer in self._layers:
+			data.append(LayerIndex._record.pack(*layer))
+
+		with util.atomicWrite(indexPath) as f:
+			f.write("".join(data))
+
+	def getLayerCount(self):
+		return len(self._layers)
+
+	def getLayers(self):
+		"""
+		Returns the indexed layers as list of (offset, length, first line, line count, z) tuples.
+		"""
+		return list(self._layers)
+
+	def getByteRange(self, first, count=1):
+		"""
+		Returns (offset, length) of ``count`` consecutive layers starting with layer number ``first``, or None if
+		``first`` is out of range.
+		"""
+		if first < 0 or first >= len(self._layers) or count < 1:
+			return None
+		last = min(first + count, len(self._layers)) - 1
+		offset = self._layers[first][0]
+		return offset, self._layers[last][0] + self._layers[last][1] - offset
+
+
+class PrintTimeIndex(object):
+	"""
+	Cumulative estimated print time of a gcode file by byte offset, as determined by its analysis, downsampled to a
+	bounded number of samples. Allows to look up the estimated time needed to print the file up to any byte offset in
+	O(log n), interpolating linearly between samples.
+
+	Stored as binary sidecar file next to the gcode file, consisting of a header (magic, version, size and modification
+	time of the indexed file, number of samples) followed by a record per sample (byte offset, seconds), all little
+	endian. Just like for the LayerIndex, an index not matching the file's size or modification time is ignored.
+	"""
+
+	MAGIC = "OPTI"
+	VERSION = 1
+
+	_header = struct.Struct("<4sBQdI")
+	_record = struct.Struct("<Qf")
+
+	def __init__(self, samples):
+		self._offsets = [offset for offset, _ in samples]
+		self._times = [seconds for _, seconds in samples]
+
+	@staticmethod
+	def getPath(absolutePath):
+		path, name = os.path.split(absolutePath)
+		return os.path.join(path, "." + name + ".times")
+
+	@staticmethod
+	def fromGcode(gcode):
+		"""
+		Creates the index from the timeline of a finished gcodeInterpreter.gcode analysis.
+		"""
+		return PrintTimeIndex(gcode.timeline)
+
+	@staticmethod
+	def read(indexPath, absolutePath):
+		if not os.path.exists(indexPath) or not os.path.exists(absolutePath):
+			return None
+
+		with open(indexPath, "rb") as f:
+			data = f.read()
+
+		try:
+			magic, version, size, mtime, count = PrintTimeIndex._header.unpack_from(data)
+			if magic != PrintTimeIndex.MAGIC or version != PrintTimeIndex.VERSION or count < 1:
+				return None
+			if len(data) != PrintTimeIndex._header.size + count * PrintTimeIndex._record.size:
+				return None
+		except struct.error:
+			return None
+
+		stat = os.stat(absolutePath)
+		if size != stat.st_size or mtime != stat.st_mtime:
+			return None
+
+		samples = []
+		for i in range(count):
+			samples.append(PrintTimeIndex._record.unpack_from(data, PrintTimeIndex._header.size + i * PrintTimeIndex._record.size))
+		return PrintTimeIndex(samples)
+
+	def write(self, indexPath, absolutePath):
+		stat = os.stat(absolutePath)
+		data = [PrintTimeIndex._header.pack(PrintTimeIndex.MAGIC, PrintTimeIndex.VERSION, stat.st_size, stat.st_mtime, len(self._offsets))]
+		for sample in zip(self._offsets, self._times):
+			data.append(PrintTimeIndex._record.pack(*sample))
+
+		with util.atomicWrite(indexPath) as f:
+			f.write("".join(data))
+
+	def getSampleCount(self):
+		return len(self._offsets)
+
+	def getTotalTime(self):
+		return self._times[-1]
+
+	def getTimeAt(self, offset):
+		"""
+		Returns the estimated time in seconds needed to print the file up to the given byte offset.
+		"""
+		i = bisect.bisect_right(self._offsets, offset)
+		if i >= len(self._offsets):
+			return self._times[-1]
+		if i == 0:
+			return self._times[0]
+
+		startOffset, endOffset = self._offsets[i - 1], self._offsets[i]
+		startTime, endTime = self._times[i - 1], self._times[i]
+		return startTime + (endTime - startTime) * (offset - startOffset) / float(endOffset - startOffset)
+
+
+class ToolpathPreview(object):
+	"""
+	Decimated toolpath of a gcode file for rendering previews without having to download and parse the file, stored as
+	binary sidecar file next to the gcode file.
+
+	Extrusion paths are simplified (Ramer-Douglas-Peucker) with the smallest epsilon that makes the whole preview fit
+	into the vertex budget and all coordinates are quantized to 16 bit within the bounding box of the toolpath. The sidecar consists of a header
+	(magic, version, bounding box as min x, min y, max x, max y, number of layers), followed by a record per layer
+	(Z height, number of vertices) and its vertices (x, y quantized to -32767..32767 and a flag that is 1 if the
+	vertex is reached by extruding, 0 if by a travel move), all little endian.
+	"""
+
+	MAGIC = "OPTP"
+	VERSION = 1
+
+	VERTEX_BUDGET = 50000
+	MIN_EPSILON = 0.05
+
+	_header = struct.Struct("<4sBffffI")
+	_layer = struct.Struct("<fI")
+	_vertex = struct.Struct("<hhB")
+
+	def __init__(self, bounds, layers):
+		self._bounds = bounds
+		self._layers = layers
+
+	@staticmethod
+	def getPath(absolutePath):
+		path, name = os.path.split(absolutePath)
+		return os.path.join(path, "." + name + ".preview")
+
+	@staticmethod
+	def fromGcode(gcode, budget=None):
+		"""
+		Creates the preview from the toolpath and layerList of a finished gcodeInterpreter.gcode analysis.
+		"""
+		if budget is None:
+			budget = ToolpathPreview.VERTEX_BUDGET
+
+		paths = gcode.toolpath.layers
+
+		# rank all points by their significance once, then pick the threshold that makes the preview fit the budget
+		significances = [_getSignificances(xs, ys, flags, ToolpathPreview.MIN_EPSILON) for xs, ys, flags in paths]
+		candidates = sorted((significance for layer in significances for _, significance in layer), reverse=True)
+		threshold = ToolpathPreview.MIN_EPSILON
+		if len(candidates) > budget:
+			threshold = max(threshold, candidates[budget])
+		keep = [[index for index, significance in layer if significance > threshold or significance == _ALWAYS] for layer in significances]
+
+		minX = minY = float("inf")
+		maxX = maxY = float("-inf")
+		for (xs, ys, flags), indices in zip(paths, keep):
+			for index in indices:
+				minX = min(minX, xs[index])
+				maxX = max(maxX, xs[index])
+				minY = min(minY, ys[index])
+				maxY = max(maxY, ys[index])
+		if minX > maxX:
+			minX = maxX = minY = maxY = 0.0
+
+		scaleX = 65534.0 / (maxX - minX) if maxX > minX else 0.0
+		scaleY = 65534.0 / (maxY - minY) if maxY > minY else 0.0
+
+		layers = []
+		for (_, _, z), (xs, ys, flags), indices in zip(gcode.layerList, paths, keep):
+			vertices = []
+			for index in indices:
+				vertices.append((
+					int(round((xs[index] - minX) * scaleX)) - 32767,
+					int(round((ys[index] - minY) * scaleY)) - 32767,
+					flags[index]
+				))
+			layers.append((z, vertices))
+
+		return ToolpathPreview((minX, minY, maxX, maxY), layers)
+
+	def write(self, path):
+		minX, minY, maxX, maxY = self._bounds
+		data = [ToolpathPreview._header.pack(ToolpathPreview.MAGIC, ToolpathPreview.VERSION, minX, minY, maxX, maxY, len(self._layers))]
+		for z, vertices in self._layers:
+			data.append(ToolpathPreview._layer.pack(z, len(vertices)))
+			for vertex in vertices:
+				data.append(ToolpathPreview._vertex.pack(*vertex))
+
+		with util.atomicWrite(path) as f:
+			f.write("".join(data))
+
+	def getBounds(self):
+		return self._bounds
+
+	def getLayers(self):
+		"""
+		Returns the layers as list of (z, vertices) tuples, with vertices being a list of quantized (x, y, extrude)
+		tuples.
+		"""
+		return list(self._layers)
+
+	def getLayerCount(self):
+		return len(self._layers)
+
+	def getVertexCount(self):
+		return sum(len(vertices) for _, vertices in self._layers)
+
+
+_ALWAYS = float("inf")
+
+
+def _getSignificances(xs, ys, flags, minEpsilon):
+	"""
+	Determines the significance of all points of the given path for simplifying runs of extrusion moves with the
+	Ramer-Douglas-Peucker algorithm: The simplification with an epsilon keeps exactly the points whose significance is
+	greater than that epsilon. Travel moves as well as start and end of every run are always kept. Points that would
+	already be dropped for ``minEpsilon`` are omitted.
+
+	Returns a list of (index, significance) tuples in path order.
+	"""
+	result = []
+	run = []
+	for index in xrange(len(xs)):
+		if flags[index]:
+			run.append(index)
+			continue
+
+		if run:
+			result.extend(_getRunSignificances(xs, ys, run, minEpsilon))
+			run = []
+		result.append((index, _ALWAYS))
+
+	if run:
+		result.extend(_getRunSignificances(xs, ys, run, minEpsilon))
+
+	return result
+
+
+def _getRunSignificances(xs, ys, run, minEpsilon):
+	if len(run) < 3:
+		return [(index, _ALWAYS) for index in run]
+
+	px = [xs[index] for index in run]
+	py = [ys[index] for index in run]
+	significances = [None] * len(run)
+	significances[0] = significances[-1] = _ALWAYS
+
+	# a point's significance is its distance to the segment it splits, limited by the significance of the point that
+	# split the enclosing segment, so that the significances decrease monotonically down the hierarchy
+	stack = [(0, len(run) - 1, _ALWAYS)]
+	while stack:
+		first, last, limit = stack.pop()
+		x1, y1 = px[first], py[first]
+		dx, dy = px[last] - x1, py[last] - y1
+		length = math.sqrt(dx * dx + dy * dy)
+
+		maxDistance = 0.0
+		maxIndex = None
+		if length > 0:
+			for i in xrange(first + 1, last):
+				distance = abs(dx * (py[i] - y1) - dy * (px[i] - x1))
+				if distance > maxDistance:
+					maxDistance = distance
+					maxIndex = i
+			maxDistance /= length
+		else:
+			for i in xrange(first + 1, last):
+				distance = math.hypot(px[i] - x1, py[i] - y1)
+				if distance > maxDistance:
+					maxDistance = distance
+					maxIndex = i
+
+		if maxIndex is not None and maxDistance > minEpsilon:
+			significance = min(maxDistance, limit)
+			significances[maxIndex] = significance
+			stack.append((first, maxIndex, significance))
+			stack.append((maxIndex, last, significance))
+
+	return [(index, significance) for index, significance in zip(run, significances) if significance is not None]
+
+
+class StreamingUpload(object):
+	"""
+	An uploaded file that is written to a temporary file next to its destination while it's being received. Its
+	SHA1 hash is computed along the way and, if requested, the data is fed to an IncrementalAnalysis.
+	"""
+
+	def __init__(self, absolutePath, analyze=True):
+		self._absolutePath = absolutePath
+
+		fd, self._tempPath = tempfile.mkstemp(prefix=".", suffix=".upload", dir=os.path.dirname(absolutePath))
+		os.chmod(self._tempPath, 0644)
+		self._file = os.fdopen(fd, "wb")
+
+		self._hash = hashlib.sha1()
+		self._size = 0
+		self._analysis = IncrementalAnalysis() if analyze else None
+
+	def getAbsolutePath(self):
+		return self._absolutePath
+
+	def getHash(self):
+		return self._hash.hexdigest()
+
+	def getSize(self):
+		return self._size
+
+	def isAnalyzing(self):
+		return self._analysis is not None
+
+	def write(self, data):
+		self._file.write(data)
+		self._hash.update(data)
+		self._size += len(data)
+		if self._analysis is not None:
+			self._analysis.feed(data)
+
+	def finish(self, analysisCallback=None):
+		"""
+		Moves the completely received file to its destination. If it's being analysed, ``analysisCallback`` will be
+		called with the finished gcodeInterpreter.gcode instance.
+		"""
+		self._file.close()
+		util.safeRename(self._tempPath, self._absolutePath)
+		if self._analysis is not None:
+			self._analysis.finish(analysisCallback)
+
+	def abort(self):
+		self._file.close()
+		util.silentRemove(self._tempPath)
+		if self._analysis is not None:
+			self._analysis.abort()
+
+
+class IncrementalAnalysis(object):
+	"""
+	Runs a gcode analysis in a background thread on data that is fed to it in arbitrary chunks, e.g. while the file is
+	still being received. Splitting the chunks into lines happens on the analysis thread too.
+
+	At most ``queueSize`` chunks wait for the analysis, feeding more blocks until the analysis caught up, so a slow
+	analysis doesn't keep a copy of the whole file in memory.
+	"""
+
+	def __init__(self, queueSize=16):
+		self._logger = logging.getLogger(__name__)
+
+		self._gcode = gcodeInterpreter.gcode()
+		self._queue = Queue.Queue(queueSize)
+		self._callback = None
+
+		self._worker = threading.Thread(target=self._work)
+		self._worker.daemon = True
+		self._worker.start()
+
+	def feed(self, data):
+		self._put(data)
+
+	def finish(self, callback=None):
+		self._callback = callback
+		self._put(None)
+
+	def abort(self):
+		self._gcode.abort()
+		self._put(None)
+
+	def join(self, timeout=None):
+		self._worker.join(timeout)
+
+	def _put(self, data):
+		# an analysis that stopped early (aborted or failed) doesn't take anything from the queue anymore
+		while self._worker.is_alive():
+			try:
+				self._queue.put(data, timeout=1.0)
+				return
+			except Queue.Full:
+				pass
+
+	def _lines(self):
+		# lines keep their line endings, just like when iterating over a file
+		remainder = ""
+		while True:
+			data = self._queue.get()
+			if data is None:
+				break
+
+			lines = (remainder + str(data)).split("\n")
+			remainder = lines.pop()
+			for line in lines:
+				yield line + "\n"
+
+		if remainder:
+			yield remainder
+
+	def _work(self):
+		try:
+			self._gcode.loadLines(self._lines())
+		except gcodeInterpreter.AnalysisAborted:
+			return
+		except:
+			self._logger.exception("Error while analysing uploaded file")
+			return
+
+		if self._callback is not None:
+			self._callback(self._gcode)
+
 
 class MetadataAnalyzer:
 	def __init__(self, getPathCallback, loadedCallback):
@@ -0,0 +1,253 @@
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import os
+import time
+import sqlite3
+import threading
+import logging
+
+from octoprint.settings import settings
+
+
+class PrintHistory(object):
+	"""
+	Stores one record per finished or failed print job (file, printer, start and end time, actual and estimated print
+	time, filament used, outcome) in an SQLite database next to the configuration. Aggregates are computed by the database
+	over indexed columns, so queries stay cheap and never load the whole history into memory, even after years of
+	printing.
+
+	The ratio between actual and estimated print time of past jobs is used to calibrate the estimated print time of
+	new jobs, see :meth:`getEstimateRatio`.
+	"""
+
+	SCHEMA_VERSION = 2
+
+	GROUP_BY = {
+		"file": "filename",
+		"printer": "printer",
+		"day": "day",
+		"outcome": "success"
+	}
+
+	def __init__(self, path=None, ratioJobs=20):
+		"""
+		:param path: path of the database, defaults to ``history.db`` in the settings folder
+		:param ratioJobs: number of most recent successful jobs the estimate ratio of a printer is learned from
+		"""
+		self._logger = logging.getLogger(__name__)
+
+		if path is None:
+			path = os.path.join(settings().settings_dir, "history.db")
+		self._path = path
+		self._ratioJobs = ratioJobs
+
+		self._mutex = threading.RLock()
+		self._connection = sqlite3.connect(path, check_same_thread=False)
+		self._migrate()
+
+		self._ratioCache = dict()
+
+	def _migrate(self):
+		with self._mutex:
+			version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+			if version >= PrintHistory.SCHEMA_VERSION:
+				return
+
+			with self._connection:
+				if version < 1:
+					self._connection.execute(
+						"CREATE TABLE IF NOT EXISTS jobs ("
+						"id INTEGER PRIMARY KEY, "
+						"filename TEXT NOT NULL, "
+						"origin TEXT, "
+						"start REAL, "
+						"end REAL NOT NULL, "
+						"day TEXT NOT NULL, "
+						"success INTEGER NOT NULL, "
+						"printTime REAL, "
+						"estimatedPrintTime REAL, "
+						"filament REAL)"
+					)
+					self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_filename ON jobs (filename, end)")
+					self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_day ON jobs (day)")
+					self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_success ON jobs (success, end)")
+				if version < 2:
+					# jobs recorded before don't know their printer
+					self._connection.execute("ALTER TABLE jobs ADD COLUMN printer TEXT")
+					self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_printer ON jobs (printer, end)")
+				self._connection.execute("PRAGMA user_version = %d" % PrintHistory.SCHEMA_VERSION)
+
+	def close(self):
+		with self._mutex:
+			self._connection.close()
+
+	def record(self, filename, success, printTime=None, estimatedPrintTime=None, filament=None, origin=None, end=None, printer=None):
+		"""
+		Records a finished (``success`` = True) or failed print job.
+
+		:param filename: name of the printed file
+		:param printer: id of the printer the job ran on
+		:param printTime: time the job took in seconds, if known
+		:param estimatedPrintTime: print time in seconds estimated by the analysis of the file (uncalibrated), if known
+		:param filament: filament used in mm, if known
+		:param origin: origin of the file, local or sdcard
+		:param end: time the job ended, defaults to now
+		"""
+		if end is None:
+			end = time.time()
+		start = end - printTime if printTime is not None else None
+
+		with self._mutex:
+			with self._connection:
+				self._connection.execute(
+					"INSERT INTO jobs (filename, printer, origin, start, end, day, success, printTime, estimatedPrintTime, filament) "
+					"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+					(filename, printer, origin, start, end, time.strftime("%Y-%m-%d", time.localtime(end)), 1 if success else 0, printTime, estimatedPrintTime, filament)
+				)
+			self._ratioCache.clear()
+
+	def changeLastOutcome(self, filename, success):
+		"""
+		Changes the outcome of the most recent job of the given file.
+		"""
+		with self._mutex:
+			with self._connection:
+				self._connection.execute(
+					"UPDATE jobs SET success = ? WHERE id = (SELECT id FROM jobs WHERE filename = ? ORDER BY end DESC LIMIT 1)",
+					(1 if success else 0, filename)
+				)
+			self._ratioCache.clear()
+
+	def getJobs(self, filename=None, before=None, limit=50, printer=None):
+		"""
+		Returns up to ``limit`` jobs that ended before the given time, most recent first, as list of dicts. Use the
+		``end`` of the last job returned as ``before`` to retrieve the next page.
+		"""
+		where, parameters = PrintHistory._createWhere(filename=filename, printer=printer, until=before)
+		with self._mutex:
+			cursor = self._connection.execute(
+				"SELECT filename, printer, origin, start, end, success, printTime, estimatedPrintTime, filament FROM jobs%s "
+				"ORDER BY end DESC LIMIT ?" % where,
+				parameters + [limit]
+			)
+			return [{
+				"file": row[0],
+				"printer": row[1],
+				"origin": row[2],
+				"start": row[3],
+				"end": row[4],
+				"success": bool(row[5]),
+				"printTime": row[6],
+				"estimatedPrintTime": row[7],
+				"filament": row[8]
+			} for row in cursor]
+
+	def getStatistics(self, groupBy=None, filename=None, since=None, until=None, success=None, printer=None):
+		"""
+		Aggregates all jobs matching the given filters, either in total or grouped by ``file``, ``printer``, ``day`` or
+		``outcome``. Returns a dict with the group as key (None if not grouped) and as value a dict containing the
+		number of jobs, number of successful jobs, the summed up actual and estimated print time and filament used.
+
+		:param since: only include jobs that ended at or after this time
+		:param until: only include jobs that ended before this time
+		:param success: only include successful (True) or failed (False) jobs
+		:param printer: only include jobs of the printer with this id
+		"""
+		if groupBy is not None and not groupBy in PrintHistory.GROUP_BY:
+			raise ValueError("Unknown grouping: %s" % groupBy)
+
+		where, parameters = PrintHistory._createWhere(filename=filename, printer=printer, since=since, until=until, success=success)
+		column = PrintHistory.GROUP_BY[groupBy] if groupBy is not None else "NULL"
+		grouping = " GROUP BY %s" % column if groupBy is not None else ""
+
+		result = dict()
+		with self._mutex:
+			cursor = self._connection.execute(
+				"SELECT %s, COUNT(*), SUM(success), TOTAL(printTime), TOTAL(estimatedPrintTime), TOTAL(filament) "
+				"FROM jobs%s%s" % (column, where, grouping),
+				parameters
+			)
+			for group, count, successes, printTime, estimatedPrintTime, filament in cursor:
+				if not count:
+					continue
+				if groupBy == "outcome":
+					group = "success" if group else "failure"
+				result[group] = {
+					"count": count,
+					"success": successes,
+					"printTime": printTime,
+					"estimatedPrintTime": estimatedPrintTime,
+					"filament": filament
+				}
+		return result
+
+	def getEstimateRatio(self, filename=None, printer=None):
+		"""
+		Returns the ratio between actual and estimated print time, learned from the successful jobs of the given file
+		if there are any, otherwise from the most recent successful jobs of any file. If ``printer`` is given only its
+		jobs are taken into account, falling back to the jobs of all printers if it has none. Returns None if there
+		are no jobs to learn from.
+		"""
+		with self._mutex:
+			key = (filename, printer)
+			if key in self._ratioCache:
+				return self._ratioCache[key]
+
+			printerCondition = ""
+			printerParameters = []
+			if printer is not None:
+				printerCondition = "printer = ? AND "
+				printerParameters = [printer]
+
+			ratio = None
+			if filename is not None:
+				ratio = self._queryRatio(
+					"SELECT TOTAL(printTime), TOTAL(estimatedPrintTime) FROM jobs "
+					"WHERE " + printerCondition + "filename = ? AND success = 1 AND printTime > 0 AND estimatedPrintTime > 0",
+					printerParameters + [filename]
+				)
+			if ratio is None:
+				ratio = self._queryRatio(
+					"SELECT TOTAL(printTime), TOTAL(estimatedPrintTime) FROM (SELECT printTime, estimatedPrintTime FROM jobs "
+					"WHERE " + printerCondition + "success = 1 AND printTime > 0 AND estimatedPrintTime > 0 "
+					"ORDER BY end DESC LIMIT ?)",
+					printerParameters + [self._ratioJobs]
+				)
+			if ratio is None and printer is not None:
+				# no jobs on this printer yet
+				ratio = self.getEstimateRatio(filename)
+
+			self._ratioCache[key] = ratio
+			return ratio
+
+	def _queryRatio(self, query, parameters):
+		printTime, estimatedPrintTime = self._connection.execute(query, parameters).fetchone()
+		if not estimatedPrintTime:
+			return None
+		return printTime / estimatedPrintTime
+
+	@staticmethod
+	def _createWhere(filename=None, printer=None, since=None, until=None, success=None):
+		conditions = []
+		parameters = []
+		if filename is not None:
+			conditions.append("filename = ?")
+			parameters.append(filename)
+		if printer is not None:
+			conditions.append("printer = ?")
+			parameters.append(printer)
+		if since is not None:
+			conditions.append("end >= ?")
+			parameters.append(since)
+		if until is not None:
+			conditions.append("end < ?")
+			parameters.append(until)
+		if success is not None:
+			conditions.append("success = ?")
+			parameters.append(1 if success else 0)
+
+		if not conditions:
+			return "", parameters
+		return " WHERE " + " AND ".join(conditions), parameters
@@ -0,0 +1,492 @@
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import os
+import time
+import datetime
+import sqlite3
+import threading
+import logging
+import bisect
+
+from octoprint.settings import settings
+from octoprint.events import eventManager, Events
+
+
+class QueuedJob(object):
+	"""
+	A file waiting in the :class:`JobQueue` to be printed, either on any printer or only on the given one.
+	"""
+
+	__slots__ = ("id", "filename", "printer", "priority", "added", "estimatedPrintTime", "filament")
+
+	def __init__(self, id, filename, printer=None, priority=0, added=None, estimatedPrintTime=None, filament=None):
+		self.id = id
+		self.filename = filename
+		self.printer = printer
+		self.priority = priority
+		self.added = added if added is not None else time.time()
+		self.estimatedPrintTime = estimatedPrintTime
+		self.filament = filament
+
+	def asDict(self):
+		return {
+			"id": self.id,
+			"file": self.filename,
+			"printer": self.printer,
+			"priority": self.priority,
+			"added": self.added,
+			"estimatedPrintTime": self.estimatedPrintTime,
+			"filament": self.filament
+		}
+
+
+class _JobIndex(object):
+	"""
+	The jobs of one priority that may be printed on one printer (or on any printer), kept sorted by estimated print
+	time, jobs without an estimate yet by the time they were added. Lookups are binary searches, so picking a job
+	stays cheap even with thousands of them queued.
+	"""
+
+	def __init__(self):
+		self._known = []
+		self._unknown = []
+
+	def __len__(self):
+		return len(self._known) + len(self._unknown)
+
+	def add(self, job):
+		if job.estimatedPrintTime is not None:
+			bisect.insort(self._known, (job.estimatedPrintTime, job.added, job.id, job))
+		else:
+			bisect.insort(self._unknown, (job.added, job.id, job))
+
+	def remove(self, job):
+		if job.estimatedPrintTime is not None:
+			entries, key = self._known, (job.estimatedPrintTime, job.added, job.id)
+		else:
+			entries, key = self._unknown, (job.added, job.id)
+
+		position = bisect.bisect_left(entries, key)
+		if position < len(entries) and entries[position][-1] is job:
+			del entries[position]
+
+	def select(self, remaining=None, filament=None):
+		"""
+		Returns a tuple of rank and job of the best job in this index for a printer which has ``remaining`` seconds
+		left until the end of the shift (None if there's no end) and ``filament`` mm of filament left (None if
+		unknown), or None if no job fits. Ranks of different indexes are comparable, lower is better.
+
+		Without an end of shift the shortest job comes first. Otherwise the longest job still finishing before the end
+		of shift is picked, so the gap gets filled as well as possible, then jobs without an estimate, and if none of
+		those are left either the longest job, which gets the most out of the time nobody is around anyway.
+		"""
+		def fits(job):
+			return filament is None or job.filament is None or job.filament <= filament
+
+		if remaining is None:
+			for estimate, added, _, job in self._known:
+				if fits(job):
+					return (0, estimate, added), job
+		else:
+			position = bisect.bisect_right(self._known, (remaining, float("inf")))
+			for i in xrange(position - 1, -1, -1):
+				estimate, added, _, job = self._known[i]
+				if fits(job):
+					return (0, -estimate, added), job
+
+		for added, _, job in self._unknown:
+			if fits(job):
+				return (1, added), job
+
+		if remaining is not None:
+			for i in xrange(len(self._known) - 1, position - 1, -1):
+				estimate, added, _, job = self._known[i]
+				if fits(job):
+					return (2, -estimate, added), job
+
+		return None
+
+
+class JobQueue(object):
+	"""
+	Persistent queue of print jobs, stored in an SQLite database next to the configuration and held in memory in
+	:class:`_JobIndex` instances per priority and printer, which :meth:`next` picks the job to print next from.
+	"""
+
+	SCHEMA_VERSION = 1
+
+	def __init__(self, path=None):
+		"""
+		:param path: path of the database, defaults to ``queue.db`` in the settings folder
+		"""
+		self._logger = logging.getLogger(__name__)
+
+		if path is None:
+			path = os.path.join(settings().settings_dir, "queue.db")
+		self._path = path
+
+		self._mutex = threading.RLock()
+		self._connection = sqlite3.connect(path, check_same_thread=False)
+		self._migrate()
+
+		self._jobs = dict()
+		self._jobsByFilename = dict()
+		self._indexes = dict()
+		self._load()
+
+	def _migrate(self):
+		with self._mutex:
+			version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+			if version >= JobQueue.SCHEMA_VERSION:
+				return
+
+			with self._connection:
+				self._connection.execute(
+					"CREATE TABLE IF NOT EXISTS queue ("
+					"id INTEGER PRIMARY KEY, "
+					"filename TEXT NOT NULL, "
+					"printer TEXT, "
+					"priority INTEGER NOT NULL, "
+					"added REAL NOT NULL, "
+					"estimatedPrintTime REAL, "
+					"filament REAL)"
+				)
+				self._connection.execute("PRAGMA user_version = %d" % JobQueue.SCHEMA_VERSION)
+
+	def _load(self):
+		with self._mutex:
+			cursor = self._connection.execute("SELECT id, filename, printer, priority, added, estimatedPrintTime, filament FROM queue")
+			for row in cursor:
+				self._index(QueuedJob(*row))
+
+	def close(self):
+		with self._mutex:
+			self._connection.close()
+
+	def __len__(self):
+		return len(self._jobs)
+
+	def add(self, filename, printer=None, priority=0, estimatedPrintTime=None, filament=None):
+		"""
+		Adds a job for the given file to the queue and returns it.
+
+		:param printer: id of the printer to print the job on, None for any printer
+		:param priority: jobs with a higher priority are printed first
+		:param estimatedPrintTime: estimated print time in seconds, if known
+		:param filament: filament needed in mm, if known
+		"""
+		added = time.time()
+		with self._mutex:
+			with self._connection:
+				cursor = self._connection.execute(
+					"INSERT INTO queue (filename, printer, priority, added, estimatedPrintTime, filament) VALUES (?, ?, ?, ?, ?, ?)",
+					(filename, printer, priority, added, estimatedPrintTime, filament)
+				)
+			job = QueuedJob(cursor.lastrowid, filename, printer=printer, priority=priority, added=added, estimatedPrintTime=estimatedPrintTime, filament=filament)
+			self._index(job)
+		return job
+
+	def remove(self, id):
+		"""
+		Removes the job with the given id from the queue and returns it, or None if there is no such job.
+		"""
+		with self._mutex:
+			job = self._jobs.get(id)
+			if job is None:
+				return None
+
+			with self._connection:
+				self._connection.execute("DELETE FROM queue WHERE id = ?", (id,))
+			self._unindex(job)
+		return job
+
+	def get(self, id):
+		return self._jobs.get(id)
+
+	def getJobs(self, printer=None):
+		"""
+		Returns all queued jobs (only those that may be printed on the given printer, if set), highest priority
+		first, then in the order they were added.
+		"""
+		with self._mutex:
+			jobs = [job for job in self._jobs.values() if printer is None or job.printer is None or job.printer == printer]
+		return sorted(jobs, key=lambda job: (-job.priority, job.added, job.id))
+
+	def updateEstimates(self, filename, estimatedPrintTime, filament):
+		"""
+		Updates estimated print time and filament of all queued jobs of the given file, e.g. after its analysis
+		finished.
+		"""
+		with self._mutex:
+			ids = self._jobsByFilename.get(filename)
+			if not ids:
+				return
+
+			with self._connection:
+				self._connection.execute(
+					"UPDATE queue SET estimatedPrintTime = ?, filament = ? WHERE filename = ?",
+					(estimatedPrintTime, filament, filename)
+				)
+			for id in list(ids):
+				job = self._jobs[id]
+				self._unindex(job)
+				job.estimatedPrintTime = estimatedPrintTime
+				job.filament = filament
+				self._index(job)
+
+	def next(self, printer, remaining=None, filament=None):
+		"""
+		Returns the job to print next on the given printer without removing it from the queue, or None if there's
+		none. Jobs of higher priority always come first, within a priority the job is picked as described in
+		:meth:`_JobIndex.select`.
+
+		:param remaining: seconds left until the end of the current shift, None if there's no end
+		:param filament: mm of filament left on the printer, None if unknown
+		"""
+		with self._mutex:
+			for priority in sorted(self._indexes.keys(), reverse=True):
+				indexes = self._indexes[priority]
+				candidates = []
+				for key in (None, printer):
+					if key in indexes:
+						candidate = indexes[key].select(remaining=remaining, filament=filament)
+						if candidate is not None:
+							candidates.append(candidate)
+				if candidates:
+					return min(candidates, key=lambda candidate: candidate[0])[1]
+		return None
+
+	def _index(self, job):
+		self._jobs[job.id] = job
+		self._jobsByFilename.setdefault(job.filename, set()).add(job.id)
+		self._indexes.setdefault(job.priority, dict()).setdefault(job.printer, _JobIndex()).add(job)
+
+	def _unindex(self, job):
+		del self._jobs[job.id]
+
+		ids = self._jobsByFilename[job.filename]
+		ids.discard(job.id)
+		if not ids:
+			del self._jobsByFilename[job.filename]
+
+		indexes = self._indexes[job.priority]
+		indexes[job.printer].remove(job)
+		if not len(indexes[job.printer]):
+			del indexes[job.printer]
+		if not indexes:
+			del self._indexes[job.priority]
+
+
+class JobScheduler(object):
+	"""
+	Starts the jobs of the :class:`JobQueue` on idle printers. A printer only gets a new job after it has been marked
+	as ready (i.e. its bed has been cleared), the job to start is picked based on the calibrated estimated print
+	time and filament usage from the analysis of the queued files and, if configured via ``jobQueue.shiftEnd``, the
+	time left until the end of the shift.
+	"""
+
+	def __init__(self, queue, printerRegistry, gcodeManager, interval=5.0):
+		self._logger = logging.getLogger(__name__)
+
+		self._queue = queue
+		self._printerRegistry = printerRegistry
+		self._gcodeManager = gcodeManager
+		self._interval = interval
+
+		self._ready = dict()
+		self._filament = dict()
+		self._prestaged = dict()
+		self._mutex = threading.RLock()
+
+		self._changed = threading.Event()
+		self._worker = threading.Thread(target=self._work)
+		self._worker.daemon = True
+		self._worker.start()
+
+		eventManager().subscribe(Events.METADATA_ANALYSIS_FINISHED, self._onMetadataAnalysisFinished)
+
+	def getQueue(self):
+		return self._queue
+
+	def enqueue(self, filename, printer=None, priority=0):
+		"""
+		Adds the given local file to the queue and returns the job, or None if there is no such file.
+		"""
+		fileData = self._gcodeManager.getFileData(filename)
+		if fileData is None:
+			return None
+
+		estimatedPrintTime, filament = JobScheduler._getEstimates(fileData.get("gcodeAnalysis"))
+		job = self._queue.add(fileData["name"], printer=printer, priority=priority, estimatedPrintTime=estimatedPrintTime, filament=filament)
+		self._changed.set()
+		return job
+
+	def setPrinterReady(self, printer, ready=True, filament=None):
+		"""
+		Marks the given printer as ready to start the next job (or not). If given, ``filament`` is the filament in mm
+		left on the printer, jobs needing more than that are not started on it.
+		"""
+		with self._mutex:
+			self._ready[printer] = ready
+			if filament is not None:
+				self._filament[printer] = filament
+		self._changed.set()
+
+	def getPrinterState(self, printer):
+		with self._mutex:
+			return {
+				"ready": self._ready.get(printer, False),
+				"filament": self._filament.get(printer)
+			}
+
+	def getRemainingShiftTime(self, now=None):
+		"""
+		Returns the seconds left until the next end of shift as configured via ``jobQueue.shiftEnd`` (``HH:MM``), or
+		None if not configured.
+		"""
+		shiftEnd = settings().get(["jobQueue", "shiftEnd"])
+		if not shiftEnd:
+			return None
+
+		try:
+			hour, minute = map(int, shiftEnd.split(":"))
+		except ValueError:
+			self._logger.warn("Invalid end of shift, expected HH:MM: %s" % shiftEnd)
+			return None
+
+		if now is None:
+			now = time.time()
+		current = datetime.datetime.fromtimestamp(now)
+		end = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+		if end <= current:
+			end += datetime.timedelta(days=1)
+		return time.mktime(end.timetuple()) - now
+
+	def schedule(self, now=None):
+		"""
+		Starts the next job on every printer that is ready and idle. Returns a list of (printer id, job) tuples of the
+		started jobs.
+		"""
+		remaining = self.getRemainingShiftTime(now)
+
+		started = []
+		with self._mutex:
+			for printer in self._printerRegistry.getAll():
+				id = printer.getId()
+				if not self._ready.get(id, False) or not printer.isReady() or printer.isPrinting() or printer.isPaused():
+					continue
+
+				filament = self._filament.get(id)
+				while True:
+					job = self._queue.next(id, remaining=self._forPrinter(remaining, id), filament=filament)
+					if job is None:
+						break
+
+					path = self._gcodeManager.getAbsolutePath(job.filename)
+					if path is None:
+						self._logger.warn("Dropping queued job %d, %s does not exist anymore" % (job.id, job.filename))
+						self._queue.remove(job.id)
+						continue
+
+					self._logger.info("Starting queued job %d (%s) on printer %s" % (job.id, job.filename, id))
+					try:
+						printer.selectFile(path, False, True)
+					except:
+						self._logger.exception("Error while starting queued job %d on printer %s" % (job.id, id))
+					if not printer.isPrinting():
+						# the printer silently refuses to select or start when it's busy, try again later
+						self._logger.warn("Printer %s did not start queued job %d, keeping it queued" % (id, job.id))
+						break
+
+					self._queue.remove(job.id)
+					self._ready[id] = False
+					if filament is not None and job.filament is not None:
+						self._filament[id] = filament - job.filament
+					started.append((id, job))
+					break
+		return started
+
+	def prestage(self, now=None):
+		"""
+		Has every printer whose current job is about to end (less than ``jobQueue.prestage.lead`` seconds left)
+		prepare the file of the job it will most likely get next, so that job starts without delay. Returns a list of
+		(printer id, job) tuples of the prestaged jobs.
+		"""
+		lead = settings().getFloat(["jobQueue", "prestage", "lead"])
+		if not lead or lead <= 0:
+			return []
+
+		remaining = self.getRemainingShiftTime(now)
+
+		prestaged = []
+		with self._mutex:
+			for printer in self._printerRegistry.getAll():
+				id = printer.getId()
+				if not printer.isPrinting():
+					self._prestaged.pop(id, None)
+					continue
+
+				timeLeft = printer.getPrintTimeLeft()
+				if timeLeft is None or timeLeft > lead:
+					continue
+
+				# the next job starts once the current one is done, the shift is shorter by then
+				left = max(0, remaining - timeLeft) if remaining is not None else None
+				job = self._queue.next(id, remaining=self._forPrinter(left, id), filament=self._filament.get(id))
+				if job is None or self._prestaged.get(id) == job.id:
+					continue
+
+				path = self._gcodeManager.getAbsolutePath(job.filename)
+				if path is None:
+					continue
+
+				self._logger.info("Prestaging queued job %d (%s) on printer %s" % (job.id, job.filename, id))
+				self._prestaged[id] = job.id
+				printer.prestageFile(path)
+				prestaged.append((id, job))
+		return prestaged
+
+	def _forPrinter(self, remaining, printer):
+		"""
+		Converts the seconds ``remaining`` on ``printer`` into the estimates of the queued jobs, which are calibrated
+		by the jobs of all printers, so that faster or slower printers get the jobs they actually manage in time.
+		"""
+		if remaining is None:
+			return None
+
+		history = self._gcodeManager.getHistory()
+		ratio = history.getEstimateRatio(printer=printer)
+		overall = history.getEstimateRatio()
+		if not ratio or not overall:
+			return remaining
+		return remaining * overall / ratio
+
+	def _work(self):
+		while True:
+			self._changed.wait(self._interval)
+			self._changed.clear()
+			try:
+				self.schedule()
+				self.prestage()
+			except:
+				self._logger.exception("Error while scheduling queued jobs")
+
+	def _onMetadataAnalysisFinished(self, event, payload):
+		estimatedPrintTime, filament = None, None
+		fileData = self._gcodeManager.getFileData(payload["file"])
+		if fileData is not None:
+			estimatedPrintTime, filament = JobScheduler._getEstimates(fileData.get("gcodeAnalysis"))
+		self._queue.updateEstimates(payload["file"], estimatedPrintTime, filament)
+		self._changed.set()
+
+	@staticmethod
+	def _getEstimates(gcodeAnalysis):
+		if not gcodeAnalysis:
+			return None, None
+
+		filament = None
+		if "filament" in gcodeAnalysis:
+			filament = sum(tool["length"] for tool in gcodeAnalysis["filament"].values())
+		return gcodeAnalysis.get("estimatedPrintTime"), filament
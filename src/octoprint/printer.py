@@ -8,31 +8,94 @@ import threading
 import copy
 import os
 import logging
+import json
+import hashlib
+import re
+import Queue
 
 import octoprint.util.comm as comm
 import octoprint.util as util
 
 from octoprint.settings import settings
-from octoprint.events import eventManager, Events
+from octoprint.events import eventManager, eventPayload, Events
 
 from octoprint.filemanager.destinations import FileDestinations
 
-def getConnectionOptions():
+def getConnectionOptions(printerId=None, ports=None):
 	"""
-	 Retrieves the available ports, baudrates, prefered port and baudrate for connecting to the printer.
+	 Retrieves the available ports, baudrates, prefered port and baudrate for connecting to the printer. Looks for the
+	 available ports unless they are given as ``ports``.
 	"""
+	preferences = getConnectionPreferences(printerId)
+	if ports is None:
+		ports = comm.serialList()
 	return {
-		"ports": comm.serialList(),
+		"ports": ports,
 		"baudrates": comm.baudrateList(),
-		"portPreference": settings().get(["serial", "port"]),
-		"baudratePreference": settings().getInt(["serial", "baudrate"]),
-		"autoconnect": settings().getBoolean(["serial", "autoconnect"])
+		"portPreference": preferences["port"],
+		"baudratePreference": preferences["baudrate"],
+		"autoconnect": preferences["autoconnect"]
 	}
 
+def getConnectionPreferences(printerId=None):
+	"""
+	 Retrieves the prefered port, baudrate and autoconnect flag of the given printer, taken from ``serial`` for the
+	 default printer and from its entry in ``printers`` for all others.
+	"""
+	if printerId is None or printerId == PrinterRegistry.DEFAULT:
+		return {
+			"port": settings().get(["serial", "port"]),
+			"baudrate": settings().getInt(["serial", "baudrate"]),
+			"autoconnect": settings().getBoolean(["serial", "autoconnect"])
+		}
+
+	config = _getPrinterConfig(printerId)
+	if config is None:
+		config = {}
+	return {
+		"port": config.get("port"),
+		"baudrate": int(config["baudrate"]) if config.get("baudrate") is not None else None,
+		"autoconnect": bool(config.get("autoconnect", False))
+	}
+
+def setConnectionPreferences(printerId=None, **preferences):
+	"""
+	 Sets the given connection preferences (``port``, ``baudrate`` and/or ``autoconnect``) of the given printer. The
+	 settings still need to be saved afterwards.
+	"""
+	if printerId is None or printerId == PrinterRegistry.DEFAULT:
+		if "port" in preferences:
+			settings().set(["serial", "port"], preferences["port"])
+		if "baudrate" in preferences:
+			settings().setInt(["serial", "baudrate"], preferences["baudrate"])
+		if "autoconnect" in preferences:
+			settings().setBoolean(["serial", "autoconnect"], preferences["autoconnect"])
+		return
+
+	printers = copy.deepcopy(settings().get(["printers"]))
+	for config in printers:
+		if config.get("id") == printerId:
+			config.update(preferences)
+			break
+	else:
+		config = {"id": printerId}
+		config.update(preferences)
+		printers.append(config)
+	settings().set(["printers"], printers)
+
+def _getPrinterConfig(printerId):
+	for config in settings().get(["printers"]):
+		if config.get("id") == printerId:
+			return config
+	return None
+
 class Printer():
-	def __init__(self, gcodeManager):
+	def __init__(self, gcodeManager, id="default", name=None):
 		from collections import deque
 
+		self._id = id
+		self._name = name if name is not None else id
+
 		self._gcodeManager = gcodeManager
 		self._gcodeManager.registerCallback(self)
 
@@ -62,6 +125,7 @@ class Printer():
 		self._printTimeLeft = None
 
 		self._printAfterSelect = False
+		self._printCancelled = False
 
 		# sd handling
 		self._sdPrinting = False
@@ -75,6 +139,11 @@ class Printer():
 		# comm
 		self._comm = None
 
+		# the available serial ports, looked up again after connecting or disconnecting or once they are too old
+		self._serialPorts = None
+		self._serialPortsTimestamp = None
+		self._serialPortsMaxAge = 30.0
+
 		# callbacks
 		self._callbacks = []
 		self._lastProgressReport = None
@@ -84,7 +153,8 @@ class Printer():
 			updateCallback=self._sendCurrentDataCallbacks,
 			addTemperatureCallback=self._sendAddTemperatureCallbacks,
 			addLogCallback=self._sendAddLogCallbacks,
-			addMessageCallback=self._sendAddMessageCallbacks
+			addMessageCallback=self._sendAddMessageCallbacks,
+			snapshotCallback=self._getStateSnapshots
 		)
 		self._stateMonitor.reset(
 			state={"state": None, "stateString": self.getStateString(), "flags": self._getStateFlags()},
@@ -107,6 +177,12 @@ class Printer():
 
 		eventManager().subscribe(Events.METADATA_ANALYSIS_FINISHED, self.onMetadataAnalysisFinished);
 
+	def getId(self):
+		return self._id
+
+	def getName(self):
+		return self._name
+
 	#~~ callback handling
 
 	def registerCallback(self, callback):
@@ -147,6 +223,10 @@ class Printer():
 			try: callback.sendFeedbackCommandOutput(name, output)
 			except: pass
 
+	def _fireEvent(self, event, payload=None):
+		# the event bus is shared by all printers, tag our events so they can be told apart
+		eventManager().fire(event, eventPayload(payload, self._id))
+
 	#~~ callback from gcodemanager
 
 	def sendUpdateTrigger(self, type):
@@ -172,7 +252,8 @@ class Printer():
 		"""
 		if self._comm is not None:
 			self._comm.close()
-		self._comm = comm.MachineCom(port, baudrate, callbackObject=self)
+		self._serialPorts = None
+		self._comm = comm.MachineCom(port, baudrate, callbackObject=self, printerId=self._id)
 
 	def disconnect(self):
 		"""
@@ -181,7 +262,8 @@ class Printer():
 		if self._comm is not None:
 			self._comm.close()
 		self._comm = None
-		eventManager().fire(Events.DISCONNECTED)
+		self._serialPorts = None
+		self._fireEvent(Events.DISCONNECTED)
 
 	def command(self, command):
 		"""
@@ -260,10 +342,31 @@ class Printer():
 			return
 
 		self._printAfterSelect = printAfterSelect
-		self._comm.selectFile(filename, sd)
+		self._comm.selectFile(filename, sd, compact=not sd and self._isCompactionAllowed(filename))
 		self._setProgressData(0, None, None, None)
 		self._setCurrentZ(None)
 
+	def _isCompactionAllowed(self, filename):
+		"""
+		 Whether the given local file may be compacted while printing, which if ``gcodeCompaction.verify`` is set
+		 requires the analysis to have verified that the compacted file drives the printer just like the original.
+		"""
+		if not settings().getBoolean(["gcodeCompaction", "enabled"]):
+			return False
+		if not settings().getBoolean(["gcodeCompaction", "verify"]):
+			return True
+
+		compaction = self._gcodeManager.getFileMetadata(filename).get("compaction")
+		return compaction is not None and compaction["identical"]
+
+	def prestageFile(self, filename):
+		"""
+		 Prepares the given local file for being printed next while the current job is still running.
+		"""
+		if self._comm is None:
+			return
+		self._comm.prestageFile(filename)
+
 	def unselectFile(self):
 		if self._comm is not None and (self._comm.isBusy() or self._comm.isStreaming()):
 			return
@@ -301,7 +404,13 @@ class Printer():
 		if self._comm is None:
 			return
 
-		self._comm.cancelPrint()
+		self._printCancelled = True
+		try:
+			self._comm.cancelPrint()
+		finally:
+			self._printCancelled = False
+		printTime = self._comm.getPrintTime()
+		progress = self._comm.getPrintProgress()
 
 		if disableMotorsAndHeater:
 			# disable motors, switch off hotends, bed and fan
@@ -316,14 +425,14 @@ class Printer():
 
 		# mark print as failure
 		if self._selectedFile is not None:
-			self._gcodeManager.printFailed(self._selectedFile["filename"])
+			PrinterTaskWorker.instance().submit(self._gcodeManager.printFailed, self._selectedFile["filename"], printTime=printTime, progress=progress, printer=self._id)
 			payload = {
 				"file": self._selectedFile["filename"],
 				"origin": FileDestinations.LOCAL
 			}
 			if self._selectedFile["sd"]:
 				payload["origin"] = FileDestinations.SDCARD
-			eventManager().fire(Events.PRINT_FAILED, payload)
+			self._fireEvent(Events.PRINT_FAILED, payload)
 
 	#~~ state monitoring
 
@@ -409,7 +518,7 @@ class Printer():
 			if not sd:
 				date = int(os.stat(filename).st_ctime)
 
-			fileData = self._gcodeManager.getFileData(filename)
+			fileData = self._gcodeManager.getFileData(filename, printer=self._id)
 			if fileData is not None and "gcodeAnalysis" in fileData.keys():
 				if "estimatedPrintTime" in fileData["gcodeAnalysis"].keys():
 					estimatedPrintTime = fileData["gcodeAnalysis"]["estimatedPrintTime"]
@@ -472,13 +581,15 @@ class Printer():
 		"""
 		oldState = self._state
 
-		# forward relevant state changes to gcode manager
+		# forward relevant state changes to gcode manager, recording the print writes to disk so it mustn't hold up the
+		# thread processing the received lines
 		if self._comm is not None and oldState == self._comm.STATE_PRINTING:
 			if self._selectedFile is not None:
-				if state == self._comm.STATE_OPERATIONAL:
-					self._gcodeManager.printSucceeded(self._selectedFile["filename"])
+				if state == self._comm.STATE_OPERATIONAL and not self._printCancelled:
+					# cancelled prints are recorded as failures by cancelPrint
+					PrinterTaskWorker.instance().submit(self._gcodeManager.printSucceeded, self._selectedFile["filename"], printTime=self._comm.getPrintTime(), printer=self._id)
 				elif state == self._comm.STATE_CLOSED or state == self._comm.STATE_ERROR or state == self._comm.STATE_CLOSED_WITH_ERROR:
-					self._gcodeManager.printFailed(self._selectedFile["filename"])
+					PrinterTaskWorker.instance().submit(self._gcodeManager.printFailed, self._selectedFile["filename"], printTime=self._comm.getPrintTime(), progress=self._comm.getPrintProgress(), printer=self._id)
 			self._gcodeManager.resumeAnalysis() # printing done, put those cpu cycles to good use
 		elif self._comm is not None and state == self._comm.STATE_PRINTING:
 			self._gcodeManager.pauseAnalysis() # do not analyse gcode while printing
@@ -508,7 +619,7 @@ class Printer():
 		if newZ != oldZ:
 			# we have to react to all z-changes, even those that might "go backward" due to a slicer's retraction or
 			# anti-backlash-routines. Event subscribes should individually take care to filter out "wrong" z-changes
-			eventManager().fire(Events.Z_CHANGE, {"new": newZ, "old": oldZ})
+			self._fireEvent(Events.Z_CHANGE, {"new": newZ, "old": oldZ})
 
 		self._setCurrentZ(newZ)
 
@@ -516,7 +627,7 @@ class Printer():
 		self._stateMonitor.setState({"state": self._state, "stateString": self.getStateString(), "flags": self._getStateFlags()})
 
 	def mcSdFiles(self, files):
-		eventManager().fire(Events.UPDATED_FILES, {"type": "gcode"})
+		self._fireEvent(Events.UPDATED_FILES, {"type": "gcode"})
 		self._sdFilelistAvailable.set()
 
 	def mcFileSelected(self, filename, filesize, sd):
@@ -541,7 +652,7 @@ class Printer():
 		self._sdStreaming = False
 
 		if self._streamingFinishedCallback is not None:
-			self._streamingFinishedCallback(self._sdRemoteName, FileDestinations.SDCARD)
+			PrinterTaskWorker.instance().submit(self._streamingFinishedCallback, self._sdRemoteName, FileDestinations.SDCARD)
 
 		self._sdRemoteName = None
 		self._setCurrentZ(None)
@@ -620,6 +731,54 @@ class Printer():
 		currentData = self._stateMonitor.getCurrentData()
 		return currentData["job"]
 
+	def getPrintTimeLeft(self):
+		"""
+		 Returns the estimated time left for the current print job in seconds, None if unknown.
+		"""
+		if self._printTimeLeft is None:
+			return None
+		return self._printTimeLeft * 60
+
+	def getStateSnapshot(self, name):
+		"""
+		 Returns the pre-serialized snapshot of the state exposed via the read-only API endpoint ``name`` (one of
+		 "printer", "job" and "connection") as a tuple (status code, body, etag), or None if there is no such snapshot.
+		"""
+		return self._stateMonitor.getSnapshot(name)
+
+	def _getStateSnapshots(self, data):
+		state, port, baudrate = self.getCurrentConnection()
+		snapshots = {
+			"job": (200, {
+				"job": data["job"],
+				"progress": data["progress"],
+				"state": data["state"]["stateString"]
+			}),
+			"connection": (200, {
+				"current": {
+					"state": state,
+					"port": port,
+					"baudrate": baudrate
+				},
+				"options": getConnectionOptions(self._id, ports=self._getSerialPorts())
+			})
+		}
+		if self.isOperational():
+			snapshots["printer"] = (200, {"temps": self.getCurrentTemperatures()})
+		else:
+			snapshots["printer"] = (409, "Printer is not operational")
+		return snapshots
+
+	def _getSerialPorts(self):
+		# looking for the serial ports means globbing /dev, too expensive to do for every state update
+		now = time.time()
+		ports = self._serialPorts
+		if ports is None or now - self._serialPortsTimestamp > self._serialPortsMaxAge:
+			ports = comm.serialList()
+			self._serialPortsTimestamp = now
+			self._serialPorts = ports
+		return ports
+
 	def getCurrentTemperatures(self):
 		if self._comm is not None:
 			tempOffset, bedTempOffset = self._comm.getOffsets()
@@ -653,6 +812,16 @@ class Printer():
 		port, baudrate = self._comm.getConnection()
 		return self._comm.getStateString(), port, baudrate
 
+	def getResendStatistics(self):
+		if self._comm is None:
+			return None
+		return self._comm.getResendStatistics()
+
+	def getProfilerStatistics(self):
+		if self._comm is None:
+			return None
+		return self._comm.getProfilerStatistics()
+
 	def isClosedOrError(self):
 		return self._comm is None or self._comm.isClosedOrError()
 
@@ -680,13 +849,221 @@ class Printer():
 	def isLoading(self):
 		return self._gcodeLoader is not None
 
+class PrinterRegistry(object):
+	"""
+	Hosts all printers served by this instance in one process. Each printer gets its own :class:`Printer` and with
+	it its own serial connection, while the gcode manager (and with it the file storage, metadata, history and the
+	analysis queue), the event bus and the thread pushing the state updates (see :class:`StateMonitorDispatcher`)
+	are shared between all of them.
+
+	The printer configured under ``serial`` is always available as ``default``, additional printers are configured
+	as list under ``printers``, each entry consisting of an ``id`` and optionally a ``name``, ``port``,
+	``baudrate`` and ``autoconnect`` flag.
+	"""
+
+	DEFAULT = "default"
+
+	_validId = re.compile("^[A-Za-z0-9_-]+$")
+
+	def __init__(self, gcodeManager):
+		from collections import OrderedDict
+
+		self._logger = logging.getLogger(__name__)
+
+		self._gcodeManager = gcodeManager
+		self._printers = OrderedDict()
+		self._mutex = threading.Lock()
+
+		self.add(PrinterRegistry.DEFAULT)
+
+	@staticmethod
+	def fromSettings(gcodeManager):
+		"""
+		Creates a registry containing the default printer and all printers configured under ``printers``.
+		"""
+		registry = PrinterRegistry(gcodeManager)
+		for config in settings().get(["printers"]):
+			try:
+				registry.add(config.get("id"), name=config.get("name"))
+			except ValueError as e:
+				registry._logger.warn("Ignoring printer configuration %r: %s" % (config, str(e)))
+		return registry
+
+	def add(self, id, name=None):
+		"""
+		Creates and registers a new printer with the given id, which must only consist of letters, digits,
+		``_`` and ``-``. Raises a ValueError if the id is invalid or already taken.
+		"""
+		if id is None or not PrinterRegistry._validId.match(id):
+			raise ValueError("Invalid printer id: %r" % id)
+
+		with self._mutex:
+			if id in self._printers:
+				raise ValueError("Printer %s is already registered" % id)
+			printer = Printer(self._gcodeManager, id=id, name=name)
+			self._printers[id] = printer
+		return printer
+
+	def get(self, id):
+		"""
+		Returns the printer with the given id, or None if there's no such printer.
+		"""
+		return self._printers.get(id)
+
+	def getDefault(self):
+		return self._printers[PrinterRegistry.DEFAULT]
+
+	def getAll(self):
+		"""
+		Returns all registered printers in the order they were added, the default printer first.
+		"""
+		with self._mutex:
+			return self._printers.values()
+
+	def autoconnect(self):
+		"""
+		Connects all printers which are configured to autoconnect and whose port is currently available.
+		"""
+		ports = None
+		for printer in self.getAll():
+			preferences = getConnectionPreferences(printer.getId())
+			if not preferences["autoconnect"]:
+				continue
+
+			if ports is None:
+				ports = comm.serialList()
+			if preferences["port"] in ports:
+				printer.connect(preferences["port"], preferences["baudrate"])
+
+	def __len__(self):
+		return len(self._printers)
+
+	def __contains__(self, id):
+		return id in self._printers
+
+class StateMonitorDispatcher(object):
+	"""
+	Pushes the state updates of all :class:`StateMonitor` instances from one worker thread instead of one thread per
+	monitor. Monitors schedule themselves whenever their state changes, each one at most once at a time and not
+	before its rate limit has passed since its last update, the worker then processes them in the order they are
+	due.
+	"""
+
+	_instance = None
+	_instanceMutex = threading.Lock()
+
+	@staticmethod
+	def instance():
+		"""
+		Returns the dispatcher shared by all state monitors that weren't given one explicitly.
+		"""
+		with StateMonitorDispatcher._instanceMutex:
+			if StateMonitorDispatcher._instance is None:
+				StateMonitorDispatcher._instance = StateMonitorDispatcher()
+			return StateMonitorDispatcher._instance
+
+	def __init__(self):
+		self._logger = logging.getLogger(__name__)
+
+		self._due = dict()
+		self._condition = threading.Condition()
+
+		self._worker = threading.Thread(target=self._work)
+		self._worker.daemon = True
+		self._worker.start()
+
+	def schedule(self, monitor, due):
+		"""
+		Schedules an update of the given monitor at the given time. If the monitor is already scheduled it keeps
+		its earlier slot.
+		"""
+		with self._condition:
+			if monitor in self._due:
+				return
+			self._due[monitor] = due
+			self._condition.notify()
+
+	def _work(self):
+		while True:
+			with self._condition:
+				while not self._due:
+					self._condition.wait()
+
+				monitor, due = min(self._due.items(), key=lambda item: item[1])
+				waitTime = due - time.time()
+				if waitTime > 0:
+					self._condition.wait(waitTime)
+					continue
+				del self._due[monitor]
+
+			try:
+				monitor._update()
+			except:
+				self._logger.exception("Error while pushing a state update")
+
+class PrinterTaskWorker(object):
+	"""
+	Runs the tasks handed off by the printers in order on one worker thread shared by all of them. The callbacks from
+	the communication layer run on the thread processing the received lines (with ``serial.reactor`` the one of all
+	printers), so whatever they'd have to wait for, like writing metadata or the print history to disk, is submitted
+	here instead.
+	"""
+
+	_instance = None
+	_instanceMutex = threading.Lock()
+
+	@staticmethod
+	def instance():
+		"""
+		Returns the worker shared by all printers, starting it on first use.
+		"""
+		with PrinterTaskWorker._instanceMutex:
+			if PrinterTaskWorker._instance is None:
+				PrinterTaskWorker._instance = PrinterTaskWorker()
+			return PrinterTaskWorker._instance
+
+	def __init__(self):
+		self._logger = logging.getLogger(__name__)
+
+		self._tasks = Queue.Queue()
+
+		self._worker = threading.Thread(target=self._work)
+		self._worker.daemon = True
+		self._worker.start()
+
+	def submit(self, task, *args, **kwargs):
+		"""
+		Schedules ``task`` to be called with the given arguments after all tasks submitted before.
+		"""
+		self._tasks.put((task, args, kwargs))
+
+	def join(self):
+		"""
+		Waits until all tasks submitted so far are done.
+		"""
+		self._tasks.join()
+
+	def _work(self):
+		while True:
+			task, args, kwargs = self._tasks.get()
+			try:
+				task(*args, **kwargs)
+			except:
+				self._logger.exception("Error while running a printer task")
+			finally:
+				self._tasks.task_done()
+
 class StateMonitor(object):
-	def __init__(self, ratelimit, updateCallback, addTemperatureCallback, addLogCallback, addMessageCallback):
+	def __init__(self, ratelimit, updateCallback, addTemperatureCallback, addLogCallback, addMessageCallback, snapshotCallback=None, snapshotMaxAge=5.0, dispatcher=None):
+		self._logger = logging.getLogger(__name__)
+
 		self._ratelimit = ratelimit
 		self._updateCallback = updateCallback
 		self._addTemperatureCallback = addTemperatureCallback
 		self._addLogCallback = addLogCallback
 		self._addMessageCallback = addMessageCallback
+		self._snapshotCallback = snapshotCallback
+		self._snapshotMaxAge = snapshotMaxAge
 
 		self._state = None
 		self._jobData = None
@@ -697,13 +1074,14 @@ class StateMonitor(object):
 
 		self._offsets = {}
 
-		self._changeEvent = threading.Event()
+		self._snapshots = {}
+		self._snapshotTimestamp = None
+		self._snapshotMutex = threading.Lock()
+
 		self._stateMutex = threading.Lock()
 
 		self._lastUpdate = time.time()
-		self._worker = threading.Thread(target=self._work)
-		self._worker.daemon = True
-		self._worker.start()
+		self._dispatcher = dispatcher if dispatcher is not None else StateMonitorDispatcher.instance()
 
 	def reset(self, state=None, jobData=None, progress=None, currentZ=None):
 		self.setState(state)
@@ -713,52 +1091,75 @@ class StateMonitor(object):
 
 	def addTemperature(self, temperature):
 		self._addTemperatureCallback(temperature)
-		self._changeEvent.set()
+		self._changed()
 
 	def addLog(self, log):
 		self._addLogCallback(log)
-		self._changeEvent.set()
+		self._changed()
 
 	def addMessage(self, message):
 		self._addMessageCallback(message)
-		self._changeEvent.set()
+		self._changed()
 
 	def setCurrentZ(self, currentZ):
 		self._currentZ = currentZ
-		self._changeEvent.set()
+		self._changed()
 
 	def setState(self, state):
 		with self._stateMutex:
 			self._state = state
-			self._changeEvent.set()
+		self._changed()
 
 	def setJobData(self, jobData):
 		self._jobData = jobData
-		self._changeEvent.set()
+		self._changed()
 
 	def setProgress(self, progress):
 		self._progress = progress
-		self._changeEvent.set()
+		self._changed()
 
 	def setTempOffsets(self, offsets):
 		self._offsets = offsets
-		self._changeEvent.set()
+		self._changed()
 
-	def _work(self):
-		while True:
-			self._changeEvent.wait()
-
-			with self._stateMutex:
-				now = time.time()
-				delta = now - self._lastUpdate
-				additionalWaitTime = self._ratelimit - delta
-				if additionalWaitTime > 0:
-					time.sleep(additionalWaitTime)
-
-				data = self.getCurrentData()
-				self._updateCallback(data)
-				self._lastUpdate = time.time()
-				self._changeEvent.clear()
+	def _changed(self):
+		self._dispatcher.schedule(self, self._lastUpdate + self._ratelimit)
+
+	def _update(self):
+		with self._stateMutex:
+			data = self.getCurrentData()
+			self._updateCallback(data)
+			self._lastUpdate = time.time()
+
+		with self._snapshotMutex:
+			self._updateSnapshots(data)
+
+	def getSnapshot(self, name):
+		with self._snapshotMutex:
+			# nothing might have changed for a while, but some parts of the snapshots (e.g. the available serial
+			# ports) are not tracked by us, so make sure we never hand out anything too old
+			if self._snapshotTimestamp is None or time.time() - self._snapshotTimestamp > self._snapshotMaxAge:
+				self._updateSnapshots(self.getCurrentData())
+			return self._snapshots.get(name)
+
+	def _updateSnapshots(self, data):
+		if self._snapshotCallback is None:
+			return
+
+		try:
+			snapshots = {}
+			for name, (status, payload) in self._snapshotCallback(data).items():
+				if status == 200:
+					body = json.dumps(payload)
+				else:
+					body = payload
+				snapshots[name] = (status, body, '"%s"' % hashlib.sha1(body).hexdigest())
+		except:
+			self._logger.exception("Error while updating the state snapshots")
+			return
+
+		self._snapshots = snapshots
+		self._snapshotTimestamp = time.time()
 
 	def getCurrentData(self):
 		return {
@@ -8,8 +8,11 @@ from sockjs.tornado import SockJSRouter
 from flask import Flask, render_template, send_from_directory, make_response
 from flask.ext.login import LoginManager
 from flask.ext.principal import Principal, Permission, RoleNeed, identity_loaded, UserNeed
+from werkzeug.local import LocalProxy
 
 import os
+import re
+import functools
 import logging
 import logging.config
 
@@ -19,7 +22,8 @@ NO_CONTENT = ("", 204)
 app = Flask("octoprint")
 debug = False
 
-printer = None
+printerRegistry = None
+jobScheduler = None
 gcodeManager = None
 userManager = None
 eventManager = None
@@ -27,13 +31,28 @@ loginManager = None
 wifiManager = None
 wifiInterface  = "wlan0"
 
+def _getCurrentPrinter():
+	"""
+	Resolves the printer the current request is targeted at, as selected via the ``/api/printers/<printerId>`` prefix
+	of the API, or the default printer.
+	"""
+	if flask.has_request_context():
+		current = getattr(flask.g, "printer", None)
+		if current is not None:
+			return current
+	return printerRegistry.getDefault()
+
+printer = LocalProxy(_getCurrentPrinter)
+
 principals = Principal(app)
 admin_permission = Permission(RoleNeed("admin"))
 user_permission = Permission(RoleNeed("user"))
 
 # only import the octoprint stuff down here, as it might depend on things defined above to be initialized already
-from octoprint.server.util import LargeResponseHandler, ReverseProxied, restricted_access, PrinterStateConnection, admin_validator
-from octoprint.printer import Printer, getConnectionOptions
+from octoprint.server.util import LargeResponseHandler, StateSnapshotHandler, UploadHandler, PrinterStateStream, PrinterStateLongPollHandler, \
+	PrinterStateEventSourceHandler, ReverseProxied, restricted_access, PrinterStateConnection, admin_validator
+from octoprint.printer import PrinterRegistry
+from octoprint.jobqueue import JobQueue, JobScheduler
 from octoprint.settings import settings
 import octoprint.gcodefiles as gcodefiles
 import octoprint.util as util
@@ -107,13 +126,15 @@ class Server():
 		self._port = port
 		self._debug = debug
 		self._allowRoot = allowRoot
+		self._stateStreams = dict()
 
 		  
 	def run(self):
 		if not self._allowRoot:
 			self._checkForRoot()
 
-		global printer
+		global printerRegistry
+		global jobScheduler
 		global gcodeManager
 		global userManager
 		global eventManager
@@ -140,15 +161,17 @@ class Server():
 
 		eventManager = events.eventManager()
 		gcodeManager = gcodefiles.GcodeManager()
-		printer = Printer(gcodeManager)
+		printerRegistry = PrinterRegistry.fromSettings(gcodeManager)
+		printer = printerRegistry.getDefault()
+		jobScheduler = JobScheduler(JobQueue(), printerRegistry, gcodeManager)
 
-		wifiManager = wifi.WifiManager(printer)
+		wifiManager = wifi.WifiManager(printerRegistry)
 
 		# configure timelapse
 		octoprint.timelapse.configureTimelapse()
 
 		# setup command triggers
-		events.CommandTrigger(printer)
+		events.CommandTrigger(printerRegistry)
 		if self._debug:
 			events.DebugEventListener()
 
@@ -180,8 +203,10 @@ class Server():
 		app.debug = self._debug
 
 		from octoprint.server.api import api
+		from octoprint.server.api.files import uploadStreamedGcodeFile
 
 		app.register_blueprint(api, url_prefix="/api")
+		app.register_blueprint(api, url_prefix="/api/printers/<printerId>")
 
 		self._router = SockJSRouter(self._createSocketConnection, "/sockjs")
 
@@ -198,21 +223,27 @@ class Server():
 				loginManager.reload_user()
 				admin_validator(flask.request)
 
-		self._tornado_app = Application(self._router.urls + [
+		wsgiContainer = WSGIContainer(app.wsgi_app)
+
+		# every printer gets its own SockJS channel and native state endpoints, the default printer is also
+		# available under the original unprefixed paths
+		routes = []
+		for p in printerRegistry.getAll():
+			routes += self._createPrinterRoutes(p, "/printers/%s" % p.getId(), wsgiContainer)
+		routes += self._router.urls + self._createPrinterRoutes(printer, "", wsgiContainer)
+
+		self._tornado_app = Application(routes + [
 			(r"/downloads/timelapse/([^/]*\.mpg)", LargeResponseHandler, {"path": settings().getBaseFolder("timelapse"), "as_attachment": True}),
 			(r"/downloads/files/local/([^/]*\.(gco|gcode|g))", LargeResponseHandler, {"path": settings().getBaseFolder("uploads"), "as_attachment": True}),
 			(r"/downloads/logs/([^/]*)", LargeResponseHandler, {"path": settings().getBaseFolder("logs"), "as_attachment": True, "access_validation": admin_access_validation}),
-			(r".*", FallbackHandler, {"fallback": WSGIContainer(app.wsgi_app)})
+			(r"/api/files/(local)", UploadHandler, {"app": app, "upload": uploadStreamedGcodeFile, "fallback": wsgiContainer}),
+			(r".*", FallbackHandler, {"fallback": wsgiContainer})
 		])
 		self._server = HTTPServer(self._tornado_app)
 		self._server.listen(self._port, address=self._host)
 
 		eventManager.fire(events.Events.STARTUP)
-		if settings().getBoolean(["serial", "autoconnect"]):
-			(port, baudrate) = settings().get(["serial", "port"]), settings().getInt(["serial", "baudrate"])
-			connectionOptions = getConnectionOptions()
-			if port in connectionOptions["ports"]:
-				printer.connect(port, baudrate)
+		printerRegistry.autoconnect()
 		try:
 			IOLoop.instance().start()
 		except KeyboardInterrupt:
@@ -221,9 +252,33 @@ class Server():
 			logger.fatal("Now that is embarrassing... Something really really went wrong here. Please report this including the stacktrace below in OctoPrint's bugtracker. Thanks!")
 			logger.exception("Stacktrace follows:")
 
-	def _createSocketConnection(self, session):
-		global printer, gcodeManager, userManager, eventManager
-		return PrinterStateConnection(printer, gcodeManager, userManager, eventManager, session)
+	def _createSocketConnection(self, session, printerId=PrinterRegistry.DEFAULT):
+		global printerRegistry, gcodeManager, userManager, eventManager
+		return PrinterStateConnection(printerRegistry.get(printerId), gcodeManager, userManager, eventManager, session)
+
+	def _createPrinterRoutes(self, printer, prefix, fallback):
+		"""
+		Creates the SockJS channel and the natively served state endpoints of the given printer, below the given
+		prefix. The unprefixed SockJS channel of the default printer is created by ``run`` itself.
+		"""
+		routes = []
+		if prefix:
+			router = SockJSRouter(functools.partial(self._createSocketConnection, printerId=printer.getId()), "/sockjs%s" % prefix)
+			routes += router.urls
+
+		if not printer.getId() in self._stateStreams:
+			self._stateStreams[printer.getId()] = PrinterStateStream(printer, eventManager)
+		stateStream = self._stateStreams[printer.getId()]
+
+		apiPrefix = re.escape("/api%s" % prefix)
+		routes += [
+			(apiPrefix + r"/printer", StateSnapshotHandler, {"printer": printer, "snapshot": "printer", "fallback": fallback}),
+			(apiPrefix + r"/job", StateSnapshotHandler, {"printer": printer, "snapshot": "job", "fallback": fallback}),
+			(apiPrefix + r"/connection", StateSnapshotHandler, {"printer": printer, "snapshot": "connection", "fallback": fallback}),
+			(apiPrefix + r"/state/poll", PrinterStateLongPollHandler, {"stream": stateStream}),
+			(apiPrefix + r"/state/stream", PrinterStateEventSourceHandler, {"stream": stateStream})
+		]
+		return routes
 
 	def _checkForRoot(self):
 		if "geteuid" in dir(os) and os.geteuid() == 0:
@@ -6,7 +6,7 @@ import logging
 import subprocess
 import netaddr
 
-from flask import Blueprint, request, jsonify, abort, current_app, session, make_response
+from flask import Blueprint, request, jsonify, abort, current_app, session, make_response, g
 from flask.ext.login import login_user, logout_user, current_user
 from flask.ext.principal import Identity, identity_changed, AnonymousIdentity
 
@@ -20,6 +20,22 @@ from octoprint.settings import settings as s, valid_boolean_trues
 
 api = Blueprint("api", __name__)
 
+
+@api.url_value_preprocessor
+def selectPrinter(endpoint, values):
+	"""
+	Selects the printer addressed via the ``/api/printers/<printerId>`` prefix the API is also registered under,
+	resolved by :data:`octoprint.server.printer` for the rest of the request.
+	"""
+	if values is None or not "printerId" in values:
+		return
+
+	printerId = values.pop("printerId")
+	printer = octoprint.server.printerRegistry.get(printerId)
+	if printer is None:
+		abort(404)
+	g.printer = printer
+
 from . import printer as api_printer
 from . import job as api_job
 from . import connection as api_connection
@@ -29,6 +45,9 @@ from . import timelapse as api_timelapse
 from . import users as api_users
 from . import log as api_logs
 from . import network as api_network
+from . import history as api_history
+from . import printers as api_printers
+from . import queue as api_queue
 
 VERSION = "0.1"
 
@@ -5,7 +5,7 @@ __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agp
 from flask import request, jsonify, make_response
 
 from octoprint.settings import settings
-from octoprint.printer import getConnectionOptions
+from octoprint.printer import getConnectionOptions, setConnectionPreferences
 from octoprint.server import printer, restricted_access, NO_CONTENT
 from octoprint.server.api import api
 import octoprint.util as util
@@ -19,7 +19,7 @@ def connectionState():
 		"port": port,
 		"baudrate": baudrate
 	}
-	return jsonify({"current": current, "options": getConnectionOptions()})
+	return jsonify({"current": current, "options": getConnectionOptions(printer.getId())})
 
 
 @api.route("/connection", methods=["POST"])
@@ -35,7 +35,7 @@ def connectionCommand():
 		return response
 
 	if command == "connect":
-		options = getConnectionOptions()
+		options = getConnectionOptions(printer.getId())
 
 		port = None
 		baudrate = None
@@ -48,10 +48,9 @@ def connectionCommand():
 			if baudrate not in options["baudrates"]:
 				return make_response("Invalid baudrate: %d" % baudrate, 400)
 		if "save" in data.keys() and data["save"]:
-			settings().set(["serial", "port"], port)
-			settings().setInt(["serial", "baudrate"], baudrate)
+			setConnectionPreferences(printer.getId(), port=port, baudrate=baudrate)
 		if "autoconnect" in data.keys():
-			settings().setBoolean(["serial", "autoconnect"], data["autoconnect"])
+			setConnectionPreferences(printer.getId(), autoconnect=data["autoconnect"])
 		settings().save()
 		printer.connect(port=port, baudrate=baudrate)
 	elif command == "disconnect":
@@ -4,7 +4,7 @@ from octoprint.events import Events
 __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
-from flask import request, jsonify, make_response, url_for
+from flask import request, jsonify, make_response, url_for, send_file
 
 import octoprint.gcodefiles as gcodefiles
 import octoprint.util as util
@@ -60,7 +60,7 @@ def _getFileList(origin):
 					}
 				})
 	else:
-		files = gcodeManager.getAllFileData()
+		files = gcodeManager.getAllFileData(printer=printer.getId())
 		for file in files:
 			file.update({
 				"refs": {
@@ -68,6 +68,8 @@ def _getFileList(origin):
 					"download": url_for("index", _external=True) + "downloads/files/" + FileDestinations.LOCAL + "/" + file["name"]
 				}
 			})
+			if "gcodeAnalysis" in file.keys() and "preview" in file["gcodeAnalysis"].keys():
+				file["refs"]["preview"] = url_for(".readGcodeFilePreview", target=FileDestinations.LOCAL, filename=file["name"], _external=True)
 	return files
 
 
@@ -93,10 +95,58 @@ def uploadGcodeFile(target):
 		return make_response("SD card support is disabled", 404)
 
 	file = request.files["file"]
-	sd = target == FileDestinations.SDCARD
 	selectAfterUpload = "select" in request.values.keys() and request.values["select"] in valid_boolean_trues
 	printAfterSelect = "print" in request.values.keys() and request.values["print"] in valid_boolean_trues
 
+	def addFile(destination, fileProcessingFinished):
+		return gcodeManager.addFile(file, destination, fileProcessingFinished)
+
+	return _processUpload(target, file, addFile, selectAfterUpload, printAfterSelect)
+
+
+@restricted_access
+def uploadStreamedGcodeFile(target, filename, data, selectAfterUpload, printAfterSelect):
+	"""
+	Counterpart of uploadGcodeFile for uploads received by the native upload handler, which already extracted the
+	file's name and contents from the request. Writes the contents to the upload folder in chunks, hashing and analysing
+	them on the fly.
+
+	Must be called within a request context for the upload request.
+	"""
+	if not target in [FileDestinations.LOCAL]:
+		return make_response("Unknown target: %s" % target, 404)
+
+	file = _StreamedFile(filename)
+
+	def addFile(destination, fileProcessingFinished):
+		upload = gcodeManager.createUpload(filename)
+		if upload is None:
+			return None, True
+
+		try:
+			# views on the received data instead of copies of it
+			for offset in xrange(0, len(data), STREAMED_UPLOAD_CHUNK_SIZE):
+				upload.write(buffer(data, offset, STREAMED_UPLOAD_CHUNK_SIZE))
+		except:
+			upload.abort()
+			raise
+
+		return gcodeManager.addUpload(upload, destination, fileProcessingFinished), True
+
+	return _processUpload(target, file, addFile, selectAfterUpload, printAfterSelect)
+
+
+STREAMED_UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+class _StreamedFile(object):
+	def __init__(self, filename):
+		self.filename = filename
+
+
+def _processUpload(target, file, addFile, selectAfterUpload, printAfterSelect):
+	sd = target == FileDestinations.SDCARD
+
 	if sd:
 		# validate that all preconditions for SD upload are met before attempting it
 		if not (printer.isOperational() and not (printer.isPrinting() or printer.isPaused())):
@@ -150,7 +200,7 @@ def uploadGcodeFile(target):
 			printer.selectFile(nameToSelect, sd, printAfterSelect)
 
 	destination = FileDestinations.SDCARD if sd else FileDestinations.LOCAL
-	filename, done = gcodeManager.addFile(file, destination, fileProcessingFinished)
+	filename, done = addFile(destination, fileProcessingFinished)
 	if filename is None:
 		return make_response("Could not upload the file %s" % file.filename, 500)
 
@@ -199,6 +249,78 @@ def readGcodeFile(target, filename):
 	return jsonify(file)
 
 
+@api.route("/files/<string:target>/<string:filename>/layers", methods=["GET"])
+def readGcodeFileLayers(target, filename):
+	if not target in [FileDestinations.LOCAL]:
+		return make_response("Unknown target: %s" % target, 404)
+
+	if not _verifyFileExists(target, filename):
+		return make_response("File not found on '%s': %s" % (target, filename), 404)
+
+	layerIndex = gcodeManager.getLayerIndex(filename)
+	if layerIndex is None:
+		return make_response("Layers of %s have not been analysed yet" % filename, 409)
+
+	layers = []
+	for number, (offset, length, line, lines, z) in enumerate(layerIndex.getLayers()):
+		layers.append({
+			"number": number,
+			"z": round(z, 4),
+			"offset": offset,
+			"length": length,
+			"line": line,
+			"lines": lines
+		})
+
+	return jsonify(layers=layers)
+
+
+@api.route("/files/<string:target>/<string:filename>/preview", methods=["GET"])
+def readGcodeFilePreview(target, filename):
+	if not target in [FileDestinations.LOCAL]:
+		return make_response("Unknown target: %s" % target, 404)
+
+	if not _verifyFileExists(target, filename):
+		return make_response("File not found on '%s': %s" % (target, filename), 404)
+
+	previewPath = gcodeManager.getToolpathPreviewPath(filename)
+	if previewPath is None:
+		return make_response("Toolpath of %s has not been analysed yet" % filename, 409)
+
+	return send_file(previewPath, mimetype="application/octet-stream")
+
+
+@api.route("/files/<string:target>/<string:filename>/layers/<int:layer>", methods=["GET"])
+def readGcodeFileLayer(target, filename, layer):
+	if not target in [FileDestinations.LOCAL]:
+		return make_response("Unknown target: %s" % target, 404)
+
+	if not _verifyFileExists(target, filename):
+		return make_response("File not found on '%s': %s" % (target, filename), 404)
+
+	try:
+		count = int(request.values.get("count", 1))
+	except ValueError:
+		return make_response("count must be a number", 400)
+
+	layerIndex = gcodeManager.getLayerIndex(filename)
+	if layerIndex is None:
+		return make_response("Layers of %s have not been analysed yet" % filename, 409)
+
+	byteRange = layerIndex.getByteRange(layer, count)
+	if byteRange is None:
+		return make_response("Layer %d not found in %s" % (layer, filename), 404)
+
+	offset, length = byteRange
+	with open(gcodeManager.getAbsolutePath(filename), "rb") as f:
+		f.seek(offset)
+		data = f.read(length)
+
+	response = make_response(data)
+	response.headers["Content-Type"] = "text/plain"
+	return response
+
+
 @api.route("/files/<string:target>/<path:filename>", methods=["POST"])
 @restricted_access
 def gcodeFileCommand(filename, target):
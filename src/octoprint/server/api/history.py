@@ -0,0 +1,48 @@
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+from flask import request, jsonify, make_response
+
+from octoprint.settings import valid_boolean_trues
+from octoprint.history import PrintHistory
+from octoprint.server import gcodeManager
+from octoprint.server.api import api
+
+
+@api.route("/history", methods=["GET"])
+def getPrintHistory():
+	try:
+		before = float(request.values["before"]) if "before" in request.values else None
+		limit = min(int(request.values.get("limit", 50)), 500)
+	except ValueError:
+		return make_response("before and limit must be numbers", 400)
+
+	jobs = gcodeManager.getHistory().getJobs(filename=request.values.get("file"), before=before, limit=limit, printer=request.values.get("printer"))
+	return jsonify(jobs=jobs)
+
+
+@api.route("/history/statistics", methods=["GET"])
+def getPrintHistoryStatistics():
+	groupBy = request.values.get("groupBy")
+	if groupBy is not None and not groupBy in PrintHistory.GROUP_BY:
+		return make_response("groupBy must be one of file, printer, day or outcome", 400)
+
+	try:
+		since = float(request.values["since"]) if "since" in request.values else None
+		until = float(request.values["until"]) if "until" in request.values else None
+	except ValueError:
+		return make_response("since and until must be timestamps", 400)
+
+	success = None
+	if "success" in request.values:
+		success = request.values["success"] in valid_boolean_trues
+
+	history = gcodeManager.getHistory()
+	statistics = history.getStatistics(groupBy=groupBy, filename=request.values.get("file"), since=since, until=until, success=success, printer=request.values.get("printer"))
+
+	if groupBy is None:
+		return jsonify(statistics=statistics.get(None, {"count": 0, "success": 0, "printTime": 0.0, "estimatedPrintTime": 0.0, "filament": 0.0}),
+		               estimateRatio=history.getEstimateRatio(request.values.get("file"), request.values.get("printer")))
+	else:
+		return jsonify(statistics=statistics)
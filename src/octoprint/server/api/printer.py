@@ -260,6 +260,18 @@ def printerSdState():
 	return jsonify(ready=printer.isSdReady())
 
 
+@api.route("/printer/profiler", methods=["GET"])
+def printerProfilerState():
+	if not settings().getBoolean(["serial", "profiler", "enabled"]):
+		return make_response("Serial profiler is disabled", 404)
+
+	statistics = printer.getProfilerStatistics()
+	if statistics is None:
+		return make_response("Printer is not connected", 409)
+
+	return jsonify(statistics)
+
+
 ##~~ Commands
 
 
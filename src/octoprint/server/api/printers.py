@@ -0,0 +1,27 @@
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+from flask import jsonify
+
+import octoprint.server
+from octoprint.server.api import api
+
+
+@api.route("/printers", methods=["GET"])
+def getPrinters():
+	printers = []
+	for printer in octoprint.server.printerRegistry.getAll():
+		state, port, baudrate = printer.getCurrentConnection()
+		printers.append({
+			"id": printer.getId(),
+			"name": printer.getName(),
+			"state": printer.getStateString(),
+			"connection": {
+				"state": state,
+				"port": port,
+				"baudrate": baudrate
+			}
+		})
+	return jsonify(printers=printers)
+
@@ -0,0 +1,76 @@
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+from flask import request, jsonify, make_response
+
+import octoprint.server
+from octoprint.server import printer, restricted_access, NO_CONTENT
+from octoprint.server.api import api
+import octoprint.util as util
+
+
+@api.route("/queue", methods=["GET"])
+def getJobQueue():
+	scheduler = octoprint.server.jobScheduler
+
+	printers = dict()
+	for p in octoprint.server.printerRegistry.getAll():
+		printers[p.getId()] = scheduler.getPrinterState(p.getId())
+
+	return jsonify(
+		jobs=[job.asDict() for job in scheduler.getQueue().getJobs()],
+		printers=printers,
+		remainingShiftTime=scheduler.getRemainingShiftTime()
+	)
+
+
+@api.route("/queue", methods=["POST"])
+@restricted_access
+def controlJobQueue():
+	scheduler = octoprint.server.jobScheduler
+
+	valid_commands = {
+		"add": ["file"],
+		"ready": []
+	}
+
+	command, data, response = util.getJsonCommandFromRequest(request, valid_commands)
+	if response is not None:
+		return response
+
+	if command == "add":
+		printerId = data.get("printer")
+		if printerId is not None and not printerId in octoprint.server.printerRegistry:
+			return make_response("Unknown printer: %s" % printerId, 400)
+		try:
+			priority = int(data.get("priority", 0))
+		except ValueError:
+			return make_response("priority must be an integer", 400)
+
+		job = scheduler.enqueue(data["file"], printer=printerId, priority=priority)
+		if job is None:
+			return make_response("File not found: %s" % data["file"], 404)
+		return make_response(jsonify(job=job.asDict()), 201)
+	elif command == "ready":
+		filament = data.get("filament")
+		if filament is not None:
+			try:
+				filament = float(filament)
+			except ValueError:
+				return make_response("filament must be a number", 400)
+		ready = data.get("ready", True)
+		if not isinstance(ready, bool):
+			return make_response("ready must be a boolean", 400)
+		scheduler.setPrinterReady(printer.getId(), ready=ready, filament=filament)
+
+	return NO_CONTENT
+
+
+@api.route("/queue/<int:jobId>", methods=["DELETE"])
+@restricted_access
+def removeQueuedJob(jobId):
+	if octoprint.server.jobScheduler.getQueue().remove(jobId) is None:
+		return make_response("Unknown job: %d" % jobId, 404)
+	return NO_CONTENT
+
@@ -3,10 +3,12 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 from flask.ext.principal import identity_changed, Identity
-from tornado.web import StaticFileHandler, HTTPError
-from flask import url_for, make_response, request, current_app
+from tornado.web import StaticFileHandler, RequestHandler, HTTPError, asynchronous
+from tornado.ioloop import IOLoop
+from flask import url_for, make_response, request, current_app, g
 from flask.ext.login import login_required, login_user, current_user
 from werkzeug.utils import redirect
+from werkzeug.exceptions import HTTPException
 from sockjs.tornado import SockJSConnection
 
 import datetime
@@ -17,13 +19,20 @@ import time
 import os
 import threading
 import logging
+import json
+import collections
+import mmap
+import uuid
+import io
+import tornado.wsgi
 from functools import wraps
 
-from octoprint.settings import settings
+from octoprint.settings import settings, valid_boolean_trues
 import octoprint.timelapse
+import octoprint.gcodefiles
 import octoprint.server
 from octoprint.users import ApiUser
-from octoprint.events import Events
+from octoprint.events import Events, getEventPrinter
 
 
 def restricted_access(func, apiEnabled=True):
@@ -53,17 +62,26 @@ def restricted_access(func, apiEnabled=True):
 		# if API is globally enabled, enabled for this request and an api key is provided, try to use that
 		apikey = _getApiKey(request)
 		if settings().get(["api", "enabled"]) and apiEnabled and apikey is not None:
-			if apikey == settings().get(["api", "key"]):
-				# master key was used
-				user = ApiUser()
+			cached = _principalCache.get(apikey)
+			if cached is not None:
+				user, identity = cached
 			else:
-				# user key might have been used
-				user = octoprint.server.userManager.findUser(apikey=apikey)
+				# taken before looking up the user, so changes made meanwhile invalidate the entry
+				generation = _principalCache.getGeneration()
+				user = _getUserForApiKey(apikey)
+				identity = None
 
 			if user is None:
-				make_response("Invalid API key", 401)
+				return make_response("Invalid API key", 401)
 			if login_user(user, remember=False):
-				identity_changed.send(current_app._get_current_object(), identity=Identity(user.get_id()))
+				if identity is None:
+					identity_changed.send(current_app._get_current_object(), identity=Identity(user.get_id()))
+					_principalCache.put(apikey, user, g.identity, generation)
+				else:
+					# identity has already been loaded for this key, skip the identity loaders
+					g.identity = identity
+					for saver in octoprint.server.principals.identity_savers:
+						saver(identity)
 				return func(*args, **kwargs)
 
 		# call regular login_required decorator
@@ -90,11 +108,75 @@ def _getUserForApiKey(apikey):
 		if apikey == settings().get(["api", "key"]):
 			# master key was used
 			return ApiUser()
-		else:
+		elif octoprint.server.userManager is not None:
 			# user key might have been used
 			return octoprint.server.userManager.findUser(apikey=apikey)
-	else:
-		return None
+	return None
+
+
+class PrincipalCache(object):
+	"""
+	Short-lived cache of the users and loaded identities authenticated via API key.
+
+	Entries are only returned as long as they are younger than ``ttl`` seconds and neither the master key nor the
+	generation of the user manager changed since they were cached, so any change to a user, its roles, activation
+	state, password or API key invalidates them right away. Nothing is cached for user managers that don't track
+	their changes.
+	"""
+
+	def __init__(self, ttl=10.0):
+		self._ttl = ttl
+		self._entries = {}
+		self._mutex = threading.Lock()
+
+	def get(self, apikey):
+		with self._mutex:
+			entry = self._entries.get(apikey)
+		if entry is None:
+			return None
+
+		user, identity, timestamp, generation = entry
+		if time.time() - timestamp > self._ttl or not self._isValid(apikey, user, generation):
+			self.invalidate(apikey)
+			return None
+		return user, identity
+
+	def put(self, apikey, user, identity, generation):
+		"""
+		Caches ``user`` and its ``identity`` for ``apikey``, ``generation`` being the one of the user manager before
+		the user was looked up (see :meth:`getGeneration`).
+		"""
+		if generation is None and not isinstance(user, ApiUser):
+			return
+		with self._mutex:
+			self._entries[apikey] = (user, identity, time.time(), generation)
+
+	def invalidate(self, apikey=None):
+		with self._mutex:
+			if apikey is None:
+				self._entries.clear()
+			else:
+				self._entries.pop(apikey, None)
+
+	def _isValid(self, apikey, user, generation):
+		if not settings().get(["api", "enabled"]):
+			return False
+		if isinstance(user, ApiUser):
+			return apikey == settings().get(["api", "key"])
+		return generation is not None and generation == self.getGeneration()
+
+	@staticmethod
+	def getGeneration():
+		if octoprint.server.userManager is None:
+			return None
+		return octoprint.server.userManager.getGeneration()
+
+_principalCache = PrincipalCache()
+
+
+def _hasInvalidApiKey(request):
+	apikey = _getApiKey(request)
+	return settings().get(["api", "enabled"]) and apikey is not None and _getUserForApiKey(apikey) is None
 
 
 def _getApiKey(request):
@@ -104,8 +186,8 @@ def _getApiKey(request):
 
 	# Check Tornado GET/POST arguments
 	if hasattr(request, "arguments") and "apikey" in request.arguments \
-		and len(request.arguments["apikey"]) > 0 and len(request.arguments["apikey"].strip()) > 0:
-		return request.arguments["apikey"]
+		and len(request.arguments["apikey"]) > 0 and len(request.arguments["apikey"][0].strip()) > 0:
+		return request.arguments["apikey"][0]
 
 	# Check Tornado and Flask headers
 	if "X-Api-Key" in request.headers.keys():
@@ -217,6 +299,8 @@ class PrinterStateConnection(SockJSConnection):
 			self._temperatureBacklog.append(data)
 
 	def _onEvent(self, event, payload):
+		if not _isEventOfPrinter(payload, self._printer):
+			return
 		self.sendEvent(event, payload)
 
 	def _emit(self, type, payload):
@@ -227,14 +311,32 @@ class PrinterStateConnection(SockJSConnection):
 
 
 class LargeResponseHandler(StaticFileHandler):
+	"""
+	Serves large files like gcode files, timelapse movies or logs.
+
+	The file is streamed asynchronously with flow control: the next chunk is only read and written once the previous
+	one has been sent to the client, so a download neither buffers the whole file in memory nor blocks the IOLoop for
+	other clients. Files are memory-mapped for reading where possible.
 
-	CHUNK_SIZE = 16 * 1024
+	Supports conditional requests (``If-None-Match`` against an ETag derived from the file's inode, size and
+	modification time, ``If-Modified-Since``) and byte range requests, including multiple ranges (answered as
+	``multipart/byteranges``) and ``If-Range`` validation against the ETag or the Last-Modified date, so interrupted
+	downloads can be resumed and clients like the gcode viewer can fetch slices of a file.
+	"""
+
+	CHUNK_SIZE = 256 * 1024
+	MAX_RANGES = 32
 
 	def initialize(self, path, default_filename=None, as_attachment=False, access_validation=None):
 		StaticFileHandler.initialize(self, path, default_filename)
 		self._as_attachment = as_attachment
 		self._access_validation = access_validation
 
+		self._file = None
+		self._mmap = None
+		self._segments = None
+
+	@asynchronous
 	def get(self, path, include_body=True):
 		if self._access_validation is not None:
 			self._access_validation(self.request)
@@ -260,8 +362,12 @@ class LargeResponseHandler(StaticFileHandler):
 
 		stat_result = os.stat(abspath)
 		modified = datetime.datetime.fromtimestamp(stat_result[stat.ST_MTIME])
+		size = stat_result[stat.ST_SIZE]
+		etag = '"%x-%x-%x"' % (stat_result[stat.ST_INO], size, stat_result[stat.ST_MTIME])
 
 		self.set_header("Last-Modified", modified)
+		self.set_header("Etag", etag)
+		self.set_header("Accept-Ranges", "bytes")
 
 		mime_type, encoding = mimetypes.guess_type(abspath)
 		if mime_type:
@@ -276,31 +382,651 @@ class LargeResponseHandler(StaticFileHandler):
 
 		self.set_extra_headers(path)
 
-		# Check the If-Modified-Since, and don't send the result if the
+		# Check the If-None-Match and If-Modified-Since, and don't send the result if the
 		# content has not been modified
+		if self._isNotModified(etag, modified):
+			self.set_status(304)
+			self.finish()
+			return
+
+		ranges = None
+		if self._isRangeApplicable(etag, modified):
+			ranges = self._getRequestedRanges(size)
+
+		if ranges is None:
+			segments = [(0, size)]
+		elif not ranges:
+			self.set_status(416)
+			self.set_header("Content-Range", "bytes */%d" % size)
+			self.finish()
+			return
+		elif len(ranges) == 1:
+			start, end = ranges[0]
+			self.set_status(206)
+			self.set_header("Content-Range", "bytes %d-%d/%d" % (start, end - 1, size))
+			segments = [(start, end)]
+		else:
+			self.set_status(206)
+			segments = self._getMultipartSegments(ranges, size, mime_type)
+		self.set_header("Content-Length", sum(len(segment) if isinstance(segment, basestring) else segment[1] - segment[0] for segment in segments))
+
+		if not include_body or size == 0:
+			self.finish()
+			return
+
+		self._open(abspath, segments)
+		self._sendNextChunk()
+
+	def on_connection_close(self):
+		self._close()
+
+	def on_finish(self):
+		self._close()
+
+	def set_extra_headers(self, path):
+		if self._as_attachment:
+			self.set_header("Content-Disposition", "attachment")
+
+	def _isNotModified(self, etag, modified):
+		inm_value = self.request.headers.get("If-None-Match")
+		if inm_value is not None:
+			return inm_value.strip() == "*" or etag in [value.strip() for value in inm_value.split(",")]
+
 		ims_value = self.request.headers.get("If-Modified-Since")
 		if ims_value is not None:
 			date_tuple = email.utils.parsedate(ims_value)
-			if_since = datetime.datetime.fromtimestamp(time.mktime(date_tuple))
-			if if_since >= modified:
-				self.set_status(304)
+			if date_tuple is not None:
+				if_since = datetime.datetime.fromtimestamp(time.mktime(date_tuple))
+				return if_since >= modified
+
+		return False
+
+	def _isRangeApplicable(self, etag, modified):
+		"""
+		Validates the request's If-Range header (if any) against the file's ETag or Last-Modified date, ranges may only
+		be served if the client's copy is still current.
+		"""
+		ir_value = self.request.headers.get("If-Range")
+		if ir_value is None:
+			return True
+
+		ir_value = ir_value.strip()
+		if ir_value.startswith('"') or ir_value.startswith("W/"):
+			return ir_value == etag
+
+		date_tuple = email.utils.parsedate(ir_value)
+		if date_tuple is None:
+			return False
+		return datetime.datetime.fromtimestamp(time.mktime(date_tuple)) == modified
+
+	def _getRequestedRanges(self, size):
+		"""
+		Parses the request's Range header and returns the satisfiable requested ranges as list of tuples (start, end)
+		with the end being exclusive, overlapping or adjacent ranges merged. Returns an empty list if none of the
+		ranges is satisfiable and None if the whole file is to be sent (no or an unparseable Range header, or too many
+		ranges).
+		"""
+		range_value = self.request.headers.get("Range")
+		if range_value is None or not range_value.startswith("bytes="):
+			return None
+
+		specs = range_value[len("bytes="):].split(",")
+		if len(specs) > LargeResponseHandler.MAX_RANGES:
+			return None
+
+		ranges = []
+		for spec in specs:
+			try:
+				start, end = [value.strip() for value in spec.split("-", 1)]
+				if not start:
+					# suffix range, the last n bytes
+					start, end = size - int(end), size
+				else:
+					start = int(start)
+					end = int(end) + 1 if end else size
+			except ValueError:
+				return None
+
+			if end <= start and start < size:
+				# syntactically invalid, so the whole header has to be ignored
+				return None
+			start, end = max(start, 0), min(end, size)
+			if start < end:
+				ranges.append((start, end))
+
+		merged = []
+		for start, end in sorted(ranges):
+			if merged and start <= merged[-1][1]:
+				merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+			else:
+				merged.append((start, end))
+		return merged
+
+	def _getMultipartSegments(self, ranges, size, mime_type):
+		boundary = uuid.uuid4().hex
+		self.set_header("Content-Type", "multipart/byteranges; boundary=%s" % boundary)
+
+		segments = []
+		for start, end in ranges:
+			header = "\r\n--%s\r\n" % boundary
+			if mime_type:
+				header += "Content-Type: %s\r\n" % mime_type
+			header += "Content-Range: bytes %d-%d/%d\r\n\r\n" % (start, end - 1, size)
+			segments.append(header)
+			segments.append((start, end))
+		segments.append("\r\n--%s--\r\n" % boundary)
+		return segments
+
+	def _open(self, abspath, segments):
+		self._file = open(abspath, "rb")
+		try:
+			self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		except (EnvironmentError, ValueError):
+			# not mappable (e.g. a special file system), read chunks from the file instead
+			self._mmap = None
+		self._segments = collections.deque(segments)
+
+	def _read(self, start, length):
+		if self._mmap is not None:
+			return self._mmap[start:start + length]
+		self._file.seek(start)
+		return self._file.read(length)
+
+	def _close(self):
+		if self._mmap is not None:
+			self._mmap.close()
+			self._mmap = None
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+	def _sendNextChunk(self):
+		if self._file is None or self.request.connection.stream.closed():
+			self._close()
+			return
+
+		# collect up to CHUNK_SIZE bytes from the remaining segments, which are either multipart headers or file ranges
+		chunk = []
+		remaining = LargeResponseHandler.CHUNK_SIZE
+		while self._segments and remaining > 0:
+			segment = self._segments[0]
+			if isinstance(segment, basestring):
+				chunk.append(segment)
+				remaining -= len(segment)
+				self._segments.popleft()
+				continue
+
+			start, end = segment
+			data = self._read(start, min(remaining, end - start))
+			if not data:
+				# file got truncated while we were sending it
+				self._segments.clear()
+				break
+
+			chunk.append(data)
+			remaining -= len(data)
+			if start + len(data) >= end:
+				self._segments.popleft()
+			else:
+				self._segments[0] = (start + len(data), end)
+
+		if not self._segments:
+			self.finish("".join(chunk))
+			return
+
+		self.write("".join(chunk))
+		self.flush(callback=self._sendNextChunk)
+
+
+#~~ native handler for the frequently polled read-only state endpoints
+
+
+class StateSnapshotHandler(RequestHandler):
+	"""
+	Serves GET requests for the read-only state endpoints (``/api/printer``, ``/api/job`` and ``/api/connection``)
+	directly from the pre-serialized snapshots the printer's state monitor keeps up to date, without going through the
+	WSGI container, Flask's session and identity handling. Responses carry an ETag, clients sending a matching
+	``If-None-Match`` header get a 304 without a body.
+
+	Just like the Flask views these endpoints don't require authentication. If an API key is provided though it is
+	checked and the request rejected with a 401 if it's invalid.
+
+	Everything else (other methods, query parameters other than ``apikey`` like the temperature ``history``) is handed
+	over to the fallback.
+
+	Arguments:
+	printer -- the printer instance to take the snapshots from
+	snapshot -- the name of the snapshot to serve
+	fallback -- callable to process all requests that can't be served from the snapshot
+	"""
+
+	def initialize(self, printer, snapshot, fallback):
+		self._printer = printer
+		self._snapshot = snapshot
+		self._fallback = fallback
+
+	def prepare(self):
+		if self.request.method != "GET" or any(key != "apikey" for key in self.request.arguments.keys()):
+			self._fallback(self.request)
+			self._finished = True
+
+	def get(self):
+		if _hasInvalidApiKey(self.request):
+			self.set_status(401)
+			self.finish("Invalid API key")
+			return
+
+		snapshot = self._printer.getStateSnapshot(self._snapshot)
+		if snapshot is None:
+			self._fallback(self.request)
+			self._finished = True
+			return
+
+		status, body, etag = snapshot
+		self.set_header("Cache-Control", "no-cache")
+		if status != 200:
+			self.set_status(status)
+			self.set_header("Content-Type", "text/html; charset=UTF-8")
+			self.finish(body)
+			return
+
+		self.set_header("Etag", etag)
+		if self.request.headers.get("If-None-Match") == etag:
+			self.set_status(304)
+			self.finish()
+			return
+
+		self.set_header("Content-Type", "application/json")
+		self.finish(body)
+
+
+#~~ native handler for file uploads
+
+
+class UploadHandler(RequestHandler):
+	"""
+	Processes multipart file uploads to ``/api/files/local`` natively instead of through the WSGI container, which
+	would make werkzeug parse the already received body again and spool the file to a temporary file, which would
+	then be copied to the upload folder and read once more for analysis. Here the file part Tornado extracted from the
+	request body is written to the upload folder, hashed and analysed in one pass, on a thread of its own so that the
+	IOLoop keeps serving other requests in the meantime.
+
+	Authentication, validation and the response are the same as for POST requests to the Flask view, since the
+	``upload`` callable is processed within a Flask request context created from the Tornado request (minus its body,
+	which Flask doesn't need to see anymore). Requests without a file part (or a non gcode file, e.g. an STL file
+	to slice) are handed over to the fallback.
+
+	Arguments:
+	app -- the Flask application to create the request context with
+	upload -- callable taking target, filename, file contents and the select and print flags, returning a Flask response
+	fallback -- callable to process all requests that can't be handled natively
+	"""
+
+	def initialize(self, app, upload, fallback):
+		self._logger = logging.getLogger(__name__)
+		self._app = app
+		self._upload = upload
+		self._fallback = fallback
+
+	def prepare(self):
+		if self.request.method != "POST" or not self._getFileArgument() \
+			or not octoprint.gcodefiles.isGcodeFileName(self._getFileArgument()["filename"]):
+			self._fallback(self.request)
+			self._finished = True
+
+	@asynchronous
+	def post(self, target):
+		file = self._getFileArgument()
+		selectAfterUpload = self._getBooleanArgument("select")
+		printAfterSelect = self._getBooleanArgument("print")
+		environ = self._createEnviron()
+		ioloop = IOLoop.current()
+
+		def process():
+			try:
+				with self._app.request_context(environ):
+					self._app.login_manager.reload_user()
+					try:
+						response = self._upload(target, file["filename"], file["body"], selectAfterUpload, printAfterSelect)
+					except HTTPException as e:
+						response = e.get_response(request.environ)
+					response = self._app.make_response(response)
+			except:
+				self._logger.exception("Error while processing upload of %s" % file["filename"])
+				ioloop.add_callback(self.send_error, 500)
 				return
+			ioloop.add_callback(self._respond, response)
+
+		thread = threading.Thread(target=process)
+		thread.daemon = True
+		thread.start()
+
+	def _respond(self, response):
+		self.set_status(response.status_code)
+		for name, value in response.headers:
+			if name.lower() != "content-length":
+				self.set_header(name, value)
+		self.finish(response.data)
+
+	def _getFileArgument(self):
+		if "file" in self.request.files and len(self.request.files["file"]) > 0:
+			return self.request.files["file"][0]
+		return None
 
-		if not include_body:
-			assert self.request.method == "HEAD"
-			self.set_header("Content-Length", stat_result[stat.ST_SIZE])
-		else:
-			with open(abspath, "rb") as file:
-				while True:
-					data = file.read(LargeResponseHandler.CHUNK_SIZE)
-					if not data:
-						break
-					self.write(data)
-					self.flush()
+	def _getBooleanArgument(self, name):
+		return name in self.request.arguments and self.request.arguments[name][0] in valid_boolean_trues
 
-	def set_extra_headers(self, path):
-		if self._as_attachment:
-			self.set_header("Content-Disposition", "attachment")
+	def _createEnviron(self):
+		environ = tornado.wsgi.WSGIContainer.environ(self.request)
+
+		# the body has already been taken care of, don't have werkzeug parse it again
+		environ["wsgi.input"] = io.BytesIO()
+		environ["CONTENT_LENGTH"] = "0"
+		environ.pop("CONTENT_TYPE", None)
+
+		# an API key sent as form field is part of the body too, hand it over as header instead
+		apikey = _getApiKey(self.request)
+		if apikey is not None:
+			environ["HTTP_X_API_KEY"] = apikey
+
+		return ReverseProxied.adjustEnviron(environ)
+
+
+#~~ push channel for clients not speaking SockJS: long poll and server sent events
+
+
+class PrinterStateStream(object):
+	"""
+	Collects state updates, temperatures and events into a bounded backlog of messages with consecutive sequence
+	numbers, to be consumed by the long poll and server sent events handlers.
+
+	Every message is serialized only once when it is added, so the number of connected clients doesn't add to the
+	serialization cost. Clients may resume from the last sequence number they received, as long as it's still covered
+	by the backlog.
+	"""
+
+	BACKLOG = 500
+
+	def __init__(self, printer, eventManager, ioloop=None):
+		self._logger = logging.getLogger(__name__)
+
+		self._printer = printer
+		self._eventManager = eventManager
+		self._ioloop = ioloop if ioloop is not None else IOLoop.instance()
+
+		self._messages = collections.deque([], PrinterStateStream.BACKLOG)
+		self._sequence = 0
+		self._mutex = threading.Lock()
+		self._listeners = []
+
+		self._printer.registerCallback(self)
+		for event in [getattr(Events, name) for name in dir(Events) if not name.startswith("__")]:
+			self._eventManager.subscribe(event, self._onEvent)
+
+	def close(self):
+		self._printer.unregisterCallback(self)
+		for event in [getattr(Events, name) for name in dir(Events) if not name.startswith("__")]:
+			self._eventManager.unsubscribe(event, self._onEvent)
+
+	def getSequence(self):
+		with self._mutex:
+			return self._sequence
+
+	def getMessagesSince(self, sequence):
+		"""
+		Returns a tuple (messages, complete) with all messages in the backlog with a sequence number greater than
+		``sequence``, each as a tuple (sequence number, type, serialized payload). ``complete`` is False if some of the
+		requested messages are not available anymore, or if ``sequence`` is not known at all (e.g. because the server
+		has been restarted since).
+		"""
+		with self._mutex:
+			if sequence > self._sequence:
+				return [], False
+			elif sequence == self._sequence:
+				return [], True
+
+			messages = [message for message in self._messages if message[0] > sequence]
+			complete = sequence >= 0 and (len(messages) == self._sequence - sequence)
+			return messages, complete
+
+	def addListener(self, listener):
+		"""
+		Registers ``listener`` to be called on the IOLoop with each new message, as
+		``listener(sequence, type, serializedPayload)``.
+		"""
+		with self._mutex:
+			self._listeners.append(listener)
+
+	def removeListener(self, listener):
+		with self._mutex:
+			if listener in self._listeners:
+				self._listeners.remove(listener)
+
+	def _add(self, type, payload):
+		try:
+			serialized = json.dumps(payload)
+		except:
+			self._logger.exception("Could not serialize %s message for the state stream" % type)
+			return
+
+		with self._mutex:
+			self._sequence += 1
+			message = (self._sequence, type, serialized)
+			self._messages.append(message)
+			listeners = list(self._listeners)
+
+		for listener in listeners:
+			self._ioloop.add_callback(listener, *message)
+
+	#~~ printer callbacks
+
+	def sendCurrentData(self, data):
+		self._add("current", data)
+
+	def sendHistoryData(self, data):
+		pass
+
+	def sendEvent(self, type, payload=None):
+		self._add("event", {"type": type, "payload": payload})
+
+	def sendFeedbackCommandOutput(self, name, output):
+		self._add("feedbackCommandOutput", {"name": name, "output": output})
+
+	def addTemperature(self, data):
+		self._add("temperature", data)
+
+	def addLog(self, data):
+		pass
+
+	def addMessage(self, data):
+		pass
+
+	def _onEvent(self, event, payload):
+		if not _isEventOfPrinter(payload, self._printer):
+			return
+		self.sendEvent(event, payload)
+
+
+def _isEventOfPrinter(payload, printer):
+	"""
+	Whether the event with ``payload`` belongs on the channels of ``printer``: events of other printers go to their own
+	channels, events not originating from any printer to all of them.
+	"""
+	printerId = getEventPrinter(payload)
+	return printerId is None or printerId == printer.getId()
+
+
+class _PrinterStateStreamHandler(RequestHandler):
+	def initialize(self, stream):
+		self._stream = stream
+
+	def _getResumeSequence(self):
+		"""
+		The sequence number to resume from, taken from the ``Last-Event-ID`` header or the ``since`` query
+		parameter. None if the client wants to start from now on.
+		"""
+		since = self.request.headers.get("Last-Event-ID", self.get_argument("since", None))
+		if since is None:
+			return None
+
+		try:
+			return int(since)
+		except ValueError:
+			raise HTTPError(400)
+
+
+class PrinterStateLongPollHandler(_PrinterStateStreamHandler):
+	"""
+	Long poll endpoint for the PrinterStateStream.
+
+	``GET /api/state/poll?since=<sequence>&timeout=<seconds>`` immediately returns all messages after ``since`` if
+	there are any, otherwise it waits for the next message or until the timeout (default 30s, at most 120s) is reached.
+	Without ``since`` only the current sequence number is returned, to be used as starting point. The response looks like
+	``{"sequence": <last sequence>, "complete": <bool>, "messages": [{"sequence": ..., "type": ..., "payload": ...}]}``,
+	with ``complete`` being False if messages have been dropped from the backlog since ``since``.
+	"""
+
+	DEFAULT_TIMEOUT = 30.0
+	MAX_TIMEOUT = 120.0
+
+	@asynchronous
+	def get(self):
+		if _hasInvalidApiKey(self.request):
+			raise HTTPError(401)
+
+		since = self._getResumeSequence()
+		try:
+			timeout = min(float(self.get_argument("timeout", PrinterStateLongPollHandler.DEFAULT_TIMEOUT)), PrinterStateLongPollHandler.MAX_TIMEOUT)
+		except ValueError:
+			raise HTTPError(400)
+
+		if since is None:
+			self._respond(self._stream.getSequence(), [], True)
+			return
+
+		self._since = since
+		self._timeout = None
+
+		messages, complete = self._stream.getMessagesSince(since)
+		if messages or not complete:
+			self._respond(messages[-1][0] if messages else self._stream.getSequence(), messages, complete)
+			return
+
+		self._stream.addListener(self._onMessage)
+		# a message might have come in between the check and registering the listener
+		messages, complete = self._stream.getMessagesSince(since)
+		if messages or not complete:
+			self._stream.removeListener(self._onMessage)
+			self._respond(messages[-1][0] if messages else self._stream.getSequence(), messages, complete)
+			return
+
+		self._timeout = IOLoop.current().add_timeout(time.time() + timeout, self._onTimeout)
+
+	def on_connection_close(self):
+		self._cleanup()
+
+	def _onMessage(self, sequence, type, payload):
+		if self._finished:
+			return
+		self._cleanup()
+		messages, complete = self._stream.getMessagesSince(self._since)
+		self._respond(messages[-1][0] if messages else sequence, messages, complete)
+
+	def _onTimeout(self):
+		self._timeout = None
+		if self._finished:
+			return
+		self._cleanup()
+		self._respond(self._since, [], True)
+
+	def _cleanup(self):
+		self._stream.removeListener(self._onMessage)
+		if getattr(self, "_timeout", None) is not None:
+			IOLoop.current().remove_timeout(self._timeout)
+			self._timeout = None
+
+	def _respond(self, sequence, messages, complete):
+		self.set_header("Content-Type", "application/json")
+		self.set_header("Cache-Control", "no-cache")
+		self.finish('{"sequence": %d, "complete": %s, "messages": [%s]}' % (
+			sequence,
+			"true" if complete else "false",
+			", ".join('{"sequence": %d, "type": %s, "payload": %s}' % (message[0], json.dumps(message[1]), message[2]) for message in messages)
+		))
+
+
+class PrinterStateEventSourceHandler(_PrinterStateStreamHandler):
+	"""
+	Server sent events endpoint for the PrinterStateStream.
+
+	``GET /api/state/stream`` keeps the connection open and sends every message of the stream as an event of the
+	message's type, with the sequence number as event id, so that browsers reconnecting with ``Last-Event-ID`` (or
+	clients using the ``since`` query parameter) resume where they left off. If that's not possible anymore since
+	messages have been dropped from the backlog, a ``reset`` event is sent first. A comment line is sent every
+	``KEEPALIVE`` seconds to keep proxies from closing the connection.
+	"""
+
+	KEEPALIVE = 15.0
+
+	@asynchronous
+	def get(self):
+		if _hasInvalidApiKey(self.request):
+			raise HTTPError(401)
+
+		since = self._getResumeSequence()
+
+		self.set_header("Content-Type", "text/event-stream")
+		self.set_header("Cache-Control", "no-cache")
+		self.write("retry: 2000\n\n")
+
+		self._keepalive = None
+		self._stream.addListener(self._onMessage)
+
+		# anything newer than this will be delivered through the listener
+		current = self._stream.getSequence()
+		if since is None:
+			self._lastSequence = current
+		else:
+			self._lastSequence = min(since, current)
+			messages, complete = self._stream.getMessagesSince(since)
+			if not complete:
+				self.write("event: reset\ndata: {}\n\n")
+			for message in messages:
+				self._writeMessage(*message)
+		self.flush()
+
+		self._scheduleKeepalive()
+
+	def on_connection_close(self):
+		self._stream.removeListener(self._onMessage)
+		if self._keepalive is not None:
+			IOLoop.current().remove_timeout(self._keepalive)
+			self._keepalive = None
+
+	def _onMessage(self, sequence, type, payload):
+		if self.request.connection.stream.closed():
+			self.on_connection_close()
+			return
+		self._writeMessage(sequence, type, payload)
+		self.flush()
+
+	def _writeMessage(self, sequence, type, payload):
+		if sequence <= self._lastSequence:
+			# already sent as part of the backlog
+			return
+		self._lastSequence = sequence
+		self.write("id: %d\nevent: %s\ndata: %s\n\n" % (sequence, type, payload))
+
+	def _scheduleKeepalive(self):
+		self._keepalive = IOLoop.current().add_timeout(time.time() + PrinterStateEventSourceHandler.KEEPALIVE, self._onKeepalive)
+
+	def _onKeepalive(self):
+		if self.request.connection.stream.closed():
+			self.on_connection_close()
+			return
+		self.write(": keepalive\n\n")
+		self.flush()
+		self._scheduleKeepalive()
 
 
 #~~ admin access validator for use with tornado
@@ -357,6 +1083,10 @@ class ReverseProxied(object):
 		self.app = app
 
 	def __call__(self, environ, start_response):
+		return self.app(ReverseProxied.adjustEnviron(environ), start_response)
+
+	@staticmethod
+	def adjustEnviron(environ):
 		script_name = environ.get('HTTP_X_SCRIPT_NAME', '')
 		if not script_name:
 			script_name = settings().get(["server", "baseUrl"])
@@ -373,7 +1103,7 @@ class ReverseProxied(object):
 
 		if scheme:
 			environ['wsgi.url_scheme'] = scheme
-		return self.app(environ, start_response)
+		return environ
 
 
 def redirectToTornado(request, target):
@@ -8,6 +8,8 @@ import yaml
 import logging
 import re
 import uuid
+import threading
+import contextlib
 
 APPNAME="OctoPrint"
 
@@ -35,8 +37,30 @@ default_settings = {
 			"temperature": 5,
 			"sdStatus": 1
 		},
+		"lineHistory": {
+			"size": 1000,
+			"maxSize": 1000
+		},
+		"reactor": False,
+		"sdTransfer": {
+			"windowed": False,
+			"bufferSize": 127
+		},
+		"profiler": {
+			"enabled": False,
+			"window": 60,
+			"export": False
+		},
 		"additionalPorts": []
 	},
+	"printers": [],
+	"jobQueue": {
+		"shiftEnd": None,
+		"prestage": {
+			"lead": 300,
+			"size": 4
+		}
+	},
 	"server": {
 		"host": "0.0.0.0",
 		"port": 5000,
@@ -63,6 +87,17 @@ default_settings = {
 		"mobileSizeThreshold": 2 * 1024 * 1024, # 2MB
 		"sizeThreshold": 20 * 1024 * 1024, # 20MB
 	},
+	"gcodeAnalysis": {
+		"estimator": "planner"
+	},
+	"gcodeCompaction": {
+		"enabled": False,
+		"verify": True
+	},
+	"gcodeArcFitting": {
+		"enabled": False,
+		"tolerance": 0.05
+	},
 	"feature": {
 		"temperatureGraph": True,
 		"waitForStartOnConnect": False,
@@ -102,6 +137,19 @@ default_settings = {
 		],
 		"bedDimensions": {
 			"x": 200.0, "y": 200.0
+		},
+		"planner": {
+			"maxFeedrate": {
+				"x": 500, "y": 500, "z": 5, "e": 25
+			},
+			"maxAcceleration": {
+				"x": 3000, "y": 3000, "z": 100, "e": 10000
+			},
+			"acceleration": 1000,
+			"retractAcceleration": 3000,
+			"travelAcceleration": 1000,
+			"junctionDeviation": 0.05,
+			"bufferSize": 16
 		}
 	},
 	"appearance": {
@@ -147,7 +195,24 @@ default_settings = {
 			"numExtruders": 1,
 			"includeCurrentToolInTemps": True,
 			"hasBed": True,
-			"repetierStyleTargetTemperature": False
+			"repetierStyleTargetTemperature": False,
+			"firmware": "marlin",
+			"processingTime": 0.0,
+			"plannerBufferSize": 0,
+			"moveTime": 0.0,
+			"moveSpeedup": 0.0
+		},
+		"replay": {
+			"enabled": False,
+			"recording": None,
+			"latency": {
+				"model": "fixed",
+				"latency": 0.0,
+				"baudrate": 115200,
+				"processing": 0.001,
+				"jitter": 0.0,
+				"seed": 0
+			}
 		}
 	}
 }
@@ -164,6 +229,13 @@ class Settings(object):
 		self._config = None
 		self._dirty = False
 
+		self._subscriptions = {}
+		self._subscriptionsMutex = threading.RLock()
+
+		self._saveMutex = threading.Lock()
+		# batches only defer the saves and notifications of the thread that opened them
+		self._batch = threading.local()
+
 		self._init_settings_dir(basedir)
 
 		if configfile is not None:
@@ -286,13 +358,75 @@ class Settings(object):
 			self._logger.info("Migrated %d event subscriptions to new format and structure" % len(newEvents["subscriptions"]))
 
 	def save(self, force=False):
+		"""
+		Persists the current configuration to the config file if it has been changed (or ``force`` is True).
+
+		The in-memory configuration stays authoritative, the file is written atomically and not read back
+		afterwards. If called within a :meth:`batch` of the calling thread, the write is deferred until the outermost
+		batch is left.
+		"""
+		batch = self._getBatch()
+		if batch.depth > 0:
+			batch.saveRequested = True
+			batch.saveForced = batch.saveForced or force
+			return
+
 		if not self._dirty and not force:
 			return
 
-		with open(self._configfile, "wb") as configFile:
-			yaml.safe_dump(self._config, configFile, default_flow_style=False, indent="    ", allow_unicode=True)
+		from octoprint.util import atomicWrite
+
+		with self._saveMutex:
+			with atomicWrite(self._configfile, "wb") as configFile:
+				yaml.safe_dump(self._config, configFile, default_flow_style=False, indent="    ", allow_unicode=True)
 			self._dirty = False
-		self.load()
+
+	@contextlib.contextmanager
+	def batch(self):
+		"""
+		Context manager for applying multiple changes to the settings in one go.
+
+		Within a batch, calls to :meth:`save` are deferred and change notifications for subscribers are collected.
+		When the outermost batch is left, subscribers are notified once per changed path and the configuration is
+		written at most once, if any save was requested during the batch. Batches are per thread, saves and changes
+		from other threads in the meantime are neither deferred nor collected.
+
+		Usage:
+
+		    with settings().batch():
+		        settings().set(["appearance", "name"], "My Printer")
+		        settings().setBoolean(["feature", "sdSupport"], False)
+		        settings().save()
+		"""
+		batch = self._getBatch()
+		batch.depth += 1
+
+		try:
+			yield self
+		finally:
+			batch.depth -= 1
+			if batch.depth == 0:
+				changedPaths = batch.changedPaths
+				saveRequested = batch.saveRequested
+				saveForced = batch.saveForced
+
+				batch.changedPaths = []
+				batch.saveRequested = False
+				batch.saveForced = False
+
+				if saveRequested:
+					self.save(force=saveForced)
+				for changedPath in changedPaths:
+					self._notifySubscribers(changedPath)
+
+	def _getBatch(self):
+		batch = self._batch
+		if not hasattr(batch, "depth"):
+			batch.depth = 0
+			batch.saveRequested = False
+			batch.saveForced = False
+			batch.changedPaths = []
+		return batch
 
 	#~~ getter
 
@@ -442,6 +576,7 @@ class Settings(object):
 		if len(path) == 0:
 			return
 
+		changedPath = list(path)
 		config = self._config
 		defaults = default_settings
 
@@ -461,12 +596,14 @@ class Settings(object):
 		if not force and key in defaults.keys() and key in config.keys() and defaults[key] == value:
 			del config[key]
 			self._dirty = True
+			self._notifySubscribers(changedPath)
 		elif force or (not key in config.keys() and defaults[key] != value) or (key in config.keys() and config[key] != value):
 			if value is None:
 				del config[key]
 			else:
 				config[key] = value
 			self._dirty = True
+			self._notifySubscribers(changedPath)
 
 	def setInt(self, path, value, force=False):
 		if value is None:
@@ -513,11 +650,73 @@ class Settings(object):
 			if not self._config["folder"]:
 				del self._config["folder"]
 			self._dirty = True
+			self._notifySubscribers(["folder", type])
 		elif (path != currentPath and path != defaultPath) or force:
 			if not "folder" in self._config.keys():
 				self._config["folder"] = {}
 			self._config["folder"][type] = path
 			self._dirty = True
+			self._notifySubscribers(["folder", type])
+
+	#~~ change notification
+
+	def subscribe(self, path, callback):
+		"""
+		Subscribes the given callback to changes of the setting identified by ``path``.
+
+		The callback will be called with the signature ``callback(path, value)`` whenever the setting at ``path``, any
+		setting below it or any setting above it gets changed through one of the setters, with ``value`` being the
+		new (effective) value at ``path``. That way components can keep frequently needed settings in plain attributes
+		instead of querying the settings over and over again, while still picking up changes made e.g. via the API.
+
+		@param path the path of the setting to subscribe to, e.g. ["devel", "virtualPrinter", "forceChecksum"]
+		@param callback the callback to call upon changes
+		"""
+		if len(path) == 0:
+			return
+
+		key = tuple(path)
+		with self._subscriptionsMutex:
+			if not key in self._subscriptions.keys():
+				self._subscriptions[key] = []
+			if not callback in self._subscriptions[key]:
+				self._subscriptions[key].append(callback)
+
+	def unsubscribe(self, path, callback):
+		"""
+		Unsubscribes the given callback from changes of the setting identified by ``path``.
+		"""
+		key = tuple(path)
+		with self._subscriptionsMutex:
+			if not key in self._subscriptions.keys() or not callback in self._subscriptions[key]:
+				return
+
+			self._subscriptions[key].remove(callback)
+			if not self._subscriptions[key]:
+				del self._subscriptions[key]
+
+	def _notifySubscribers(self, changedPath):
+		batch = self._getBatch()
+		if batch.depth > 0:
+			if not changedPath in batch.changedPaths:
+				batch.changedPaths.append(list(changedPath))
+			return
+
+		changed = tuple(changedPath)
+		with self._subscriptionsMutex:
+			affected = []
+			for key, callbacks in self._subscriptions.items():
+				length = min(len(key), len(changed))
+				if key[:length] == changed[:length]:
+					affected.append((key, list(callbacks)))
+
+		for key, callbacks in affected:
+			value = self.get(list(key))
+			for callback in callbacks:
+				try:
+					callback(list(key), value)
+				except:
+					self._logger.exception("Error while notifying %r about change of setting %r" % (callback, key))
 
 def _resolveSettingsDir(applicationName):
 	# taken from http://stackoverflow.com/questions/1084697/how-do-i-store-desktop-application-data-in-a-cross-platform-way-for-python
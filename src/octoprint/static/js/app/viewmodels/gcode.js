@@ -146,6 +146,11 @@ function GcodeViewModel(loginStateViewModel, settingsViewModel) {
     self.currentLayer = undefined;
     self.currentCommand = undefined;
 
+    // files too large to be visualized completely are visualized in windows of layers around the current print
+    // position, fetched via the layer index
+    self.LAYER_WINDOW_SIZE = 20;
+    self.layerWindow = undefined;
+
     self.initialize = function() {
         self._configureLayerSlider();
         self._configureLayerCommandSlider();
@@ -168,6 +173,7 @@ function GcodeViewModel(loginStateViewModel, settingsViewModel) {
         self.enableReload(false);
         self.loadedFilename = undefined;
         self.loadedFileDate = undefined;
+        self.layerWindow = undefined;
         self.clear();
     };
 
@@ -216,6 +222,7 @@ function GcodeViewModel(loginStateViewModel, settingsViewModel) {
                         self.showGCodeViewer(response, rstatus);
                         self.loadedFilename = filename;
                         self.loadedFileDate = date;
+                        self.layerWindow = undefined;
                         self.status = "idle";
                         self.enableReload(true);
                     }
@@ -228,6 +235,65 @@ function GcodeViewModel(loginStateViewModel, settingsViewModel) {
         }
     };
 
+    self.loadLayerWindow = function(filename, date, filepos, onUnavailable) {
+        self.enableReload(false);
+        if (self.status != "idle" || self.errorCount >= 3) return;
+
+        self.status = "request";
+        $.ajax({
+            url: API_BASEURL + "files/local/" + filename + "/layers",
+            type: "GET",
+            dataType: "json",
+            success: function(response) {
+                var layers = response.layers;
+                if (!layers || layers.length == 0) {
+                    self.status = "idle";
+                    if (onUnavailable) onUnavailable();
+                    return;
+                }
+
+                var first = 0;
+                if (filepos) {
+                    for (var i = 0; i < layers.length; i++) {
+                        if (layers[i].offset > filepos) break;
+                        first = i;
+                    }
+                }
+                first = Math.max(0, Math.min(first, layers.length - self.LAYER_WINDOW_SIZE));
+                var last = Math.min(first + self.LAYER_WINDOW_SIZE, layers.length) - 1;
+
+                $.ajax({
+                    url: API_BASEURL + "files/local/" + filename + "/layers/" + first,
+                    data: { "count": last - first + 1, "ctime": date },
+                    type: "GET",
+                    dataType: "text",
+                    success: function(gcode) {
+                        self.showGCodeViewer(gcode);
+                        self.loadedFilename = filename;
+                        self.loadedFileDate = date;
+                        self.layerWindow = {
+                            first: first,
+                            last: last,
+                            total: layers.length,
+                            offset: layers[first].offset,
+                            length: layers[last].offset + layers[last].length - layers[first].offset
+                        };
+                        self.status = "idle";
+                        self.enableReload(true);
+                    },
+                    error: function() {
+                        self.status = "idle";
+                        self.errorCount++;
+                    }
+                });
+            },
+            error: function() {
+                self.status = "idle";
+                if (onUnavailable) onUnavailable();
+            }
+        });
+    };
+
     self.showGCodeViewer = function(response, rstatus) {
         var par = {
             target: {
@@ -242,7 +308,11 @@ function GcodeViewModel(loginStateViewModel, settingsViewModel) {
 
     self.reload = function() {
         if (!self.enableReload()) return;
-        self.loadFile(self.loadedFilename, self.loadedFileDate);
+        if (self.layerWindow) {
+            self.loadLayerWindow(self.loadedFilename, self.loadedFileDate, self.layerWindow.offset);
+        } else {
+            self.loadFile(self.loadedFilename, self.loadedFileDate);
+        }
     };
 
     self.fromHistoryData = function(data) {
@@ -272,8 +342,16 @@ function GcodeViewModel(loginStateViewModel, settingsViewModel) {
         if(self.loadedFilename
                 && self.loadedFilename == data.job.file.name
                 && self.loadedFileDate == data.job.file.date) {
-            if (self.currentlyPrinting && self.renderer_syncProgress() && !self.waitForApproval()) {
-                var cmdIndex = GCODE.gCodeReader.getCmdIndexForPercentage(data.progress.completion);
+            if (self.currentlyPrinting && self.layerWindow && data.progress.filepos
+                    && (data.progress.filepos < self.layerWindow.offset || data.progress.filepos >= self.layerWindow.offset + self.layerWindow.length)) {
+                // the print left the visualized layers, move the window along
+                self.loadLayerWindow(data.job.file.name, data.job.file.date, data.progress.filepos);
+            } else if (self.currentlyPrinting && self.renderer_syncProgress() && !self.waitForApproval()) {
+                var completion = data.progress.completion;
+                if (self.layerWindow) {
+                    completion = (data.progress.filepos - self.layerWindow.offset) * 100 / self.layerWindow.length;
+                }
+                var cmdIndex = GCODE.gCodeReader.getCmdIndexForPercentage(completion);
                 if(cmdIndex){
                     GCODE.renderer.render(cmdIndex.layer, 0, cmdIndex.cmd);
                     GCODE.ui.updateLayerInfo(cmdIndex.layer);
@@ -292,9 +370,15 @@ function GcodeViewModel(loginStateViewModel, settingsViewModel) {
                 self.selectedFile.size(data.job.file.size);
 
                 if (data.job.file.size > CONFIG_GCODE_SIZE_THRESHOLD || ($.browser.mobile && data.job.file.size > CONFIG_GCODE_MOBILE_SIZE_THRESHOLD)) {
-                    self.waitForApproval(true);
+                    self.waitForApproval(false);
                     self.loadedFilename = undefined;
                     self.loadedFileDate = undefined;
+
+                    // only visualize the layers around the current position if the file has been indexed, otherwise
+                    // ask for approval to load it completely
+                    self.loadLayerWindow(data.job.file.name, data.job.file.date, data.progress.filepos, function() {
+                        self.waitForApproval(true);
+                    });
                 } else {
                     self.waitForApproval(false);
                     self.loadFile(data.job.file.name, data.job.file.date);
@@ -333,6 +417,9 @@ function GcodeViewModel(loginStateViewModel, settingsViewModel) {
             output.push("Estimated print time: " + formatDuration(model.printTime));
             output.push("Estimated layer height: " + model.layerHeight.toFixed(2) + "mm");
             output.push("Layer count: " + model.layersPrinted.toFixed(0) + " printed, " + model.layersTotal.toFixed(0) + " visited");
+            if (self.layerWindow) {
+                output.push("Showing layers " + (self.layerWindow.first + 1) + " to " + (self.layerWindow.last + 1) + " of " + self.layerWindow.total);
+            }
 
             self.ui_modelInfo(output.join("<br>"));
 
@@ -17,7 +17,7 @@ import shutil
 import octoprint.util as util
 
 from octoprint.settings import settings
-from octoprint.events import eventManager, Events
+from octoprint.events import eventManager, getEventPrinter, Events
 
 # currently configured timelapse
 current = None
@@ -106,23 +106,36 @@ class Timelapse(object):
 		self._postRollStart = None
 		self._onPostRollDone = None
 
-		self._captureDir = settings().getBaseFolder("timelapse_tmp")
-		self._movieDir = settings().getBaseFolder("timelapse")
-		self._snapshotUrl = settings().get(["webcam", "snapshot"])
+		self._loadSettings()
+		settings().subscribe(["webcam"], self._onSettingsChanged)
+		settings().subscribe(["folder"], self._onSettingsChanged)
 
 		self._fps = 25
 
 		self._renderThread = None
 		self._captureMutex = threading.Lock()
 
+		# the printer whose print the timelapse follows, events of all other printers are ignored
+		self._printerId = None
+
 		# subscribe events
-		eventManager().subscribe(Events.PRINT_STARTED, self.onPrintStarted)
-		eventManager().subscribe(Events.PRINT_FAILED, self.onPrintDone)
-		eventManager().subscribe(Events.PRINT_DONE, self.onPrintDone)
-		eventManager().subscribe(Events.PRINT_RESUMED, self.onPrintResumed)
-		for (event, callback) in self.eventSubscriptions():
+		self._subscriptions = [(event, self._forPrinter(callback)) for (event, callback) in [
+			(Events.PRINT_STARTED, self.onPrintStarted),
+			(Events.PRINT_FAILED, self.onPrintDone),
+			(Events.PRINT_DONE, self.onPrintDone),
+			(Events.PRINT_RESUMED, self.onPrintResumed)
+		] + self.eventSubscriptions()]
+		for (event, callback) in self._subscriptions:
 			eventManager().subscribe(event, callback)
 
+	def _loadSettings(self):
+		self._captureDir = settings().getBaseFolder("timelapse_tmp")
+		self._movieDir = settings().getBaseFolder("timelapse")
+		self._snapshotUrl = settings().get(["webcam", "snapshot"])
+
+	def _onSettingsChanged(self, path, value):
+		self._loadSettings()
+
 	def postRoll(self):
 		return self._postRoll
 
@@ -130,14 +143,27 @@ class Timelapse(object):
 		if self._inTimelapse:
 			self.stopTimelapse(doCreateMovie=False)
 
+		settings().unsubscribe(["webcam"], self._onSettingsChanged)
+		settings().unsubscribe(["folder"], self._onSettingsChanged)
+
 		# unsubscribe events
-		eventManager().unsubscribe(Events.PRINT_STARTED, self.onPrintStarted)
-		eventManager().unsubscribe(Events.PRINT_FAILED, self.onPrintDone)
-		eventManager().unsubscribe(Events.PRINT_DONE, self.onPrintDone)
-		eventManager().unsubscribe(Events.PRINT_RESUMED, self.onPrintResumed)
-		for (event, callback) in self.eventSubscriptions():
+		for (event, callback) in self._subscriptions:
 			eventManager().unsubscribe(event, callback)
 
+	def _forPrinter(self, callback):
+		"""
+		Wraps the event ``callback`` so it's only called for events of the printer the timelapse follows. A print
+		started or resumed while no timelapse is running makes the timelapse follow the printer of that print.
+		"""
+		def onEvent(event, payload):
+			printerId = getEventPrinter(payload)
+			if event in (Events.PRINT_STARTED, Events.PRINT_RESUMED) and not self._inTimelapse:
+				self._printerId = printerId
+			elif printerId is not None and printerId != self._printerId:
+				return
+			callback(event, payload)
+		return onEvent
+
 	def onPrintStarted(self, event, payload):
 		"""
 		Override this to perform additional actions upon start of a print job.
@@ -48,6 +48,13 @@ class UserManager(object):
 	def hasBeenCustomized(self):
 		return False
 
+	def getGeneration(self):
+		"""
+		Returns a number that changes whenever a user is added or removed or a user's activation state, roles, password
+		or API key changes, None if changes can't be tracked.
+		"""
+		return None
+
 ##~~ FilebasedUserManager, takes available users from users.yaml file
 
 class FilebasedUserManager(UserManager):
@@ -59,7 +66,9 @@ class FilebasedUserManager(UserManager):
 			userfile = os.path.join(settings().settings_dir, "users.yaml")
 		self._userfile = userfile
 		self._users = {}
+		self._apikeys = {}
 		self._dirty = False
+		self._generation = 0
 
 		self._customized = None
 		self._load()
@@ -77,11 +86,18 @@ class FilebasedUserManager(UserManager):
 					self._users[name] = User(name, attributes["password"], attributes["active"], attributes["roles"], apikey)
 		else:
 			self._customized = False
+		self._rebuildApikeyIndex()
+
+	def _rebuildApikeyIndex(self):
+		self._apikeys = dict((user._apikey, name) for name, user in self._users.items() if user._apikey is not None)
 
 	def _save(self, force=False):
 		if not self._dirty and not force:
 			return
 
+		# all changes end up here right after they were made to the user objects
+		self._generation += 1
+
 		data = {}
 		for name in self._users.keys():
 			user = self._users[name]
@@ -102,6 +118,8 @@ class FilebasedUserManager(UserManager):
 			raise UserAlreadyExists(username)
 
 		self._users[username] = User(username, UserManager.createPasswordHash(password), active, roles, apikey)
+		if apikey is not None:
+			self._apikeys[apikey] = username
 		self._dirty = True
 		self._save()
 
@@ -164,7 +182,10 @@ class FilebasedUserManager(UserManager):
 			raise UnknownUser(username)
 
 		user = self._users[username]
+		if user._apikey is not None:
+			self._apikeys.pop(user._apikey, None)
 		user._apikey = ''.join('%02X' % ord(z) for z in uuid.uuid4().bytes)
+		self._apikeys[user._apikey] = username
 		self._dirty = True
 		self._save()
 		return user._apikey
@@ -174,6 +195,8 @@ class FilebasedUserManager(UserManager):
 			raise UnknownUser(username)
 
 		user = self._users[username]
+		if user._apikey is not None:
+			self._apikeys.pop(user._apikey, None)
 		user._apikey = None
 		self._dirty = True
 		self._save()
@@ -182,7 +205,9 @@ class FilebasedUserManager(UserManager):
 		if not username in self._users.keys():
 			raise UnknownUser(username)
 
-		del self._users[username]
+		user = self._users.pop(username)
+		if user._apikey is not None:
+			self._apikeys.pop(user._apikey, None)
 		self._dirty = True
 		self._save()
 
@@ -193,10 +218,10 @@ class FilebasedUserManager(UserManager):
 
 			return self._users[username]
 		elif apikey is not None:
-			for user in self._users.values():
-				if apikey == user._apikey:
-					return user
-			return None
+			if apikey not in self._apikeys:
+				return None
+
+			return self._users.get(self._apikeys[apikey])
 		else:
 			return None
 
@@ -206,6 +231,9 @@ class FilebasedUserManager(UserManager):
 	def hasBeenCustomized(self):
 		return self._customized
 
+	def getGeneration(self):
+		return self._generation
+
 ##~~ Exceptions
 
 class UserAlreadyExists(Exception):
@@ -8,6 +8,7 @@ import sys
 import time
 import re
 import tempfile
+import contextlib
 from flask import make_response
 
 from octoprint.settings import settings, default_settings
@@ -179,6 +180,42 @@ def safeRename(old, new):
 		os.rename(old, new)
 
 
+@contextlib.contextmanager
+def atomicWrite(filename, mode="wb"):
+	"""
+	Context manager for atomically replacing a file.
+
+	Yields a file object for a temporary file located next to the target file. When the block is left without
+	an exception, the temporary file is flushed and synced to disk and then renamed to the target via
+	safeRename, so readers either see the old or the new content but never a half written file. If the block
+	raises an exception, the temporary file is removed and the target stays untouched.
+
+	Usage:
+
+	    with atomicWrite("/path/to/config.yaml") as f:
+	        yaml.safe_dump(data, f)
+
+	@param filename the path of the file to write
+	@param mode the mode to open the temporary file with, defaults to "wb"
+	"""
+
+	path, name = os.path.split(os.path.abspath(filename))
+	fh, tempPath = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=path)
+	try:
+		if os.path.exists(filename):
+			# mkstemp creates the file with mode 0600, keep the permissions of the file we are replacing
+			os.chmod(tempPath, os.stat(filename).st_mode & 0777)
+
+		with os.fdopen(fh, mode) as f:
+			yield f
+			f.flush()
+			os.fsync(f.fileno())
+		safeRename(tempPath, filename)
+	except:
+		silentRemove(tempPath)
+		raise
+
+
 def silentRemove(file):
 	"""
 	Silently removes a file. Does not raise an error if the file doesn't exist.
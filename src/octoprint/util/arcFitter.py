@@ -0,0 +1,300 @@
+from __future__ import absolute_import
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import hashlib
+import math
+
+from octoprint.util.positionTracker import PositionTracker
+
+
+class ArcFitter(object):
+	"""
+	Replaces runs of short ``G1`` moves that follow a circle (as slicers produce them for round perimeters) with
+	single ``G2``/``G3`` arcs:
+
+	* all end points of a run have to lie within ``tolerance`` mm of the circle, and the arc may not stray further
+	  than ``tolerance`` from any of the original segments,
+	* a run has to consist of at least ``minSegments`` moves in the XY plane only, in absolute positioning, with an
+	  unchanged feedrate, and either all of them extruding at about the same rate per mm (``extrusionTolerance``) or
+	  none of them extruding at all,
+	* the arc ends exactly where the last move ended, with the exact ``E`` of that move (in relative extrusion mode
+	  the sum of the run), so the amount of extruded filament stays the same.
+
+	Lines are passed through :meth:`process` in order, comments and everything that's no candidate for an arc pass
+	through unchanged. Whenever the position can't be known for sure (homing, tool changes, unknown commands) no arc
+	is fitted until all axes have been moved to known positions again.
+	"""
+
+	def __init__(self, tolerance=0.05, minSegments=4, maxSegments=200, maxRadius=1000.0, extrusionTolerance=0.05):
+		self._tolerance = tolerance
+		self._minSegments = minSegments
+		self._maxSegments = maxSegments
+		self._maxRadius = maxRadius
+		self._extrusionTolerance = extrusionTolerance
+
+		self._tracker = PositionTracker()
+
+		self._run = []
+		self._runStart = None
+		self._runFeedrate = None
+
+		self._lines = 0
+		self._fittedLines = 0
+		self._arcs = 0
+
+	def process(self, lines):
+		"""
+		Generator yielding the lines of the given iterable with all fitting runs of moves replaced by arcs.
+		"""
+		for line in lines:
+			self._lines += 1
+			for result in self._process(line):
+				self._fittedLines += 1
+				yield result
+
+		for result in self._flush():
+			self._fittedLines += 1
+			yield result
+
+	def getStatistics(self):
+		return {
+			"lines": self._lines,
+			"fittedLines": self._fittedLines,
+			"arcs": self._arcs,
+			"reduction": 1.0 - float(self._fittedLines) / self._lines if self._lines else 0.0
+		}
+
+	def _process(self, line):
+		code = line
+		if ";" in code:
+			code = code[:code.find(";")]
+		words = code.split()
+
+		move = self._parseMove(words, line)
+		if move is not None:
+			result = []
+			if self._run:
+				if move["feedrate"] is not None and move["feedrate"] != self._runFeedrate \
+						or move["extrusion"] != self._run[0]["extrusion"]:
+					# different kind of move, starts a new run
+					result.extend(self._flush())
+				else:
+					self._run.append(move)
+					if len(self._run) > self._maxSegments or (len(self._run) >= 2 and self._fitCircle(self._run) is None):
+						self._run.pop()
+						result.extend(self._flush())
+
+			if not self._run:
+				position = self._tracker.position
+				self._runStart = (position["X"], position["Y"], position["E"])
+				self._runFeedrate = move["feedrate"] if move["feedrate"] is not None else self._tracker.feedrate
+				self._run.append(move)
+
+			self._tracker.update(words)
+			return result
+
+		result = self._flush()
+		if words:
+			self._tracker.update(words)
+		result.append(line)
+		return result
+
+	def _parseMove(self, words, line):
+		"""
+		Returns the target of the move in ``words`` if it may become part of an arc, None otherwise.
+		"""
+		if not words or not words[0].upper() in ("G1", "G01"):
+			return None
+		position = self._tracker.position
+		if self._tracker.isRelative("X") or position["X"] is None or position["Y"] is None:
+			return None
+
+		values = dict()
+		for word in words[1:]:
+			parsed = PositionTracker.parseWord(word)
+			if parsed is None or not parsed[0] in ("X", "Y", "E", "F"):
+				return None
+			values[parsed[0]] = (float(parsed[1]), parsed[1])
+
+		x = values["X"][0] if "X" in values else position["X"]
+		y = values["Y"][0] if "Y" in values else position["Y"]
+		length = math.hypot(x - position["X"], y - position["Y"])
+		if length == 0:
+			return None
+
+		extrusion = 0.0
+		if "E" in values:
+			if self._tracker.absoluteE:
+				if position["E"] is None:
+					return None
+				extrusion = values["E"][0] - position["E"]
+			else:
+				extrusion = values["E"][0]
+			if extrusion < 0:
+				# wipes while retracting stay as they are
+				return None
+
+		return dict(
+			line=line,
+			x=x,
+			y=y,
+			length=length,
+			extrusion=extrusion > 0,
+			e=extrusion,
+			eText=values["E"][1] if "E" in values else None,
+			feedrate=values["F"][0] if "F" in values else None
+		)
+
+	def _flush(self):
+		run = self._run
+		self._run = []
+		if not run:
+			return []
+		if len(run) < self._minSegments:
+			return [move["line"] for move in run]
+
+		center, clockwise = self._fitCircle(run)
+		startX, startY, startE = self._runStart
+		words = [
+			"G2" if clockwise else "G3",
+			"X" + self._formatPosition(run[-1]["x"], "X"),
+			"Y" + self._formatPosition(run[-1]["y"], "Y"),
+			"I%.4f" % (center[0] - startX),
+			"J%.4f" % (center[1] - startY)
+		]
+		if run[0]["extrusion"]:
+			if self._tracker.absoluteE:
+				words.append("E" + run[-1]["eText"])
+			else:
+				decimals = max(len(move["eText"].partition(".")[2]) for move in run)
+				words.append("E%.*f" % (decimals, sum(move["e"] for move in run)))
+		if run[0]["feedrate"] is not None:
+			words.append("F" + ArcFitter._formatNumber(run[0]["feedrate"]))
+
+		self._arcs += 1
+		line = " ".join(words)
+		if run[-1]["line"].endswith("\n"):
+			line += "\n"
+		return [line]
+
+	def _formatPosition(self, value, code):
+		# prefer the number exactly as it was written in the file
+		if value == self._tracker.position[code] and self._tracker.text[code] is not None:
+			return self._tracker.text[code]
+		return ArcFitter._formatNumber(value)
+
+	def _fitCircle(self, run):
+		"""
+		Returns center and direction of the arc replacing the moves of ``run``, None if there's no such arc within the
+		tolerance.
+		"""
+		points = [self._runStart[:2]] + [(move["x"], move["y"]) for move in run]
+
+		ax, ay = points[0]
+		bx, by = points[len(points) // 2][0] - ax, points[len(points) // 2][1] - ay
+		cx, cy = points[-1][0] - ax, points[-1][1] - ay
+		d = 2.0 * (bx * cy - by * cx)
+		if d == 0:
+			return None
+		centerX = (cy * (bx * bx + by * by) - by * (cx * cx + cy * cy)) / d
+		centerY = (bx * (cx * cx + cy * cy) - cx * (bx * bx + by * by)) / d
+		radius = math.hypot(centerX, centerY)
+		if radius > self._maxRadius:
+			return None
+		center = (ax + centerX, ay + centerY)
+		clockwise = d < 0
+
+		sweep = 0.0
+		previous = None
+		for x, y in points:
+			if abs(math.hypot(x - center[0], y - center[1]) - radius) > self._tolerance:
+				return None
+			angle = math.atan2(y - center[1], x - center[0])
+			if previous is not None:
+				step = angle - previous
+				if step > math.pi:
+					step -= 2 * math.pi
+				elif step < -math.pi:
+					step += 2 * math.pi
+				if (step < 0) != clockwise or abs(step) > math.pi / 2:
+					return None
+				sweep += step
+			previous = angle
+		if abs(sweep) > 1.9 * math.pi:
+			return None
+
+		extrusionRate = sum(move["e"] for move in run) / sum(move["length"] for move in run)
+		for move in run:
+			halfChord = move["length"] / 2
+			if halfChord > radius or radius - math.sqrt(radius * radius - halfChord * halfChord) > self._tolerance:
+				return None
+			if abs(move["e"] / move["length"] - extrusionRate) > self._extrusionTolerance * extrusionRate:
+				return None
+
+		return center, clockwise
+
+	@staticmethod
+	def _formatNumber(value):
+		return ("%.4f" % value).rstrip("0").rstrip(".")
+
+
+def fitFile(source, destination, tolerance=0.05):
+	"""
+	Writes the file at ``source`` with all fitting runs of moves replaced by arcs to ``destination``. Returns the
+	statistics of the :class:`ArcFitter` together with the SHA1 ``hash`` of the written file.
+	"""
+	fitter = ArcFitter(tolerance=tolerance)
+	hash = hashlib.sha1()
+	with open(source, "r") as input:
+		with open(destination, "w") as output:
+			for line in fitter.process(input):
+				output.write(line)
+				hash.update(line)
+
+	result = fitter.getStatistics()
+	result["hash"] = hash.hexdigest()
+	return result
+
+
+def validate(original, fitted, tolerance=0.05):
+	"""
+	Compares the finished gcode analyses (``gcodeInterpreter.gcode``) of a file and of its fitted version: the
+	extruded filament per tool, the Z height of all layers and the extent of the toolpath of each layer have to match,
+	the difference of the estimated print times is reported. Returns a dict with the result in ``valid``, the
+	``differences`` found and the relative ``timeDifference``.
+	"""
+	differences = []
+	if len(original.extrusionAmount) != len(fitted.extrusionAmount) \
+			or any(abs(a - b) > 1e-6 * max(1.0, abs(a)) for a, b in zip(original.extrusionAmount, fitted.extrusionAmount)):
+		differences.append("filament")
+	if [layer[2] for layer in original.layerList] != [layer[2] for layer in fitted.layerList]:
+		differences.append("layers")
+	if len(original.toolpath.layers) != len(fitted.toolpath.layers) \
+			or any(not _isSimilarLayer(a, b, tolerance) for a, b in zip(original.toolpath.layers, fitted.toolpath.layers)):
+		differences.append("toolpath")
+
+	timeDifference = 0.0
+	if original.totalMoveTimeMinute:
+		timeDifference = (fitted.totalMoveTimeMinute - original.totalMoveTimeMinute) / original.totalMoveTimeMinute
+
+	return {
+		"valid": not differences,
+		"differences": differences,
+		"timeDifference": timeDifference
+	}
+
+
+def _isSimilarLayer(original, fitted, tolerance):
+	def bounds(layer):
+		xs, ys, _ = layer
+		return [f(values) for values in (xs, ys) for f in (min, max)] if xs else []
+
+	originalBounds = bounds(original)
+	fittedBounds = bounds(fitted)
+	if len(originalBounds) != len(fittedBounds):
+		return False
+	# the toolpath skips points closer than its resolution, allow for one of those on top of the tolerance
+	return all(abs(a - b) <= tolerance + 0.1 for a, b in zip(originalBounds, fittedBounds))
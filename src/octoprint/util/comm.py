@@ -10,21 +10,27 @@ import glob
 import time
 import re
 import threading
+import collections
 import Queue as queue
 import logging
+import struct
+import zlib
+import json
 import serial
 
-from collections import deque
-
 from octoprint.util.avr_isp import stk500v2
 from octoprint.util.avr_isp import ispBase
 
-from octoprint.settings import settings
-from octoprint.events import eventManager, Events
+from octoprint.settings import settings, default_settings
+from octoprint.events import eventManager, eventPayload, Events
 from octoprint.filemanager.destinations import FileDestinations
-from octoprint.gcodefiles import isGcodeFileName
-from octoprint.util import getExceptionString, getNewTimeout, sanitizeAscii, filterNonAscii
+from octoprint.gcodefiles import isGcodeFileName, PrintTimeIndex
+from octoprint.util import getExceptionString, sanitizeAscii, filterNonAscii
 from octoprint.util.virtual import VirtualPrinter
+from octoprint.util.replay import ReplayTransport, Recording, createLatencyModel
+from octoprint.util.reactor import SerialReactor
+from octoprint.util.gcodeCompactor import GcodeCompactor
+from octoprint.util.serialProfiler import SerialProfiler
 
 try:
 	import _winreg
@@ -61,8 +67,41 @@ def serialList():
 		baselist.insert(0, prev)
 	if settings().getBoolean(["devel", "virtualPrinter", "enabled"]):
 		baselist.append("VIRTUAL")
+	if settings().getBoolean(["devel", "replay", "enabled"]):
+		baselist.append("REPLAY")
 	return baselist
 
+_checksumStructs = dict()
+
+def checksum(data):
+	"""
+	Calculates the checksum of a line as expected by the firmware, the XOR of all its bytes. XORs the line as 64 bit
+	words (padded with zeros) instead of byte by byte and folds the result, which is a lot faster in Python.
+	"""
+	words = (len(data) + 7) // 8
+	unpacker = _checksumStructs.get(words)
+	if unpacker is None:
+		unpacker = _checksumStructs[words] = struct.Struct("<%dQ" % words)
+
+	padding = words * 8 - len(data)
+	if padding:
+		data += "\0" * padding
+
+	result = 0
+	for word in unpacker.unpack(data):
+		result ^= word
+	result ^= result >> 32
+	result ^= result >> 16
+	result ^= result >> 8
+	return result & 0xff
+
+def frameLine(cmd, lineNumber):
+	"""
+	Frames the command for sending with line number and checksum, including the terminating newline.
+	"""
+	line = "N%d %s" % (lineNumber, cmd)
+	return "%s*%d\n" % (line, checksum(line))
+
 def baudrateList():
 	ret = [250000, 230400, 115200, 57600, 38400, 19200, 9600]
 	prev = settings().getInt(["serial", "baudrate"])
@@ -114,7 +153,7 @@ class MachineCom(object):
 	STATE_CLOSED_WITH_ERROR = 10
 	STATE_TRANSFERING_FILE = 11
 	
-	def __init__(self, port = None, baudrate = None, callbackObject = None):
+	def __init__(self, port = None, baudrate = None, callbackObject = None, printerId = None):
 		self._logger = logging.getLogger(__name__)
 		self._serialLogger = logging.getLogger("SERIAL")
 
@@ -132,6 +171,7 @@ class MachineCom(object):
 		self._port = port
 		self._baudrate = baudrate
 		self._callback = callbackObject
+		self._printerId = printerId
 		self._state = self.STATE_NONE
 		self._serial = None
 		self._baudrateDetectList = baudrateList()
@@ -143,13 +183,24 @@ class MachineCom(object):
 		self._commandQueue = queue.Queue()
 		self._currentZ = None
 		self._heatupWaitStartTime = 0
-		self._heatupWaitTimeLost = 0.0
+		self._heatupWaitTime = 0.0
 		self._currentExtruder = 0
+		self._profiler = None
+		self._profiledFile = None
+
+		self._loadSettings()
+		settings().subscribe(["feature"], self._onSettingsChanged)
+		settings().subscribe(["serial", "timeout"], self._onSettingsChanged)
+		settings().subscribe(["serial", "sdTransfer"], self._onSettingsChanged)
+		settings().subscribe(["serial", "profiler"], self._onSettingsChanged)
 
-		self._alwaysSendChecksum = settings().getBoolean(["feature", "alwaysSendChecksum"])
 		self._currentLine = 1
 		self._resendDelta = None
-		self._lastLines = deque([], 50)
+		self._lineHistory = LineHistory(
+			size=settings().getInt(["serial", "lineHistory", "size"]),
+			maxSize=settings().getInt(["serial", "lineHistory", "maxSize"])
+		)
+		self._resendStatistics = ResendStatistics()
 
 		# SD status data
 		self._sdAvailable = False
@@ -158,6 +209,16 @@ class MachineCom(object):
 
 		# print job
 		self._currentFile = None
+		self._remainingTimeEstimator = None
+		self._prestaged = None
+
+		# windowed transfers to SD
+		self._transferWindow = None
+		self._transferPending = None
+		self._transferRead = False
+		self._resendIgnoreLine = None
+		self._resendIgnoreCount = 0
+		self._sentLineNumbers = collections.deque(maxlen=64)
 
 		# regexes
 		floatPattern = "[-+]?[0-9]*\.?[0-9]+"
@@ -187,6 +248,11 @@ class MachineCom(object):
 		self._sendNextLock = threading.Lock()
 		self._sendingLock = threading.Lock()
 
+		# shared serial reactor, if monitoring is handed over to it
+		self._useReactor = settings().getBoolean(["serial", "reactor"])
+		self._reactor = None
+		self._partialErrorLine = None
+
 		# monitoring thread
 		self.thread = threading.Thread(target=self._monitor)
 		self.thread.daemon = True
@@ -195,6 +261,38 @@ class MachineCom(object):
 	def __del__(self):
 		self.close()
 
+	def _loadSettings(self):
+		s = settings()
+		self._alwaysSendChecksum = s.getBoolean(["feature", "alwaysSendChecksum"])
+		self._swallowOkAfterResend = s.getBoolean(["feature", "swallowOkAfterResend"])
+		self._repetierTargetTemp = s.getBoolean(["feature", "repetierTargetTemp"])
+		self._sdSupport = s.getBoolean(["feature", "sdSupport"])
+		self._sdAlwaysAvailable = s.getBoolean(["feature", "sdAlwaysAvailable"])
+		self._sdTransferWindowed = s.getBoolean(["serial", "sdTransfer", "windowed"])
+		self._sdTransferBufferSize = s.getInt(["serial", "sdTransfer", "bufferSize"])
+		self._profilerExport = s.getBoolean(["serial", "profiler", "export"])
+		if not s.getBoolean(["serial", "profiler", "enabled"]):
+			self._profiler = None
+		elif self._profiler is None:
+			self._profiler = SerialProfiler(window=s.getInt(["serial", "profiler", "window"]))
+
+		timeouts = {}
+		for type in default_settings["serial"]["timeout"].keys():
+			timeouts[type] = s.getFloat(["serial", "timeout", type])
+		self._timeouts = timeouts
+
+	def _onSettingsChanged(self, path, value):
+		self._loadSettings()
+
+	def _getNewTimeout(self, type):
+		now = time.time()
+
+		if type not in self._timeouts.keys() or self._timeouts[type] is None:
+			# timeout immediately for unknown timeout type
+			return now
+
+		return now + self._timeouts[type]
+
 	##~~ internal state management
 
 	def _changeState(self, newState):
@@ -202,7 +300,7 @@ class MachineCom(object):
 			return
 
 		if newState == self.STATE_CLOSED or newState == self.STATE_CLOSED_WITH_ERROR:
-			if settings().get(["feature", "sdSupport"]):
+			if self._sdSupport:
 				self._sdFileList = False
 				self._sdFiles = []
 				self._callback.mcSdFiles([])
@@ -210,16 +308,38 @@ class MachineCom(object):
 		oldState = self.getStateString()
 		self._state = newState
 		self._log('Changing monitoring state from \'%s\' to \'%s\'' % (oldState, self.getStateString()))
+
+		profiler = self._profiler
+		if profiler is not None:
+			if newState == self.STATE_PRINTING:
+				if self._currentFile is not None:
+					self._profiledFile = self._currentFile.getFilename()
+				profiler.start()
+			elif newState == self.STATE_PAUSED:
+				profiler.pause()
+			else:
+				profile = profiler.stop()
+				if profile is not None and self._profilerExport:
+					self._exportProfile(profile)
+
 		self._callback.mcStateChange(newState)
 
+	def _exportProfile(self, profile):
+		profile["file"] = self._profiledFile
+		profile["port"] = self._port
+		filename = "serial-profile-%s-%s.json" % (time.strftime("%Y%m%d-%H%M%S", time.localtime(profile["start"])), os.path.basename(self._profiledFile or "unknown"))
+		path = os.path.join(settings().getBaseFolder("logs"), filename)
+		try:
+			with open(path, "w") as f:
+				json.dump(profile, f)
+			self._logger.info("Exported serial profile of the print to %s" % path)
+		except:
+			self._logger.exception("Could not export serial profile to %s" % path)
+
 	def _log(self, message):
 		self._callback.mcLog(message)
 		self._serialLogger.debug(message)
 
-	def _addToLastLines(self, cmd):
-		self._lastLines.append(cmd)
-		self._logger.debug("Got %d lines of history in memory" % len(self._lastLines))
-
 	##~~ getters
 
 	def getState(self):
@@ -316,6 +436,10 @@ class MachineCom(object):
 		if printTime is None:
 			return None
 
+		if self._remainingTimeEstimator is not None:
+			return self._remainingTimeEstimator.estimate(self._currentFile.getFilepos(), printTime, self._heatupWaitTime) / 60
+
+		# no analysis data available, extrapolate from the progress so far
 		printTime /= 60
 		progress = self._currentFile.getProgress()
 		if progress:
@@ -336,6 +460,15 @@ class MachineCom(object):
 	def getConnection(self):
 		return self._port, self._baudrate
 
+	def getResendStatistics(self):
+		return self._resendStatistics.asDict()
+
+	def getProfilerStatistics(self):
+		profiler = self._profiler
+		if profiler is None:
+			return None
+		return profiler.getStatistics()
+
 	##~~ external interface
 
 	def close(self, isError = False):
@@ -345,10 +478,18 @@ class MachineCom(object):
 				self._changeState(self.STATE_CLOSED_WITH_ERROR)
 			else:
 				self._changeState(self.STATE_CLOSED)
+			if self._reactor is not None:
+				self._reactor.unregister(self._serial.fileno())
+				self._reactor = None
 			self._serial.close()
 		self._serial = None
 
-		if settings().get(["feature", "sdSupport"]):
+		settings().unsubscribe(["feature"], self._onSettingsChanged)
+		settings().unsubscribe(["serial", "timeout"], self._onSettingsChanged)
+		settings().unsubscribe(["serial", "sdTransfer"], self._onSettingsChanged)
+		settings().unsubscribe(["serial", "profiler"], self._onSettingsChanged)
+
+		if self._sdSupport:
 			self._sdFileList = []
 
 		if printing:
@@ -359,8 +500,8 @@ class MachineCom(object):
 					"filename": os.path.basename(self._currentFile.getFilename()),
 					"origin": self._currentFile.getFileLocation()
 				}
-			eventManager().fire(Events.PRINT_FAILED, payload)
-		eventManager().fire(Events.DISCONNECTED)
+			self._fireEvent(Events.PRINT_FAILED, payload)
+		self._fireEvent(Events.DISCONNECTED)
 
 	def setTemperatureOffset(self, tool=None, bed=None):
 		if tool is not None:
@@ -385,10 +526,12 @@ class MachineCom(object):
 
 		try:
 			self._currentFile.start()
+			self._remainingTimeEstimator = self._createRemainingTimeEstimator()
+			self._resendStatistics.reset()
 
 			wasPaused = self.isPaused()
 			self._changeState(self.STATE_PRINTING)
-			eventManager().fire(Events.PRINT_STARTED, {
+			self._fireEvent(Events.PRINT_STARTED, {
 				"file": self._currentFile.getFilename(),
 				"filename": os.path.basename(self._currentFile.getFilename()),
 				"origin": self._currentFile.getFileLocation()
@@ -404,7 +547,22 @@ class MachineCom(object):
 		except:
 			self._errorValue = getExceptionString()
 			self._changeState(self.STATE_ERROR)
-			eventManager().fire(Events.ERROR, {"error": self.getErrorString()})
+			self._fireEvent(Events.ERROR, {"error": self.getErrorString()})
+
+	def _createRemainingTimeEstimator(self):
+		if not isinstance(self._currentFile, PrintingGcodeFileInformation):
+			return None
+
+		filename = self._currentFile.getFilename()
+		try:
+			timeIndex = PrintTimeIndex.read(PrintTimeIndex.getPath(filename), filename)
+		except:
+			self._logger.exception("Could not read print time index of %s" % filename)
+			return None
+
+		if timeIndex is None:
+			return None
+		return RemainingTimeEstimator(timeIndex)
 
 	def startFileTransfer(self, filename, localFilename, remoteFilename):
 		if not self.isOperational() or self.isBusy():
@@ -413,12 +571,22 @@ class MachineCom(object):
 
 		self._currentFile = StreamingGcodeFileInformation(filename, localFilename, remoteFilename)
 		self._currentFile.start()
+		self._remainingTimeEstimator = None
+
+		self._transferPending = None
+		self._transferRead = False
+		self._resendIgnoreLine = None
+		self._resendIgnoreCount = 0
+		if self._sdTransferWindowed:
+			self._transferWindow = SendWindow(self._sdTransferBufferSize)
+		else:
+			self._transferWindow = None
 
 		self.sendCommand("M28 %s" % remoteFilename)
-		eventManager().fire(Events.TRANSFER_STARTED, {"local": localFilename, "remote": remoteFilename})
+		self._fireEvent(Events.TRANSFER_STARTED, {"local": localFilename, "remote": remoteFilename})
 		self._callback.mcFileTransferStarted(remoteFilename, self._currentFile.getFilesize())
 
-	def selectFile(self, filename, sd):
+	def selectFile(self, filename, sd, compact=False):
 		if self.isBusy():
 			return
 
@@ -428,19 +596,42 @@ class MachineCom(object):
 				return
 			self.sendCommand("M23 %s" % filename)
 		else:
-			self._currentFile = PrintingGcodeFileInformation(filename, self.getOffsets)
-			eventManager().fire(Events.FILE_SELECTED, {
+			prestaged = self._prestaged
+			self._prestaged = None
+			if prestaged is not None and prestaged.getFilename() != filename:
+				prestaged = None
+
+			compactor = GcodeCompactor() if compact else None
+			self._currentFile = PrintingGcodeFileInformation(filename, self.getOffsets, prestaged=prestaged, compactor=compactor)
+			self._remainingTimeEstimator = None
+			self._fireEvent(Events.FILE_SELECTED, {
 				"file": self._currentFile.getFilename(),
 				"origin": self._currentFile.getFileLocation()
 			})
 			self._callback.mcFileSelected(filename, self._currentFile.getFilesize(), False)
 
+	def prestageFile(self, filename):
+		"""
+		Prepares the given local file in the background so that it starts printing right away once it gets selected
+		next, see :class:`PrestagedGcodeFile`.
+		"""
+		if self._prestaged is not None and self._prestaged.getFilename() == filename:
+			return
+
+		prestaged = PrestagedGcodeFile(filename, settings().getInt(["jobQueue", "prestage", "size"]) * 1024 * 1024)
+		self._prestaged = prestaged
+
+		thread = threading.Thread(target=prestaged.load)
+		thread.daemon = True
+		thread.start()
+
 	def unselectFile(self):
 		if self.isBusy():
 			return
 
 		self._currentFile = None
-		eventManager().fire(Events.FILE_DESELECTED)
+		self._remainingTimeEstimator = None
+		self._fireEvent(Events.FILE_DESELECTED)
 		self._callback.mcFileSelected(None, None, False)
 
 	def cancelPrint(self):
@@ -453,7 +644,7 @@ class MachineCom(object):
 			self.sendCommand("M25")    # pause print
 			self.sendCommand("M26 S0") # reset position in file to byte 0
 
-		eventManager().fire(Events.PRINT_CANCELLED, {
+		self._fireEvent(Events.PRINT_CANCELLED, {
 			"file": self._currentFile.getFilename(),
 			"filename": os.path.basename(self._currentFile.getFilename()),
 			"origin": self._currentFile.getFileLocation()
@@ -468,9 +659,11 @@ class MachineCom(object):
 			if self.isSdFileSelected():
 				self.sendCommand("M24")
 			else:
+				# whatever was sent while paused might have moved the printer
+				self._currentFile.resetCompaction()
 				self._sendNext()
 
-			eventManager().fire(Events.PRINT_RESUMED, {
+			self._fireEvent(Events.PRINT_RESUMED, {
 				"file": self._currentFile.getFilename(),
 				"filename": os.path.basename(self._currentFile.getFilename()),
 				"origin": self._currentFile.getFileLocation()
@@ -480,7 +673,7 @@ class MachineCom(object):
 			if self.isSdFileSelected():
 				self.sendCommand("M25") # pause print
 
-			eventManager().fire(Events.PRINT_PAUSED, {
+			self._fireEvent(Events.PRINT_PAUSED, {
 				"file": self._currentFile.getFilename(),
 				"filename": os.path.basename(self._currentFile.getFilename()),
 				"origin": self._currentFile.getFileLocation()
@@ -523,7 +716,7 @@ class MachineCom(object):
 		if not self.isOperational():
 			return
 		self.sendCommand("M21")
-		if settings().getBoolean(["feature", "sdAlwaysAvailable"]):
+		if self._sdAlwaysAvailable:
 			self._sdAvailable = True
 			self.refreshSdFiles()
 			self._callback.mcSdStateChange(self._sdAvailable)
@@ -609,10 +802,6 @@ class MachineCom(object):
 				self._bedTemp = (actual, None)
 
 	def _monitor(self):
-		feedbackControls = settings().getFeedbackControls()
-		pauseTriggers = settings().getPauseTriggers()
-		feedbackErrors = []
-
 		#Open the serial port.
 		if not self._openSerial():
 			return
@@ -625,294 +814,349 @@ class MachineCom(object):
 			self._changeState(self.STATE_CONNECTING)
 
 		#Start monitoring the serial port.
-		timeout = getNewTimeout("communication")
-		tempRequestTimeout = getNewTimeout("temperature")
-		sdStatusRequestTimeout = getNewTimeout("sdStatus")
-		startSeen = not settings().getBoolean(["feature", "waitForStartOnConnect"])
-		heatingUp = False
-		swallowOk = False
-		supportRepetierTargetTemp = settings().getBoolean(["feature", "repetierTargetTemp"])
+		self._feedbackControls = settings().getFeedbackControls()
+		self._pauseTriggers = settings().getPauseTriggers()
+		self._feedbackErrors = []
+
+		self._communicationTimeout = self._getNewTimeout("communication")
+		self._tempRequestTimeout = self._getNewTimeout("temperature")
+		self._sdStatusRequestTimeout = self._getNewTimeout("sdStatus")
+		self._startSeen = not settings().getBoolean(["feature", "waitForStartOnConnect"])
+		self._heatingUp = False
+		self._swallowOk = False
+		self._partialErrorLine = None
+
+		if self._useReactor and hasattr(self._serial, "fileno"):
+			# from here on the shared reactor reads the port and feeds us the received lines, this thread is done
+			self._log("Handing over monitoring to the shared serial reactor")
+			self._reactor = SerialReactor.instance()
+			self._reactor.register(self._serial.fileno(), self._onReactorLine, self._onReactorError, self._getReadTimeout)
+			return
 
 		while True:
-			try:
-				line = self._readline()
-				if line is None:
-					break
-				if line.strip() is not "":
-					timeout = getNewTimeout("communication")
-
-				##~~ Error handling
-				line = self._handleErrors(line)
-
-				##~~ SD file list
-				# if we are currently receiving an sd file list, each line is just a filename, so just read it and abort processing
-				if self._sdFileList and isGcodeFileName(line.strip().lower()) and not 'End file list' in line:
-					filename = line.strip().lower()
-					if filterNonAscii(filename):
-						self._logger.warn("Got a file from printer's SD that has a non-ascii filename (%s), that shouldn't happen according to the protocol" % filename)
-					else:
-						self._sdFiles.append(filename)
-					continue
+			line = self._readline()
+			if line is None:
+				break
+			self._processLine(line)
+		self._log("Connection closed, closing down monitor")
 
-				##~~ Temperature processing
-				if ' T:' in line or line.startswith('T:') or ' T0:' in line or line.startswith('T0:'):
-					self._processTemperatures(line)
-					self._callback.mcTempUpdate(self._temp, self._bedTemp)
-
-					#If we are waiting for an M109 or M190 then measure the time we lost during heatup, so we can remove that time from our printing time estimate.
-					if not 'ok' in line:
-						heatingUp = True
-						if self._heatupWaitStartTime != 0:
-							t = time.time()
-							self._heatupWaitTimeLost = t - self._heatupWaitStartTime
-							self._heatupWaitStartTime = t
-				elif supportRepetierTargetTemp:
-					matchExtr = self._regex_repetierTempExtr.match(line)
-					matchBed = self._regex_repetierTempBed.match(line)
-
-					if matchExtr is not None:
-						toolNum = int(matchExtr.group(1))
-						try:
-							target = float(matchExtr.group(2))
-							if toolNum in self._temp.keys() and self._temp[toolNum] is not None and isinstance(self._temp[toolNum], tuple):
-								(actual, oldTarget) = self._temp[toolNum]
-								self._temp[toolNum] = (actual, target)
-							else:
-								self._temp[toolNum] = (None, target)
-							self._callback.mcTempUpdate(self._temp, self._bedTemp)
-						except ValueError:
-							pass
-					elif matchBed is not None:
-						try:
-							target = float(matchBed.group(1))
-							if self._bedTemp is not None and isinstance(self._bedTemp, tuple):
-								(actual, oldTarget) = self._bedTemp
-								self._bedTemp = (actual, target)
-							else:
-								self._bedTemp = (None, target)
-							self._callback.mcTempUpdate(self._temp, self._bedTemp)
-						except ValueError:
-							pass
-
-				##~~ SD Card handling
-				elif 'SD init fail' in line or 'volume.init failed' in line or 'openRoot failed' in line:
-					self._sdAvailable = False
-					self._sdFiles = []
-					self._callback.mcSdStateChange(self._sdAvailable)
-				elif 'Not SD printing' in line:
-					if self.isSdFileSelected() and self.isPrinting():
-						# something went wrong, printer is reporting that we actually are not printing right now...
-						self._sdFilePos = 0
-						self._changeState(self.STATE_OPERATIONAL)
-				elif 'SD card ok' in line and not self._sdAvailable:
-					self._sdAvailable = True
-					self.refreshSdFiles()
-					self._callback.mcSdStateChange(self._sdAvailable)
-				elif 'Begin file list' in line:
-					self._sdFiles = []
-					self._sdFileList = True
-				elif 'End file list' in line:
-					self._sdFileList = False
-					self._callback.mcSdFiles(self._sdFiles)
-				elif 'SD printing byte' in line:
-					# answer to M27, at least on Marlin, Repetier and Sprinter: "SD printing byte %d/%d"
-					match = self._regex_sdPrintingByte.search(line)
-					self._currentFile.setFilepos(int(match.group(1)))
-					self._callback.mcProgress()
-				elif 'File opened' in line:
-					# answer to M23, at least on Marlin, Repetier and Sprinter: "File opened:%s Size:%d"
-					match = self._regex_sdFileOpened.search(line)
-					self._currentFile = PrintingSdFileInformation(match.group(1), int(match.group(2)))
-				elif 'File selected' in line:
-					# final answer to M23, at least on Marlin, Repetier and Sprinter: "File selected"
-					if self._currentFile is not None:
-						self._callback.mcFileSelected(self._currentFile.getFilename(), self._currentFile.getFilesize(), True)
-						eventManager().fire(Events.FILE_SELECTED, {
-							"file": self._currentFile.getFilename(),
-							"origin": self._currentFile.getFileLocation()
-						})
-				elif 'Writing to file' in line:
-					# anwer to M28, at least on Marlin, Repetier and Sprinter: "Writing to file: %s"
-					self._printSection = "CUSTOM"
-					self._changeState(self.STATE_PRINTING)
-					line = "ok"
-				elif 'Done printing file' in line:
-					# printer is reporting file finished printing
+	def _processLine(self, line):
+		"""
+		Processes a line received from the printer, an empty line signals a read timeout. Called for every line from
+		either the monitor thread or the shared serial reactor.
+		"""
+		try:
+			if line.strip() is not "":
+				self._communicationTimeout = self._getNewTimeout("communication")
+
+			# Marlin reports a MIN/MAX temp error as "Error:x\n: Extruder switched off. MAXTEMP triggered !\n", so
+			# wait for the next line to complete it
+			if self._partialErrorLine is not None:
+				line = self._partialErrorLine + line
+				self._partialErrorLine = None
+			elif self._regex_minMaxError.match(line):
+				self._partialErrorLine = line.rstrip()
+				return
+
+			##~~ Error handling
+			line = self._handleErrors(line)
+
+			if self._profiler is not None and line.startswith("ok"):
+				self._profiler.acknowledged()
+
+			##~~ SD file list
+			# if we are currently receiving an sd file list, each line is just a filename, so just read it and abort processing
+			if self._sdFileList and isGcodeFileName(line.strip().lower()) and not 'End file list' in line:
+				filename = line.strip().lower()
+				if filterNonAscii(filename):
+					self._logger.warn("Got a file from printer's SD that has a non-ascii filename (%s), that shouldn't happen according to the protocol" % filename)
+				else:
+					self._sdFiles.append(filename)
+				return
+
+			##~~ Temperature processing
+			if ' T:' in line or line.startswith('T:') or ' T0:' in line or line.startswith('T0:'):
+				self._processTemperatures(line)
+				self._callback.mcTempUpdate(self._temp, self._bedTemp)
+
+				#If we are waiting for an M109 or M190 then measure the time we lost during heatup, so we can remove that time from our printing time estimate.
+				if not 'ok' in line:
+					self._heatingUp = True
+			elif self._repetierTargetTemp:
+				matchExtr = self._regex_repetierTempExtr.match(line)
+				matchBed = self._regex_repetierTempBed.match(line)
+
+				if matchExtr is not None:
+					toolNum = int(matchExtr.group(1))
+					try:
+						target = float(matchExtr.group(2))
+						if toolNum in self._temp.keys() and self._temp[toolNum] is not None and isinstance(self._temp[toolNum], tuple):
+							(actual, oldTarget) = self._temp[toolNum]
+							self._temp[toolNum] = (actual, target)
+						else:
+							self._temp[toolNum] = (None, target)
+						self._callback.mcTempUpdate(self._temp, self._bedTemp)
+					except ValueError:
+						pass
+				elif matchBed is not None:
+					try:
+						target = float(matchBed.group(1))
+						if self._bedTemp is not None and isinstance(self._bedTemp, tuple):
+							(actual, oldTarget) = self._bedTemp
+							self._bedTemp = (actual, target)
+						else:
+							self._bedTemp = (None, target)
+						self._callback.mcTempUpdate(self._temp, self._bedTemp)
+					except ValueError:
+						pass
+
+			##~~ SD Card handling
+			elif 'SD init fail' in line or 'volume.init failed' in line or 'openRoot failed' in line:
+				self._sdAvailable = False
+				self._sdFiles = []
+				self._callback.mcSdStateChange(self._sdAvailable)
+			elif 'Not SD printing' in line:
+				if self.isSdFileSelected() and self.isPrinting():
+					# something went wrong, printer is reporting that we actually are not printing right now...
 					self._sdFilePos = 0
-					self._callback.mcPrintjobDone()
 					self._changeState(self.STATE_OPERATIONAL)
-					eventManager().fire(Events.PRINT_DONE, {
+			elif 'SD card ok' in line and not self._sdAvailable:
+				self._sdAvailable = True
+				self.refreshSdFiles()
+				self._callback.mcSdStateChange(self._sdAvailable)
+			elif 'Begin file list' in line:
+				self._sdFiles = []
+				self._sdFileList = True
+			elif 'End file list' in line:
+				self._sdFileList = False
+				self._callback.mcSdFiles(self._sdFiles)
+			elif 'SD printing byte' in line:
+				# answer to M27, at least on Marlin, Repetier and Sprinter: "SD printing byte %d/%d"
+				match = self._regex_sdPrintingByte.search(line)
+				self._currentFile.setFilepos(int(match.group(1)))
+				self._callback.mcProgress()
+			elif 'File opened' in line:
+				# answer to M23, at least on Marlin, Repetier and Sprinter: "File opened:%s Size:%d"
+				match = self._regex_sdFileOpened.search(line)
+				self._currentFile = PrintingSdFileInformation(match.group(1), int(match.group(2)))
+			elif 'File selected' in line:
+				# final answer to M23, at least on Marlin, Repetier and Sprinter: "File selected"
+				if self._currentFile is not None:
+					self._callback.mcFileSelected(self._currentFile.getFilename(), self._currentFile.getFilesize(), True)
+					self._fireEvent(Events.FILE_SELECTED, {
 						"file": self._currentFile.getFilename(),
-						"filename": os.path.basename(self._currentFile.getFilename()),
-						"origin": self._currentFile.getFileLocation(),
-						"time": self.getPrintTime()
+						"origin": self._currentFile.getFileLocation()
 					})
-				elif 'Done saving file' in line:
-					self.refreshSdFiles()
-
-				##~~ Message handling
-				elif line.strip() != '' \
-						and line.strip() != 'ok' and not line.startswith("wait") \
-						and not line.startswith('Resend:') \
-						and line != 'echo:Unknown command:""\n' \
-						and self.isOperational():
-					self._callback.mcMessage(line)
-
-				##~~ Parsing for feedback commands
-				if feedbackControls:
-					for name, matcher, template in feedbackControls:
-						if name in feedbackErrors:
-							# we previously had an error with that one, so we'll skip it now
-							continue
+			elif 'Writing to file' in line:
+				# anwer to M28, at least on Marlin, Repetier and Sprinter: "Writing to file: %s"
+				self._printSection = "CUSTOM"
+				self._changeState(self.STATE_PRINTING)
+				if self._transferWindow is None:
+					line = "ok"
+				# otherwise the transfer starts with the "ok" following this line, which would otherwise be taken as
+				# acknowledgement of the first line sent
+			elif 'Done printing file' in line:
+				# printer is reporting file finished printing
+				self._sdFilePos = 0
+				self._callback.mcPrintjobDone()
+				self._changeState(self.STATE_OPERATIONAL)
+				self._fireEvent(Events.PRINT_DONE, {
+					"file": self._currentFile.getFilename(),
+					"filename": os.path.basename(self._currentFile.getFilename()),
+					"origin": self._currentFile.getFileLocation(),
+					"time": self.getPrintTime()
+				})
+			elif 'Done saving file' in line:
+				self.refreshSdFiles()
+
+			##~~ Message handling
+			elif line.strip() != '' \
+					and line.strip() != 'ok' and not line.startswith("wait") \
+					and not line.startswith('Resend:') \
+					and line != 'echo:Unknown command:""\n' \
+					and self.isOperational():
+				self._callback.mcMessage(line)
+
+			##~~ Parsing for feedback commands
+			if self._feedbackControls:
+				for name, matcher, template in self._feedbackControls:
+					if name in self._feedbackErrors:
+						# we previously had an error with that one, so we'll skip it now
+						continue
+					try:
+						match = matcher.search(line)
+						if match is not None:
+							formatFunction = None
+							if isinstance(template, str):
+								formatFunction = str.format
+							elif isinstance(template, unicode):
+								formatFunction = unicode.format
+
+							if formatFunction is not None:
+								self._callback.mcReceivedRegisteredMessage(name, formatFunction(template, *(match.groups("n/a"))))
+					except:
+						if not name in self._feedbackErrors:
+							self._logger.info("Something went wrong with feedbackControl \"%s\": " % name, exc_info=True)
+							self._feedbackErrors.append(name)
+						pass
+
+			##~~ Parsing for pause triggers
+			if self._pauseTriggers and not self.isStreaming():
+				if "enable" in self._pauseTriggers.keys() and self._pauseTriggers["enable"].search(line) is not None:
+					self.setPause(True)
+				elif "disable" in self._pauseTriggers.keys() and self._pauseTriggers["disable"].search(line) is not None:
+					self.setPause(False)
+				elif "toggle" in self._pauseTriggers.keys() and self._pauseTriggers["toggle"].search(line) is not None:
+					self.setPause(not self.isPaused())
+
+			if "ok" in line and self._heatingUp:
+				self._heatingUp = False
+				if self._heatupWaitStartTime != 0:
+					self._heatupWaitTime += time.time() - self._heatupWaitStartTime
+					self._heatupWaitStartTime = 0
+
+			### Baudrate detection
+			if self._state == self.STATE_DETECT_BAUDRATE:
+				if line == '' or time.time() > self._communicationTimeout:
+					if len(self._baudrateDetectList) < 1:
+						self.close()
+						self._errorValue = "No more baudrates to test, and no suitable baudrate found."
+						self._changeState(self.STATE_ERROR)
+						self._fireEvent(Events.ERROR, {"error": self.getErrorString()})
+					elif self._baudrateDetectRetry > 0:
+						self._baudrateDetectRetry -= 1
+						self._writeSerial('\n')
+						self._log("Baudrate test retry: %d" % (self._baudrateDetectRetry))
+						self._sendCommand("M105")
+						self._testingBaudrate = True
+					else:
+						baudrate = self._baudrateDetectList.pop(0)
 						try:
-							match = matcher.search(line)
-							if match is not None:
-								formatFunction = None
-								if isinstance(template, str):
-									formatFunction = str.format
-								elif isinstance(template, unicode):
-									formatFunction = unicode.format
-
-								if formatFunction is not None:
-									self._callback.mcReceivedRegisteredMessage(name, formatFunction(template, *(match.groups("n/a"))))
-						except:
-							if not name in feedbackErrors:
-								self._logger.info("Something went wrong with feedbackControl \"%s\": " % name, exc_info=True)
-								feedbackErrors.append(name)
-							pass
-
-				##~~ Parsing for pause triggers
-				if pauseTriggers and not self.isStreaming():
-					if "enable" in pauseTriggers.keys() and pauseTriggers["enable"].search(line) is not None:
-						self.setPause(True)
-					elif "disable" in pauseTriggers.keys() and pauseTriggers["disable"].search(line) is not None:
-						self.setPause(False)
-					elif "toggle" in pauseTriggers.keys() and pauseTriggers["toggle"].search(line) is not None:
-						self.setPause(not self.isPaused())
-
-				if "ok" in line and heatingUp:
-					heatingUp = False
-
-				### Baudrate detection
-				if self._state == self.STATE_DETECT_BAUDRATE:
-					if line == '' or time.time() > timeout:
-						if len(self._baudrateDetectList) < 1:
-							self.close()
-							self._errorValue = "No more baudrates to test, and no suitable baudrate found."
-							self._changeState(self.STATE_ERROR)
-							eventManager().fire(Events.ERROR, {"error": self.getErrorString()})
-						elif self._baudrateDetectRetry > 0:
-							self._baudrateDetectRetry -= 1
-							self._serial.write('\n')
-							self._log("Baudrate test retry: %d" % (self._baudrateDetectRetry))
+							self._serial.baudrate = baudrate
+							self._serial.timeout = self._timeouts["detection"]
+							self._log("Trying baudrate: %d" % (baudrate))
+							self._baudrateDetectRetry = 5
+							self._baudrateDetectTestOk = 0
+							self._communicationTimeout = self._getNewTimeout("communication")
+							self._writeSerial('\n')
 							self._sendCommand("M105")
 							self._testingBaudrate = True
-						else:
-							baudrate = self._baudrateDetectList.pop(0)
-							try:
-								self._serial.baudrate = baudrate
-								self._serial.timeout = settings().getFloat(["serial", "timeout", "detection"])
-								self._log("Trying baudrate: %d" % (baudrate))
-								self._baudrateDetectRetry = 5
-								self._baudrateDetectTestOk = 0
-								timeout = getNewTimeout("communication")
-								self._serial.write('\n')
-								self._sendCommand("M105")
-								self._testingBaudrate = True
-							except:
-								self._log("Unexpected error while setting baudrate: %d %s" % (baudrate, getExceptionString()))
-					elif 'ok' in line and 'T:' in line:
-						self._baudrateDetectTestOk += 1
-						if self._baudrateDetectTestOk < 10:
-							self._log("Baudrate test ok: %d" % (self._baudrateDetectTestOk))
-							self._sendCommand("M105")
-						else:
-							self._sendCommand("M999")
-							self._serial.timeout = settings().getFloat(["serial", "timeout", "connection"])
-							self._changeState(self.STATE_OPERATIONAL)
-							if self._sdAvailable:
-								self.refreshSdFiles()
-							else:
-								self.initSdCard()
-							eventManager().fire(Events.CONNECTED, {"port": self._port, "baudrate": self._baudrate})
-					else:
-						self._testingBaudrate = False
-
-				### Connection attempt
-				elif self._state == self.STATE_CONNECTING:
-					if (line == "" or "wait" in line) and startSeen:
+						except:
+							self._log("Unexpected error while setting baudrate: %d %s" % (baudrate, getExceptionString()))
+				elif 'ok' in line and 'T:' in line:
+					self._baudrateDetectTestOk += 1
+					if self._baudrateDetectTestOk < 10:
+						self._log("Baudrate test ok: %d" % (self._baudrateDetectTestOk))
 						self._sendCommand("M105")
-					elif "start" in line:
-						startSeen = True
-					elif "ok" in line and startSeen:
+					else:
+						self._sendCommand("M999")
+						self._serial.timeout = self._timeouts["connection"]
 						self._changeState(self.STATE_OPERATIONAL)
 						if self._sdAvailable:
 							self.refreshSdFiles()
 						else:
 							self.initSdCard()
-						eventManager().fire(Events.CONNECTED, {"port": self._port, "baudrate": self._baudrate})
-					elif time.time() > timeout:
-						self.close()
+						self._fireEvent(Events.CONNECTED, {"port": self._port, "baudrate": self._baudrate})
+				else:
+					self._testingBaudrate = False
+
+			### Connection attempt
+			elif self._state == self.STATE_CONNECTING:
+				if (line == "" or "wait" in line) and self._startSeen:
+					self._sendCommand("M105")
+				elif "start" in line:
+					self._startSeen = True
+				elif "ok" in line and self._startSeen:
+					self._changeState(self.STATE_OPERATIONAL)
+					if self._sdAvailable:
+						self.refreshSdFiles()
+					else:
+						self.initSdCard()
+					self._fireEvent(Events.CONNECTED, {"port": self._port, "baudrate": self._baudrate})
+				elif time.time() > self._communicationTimeout:
+					self.close()
+
+			### Operational
+			elif self._state == self.STATE_OPERATIONAL or self._state == self.STATE_PAUSED:
+				#Request the temperature on comm timeout (every 5 seconds) when we are not printing.
+				if line == "" or "wait" in line:
+					if self._resendDelta is not None:
+						self._resendNextCommand()
+					elif not self._commandQueue.empty():
+						self._sendQueuedCommand()
+					else:
+						self._sendCommand("M105")
+					self._tempRequestTimeout = self._getNewTimeout("temperature")
+				# resend -> start resend procedure from requested line
+				elif line.lower().startswith("resend") or line.lower().startswith("rs"):
+					if self._swallowOkAfterResend:
+						self._swallowOk = True
+					self._handleResendRequest(line)
+
+			### Printing
+			elif self._state == self.STATE_PRINTING:
+				if line == "" and time.time() > self._communicationTimeout:
+					self._log("Communication timeout during printing, forcing a line")
+					line = 'ok'
+					if self._profiler is not None:
+						self._profiler.acknowledged()
+
+				if self.isSdPrinting():
+					if time.time() > self._tempRequestTimeout and not self._heatingUp:
+						self._sendCommand("M105")
+						self._tempRequestTimeout = self._getNewTimeout("temperature")
 
-				### Operational
-				elif self._state == self.STATE_OPERATIONAL or self._state == self.STATE_PAUSED:
-					#Request the temperature on comm timeout (every 5 seconds) when we are not printing.
-					if line == "" or "wait" in line:
+					if time.time() > self._sdStatusRequestTimeout and not self._heatingUp:
+						self._sendCommand("M27")
+						self._sdStatusRequestTimeout = self._getNewTimeout("sdStatus")
+				else:
+					# Even when printing request the temperature every 5 seconds.
+					if time.time() > self._tempRequestTimeout and not self.isStreaming():
+						self._commandQueue.put("M105")
+						self._tempRequestTimeout = self._getNewTimeout("temperature")
+
+					if "ok" in line and self._transferWindow is not None and self.isStreaming():
+						# every line sent ahead, even a rejected one, takes up the receive buffer until its "ok"
+						self._swallowOk = False
+						self._transferWindow.acknowledged()
+						self._fillTransferWindow()
+					elif "ok" in line and self._swallowOk:
+						self._swallowOk = False
+					elif "ok" in line:
 						if self._resendDelta is not None:
 							self._resendNextCommand()
-						elif not self._commandQueue.empty():
-							self._sendCommand(self._commandQueue.get())
+						elif not self._commandQueue.empty() and not self.isStreaming():
+							self._sendQueuedCommand()
 						else:
-							self._sendCommand("M105")
-						tempRequestTimeout = getNewTimeout("temperature")
-					# resend -> start resend procedure from requested line
+							self._sendNext()
 					elif line.lower().startswith("resend") or line.lower().startswith("rs"):
-						if settings().get(["feature", "swallowOkAfterResend"]):
-							swallowOk = True
+						if self._swallowOkAfterResend:
+							self._swallowOk = True
 						self._handleResendRequest(line)
+		except:
+			self._logger.exception("Something crashed inside the serial connection loop, please report this in OctoPrint's bug tracker:")
 
-				### Printing
-				elif self._state == self.STATE_PRINTING:
-					if line == "" and time.time() > timeout:
-						self._log("Communication timeout during printing, forcing a line")
-						line = 'ok'
+			errorMsg = "See octoprint.log for details"
+			self._log(errorMsg)
+			self._errorValue = errorMsg
+			self._changeState(self.STATE_ERROR)
+			self._fireEvent(Events.ERROR, {"error": self.getErrorString()})
 
-					if self.isSdPrinting():
-						if time.time() > tempRequestTimeout and not heatingUp:
-							self._sendCommand("M105")
-							tempRequestTimeout = getNewTimeout("temperature")
+	def _onReactorLine(self, line):
+		if line:
+			self._log("Recv: %s" % sanitizeAscii(line))
+		self._processLine(line)
 
-						if time.time() > sdStatusRequestTimeout and not heatingUp:
-							self._sendCommand("M27")
-							sdStatusRequestTimeout = getNewTimeout("sdStatus")
-					else:
-						# Even when printing request the temperature every 5 seconds.
-						if time.time() > tempRequestTimeout and not self.isStreaming():
-							self._commandQueue.put("M105")
-							tempRequestTimeout = getNewTimeout("temperature")
-
-						if "ok" in line and swallowOk:
-							swallowOk = False
-						elif "ok" in line:
-							if self._resendDelta is not None:
-								self._resendNextCommand()
-							elif not self._commandQueue.empty() and not self.isStreaming():
-								self._sendCommand(self._commandQueue.get())
-							else:
-								self._sendNext()
-						elif line.lower().startswith("resend") or line.lower().startswith("rs"):
-							if settings().get(["feature", "swallowOkAfterResend"]):
-								swallowOk = True
-							self._handleResendRequest(line)
-			except:
-				self._logger.exception("Something crashed inside the serial connection loop, please report this in OctoPrint's bug tracker:")
+	def _onReactorError(self, error):
+		self._log("Unexpected error while reading serial port: %s" % error)
+		self._errorValue = error
+		self.close(True)
 
-				errorMsg = "See octoprint.log for details"
-				self._log(errorMsg)
-				self._errorValue = errorMsg
-				self._changeState(self.STATE_ERROR)
-				eventManager().fire(Events.ERROR, {"error": self.getErrorString()})
-		self._log("Connection closed, closing down monitor")
+	def _getReadTimeout(self):
+		serial = self._serial
+		if serial is None:
+			return None
+		return serial.timeout
 
 	def _openSerial(self):
 		if self._port == 'AUTO':
@@ -935,11 +1179,24 @@ class MachineCom(object):
 				self._log("Failed to autodetect serial port")
 				self._errorValue = 'Failed to autodetect serial port.'
 				self._changeState(self.STATE_ERROR)
-				eventManager().fire(Events.ERROR, {"error": self.getErrorString()})
+				self._fireEvent(Events.ERROR, {"error": self.getErrorString()})
 				return False
 		elif self._port == 'VIRTUAL':
 			self._changeState(self.STATE_OPEN_SERIAL)
 			self._serial = VirtualPrinter()
+		elif self._port == 'REPLAY':
+			self._changeState(self.STATE_OPEN_SERIAL)
+			try:
+				path = settings().get(["devel", "replay", "recording"])
+				recording = Recording.fromFile(path) if path else Recording.default()
+				latency = createLatencyModel(settings().get(["devel", "replay", "latency"]))
+				self._serial = ReplayTransport(recording, latency, timeout=0.1 if self._baudrate == 0 else self._timeouts["connection"])
+			except:
+				self._log("Unexpected error while loading the recording to replay: %s" % getExceptionString())
+				self._errorValue = "Failed to load the recording to replay"
+				self._changeState(self.STATE_ERROR)
+				self._fireEvent(Events.ERROR, {"error": self.getErrorString()})
+				return False
 		else:
 			self._changeState(self.STATE_OPEN_SERIAL)
 			try:
@@ -947,12 +1204,12 @@ class MachineCom(object):
 				if self._baudrate == 0:
 					self._serial = serial.Serial(str(self._port), 115200, timeout=0.1, writeTimeout=10000)
 				else:
-					self._serial = serial.Serial(str(self._port), self._baudrate, timeout=settings().getFloat(["serial", "timeout", "connection"]), writeTimeout=10000)
+					self._serial = serial.Serial(str(self._port), self._baudrate, timeout=self._timeouts["connection"], writeTimeout=10000)
 			except:
 				self._log("Unexpected error while connecting to serial port: %s %s" % (self._port, getExceptionString()))
 				self._errorValue = "Failed to open serial port, permissions correct?"
 				self._changeState(self.STATE_ERROR)
-				eventManager().fire(Events.ERROR, {"error": self.getErrorString()})
+				self._fireEvent(Events.ERROR, {"error": self.getErrorString()})
 				return False
 		return True
 
@@ -962,9 +1219,7 @@ class MachineCom(object):
 			#Oh YEAH, consistency.
 			# Marlin reports an MIN/MAX temp error as "Error:x\n: Extruder switched off. MAXTEMP triggered !\n"
 			#	But a bed temp error is reported as "Error: Temperature heated bed switched off. MAXTEMP triggered !!"
-			#	So we can have an extra newline in the most common case. Awesome work people.
-			if self._regex_minMaxError.match(line):
-				line = line.rstrip() + self._readline()
+			#	So we can have an extra newline in the most common case, which _processLine takes care of. Awesome work people.
 			#Skip the communication errors, as those get corrected.
 			if 'checksum mismatch' in line \
 				or 'Wrong checksum' in line \
@@ -977,7 +1232,7 @@ class MachineCom(object):
 			elif not self.isError():
 				self._errorValue = line[6:]
 				self._changeState(self.STATE_ERROR)
-				eventManager().fire(Events.ERROR, {"error": self.getErrorString()})
+				self._fireEvent(Events.ERROR, {"error": self.getErrorString()})
 		return line
 
 	def _readline(self):
@@ -998,23 +1253,11 @@ class MachineCom(object):
 
 	def _sendNext(self):
 		with self._sendNextLock:
+			enqueued = time.time()
 			line = self._currentFile.getNext()
 			if line is None:
 				if self.isStreaming():
-					self._sendCommand("M29")
-
-					filename = self._currentFile.getFilename()
-					payload = {
-						"local": self._currentFile.getLocalFilename(),
-						"remote": self._currentFile.getRemoteFilename(),
-						"time": self.getPrintTime()
-					}
-
-					self._currentFile = None
-					self._changeState(self.STATE_OPERATIONAL)
-					self._callback.mcFileTransferDone(filename)
-					eventManager().fire(Events.TRANSFER_DONE, payload)
-					self.refreshSdFiles()
+					self._finishFileTransfer()
 				else:
 					payload = {
 						"file": self._currentFile.getFilename(),
@@ -1024,12 +1267,99 @@ class MachineCom(object):
 					}
 					self._callback.mcPrintjobDone()
 					self._changeState(self.STATE_OPERATIONAL)
-					eventManager().fire(Events.PRINT_DONE, payload)
+					self._fireEvent(Events.PRINT_DONE, payload)
+
+					statistics = self._resendStatistics.asDict()
+					if statistics["requests"]:
+						self._logger.info("Print needed %d resend requests for %d lines sent, resending %d lines" % (statistics["requests"], statistics["sent"], statistics["resent"]))
+
+					statistics = self._currentFile.getCompactionStatistics()
+					if statistics is not None:
+						self._logger.info("Compaction saved %d of %d bytes (%.1f%%), dropping %d of %d lines" % (statistics["bytes"] - statistics["compactedBytes"], statistics["bytes"], statistics["saved"] * 100, statistics["dropped"], statistics["lines"]))
 				return
 
+			if self._profiler is not None:
+				# reading the line is part of the host's latency
+				self._profiler.enqueued(enqueued)
 			self._sendCommand(line, True)
 			self._callback.mcProgress()
 
+	def _fillTransferWindow(self):
+		"""
+		Sends as many lines of the file transfer (or lines to resend) as fit into the receive buffer of the printer.
+		"""
+		with self._sendNextLock:
+			if self._currentFile is None:
+				return
+
+			sent = False
+			while True:
+				if self._resendDelta is not None:
+					lineNumber = self._currentLine - self._resendDelta
+					length = len(self._lineHistory[lineNumber])
+					if not self._transferWindow.fits(length):
+						break
+					if self._profiler is not None:
+						self._profiler.enqueued()
+					self._transferWindow.sent(lineNumber, length)
+					self._resendNextCommand()
+					continue
+
+				if self._transferPending is None:
+					cmd = None
+					if not self._transferRead:
+						cmd = self._currentFile.getNext()
+					if cmd is None:
+						self._transferRead = True
+						# only end the transfer once everything has been acknowledged, there might be resends to do
+						if not len(self._transferWindow):
+							self._finishFileTransfer()
+							return
+						break
+					self._transferPending = frameLine(cmd, self._currentLine)
+
+				line = self._transferPending
+				if not self._transferWindow.fits(len(line)):
+					break
+				self._transferPending = None
+				if self._profiler is not None:
+					self._profiler.enqueued()
+
+				with self._sendingLock:
+					if self._serial is None:
+						return
+					lineNumber = self._currentLine
+					self._transferWindow.sent(lineNumber, len(line))
+					self._lineHistory.append(lineNumber, line)
+					self._resendStatistics.lineSent()
+					self._currentLine += 1
+					self._doSendFramed(line, lineNumber)
+				sent = True
+
+			if sent:
+				self._callback.mcProgress()
+
+	def _finishFileTransfer(self):
+		self._sendCommand("M29")
+
+		filename = self._currentFile.getFilename()
+		throughput = self._currentFile.getThroughput()
+		payload = {
+			"local": self._currentFile.getLocalFilename(),
+			"remote": self._currentFile.getRemoteFilename(),
+			"time": self.getPrintTime(),
+			"throughput": throughput
+		}
+		self._logger.info("Transferred %s to SD in %.1fs, %.0f bytes/s" % (payload["local"], payload["time"], throughput))
+
+		self._currentFile = None
+		self._transferWindow = None
+		self._transferPending = None
+		self._changeState(self.STATE_OPERATIONAL)
+		self._callback.mcFileTransferDone(filename)
+		self._fireEvent(Events.TRANSFER_DONE, payload)
+		self.refreshSdFiles()
+
 	def _handleResendRequest(self, line):
 		lineToResend = None
 		try:
@@ -1038,35 +1368,72 @@ class MachineCom(object):
 			if "rs" in line:
 				lineToResend = int(line.split()[1])
 
+		# the lines sent ahead after the one that failed get rejected as well, each with its own resend request for
+		# the same line, only the first one counts
 		if lineToResend is not None:
+			if lineToResend == self._resendIgnoreLine and self._resendIgnoreCount > 0:
+				# ... so there are as many more requests for it as lines were sent after it
+				self._resendIgnoreCount -= 1
+				return
+			self._resendIgnoreLine = lineToResend
+			if self._transferWindow is not None:
+				self._resendIgnoreCount = self._transferWindow.countSentAfter(lineToResend)
+			else:
+				self._resendIgnoreCount = self._getLinesSentAfter(lineToResend)
+
+		if lineToResend is not None:
+			self._resendStatistics.resendRequested(self._currentLine - lineToResend, self._resendDelta is not None)
+			self._lineHistory.resendRequested(lineToResend)
+
 			self._resendDelta = self._currentLine - lineToResend
-			if self._resendDelta > len(self._lastLines) or len(self._lastLines) == 0 or self._resendDelta <= 0:
+			if not lineToResend in self._lineHistory:
+				self._resendDelta = None
 				self._errorValue = "Printer requested line %d but no sufficient history is available, can't resend" % lineToResend
 				self._logger.warn(self._errorValue)
 				if self.isPrinting():
 					# abort the print, there's nothing we can do to rescue it now
 					self._changeState(self.STATE_ERROR)
-					eventManager().fire(Events.ERROR, {"error": self.getErrorString()})
-				else:
-					# reset resend delta, we can't do anything about it
-					self._resendDelta = None
+					self._fireEvent(Events.ERROR, {"error": self.getErrorString()})
+			elif self._transferWindow is not None and self.isStreaming():
+				self._fillTransferWindow()
 			else:
 				self._resendNextCommand()
 
+	def _getLinesSentAfter(self, lineNumber):
+		"""
+		Returns the number of lines sent after ``lineNumber`` was last sent, 0 if it wasn't sent recently.
+		"""
+		for count, sentLineNumber in enumerate(reversed(self._sentLineNumbers)):
+			if sentLineNumber == lineNumber:
+				return count
+		return 0
+
 	def _resendNextCommand(self):
 		# Make sure we are only handling one sending job at a time
 		with self._sendingLock:
-			self._logger.debug("Resending line %d, delta is %d, history log is %s items strong" % (self._currentLine - self._resendDelta, self._resendDelta, len(self._lastLines)))
-			cmd = self._lastLines[-self._resendDelta]
 			lineNumber = self._currentLine - self._resendDelta
+			self._logger.debug("Resending line %d, delta is %d, history log is %d items strong", lineNumber, self._resendDelta, len(self._lineHistory))
 
-			self._doSendWithChecksum(cmd, lineNumber)
+			# the history holds the lines as framed when first sent
+			self._doSendFramed(self._lineHistory[lineNumber], lineNumber)
+			self._resendStatistics.lineResent()
 
 			self._resendDelta -= 1
 			if self._resendDelta <= 0:
 				self._resendDelta = None
+				self._resendStatistics.resendFinished()
+
+	def _sendQueuedCommand(self):
+		cmd = self._commandQueue.get()
+		if not cmd.startswith("M105") and isinstance(self._currentFile, PrintingGcodeFileInformation):
+			# the printer might not be where the compaction of the file expects it anymore
+			self._currentFile.resetCompaction()
+		self._sendCommand(cmd)
 
 	def _sendCommand(self, cmd, sendChecksum=False):
+		if self._profiler is not None:
+			self._profiler.enqueued()
+
 		# Make sure we are only handling one sending job at a time
 		with self._sendingLock:
 			if self._serial is None:
@@ -1078,7 +1445,7 @@ class MachineCom(object):
 					gcode = gcode.group(1)
 
 					if gcode in gcodeToEvent:
-						eventManager().fire(gcodeToEvent[gcode])
+						self._fireEvent(gcodeToEvent[gcode])
 
 					gcodeHandler = "_gcode_" + gcode
 					if hasattr(self, gcodeHandler):
@@ -1090,36 +1457,57 @@ class MachineCom(object):
 	def _doSend(self, cmd, sendChecksum=False):
 		if sendChecksum or self._alwaysSendChecksum:
 			lineNumber = self._currentLine
-			self._addToLastLines(cmd)
+			line = frameLine(cmd, lineNumber)
+			self._lineHistory.append(lineNumber, line)
+			self._resendStatistics.lineSent()
 			self._currentLine += 1
-			self._doSendWithChecksum(cmd, lineNumber)
+			self._doSendFramed(line, lineNumber)
 		else:
 			self._doSendWithoutChecksum(cmd)
 
 	def _doSendWithChecksum(self, cmd, lineNumber):
-		self._logger.debug("Sending cmd '%s' with lineNumber %r" % (cmd, lineNumber))
-
-		commandToSend = "N%d %s" % (lineNumber, cmd)
-		checksum = reduce(lambda x,y:x^y, map(ord, commandToSend))
-		commandToSend = "%s*%d" % (commandToSend, checksum)
-		self._doSendWithoutChecksum(commandToSend)
+		self._doSendFramed(frameLine(cmd, lineNumber), lineNumber)
 
 	def _doSendWithoutChecksum(self, cmd):
-		self._log("Send: %s" % cmd)
+		self._doSendFramed(cmd + "\n")
+
+	def _fireEvent(self, event, payload=None):
+		# the event bus is shared by all printers, tag our events so they can be told apart
+		eventManager().fire(event, eventPayload(payload, self._printerId))
+
+	def _writeSerial(self, data):
+		reactor = self._reactor
+		if reactor is not None:
+			# lines are processed and answered on the reactor's thread, which must never block on a full port
+			reactor.write(self._serial.fileno(), data)
+		else:
+			self._serial.write(data)
+
+	def _doSendFramed(self, line, lineNumber=None):
+		self._log("Send: %s" % line[:-1])
 		try:
-			self._serial.write(cmd + '\n')
+			self._writeSerial(line)
 		except serial.SerialTimeoutException:
 			self._log("Serial timeout while writing to serial port, trying again.")
 			try:
-				self._serial.write(cmd + '\n')
+				self._writeSerial(line)
 			except:
 				self._log("Unexpected error while writing serial port: %s" % (getExceptionString()))
 				self._errorValue = getExceptionString()
 				self.close(True)
+				return
 		except:
 			self._log("Unexpected error while writing serial port: %s" % (getExceptionString()))
 			self._errorValue = getExceptionString()
 			self.close(True)
+			return
+
+		if lineNumber is not None:
+			self._sentLineNumbers.append(lineNumber)
+
+		profiler = self._profiler
+		if profiler is not None:
+			profiler.written(len(line), lineNumber)
 
 	def _gcode_T(self, cmd):
 		toolMatch = self._regex_paramTInt.search(cmd)
@@ -1202,7 +1590,8 @@ class MachineCom(object):
 		self._currentLine = newLineNumber + 1
 
 		# after a reset of the line number we have no way to determine what line exactly the printer now wants
-		self._lastLines.clear()
+		self._lineHistory.clear()
+		self._sentLineNumbers.clear()
 		self._resendDelta = None
 
 		return None
@@ -1251,6 +1640,203 @@ class MachineComPrintCallback(object):
 
 ### Printing file information classes ##################################################################################
 
+class LineHistory(object):
+	"""
+	Ring buffer of the last lines sent with line numbers (as framed for sending), indexed by line number, so that the
+	lines to resend can be looked up in O(1).
+
+	Starts out with room for ``size`` lines. Whenever the printer requests a resend of a line more than half the
+	buffer back, the buffer is grown to twice that distance (up to ``maxSize`` lines), so that connections prone to
+	errors get a history deep enough for the resends they cause. Growing only helps with the requests after that, so
+	by default the history starts out at its maximum size.
+	"""
+
+	def __init__(self, size=1000, maxSize=1000):
+		self._size = max(1, size)
+		self._maxSize = max(self._size, maxSize)
+		self._buffer = [None] * self._size
+		self._first = 0
+		self._next = 0
+
+	def __len__(self):
+		return self._next - self._first
+
+	def __contains__(self, lineNumber):
+		return self._first <= lineNumber < self._next
+
+	def __getitem__(self, lineNumber):
+		if not lineNumber in self:
+			raise KeyError(lineNumber)
+		return self._buffer[lineNumber % self._size]
+
+	def getSize(self):
+		return self._size
+
+	def append(self, lineNumber, cmd):
+		if lineNumber != self._next or not len(self):
+			# line numbers have to be consecutive, start over if they are not
+			self._first = self._next = lineNumber
+
+		self._buffer[lineNumber % self._size] = cmd
+		self._next = lineNumber + 1
+		if self._next - self._first > self._size:
+			self._first = self._next - self._size
+
+	def clear(self):
+		self._first = self._next = 0
+		self._buffer = [None] * self._size
+
+	def resendRequested(self, lineNumber):
+		distance = self._next - lineNumber
+		if distance * 2 > self._size and self._size < self._maxSize:
+			self.resize(min(self._maxSize, distance * 2))
+
+	def resize(self, size):
+		lines = [(lineNumber, self[lineNumber]) for lineNumber in range(max(self._first, self._next - size), self._next)]
+		self._size = size
+		self._buffer = [None] * size
+		for lineNumber, cmd in lines:
+			self._buffer[lineNumber % size] = cmd
+		if lines:
+			self._first = lines[0][0]
+
+class SendWindow(object):
+	"""
+	Keeps track of the lines sent to the printer but not yet acknowledged, so that further lines can be sent without
+	waiting for the "ok" to the previous one as long as all of them fit into the receive buffer of the firmware
+	(``size`` bytes). The firmware acknowledges the lines in the order it received them. A single line longer than the
+	buffer is still sent once nothing else is outstanding.
+	"""
+
+	def __init__(self, size):
+		self._size = size
+		self._lines = collections.deque()
+		self._used = 0
+
+	def __len__(self):
+		return len(self._lines)
+
+	def fits(self, length):
+		return not self._lines or self._used + length <= self._size
+
+	def sent(self, lineNumber, length):
+		self._lines.append((lineNumber, length))
+		self._used += length
+
+	def acknowledged(self):
+		"""
+		Removes the oldest outstanding line and returns its line number, None if there is none.
+		"""
+		if not self._lines:
+			return None
+		lineNumber, length = self._lines.popleft()
+		self._used -= length
+		return lineNumber
+
+	def countSentAfter(self, lineNumber):
+		"""
+		Returns the number of outstanding lines sent after ``lineNumber`` was last sent, 0 if it isn't outstanding.
+		"""
+		for count, line in enumerate(reversed(self._lines)):
+			if line[0] == lineNumber:
+				return count
+		return 0
+
+class ResendStatistics(object):
+	"""
+	Keeps track of how many lines needed to be resent: the resend rate (resend requests per line sent), how far back
+	resends were requested and the number of lines resent per error burst. A burst starts with a resend request and
+	lasts, including any further resend requests in the meantime, until all requested lines have been resent.
+	"""
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self._sent = 0
+		self._requests = 0
+		self._resent = 0
+		self._distanceTotal = 0
+		self._distanceMax = 0
+		self._bursts = 0
+		self._burstLines = 0
+		self._burstLinesMax = 0
+
+	def lineSent(self):
+		self._sent += 1
+
+	def lineResent(self):
+		self._resent += 1
+		self._burstLines += 1
+
+	def resendRequested(self, distance, resending):
+		self._requests += 1
+		self._distanceTotal += distance
+		self._distanceMax = max(self._distanceMax, distance)
+		if not resending:
+			self._bursts += 1
+			self._burstLines = 0
+
+	def resendFinished(self):
+		self._burstLinesMax = max(self._burstLinesMax, self._burstLines)
+
+	def asDict(self):
+		return {
+			"sent": self._sent,
+			"requests": self._requests,
+			"resent": self._resent,
+			"rate": float(self._requests) / self._sent if self._sent else 0.0,
+			"distance": {
+				"average": float(self._distanceTotal) / self._requests if self._requests else 0.0,
+				"max": self._distanceMax
+			},
+			"bursts": {
+				"count": self._bursts,
+				"averageLines": float(self._resent) / self._bursts if self._bursts else 0.0,
+				"maxLines": max(self._burstLinesMax, self._burstLines)
+			}
+		}
+
+class RemainingTimeEstimator(object):
+	"""
+	Estimates the remaining print time of a job by looking up the current file position in the PrintTimeIndex created
+	by the analysis of the file. Since that's only an estimate, the ratio between the actual time spent printing so far
+	and the predicted time up to the current position is learned while printing and applied to the predicted remaining
+	time. Time spent waiting for heatups is not predicted by the analysis and hence excluded from the actual time.
+
+	The correction only becomes fully effective after ``warmup`` seconds of predicted print time, so that a slow
+	first few moves don't skew the estimate, and is bounded to ``maxCorrection`` (and its inverse).
+	"""
+
+	def __init__(self, timeIndex, warmup=300.0, maxCorrection=4.0):
+		self._timeIndex = timeIndex
+		self._warmup = warmup
+		self._maxCorrection = maxCorrection
+		self._start = None
+
+	def estimate(self, filepos, printTime, heatupWaitTime):
+		"""
+		Returns the estimated remaining time in seconds at the given file position, after ``printTime`` seconds of
+		printing of which ``heatupWaitTime`` were spent waiting for heatups (both can include time from before the
+		print started, only their changes are taken into account).
+		"""
+		predicted = self._timeIndex.getTimeAt(filepos)
+		if self._start is None:
+			# the print time is only measured from some point into the print, use that as baseline
+			self._start = (predicted, printTime, heatupWaitTime)
+		startPredicted, startPrintTime, startHeatupWaitTime = self._start
+
+		predictedSoFar = predicted - startPredicted
+		actualSoFar = (printTime - startPrintTime) - (heatupWaitTime - startHeatupWaitTime)
+
+		correction = 1.0
+		if predictedSoFar > 0 and actualSoFar > 0:
+			ratio = max(1.0 / self._maxCorrection, min(self._maxCorrection, actualSoFar / predictedSoFar))
+			weight = min(1.0, predictedSoFar / self._warmup)
+			correction = 1.0 + (ratio - 1.0) * weight
+
+		return max(0.0, (self._timeIndex.getTotalTime() - predicted) * correction)
+
 class PrintingFileInformation(object):
 	"""
 	Encapsulates information regarding the current file being printed: file name, current position, total size and
@@ -1319,16 +1905,141 @@ class PrintingSdFileInformation(PrintingFileInformation):
 	def getFileLocation(self):
 		return FileDestinations.SDCARD
 
+class PrestagedGcodeFile(object):
+	"""
+	Prepares a gcode file for printing before it's selected, so that the print of the next job starts without
+	waiting on cold storage (e.g. an SD card backing the upload folder). :meth:`load` asks the kernel to read the whole
+	file ahead into the page cache and turns the first ``size`` bytes into the form they are sent in (comments and
+	whitespace stripped, empty lines dropped). Tool tracking and temperature offsets depend on the state at the time
+	of printing and are still applied while sending.
+
+	Size and modification time of the file and a CRC32 over the preprocessed bytes are recorded, :meth:`verify`
+	checks them against the file opened for printing, so a file changed in the meantime is never printed from stale
+	lines.
+	"""
+
+	_chunkSize = 1024 * 1024
+
+	def __init__(self, filename, size):
+		self._filename = filename
+		self._size = size
+
+		self._lines = []
+		self._positions = []
+		self._end = 0
+		self._crc = None
+		self._stat = None
+		self._loaded = threading.Event()
+
+	def getFilename(self):
+		return self._filename
+
+	def getLines(self):
+		"""
+		Returns the preprocessed lines and the file position after each one of them.
+		"""
+		return self._lines, self._positions
+
+	def getEnd(self):
+		"""
+		Returns the file position at which printing has to continue after the preprocessed lines.
+		"""
+		return self._end
+
+	def isLoaded(self):
+		return self._loaded.is_set()
+
+	def load(self):
+		"""
+		Warms up the page cache for the file and preprocesses its beginning. Meant to be run in the background,
+		returns True if the file could be prestaged.
+		"""
+		try:
+			with open(self._filename, "rb") as f:
+				stat = os.fstat(f.fileno())
+				self._readahead(f, stat.st_size)
+
+				lines = []
+				positions = []
+				crc = 0
+				position = 0
+				while position < self._size:
+					line = f.readline()
+					if not line:
+						break
+					crc = zlib.crc32(line, crc)
+					position += len(line)
+					processed = PrintingGcodeFileInformation._stripLine(line)
+					if processed:
+						lines.append(processed)
+						positions.append(position)
+
+				if not PrestagedGcodeFile._sameFile(stat, os.fstat(f.fileno())):
+					# changed while we were reading it
+					return False
+		except (IOError, OSError):
+			logging.getLogger(__name__).exception("Could not prestage %s" % self._filename)
+			return False
+
+		self._lines = lines
+		self._positions = positions
+		self._end = position
+		self._crc = crc
+		self._stat = stat
+		self._loaded.set()
+		return True
+
+	def verify(self, filehandle):
+		"""
+		Checks that the prestaged lines still match the beginning of the file opened as ``filehandle``. Leaves the
+		file positioned after the preprocessed part.
+		"""
+		if not self._loaded.is_set():
+			return False
+
+		if not PrestagedGcodeFile._sameFile(self._stat, os.fstat(filehandle.fileno())):
+			return False
+
+		filehandle.seek(0)
+		crc = 0
+		remaining = self._end
+		while remaining > 0:
+			data = filehandle.read(min(remaining, self._chunkSize))
+			if not data:
+				return False
+			crc = zlib.crc32(data, crc)
+			remaining -= len(data)
+		return crc == self._crc
+
+	def _readahead(self, f, filesize):
+		fadvise = getattr(os, "posix_fadvise", None)
+		if fadvise is not None:
+			fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+			fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+		else:
+			# no readahead hints available, reading the file once pulls it into the page cache just the same
+			while f.read(self._chunkSize):
+				pass
+			f.seek(0)
+
+	@staticmethod
+	def _sameFile(a, b):
+		return a.st_size == b.st_size and a.st_mtime == b.st_mtime and a.st_ino == b.st_ino
+
 class PrintingGcodeFileInformation(PrintingFileInformation):
 	"""
 	Encapsulates information regarding an ongoing direct print. Takes care of the needed file handle and ensures
 	that the file is closed in case of an error.
 	"""
 
-	def __init__(self, filename, offsetCallback):
+	def __init__(self, filename, offsetCallback, prestaged=None, compactor=None):
 		PrintingFileInformation.__init__(self, filename)
 
 		self._filehandle = None
+		self._compactor = compactor
+		self._prestaged = prestaged
+		self._prestagedLines = None
+		self._prestagedIndex = 0
 
 		self._filesetMenuModehandle = None
 		self._lineCount = None
@@ -1352,6 +2063,19 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 		self._filehandle = open(self._filename, "r")
 		self._lineCount = None
 		self._startTime = None
+		if self._compactor is not None:
+			self._compactor.reset()
+
+		self._prestagedLines = None
+		self._prestagedIndex = 0
+		if self._prestaged is not None:
+			if self._prestaged.verify(self._filehandle):
+				self._prestagedLines = self._prestaged.getLines()
+				self._filehandle.seek(self._prestaged.getEnd())
+			else:
+				logging.getLogger(__name__).info("Prestaged lines of %s are outdated, reading it from the start" % self._filename)
+				self._filehandle.seek(0)
+				self._prestaged = None
 
 	def getNext(self):
 		"""
@@ -1364,6 +2088,21 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 			self._lineCount = 0
 			return "M110 N0"
 
+		if self._prestagedLines is not None:
+			lines, positions = self._prestagedLines
+			while self._prestagedIndex < len(lines):
+				processedLine = self._processLine(lines[self._prestagedIndex], stripped=True)
+				self._filepos = positions[self._prestagedIndex]
+				self._prestagedIndex += 1
+				if processedLine is None:
+					# dropped by the compactor
+					continue
+				self._lineCount += 1
+				if self._lineCount >= 100 and self._startTime is None:
+					self._startTime = time.time()
+				return processedLine
+			self._prestagedLines = None
+
 		try:
 			processedLine = None
 			while processedLine is None:
@@ -1388,10 +2127,31 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 				self._filehandle = None
 			raise e
 
-	def _processLine(self, line):
+	def resetCompaction(self):
+		if self._compactor is not None:
+			self._compactor.reset()
+
+	def getCompactionStatistics(self):
+		"""
+		Returns the statistics of the compaction of the lines sent so far, None if the file isn't compacted.
+		"""
+		if self._compactor is None:
+			return None
+		return self._compactor.getStatistics()
+
+	@staticmethod
+	def _stripLine(line):
 		if ";" in line:
 			line = line[0:line.find(";")]
-		line = line.strip()
+		return line.strip()
+
+	def _processLine(self, line, stripped=False):
+		if not stripped:
+			line = PrintingGcodeFileInformation._stripLine(line)
+		if len(line) > 0 and self._compactor is not None:
+			line = self._compactor.compact(line)
+			if line is None:
+				return None
 		if len(line) > 0:
 			toolMatch = self._regex_toolCommand.match(line)
 			if toolMatch is not None:
@@ -1451,5 +2211,24 @@ class StreamingGcodeFileInformation(PrintingGcodeFileInformation):
 	def getLocalFilename(self):
 		return self._localFilename
 
+	def getThroughput(self):
+		"""
+		Returns the bytes of the file transferred per second so far.
+		"""
+		if self._startTime is None:
+			return 0.0
+		duration = time.time() - self._startTime
+		if duration <= 0:
+			return 0.0
+		return self._filepos / duration
+
+	def _processLine(self, line, stripped=False):
+		# the printer only stores the lines, no need to track tools or apply offsets
+		if not stripped:
+			line = PrintingGcodeFileInformation._stripLine(line)
+		if len(line) > 0:
+			return line
+		return None
+
 	def getRemoteFilename(self):
 		return self._remoteFilename
@@ -0,0 +1,172 @@
+from __future__ import absolute_import
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import octoprint.util.gcodeInterpreter as gcodeInterpreter
+from octoprint.util.positionTracker import PositionTracker
+
+
+class GcodeCompactor(object):
+	"""
+	Shortens the moves (``G0``/``G1``) of a file while it's being printed without changing what the printer does:
+
+	* numbers lose trailing zeros and the leading zero before the decimal point (``X10.000`` becomes ``X10``,
+	  ``E0.0500`` becomes ``E.05``),
+	* words are separated by a single space,
+	* axis words moving to where the axis already is are dropped (in relative mode those moving by zero), just like
+	  ``F`` words repeating the current feedrate,
+	* moves left without any words are dropped completely.
+
+	Lines have to be passed in order, already stripped of comments. All lines that aren't moves stay untouched, they
+	are only used to keep track of positions and positioning modes (see
+	:class:`~octoprint.util.positionTracker.PositionTracker`). Whenever the position or feedrate can't be known for sure
+	(homing, tool changes, any other command than the ones known to leave them alone) all of them are forgotten, so
+	the following moves are sent with all of their words again. The same has to happen via :meth:`reset` whenever
+	commands from elsewhere are sent in between the lines of the file.
+	"""
+
+	def __init__(self):
+		self._lines = 0
+		self._dropped = 0
+		self._bytes = 0
+		self._compactedBytes = 0
+		self._tracker = PositionTracker()
+
+	def reset(self):
+		"""
+		Forgets positions and feedrate, e.g. after commands from elsewhere have been sent to the printer. The
+		positioning modes of the file stay in effect.
+		"""
+		self._tracker.reset()
+
+	def compact(self, line):
+		"""
+		Returns the compacted version of the given line, None if the line can be dropped.
+		"""
+		self._lines += 1
+		self._bytes += len(line)
+
+		result = self._compact(line)
+		if result is None:
+			self._dropped += 1
+		else:
+			self._compactedBytes += len(result)
+		return result
+
+	def getStatistics(self):
+		return {
+			"lines": self._lines,
+			"dropped": self._dropped,
+			"bytes": self._bytes,
+			"compactedBytes": self._compactedBytes,
+			"saved": 1.0 - float(self._compactedBytes) / self._bytes if self._bytes else 0.0
+		}
+
+	def _compact(self, line):
+		words = line.split()
+		if not words:
+			return line
+
+		result = line
+		if PositionTracker.isMove(words[0].upper()):
+			result = self._compactMove(line, "G%d" % int(words[0][1:]), words[1:])
+		self._tracker.update(words)
+		return result
+
+	def _compactMove(self, line, command, words):
+		parsed = []
+		for word in words:
+			codeAndNumber = PositionTracker.parseWord(word)
+			if codeAndNumber is None:
+				# can't tell what this does, send it as it is
+				return line
+			parsed.append(codeAndNumber)
+
+		result = [command]
+		for code, number in parsed:
+			value = float(number)
+			if code in PositionTracker.axes:
+				if self._isRedundantMove(code, value):
+					continue
+			elif code == "F":
+				# firmwares either share the feedrate between G0 and G1 or keep one per command, it's only redundant
+				# if it's the same under both rules
+				if self._tracker.feedrate == value and self._tracker.feedrateCommand == command:
+					continue
+			result.append(code + GcodeCompactor._formatNumber(number))
+
+		if len(result) == 1:
+			return None
+		return " ".join(result)
+
+	def _isRedundantMove(self, code, value):
+		relative = self._tracker.isRelative(code)
+		if relative is None:
+			return False
+		if relative:
+			return value == 0
+		# only positions set by absolute moves or G92 count, those followed through relative moves might be off by
+		# rounding errors
+		return self._tracker.text[code] is not None and self._tracker.position[code] == value
+
+	@staticmethod
+	def _formatNumber(number):
+		negative = number.startswith("-")
+		number = number.lstrip("+-")
+		if "." in number:
+			number = number.rstrip("0").rstrip(".")
+		number = number.lstrip("0")
+		if not number:
+			return "0"
+		return ("-" if negative else "") + number
+
+
+def verify(path, original=None, interpreter=None):
+	"""
+	Checks that the compacted version of the file at ``path`` drives the printer exactly like the file itself, by
+	running both through the gcode interpreter and comparing the extruded filament per tool, the Z height of all
+	layers, the toolpath of each layer and the estimated print time.
+
+	``original`` may be the already finished analysis of the file, ``interpreter`` the ``gcodeInterpreter.gcode``
+	instance to use for the compacted version (so it can be aborted). Returns a dict with the result in ``identical``,
+	the ``differences`` found and the compaction statistics.
+	"""
+	if original is None:
+		original = gcodeInterpreter.gcode()
+		original.load(path)
+	if interpreter is None:
+		interpreter = gcodeInterpreter.gcode()
+
+	compactor = GcodeCompactor()
+
+	def compactedLines():
+		with open(path, "r") as f:
+			for line in f:
+				if ";" in line:
+					line = line[:line.find(";")]
+				line = line.strip()
+				if not line:
+					continue
+				line = compactor.compact(line)
+				if line is not None:
+					yield line + "\n"
+
+	interpreter.loadLines(compactedLines())
+
+	differences = []
+	if original.extrusionAmount != interpreter.extrusionAmount:
+		differences.append("filament")
+	if [layer[2] for layer in original.layerList] != [layer[2] for layer in interpreter.layerList]:
+		differences.append("layers")
+	if len(original.toolpath.layers) != len(interpreter.toolpath.layers) \
+			or any(a != b for a, b in zip(original.toolpath.layers, interpreter.toolpath.layers)):
+		differences.append("toolpath")
+	if abs(original.totalMoveTimeMinute - interpreter.totalMoveTimeMinute) > 1e-9 * max(1.0, original.totalMoveTimeMinute):
+		differences.append("time")
+
+	result = compactor.getStatistics()
+	result["identical"] = not differences
+	result["differences"] = differences
+	return result
@@ -10,6 +10,8 @@ import os
 import base64
 import zlib
 import logging
+import array
+import collections
 
 from octoprint.settings import settings
 
@@ -23,9 +25,13 @@ class gcode(object):
 		self._logger = logging.getLogger(__name__)
 
 		self.layerList = None
+		self.totalBytes = 0
+		self.totalLines = 0
+		self.toolpath = None
 		self.extrusionAmount = [0]
 		self.extrusionVolume = [0]
 		self.totalMoveTimeMinute = 0
+		self.timeline = None
 		self.filename = None
 		self.progressCallback = None
 		self._abort = False
@@ -38,18 +44,29 @@ class gcode(object):
 			with open(filename, "r") as f:
 				self._load(f)
 
+	def loadLines(self, lines):
+		"""
+		Analyzes the gcode lines yielded by the given iterable, e.g. while the file is still being received.
+		"""
+		self._load(lines)
+
 	def abort(self):
 		self._abort = True
 
 	def _load(self, gcodeFile):
 		filePos = 0
+		bytePos = 0
+		layers = []
+		layerChange = (0, 0)
+		toolpath = Toolpath()
+		timeline = Timeline()
 		pos = [0.0, 0.0, 0.0]
 		posOffset = [0.0, 0.0, 0.0]
 		currentE = [0.0]
 		totalExtrusion = [0.0]
 		maxExtrusion = [0.0]
 		currentExtruder = 0
-		totalMoveTimeMinute = 0.0
+		estimator = createTimeEstimator()
 		absoluteE = True
 		scale = 1.0
 		posAbs = True
@@ -61,6 +78,11 @@ class gcode(object):
 				raise AnalysisAborted()
 			filePos += 1
 
+			lineStart = bytePos
+			bytePos += len(line)
+			oldZ = pos[2]
+			extruding = False
+
 			try:
 				if self.progressCallback is not None and (filePos % 1000 == 0):
 					if isinstance(gcodeFile, (file)):
@@ -105,7 +127,7 @@ class gcode(object):
 			
 			G = getCodeInt(line, 'G')
 			if G is not None:
-				if G == 0 or G == 1:	#Move
+				if G == 0 or G == 1 or G == 2 or G == 3:	#Move, arc
 					x = getCodeFloat(line, 'X')
 					y = getCodeFloat(line, 'Y')
 					z = getCodeFloat(line, 'Z')
@@ -136,6 +158,7 @@ class gcode(object):
 							e -= currentE[currentExtruder]
 						if e > 0.0:
 							moveType = 'extrude'
+							extruding = x is not None or y is not None
 						if e < 0.0:
 							moveType = 'retract'
 						totalExtrusion[currentExtruder] += e
@@ -145,18 +168,26 @@ class gcode(object):
 					else:
 						e = 0.0
 
-					if x is not None or y is not None or z is not None:
-						diffX = oldPos[0] - pos[0]
-						diffY = oldPos[1] - pos[1]
-						totalMoveTimeMinute += math.sqrt(diffX * diffX + diffY * diffY) / feedRateXY
-					elif moveType == "extrude":
-						diffX = oldPos[0] - pos[0]
-						diffY = oldPos[1] - pos[1]
-						time1 = math.sqrt(diffX * diffX + diffY * diffY) / feedRateXY
-						time2 = abs(e / feedRateXY)
-						totalMoveTimeMinute += max(time1, time2)
-					elif moveType == "retract":
-						totalMoveTimeMinute += abs(e / feedRateXY)
+					if G == 2 or G == 3:
+						i = getCodeFloat(line, 'I')
+						j = getCodeFloat(line, 'J')
+						if i is not None or j is not None:
+							center = (oldPos[0] + (i or 0.0) * scale, oldPos[1] + (j or 0.0) * scale)
+							points = getArcPoints(oldPos, pos, center, G == 2)
+						else:
+							# radius format, not supported, the straight line is close enough for the analysis
+							points = [pos]
+					else:
+						points = [pos]
+
+					length = sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip([oldPos] + points[:-1], points))
+					segmentStart = oldPos
+					for point in points:
+						if segmentStart[0] != point[0] or segmentStart[1] != point[1]:
+							toolpath.addPoint(point[0], point[1], point[2], moveType == 'extrude')
+						share = math.hypot(point[0] - segmentStart[0], point[1] - segmentStart[1]) / length if len(points) > 1 else 1.0
+						estimator.move(point[0] - segmentStart[0], point[1] - segmentStart[1], point[2] - segmentStart[2], e * share, feedRateXY)
+						segmentStart = point
 
 					if moveType == 'move' and oldPos[2] != pos[2]:
 						if oldPos[2] > pos[2] and abs(oldPos[2] - pos[2]) > 5.0 and pos[2] < 1.0:
@@ -164,10 +195,10 @@ class gcode(object):
 				elif G == 4:	#Delay
 					S = getCodeFloat(line, 'S')
 					if S is not None:
-						totalMoveTimeMinute += S / 60.0
+						estimator.dwell(S)
 					P = getCodeFloat(line, 'P')
 					if P is not None:
-						totalMoveTimeMinute += P / 60.0 / 1000.0
+						estimator.dwell(P / 1000.0)
 				elif G == 20:	#Units are inches
 					scale = 25.4
 				elif G == 21:	#Units are mm
@@ -187,6 +218,7 @@ class gcode(object):
 							pos[1] = center[1]
 						if z is not None:
 							pos[2] = center[2]
+					toolpath.addPoint(pos[0], pos[1], pos[2], False)
 				elif G == 90:	#Absolute position
 					posAbs = True
 				elif G == 91:	#Relative position
@@ -211,6 +243,35 @@ class gcode(object):
 						absoluteE = True
 					elif M == 83:   #Relative E
 						absoluteE = False
+					elif M == 201:   #Max acceleration
+						estimator.setMaxAcceleration(**_getAxisValues(line))
+					elif M == 203:   #Max feedrate
+						estimator.setMaxFeedrate(**_getAxisValues(line))
+					elif M == 204:   #Default acceleration
+						S = getCodeFloat(line, 'S')
+						P = getCodeFloat(line, 'P')
+						R = getCodeFloat(line, 'R')
+						T = getCodeFloat(line, 'T')
+						estimator.setAcceleration(
+							acceleration=P if P is not None else S,
+							retractAcceleration=R,
+							travelAcceleration=T if T is not None else S
+						)
+
+			# a new layer starts with the last change of Z before extruding at a new height, so that travel moves and
+			# Z hops between layers end up in the layer they lead to
+			if pos[2] != oldZ:
+				layerChange = (lineStart, filePos - 1)
+			if extruding and (not layers or layers[-1][2] != pos[2]):
+				if layers:
+					layers.append((layerChange[0], layerChange[1], pos[2]))
+					toolpath.layerStarted()
+				else:
+					layers.append((0, 0, pos[2]))
+
+			# the planner only accounts for moves that already left its lookahead buffer, so the samples lag behind by
+			# at most that many moves
+			timeline.add(bytePos, estimator.getTime())
 		if self.progressCallback is not None:
 			self.progressCallback(100.0)
 
@@ -219,12 +280,405 @@ class gcode(object):
 		for i in range(len(maxExtrusion)):
 			radius = self._filamentDiameter / 2
 			self.extrusionVolume[i] = (self.extrusionAmount[i] * (math.pi * radius * radius)) / 1000
-		self.totalMoveTimeMinute = totalMoveTimeMinute
+		totalTime = estimator.finish()
+		self.totalMoveTimeMinute = totalTime / 60.0
+		self.timeline = timeline.finish(bytePos, totalTime)
+		self.layerList = layers
+		self.totalBytes = bytePos
+		self.totalLines = filePos
+		self.toolpath = toolpath.finish()
 
 	def _parseCuraProfileString(self, comment):
 		return {key: value for (key, value) in map(lambda x: x.split("=", 1), zlib.decompress(base64.b64decode(comment[len("CURA_PROFILE_STRING:"):])).split("\b"))}
 
 
+class Toolpath(object):
+	"""
+	Records the XY toolpath of a file during its analysis, per layer (as determined for the layer list). Points are
+	stored in compact arrays, points less than ``resolution`` mm away from the previously recorded one are skipped if
+	both were reached by the same kind of move.
+
+	After finish, ``layers`` contains a ``(xs, ys, extrude)`` tuple of arrays per layer, with ``extrude[i]`` telling
+	whether the move to point ``i`` was an extrusion or a travel move.
+	"""
+
+	def __init__(self, resolution=0.1):
+		self.layers = []
+		self._resolution = resolution
+		self._current = Toolpath._createPath()
+		self._pending = Toolpath._createPath()
+		self._last = None
+		self._lastZ = None
+
+	@staticmethod
+	def _createPath():
+		return array.array("f"), array.array("f"), array.array("b")
+
+	def addPoint(self, x, y, z, extrude):
+		if z != self._lastZ:
+			# moves after a Z change belong to the layer that change leads to, which is only known once extruding there
+			self._flushPending()
+			self._lastZ = z
+
+		if self._last is not None:
+			lastX, lastY, lastExtrude = self._last
+			if lastExtrude == extrude and abs(x - lastX) < self._resolution and abs(y - lastY) < self._resolution:
+				return
+
+		xs, ys, flags = self._pending
+		xs.append(x)
+		ys.append(y)
+		flags.append(1 if extrude else 0)
+		self._last = (x, y, extrude)
+
+	def layerStarted(self):
+		self.layers.append(self._current)
+		self._current = Toolpath._createPath()
+
+	def finish(self):
+		self._flushPending()
+		self.layers.append(self._current)
+		self._current = None
+		return self
+
+	def _flushPending(self):
+		for target, source in zip(self._current, self._pending):
+			target.extend(source)
+		self._pending = Toolpath._createPath()
+
+
+class Timeline(object):
+	"""
+	Records the estimated print time up to the end of each line of a file during its analysis, as a list of
+	``(byte offset, seconds)`` samples at least ``resolution`` bytes apart. Whenever ``maxSamples`` is reached every
+	other sample is dropped and the resolution doubled, so the timeline stays bounded regardless of the file size.
+	"""
+
+	def __init__(self, maxSamples=1024, resolution=4096):
+		self._samples = [(0, 0.0)]
+		self._maxSamples = maxSamples
+		self._resolution = resolution
+		self._next = resolution
+
+	def add(self, offset, time):
+		if offset < self._next:
+			return
+		self._samples.append((offset, time))
+		if len(self._samples) >= self._maxSamples:
+			self._samples = self._samples[::2]
+			self._resolution *= 2
+		self._next = self._samples[-1][0] + self._resolution
+
+	def finish(self, offset, time):
+		"""
+		Adds the final sample at the end of the file and returns all samples.
+		"""
+		if self._samples[-1][0] == offset:
+			self._samples[-1] = (offset, time)
+		else:
+			self._samples.append((offset, time))
+		return self._samples
+
+
+def createTimeEstimator(name=None):
+	"""
+	Creates the print time estimator configured via ``gcodeAnalysis.estimator``, either ``planner`` for the
+	PlannerTimeEstimator or ``simple`` for the SimpleTimeEstimator.
+	"""
+	if name is None:
+		name = settings().get(["gcodeAnalysis", "estimator"])
+
+	if name == "simple":
+		return SimpleTimeEstimator()
+	else:
+		return PlannerTimeEstimator.fromSettings()
+
+
+class SimpleTimeEstimator(object):
+	"""
+	Estimates the print time as XY distance divided by feedrate, or extruded length divided by feedrate for moves
+	only extruding or retracting. Ignores acceleration and any axis limits.
+	"""
+
+	def __init__(self):
+		self._time = 0.0
+
+	def move(self, dx, dy, dz, de, feedrate):
+		"""
+		Adds a move by the given deltas (mm), at the given feedrate (mm/min).
+		"""
+		if dx or dy or dz:
+			self._time += math.sqrt(dx * dx + dy * dy) / feedrate * 60.0
+		elif de:
+			self._time += abs(de) / feedrate * 60.0
+
+	def dwell(self, seconds):
+		self._time += seconds
+
+	def setAcceleration(self, acceleration=None, retractAcceleration=None, travelAcceleration=None):
+		pass
+
+	def setMaxAcceleration(self, **limits):
+		pass
+
+	def setMaxFeedrate(self, **limits):
+		pass
+
+	def getTime(self):
+		"""
+		Returns the estimated time in seconds of all moves so far.
+		"""
+		return self._time
+
+	def finish(self):
+		return self._time
+
+
+class PlannerTimeEstimator(object):
+	"""
+	Estimates the print time by simulating the motion planner of the firmware: Every move is executed with a trapezoidal
+	velocity profile, its nominal speed and acceleration limited by the per axis maximum feedrates and accelerations.
+	Speeds at the junctions between moves are limited by the junction deviation and what can be reached by accelerating
+	or decelerating over the moves before and after within the lookahead buffer. Just like on the printer, the last move
+	in the buffer has to be able to stop.
+
+	Moves are finalized and their time added up as soon as they drop out of the lookahead buffer, so this runs in
+	linear time with memory bounded by the buffer size.
+	"""
+
+	AXES = ("x", "y", "z", "e")
+
+	def __init__(self, maxFeedrate=None, maxAcceleration=None, acceleration=1000.0, retractAcceleration=3000.0,
+	             travelAcceleration=None, junctionDeviation=0.05, bufferSize=16):
+		"""
+		:param maxFeedrate: dict of maximum feedrate per axis in mm/s
+		:param maxAcceleration: dict of maximum acceleration per axis in mm/s²
+		:param acceleration: acceleration of printing moves in mm/s²
+		:param retractAcceleration: acceleration of moves only moving the extruder in mm/s²
+		:param travelAcceleration: acceleration of non extruding moves in mm/s², defaults to ``acceleration``
+		:param junctionDeviation: junction deviation in mm
+		:param bufferSize: size of the lookahead buffer in moves
+		"""
+		self._maxFeedrate = dict(x=500.0, y=500.0, z=5.0, e=25.0)
+		if maxFeedrate:
+			self._maxFeedrate.update(maxFeedrate)
+		self._maxAcceleration = dict(x=3000.0, y=3000.0, z=100.0, e=10000.0)
+		if maxAcceleration:
+			self._maxAcceleration.update(maxAcceleration)
+		self._acceleration = acceleration
+		self._retractAcceleration = retractAcceleration
+		self._travelAcceleration = travelAcceleration if travelAcceleration is not None else acceleration
+		self._junctionDeviation = junctionDeviation
+		self._bufferSize = bufferSize
+		self._updateLimits()
+
+		# every block is a list of [distance, nominal speed², acceleration, max entry speed², max entry speed² as
+		# limited by the following blocks, entry speed²]
+		self._blocks = collections.deque()
+		self._previousUnit = None
+		self._previousNominal2 = 0.0
+		self._time = 0.0
+
+	@staticmethod
+	def fromSettings():
+		def getAxes(key):
+			result = dict()
+			for axis in PlannerTimeEstimator.AXES:
+				value = settings().getFloat(["printerParameters", "planner", key, axis])
+				if value is not None:
+					result[axis] = value
+			return result
+
+		return PlannerTimeEstimator(
+			maxFeedrate=getAxes("maxFeedrate"),
+			maxAcceleration=getAxes("maxAcceleration"),
+			acceleration=settings().getFloat(["printerParameters", "planner", "acceleration"]),
+			retractAcceleration=settings().getFloat(["printerParameters", "planner", "retractAcceleration"]),
+			travelAcceleration=settings().getFloat(["printerParameters", "planner", "travelAcceleration"]),
+			junctionDeviation=settings().getFloat(["printerParameters", "planner", "junctionDeviation"]),
+			bufferSize=settings().getInt(["printerParameters", "planner", "bufferSize"])
+		)
+
+	def setAcceleration(self, acceleration=None, retractAcceleration=None, travelAcceleration=None):
+		if acceleration is not None:
+			self._acceleration = acceleration
+		if retractAcceleration is not None:
+			self._retractAcceleration = retractAcceleration
+		if travelAcceleration is not None:
+			self._travelAcceleration = travelAcceleration
+
+	def setMaxAcceleration(self, **limits):
+		self._maxAcceleration.update(limits)
+		self._updateLimits()
+
+	def setMaxFeedrate(self, **limits):
+		self._maxFeedrate.update(limits)
+		self._updateLimits()
+
+	def _updateLimits(self):
+		self._feedrateLimits = tuple(self._maxFeedrate[axis] for axis in PlannerTimeEstimator.AXES)
+		self._accelerationLimits = tuple(self._maxAcceleration[axis] for axis in PlannerTimeEstimator.AXES)
+
+	def move(self, dx, dy, dz, de, feedrate):
+		"""
+		Adds a move by the given deltas (mm), at the given feedrate (mm/min).
+		"""
+		distance = math.sqrt(dx * dx + dy * dy + dz * dz)
+		if distance > 0:
+			acceleration = self._acceleration if de > 0 else self._travelAcceleration
+		else:
+			distance = abs(de)
+			acceleration = self._retractAcceleration
+		if distance <= 0 or feedrate <= 0:
+			return
+
+		# limit speed and acceleration so no axis exceeds its limits
+		speed = feedrate / 60.0
+		unit = (dx / distance, dy / distance, dz / distance, de / distance)
+		for fraction, maxFeedrate, maxAcceleration in zip(unit, self._feedrateLimits, self._accelerationLimits):
+			if fraction < 0:
+				fraction = -fraction
+			if speed * fraction > maxFeedrate:
+				speed = maxFeedrate / fraction
+			if acceleration * fraction > maxAcceleration:
+				acceleration = maxAcceleration / fraction
+		nominal2 = speed * speed
+
+		# junction speed with the previous move as per the junction deviation
+		maxEntry2 = 0.0
+		previousUnit = self._previousUnit
+		if previousUnit is not None:
+			cosTheta = -(previousUnit[0] * unit[0] + previousUnit[1] * unit[1] + previousUnit[2] * unit[2] + previousUnit[3] * unit[3])
+			if cosTheta < 0.999999:
+				maxEntry2 = nominal2 if nominal2 < self._previousNominal2 else self._previousNominal2
+				if cosTheta > -0.999999:
+					sinThetaHalf = math.sqrt(0.5 * (1.0 - cosTheta))
+					junction2 = acceleration * self._junctionDeviation * sinThetaHalf / (1.0 - sinThetaHalf)
+					if junction2 < maxEntry2:
+						maxEntry2 = junction2
+		self._previousUnit = unit
+		self._previousNominal2 = nominal2
+
+		self._blocks.append([distance, nominal2, acceleration, maxEntry2, maxEntry2, 0.0])
+		self._recalculate()
+
+		while len(self._blocks) > self._bufferSize:
+			self._finalize()
+
+	def dwell(self, seconds):
+		# the printer finishes all buffered moves before dwelling
+		self._flush()
+		self._time += seconds
+
+	def getTime(self):
+		"""
+		Returns the estimated time in seconds of all moves that already left the lookahead buffer.
+		"""
+		return self._time
+
+	def finish(self):
+		"""
+		Finalizes all moves still in the lookahead buffer and returns the total estimated time in seconds.
+		"""
+		self._flush()
+		return self._time
+
+	def _flush(self):
+		while self._blocks:
+			self._finalize()
+		self._previousUnit = None
+		self._previousNominal2 = 0.0
+
+	def _recalculate(self):
+		blocks = self._blocks
+		count = len(blocks)
+
+		# reverse pass: every block must be able to decelerate to the entry speed of the next one, the last one to a
+		# stop. Stops as soon as a block's limit doesn't change anymore, since the ones before won't change either then
+		start = 1
+		next2 = 0.0
+		for i in xrange(count - 1, 0, -1):
+			block = blocks[i]
+			limit2 = next2 + 2.0 * block[2] * block[0]
+			if block[3] < limit2:
+				limit2 = block[3]
+			if limit2 == block[4] and i < count - 1:
+				start = i + 1
+				break
+			block[4] = limit2
+			next2 = limit2
+
+		# forward pass over the blocks whose limits changed: every block's entry speed must be reachable by
+		# accelerating over the previous one, the first block's entry speed is already fixed by the finalized block
+		# before it
+		previous = blocks[start - 1]
+		for i in xrange(start, count):
+			block = blocks[i]
+			entry2 = previous[5] + 2.0 * previous[2] * previous[0]
+			if block[4] < entry2:
+				entry2 = block[4]
+			block[5] = entry2
+			previous = block
+
+	def _finalize(self):
+		block = self._blocks.popleft()
+		exit2 = self._blocks[0][5] if self._blocks else 0.0
+		self._time += _trapezoidTime(block[0], block[5], block[1], exit2, block[2])
+
+
+def _trapezoidTime(distance, entry2, nominal2, exit2, acceleration):
+	"""
+	Duration of a move over ``distance`` with a trapezoidal velocity profile, accelerating from the entry speed to at
+	most the nominal speed and decelerating to the exit speed in time (all speeds given squared).
+	"""
+	entry = math.sqrt(entry2)
+	exit = math.sqrt(exit2)
+
+	accelerateDistance = (nominal2 - entry2) / (2.0 * acceleration)
+	decelerateDistance = (nominal2 - exit2) / (2.0 * acceleration)
+	if accelerateDistance + decelerateDistance <= distance:
+		nominal = math.sqrt(nominal2)
+		cruiseDistance = distance - accelerateDistance - decelerateDistance
+		return (nominal - entry) / acceleration + (nominal - exit) / acceleration + cruiseDistance / nominal
+
+	# triangular profile, the nominal speed is never reached
+	peak = math.sqrt(max(entry2, exit2, (2.0 * acceleration * distance + entry2 + exit2) / 2.0))
+	return (peak - entry) / acceleration + (peak - exit) / acceleration
+
+
+def getArcPoints(start, end, center, clockwise, segmentLength=1.0):
+	"""
+	Splits the arc from ``start`` around ``center`` to ``end`` into segments of about ``segmentLength`` mm like
+	firmwares do, returns the end points of all segments (the last one being ``end``). Z moves along linearly (helix),
+	an arc ending where it started is a full circle.
+	"""
+	radius = math.hypot(start[0] - center[0], start[1] - center[1])
+	startAngle = math.atan2(start[1] - center[1], start[0] - center[0])
+	sweep = math.atan2(end[1] - center[1], end[0] - center[0]) - startAngle
+	if clockwise:
+		if sweep >= 0:
+			sweep -= 2 * math.pi
+	elif sweep <= 0:
+		sweep += 2 * math.pi
+
+	count = max(1, int(math.ceil(abs(sweep) * radius / segmentLength)))
+	points = []
+	for n in range(1, count):
+		angle = startAngle + sweep * n / count
+		points.append([center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle), start[2] + (end[2] - start[2]) * n / count])
+	points.append(end)
+	return points
+
+
+def _getAxisValues(line):
+	result = dict()
+	for axis in PlannerTimeEstimator.AXES:
+		value = getCodeFloat(line, axis.upper())
+		if value is not None:
+			result[axis] = value
+	return result
+
+
 def getCodeInt(line, code):
 	n = line.find(code) + 1
 	if n < 1:
@@ -0,0 +1,149 @@
+from __future__ import absolute_import
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import re
+
+
+class PositionTracker(object):
+	"""
+	Keeps track of the logical position of the axes, the feedrate and the positioning modes (``G90``/``G91``,
+	``M82``/``M83``) while the lines of a file are passed to :meth:`update` in order, already split into words and
+	stripped of comments.
+
+	``position`` holds the known position of each axis, None if it's unknown. Positions are known from absolute
+	moves and ``G92`` (``text`` then holds the number exactly as it was written) and follow relative moves from
+	there (``text`` then is None). Whenever a position can't be known for sure (homing, tool changes, any other
+	command than the ones known to leave the positions alone) it's forgotten, together with the feedrate unless the
+	command is only known to move the logical position (``M206``, ``M428``).
+	"""
+
+	axes = ("X", "Y", "Z", "E")
+
+	_regex_word = re.compile("^([A-Za-z])([-+]?(?:\d+\.?\d*|\.\d+))$")
+
+	# commands known to change neither positions nor positioning modes
+	_neutralCommands = ("G4",)
+	# commands moving the logical position of axes out of our sight
+	_positionCommands = ("M206", "M428")
+
+	def __init__(self):
+		self.position = dict()
+		self.text = dict()
+		self.feedrate = None
+		self.feedrateCommand = None
+		# absolute positioning, like after connecting
+		self.absolute = True
+		self.absoluteE = True
+		self.reset()
+
+	def reset(self):
+		"""
+		Forgets positions and feedrate, e.g. after commands from elsewhere have been sent to the printer. The
+		positioning modes stay as they are, the printer keeps them no matter what's sent in between.
+		"""
+		self._forgetAll()
+
+	def isRelative(self, axis):
+		"""
+		Whether moves of ``axis`` are relative, None for ``E`` in ``G91`` with absolute extrusion since firmwares
+		don't agree on whether that's relative or not.
+		"""
+		if axis == "E":
+			if not self.absolute and self.absoluteE:
+				return None
+			return not self.absoluteE
+		return not self.absolute
+
+	def update(self, words):
+		"""
+		Applies the command in ``words`` (the words of a line, the command first).
+		"""
+		command = words[0].upper()
+		if PositionTracker.isMove(command):
+			self._move("G%d" % int(command[1:]), words[1:])
+		elif command == "G90":
+			self.absolute = True
+		elif command == "G91":
+			self.absolute = False
+		elif command == "M82":
+			self.absoluteE = True
+			self._forget("E")
+		elif command == "M83":
+			self.absoluteE = False
+			self._forget("E")
+		elif command == "G92":
+			self._setPosition(words[1:])
+		elif command in PositionTracker._positionCommands:
+			self.forgetPosition()
+		elif not command.startswith("M") and not command in PositionTracker._neutralCommands:
+			# homing, tool changes, other G codes, line numbers or anything else unknown
+			self._forgetAll()
+
+	def forgetPosition(self):
+		for axis in PositionTracker.axes:
+			self._forget(axis)
+
+	@staticmethod
+	def isMove(command):
+		return command in ("G0", "G1", "G00", "G01")
+
+	@staticmethod
+	def parseWord(word):
+		"""
+		Returns code (upper case) and number (as written) of ``word``, None if it's no simple numeric word.
+		"""
+		match = PositionTracker._regex_word.match(word)
+		if match is None:
+			return None
+		return match.group(1).upper(), match.group(2)
+
+	def _move(self, command, words):
+		for word in words:
+			parsed = PositionTracker.parseWord(word)
+			if parsed is None:
+				# can't tell what this does
+				self._forgetAll()
+				return
+
+			code, number = parsed
+			if code == "F":
+				self.feedrate = float(number)
+				self.feedrateCommand = command
+			elif code in self.position:
+				relative = self.isRelative(code)
+				if relative is None:
+					self._forget(code)
+				elif not relative:
+					self.position[code] = float(number)
+					self.text[code] = number
+				elif self.position[code] is not None:
+					self.position[code] += float(number)
+					self.text[code] = None
+
+	def _setPosition(self, words):
+		codes = []
+		for word in words:
+			parsed = PositionTracker.parseWord(word)
+			if parsed is None or not parsed[0] in self.position:
+				self.forgetPosition()
+				return
+			codes.append(parsed)
+
+		if not codes:
+			# firmwares don't agree on what G92 without axes does
+			self.forgetPosition()
+		for code, number in codes:
+			self.position[code] = float(number)
+			self.text[code] = number
+
+	def _forgetAll(self):
+		self.forgetPosition()
+		self.feedrate = None
+		self.feedrateCommand = None
+
+	def _forget(self, axis):
+		self.position[axis] = None
+		self.text[axis] = None
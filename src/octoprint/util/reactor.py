@@ -0,0 +1,281 @@
+from __future__ import absolute_import
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import os
+import errno
+import fcntl
+import select
+import threading
+import time
+import logging
+
+
+class SerialReactor(object):
+	"""
+	Reads the serial ports of any number of printers on one thread instead of one monitor thread blocking in
+	``readline`` per connection. All registered file descriptors are multiplexed via ``epoll`` (``poll`` where epoll
+	isn't available), whatever arrives is split into lines which are handed to the callback of the connection, on the
+	reactor's thread.
+
+	Just like a blocking ``readline`` with a timeout, an empty line is delivered if no line was completed within the
+	connection's current read timeout, so the line processing (including all of its timeout handling) stays the same
+	in both cases.
+
+	Since the lines are processed on the reactor's thread, which also sends the next lines in reply, writing to the
+	ports must never block: registered file descriptors are switched to non-blocking mode and :meth:`write` buffers
+	whatever a port doesn't take right away, the reactor writes it as soon as the port is ready for more.
+	"""
+
+	_instance = None
+	_instanceMutex = threading.Lock()
+
+	_readSize = 4096
+
+	@staticmethod
+	def instance():
+		"""
+		Returns the reactor shared by all connections, starting it on first use.
+		"""
+		with SerialReactor._instanceMutex:
+			if SerialReactor._instance is None:
+				SerialReactor._instance = SerialReactor()
+			return SerialReactor._instance
+
+	def __init__(self):
+		self._logger = logging.getLogger(__name__)
+
+		if hasattr(select, "epoll"):
+			self._poller = select.epoll()
+			self._readMask = select.EPOLLIN | select.EPOLLPRI
+			self._writeMask = select.EPOLLOUT
+			self._errorMask = select.EPOLLERR | select.EPOLLHUP
+		else:
+			self._poller = select.poll()
+			self._readMask = select.POLLIN | select.POLLPRI
+			self._writeMask = select.POLLOUT
+			self._errorMask = select.POLLERR | select.POLLHUP | select.POLLNVAL
+
+		self._connections = dict()
+		self._mutex = threading.RLock()
+
+		# registrations from other threads wake up the reactor through this pipe, so new timeouts are picked up
+		self._wakeupRead, self._wakeupWrite = os.pipe()
+		for fileno in (self._wakeupRead, self._wakeupWrite):
+			_setNonBlocking(fileno)
+		self._poller.register(self._wakeupRead, self._readMask)
+
+		self._worker = threading.Thread(target=self._work)
+		self._worker.daemon = True
+		self._worker.start()
+
+	def register(self, fileno, lineCallback, errorCallback, timeoutCallback):
+		"""
+		Starts reading the given file descriptor.
+
+		:param lineCallback: called with every received line (including the line break), or with an empty string on
+		    timeout
+		:param errorCallback: called with an error message if reading fails or the port is gone, the connection is
+		    unregistered before that
+		:param timeoutCallback: returns the current read timeout of the connection in seconds, None for no timeout
+		"""
+		with self._mutex:
+			_setNonBlocking(fileno)
+			connection = _ReactorConnection(fileno, lineCallback, errorCallback, timeoutCallback)
+			self._connections[fileno] = connection
+			self._poller.register(fileno, self._readMask)
+		self._wakeup()
+
+	def write(self, fileno, data):
+		"""
+		Writes to the given file descriptor without ever blocking. Whatever the port doesn't take right away is buffered
+		and written by the reactor as soon as the port is ready for more, all data goes out in the order it was
+		written. Data for file descriptors that aren't registered (anymore) is dropped.
+
+		Raises an ``OSError`` if writing to the port fails.
+		"""
+		with self._mutex:
+			connection = self._connections.get(fileno)
+			if connection is None:
+				return
+
+			if not connection.pending:
+				data = data[_writeSome(fileno, data):]
+				if not data:
+					return
+				self._poller.modify(fileno, self._readMask | self._writeMask)
+			connection.pending += data
+		self._wakeup()
+
+	def unregister(self, fileno):
+		"""
+		Stops reading the given file descriptor. Must be called before the file descriptor is closed.
+		"""
+		with self._mutex:
+			if self._connections.pop(fileno, None) is None:
+				return
+			try:
+				self._poller.unregister(fileno)
+			except (IOError, OSError, KeyError, ValueError):
+				pass
+		self._wakeup()
+
+	def getConnectionCount(self):
+		return len(self._connections)
+
+	def _wakeup(self):
+		if threading.current_thread() is self._worker:
+			return
+		try:
+			os.write(self._wakeupWrite, "x")
+		except OSError:
+			pass
+
+	def _work(self):
+		while True:
+			try:
+				self._poll()
+			except:
+				self._logger.exception("Error in the serial reactor loop")
+				time.sleep(0.1)
+
+	def _poll(self):
+		with self._mutex:
+			deadlines = [connection.deadline for connection in self._connections.values() if connection.deadline is not None]
+		timeout = max(0.0, min(deadlines) - time.time()) if deadlines else None
+
+		try:
+			events = self._poller.poll(timeout if timeout is not None else -1)
+		except (IOError, OSError, select.error) as e:
+			if e.args[0] == errno.EINTR:
+				return
+			raise
+
+		for fileno, mask in events:
+			if fileno == self._wakeupRead:
+				try:
+					os.read(self._wakeupRead, self._readSize)
+				except OSError:
+					pass
+				continue
+
+			connection = self._connections.get(fileno)
+			if connection is None:
+				continue
+
+			if mask & self._writeMask and not self._flush(connection):
+				continue
+
+			if mask & self._readMask:
+				try:
+					data = os.read(fileno, self._readSize)
+				except OSError as e:
+					if e.errno in (errno.EAGAIN, errno.EINTR):
+						continue
+					self._fail(connection, str(e))
+					continue
+				if not data:
+					self._fail(connection, "Serial port closed")
+					continue
+				self._dispatch(connection, connection.received(data))
+			elif mask & self._errorMask:
+				self._fail(connection, "Serial port closed")
+
+		now = time.time()
+		with self._mutex:
+			expired = [connection for connection in self._connections.values() if connection.deadline is not None and connection.deadline <= now]
+		for connection in expired:
+			self._dispatch(connection, [connection.flush()])
+
+	def _flush(self, connection):
+		"""
+		Writes as much of the data buffered for the connection as the port takes, returns False if that failed.
+		"""
+		with self._mutex:
+			if self._connections.get(connection.fileno) is not connection or not connection.pending:
+				return True
+			try:
+				connection.pending = connection.pending[_writeSome(connection.fileno, connection.pending):]
+			except OSError as e:
+				error = str(e)
+			else:
+				if not connection.pending:
+					self._poller.modify(connection.fileno, self._readMask)
+				return True
+		self._fail(connection, error)
+		return False
+
+	def _dispatch(self, connection, lines):
+		for line in lines:
+			if self._connections.get(connection.fileno) is not connection:
+				# got unregistered while processing the previous line
+				return
+			try:
+				connection.lineCallback(line)
+			except:
+				self._logger.exception("Error while processing a line received from the serial port")
+
+	def _fail(self, connection, error):
+		self.unregister(connection.fileno)
+		try:
+			connection.errorCallback(error)
+		except:
+			self._logger.exception("Error while handling a serial port error")
+
+
+class _ReactorConnection(object):
+	def __init__(self, fileno, lineCallback, errorCallback, timeoutCallback):
+		self.fileno = fileno
+		self.lineCallback = lineCallback
+		self.errorCallback = errorCallback
+		self.timeoutCallback = timeoutCallback
+
+		self.deadline = None
+		self.pending = ""
+		self._buffer = ""
+		self._updateDeadline()
+
+	def received(self, data):
+		"""
+		Adds the received data to the buffer and returns all lines completed by it.
+		"""
+		data = self._buffer + data
+		end = data.rfind("\n")
+		if end < 0:
+			self._buffer = data
+			return []
+
+		self._buffer = data[end + 1:]
+		self._updateDeadline()
+		return [line + "\n" for line in data[:end].split("\n")]
+
+	def flush(self):
+		"""
+		Returns whatever was received since the last complete line (an empty string if nothing) on timeout.
+		"""
+		line = self._buffer
+		self._buffer = ""
+		self._updateDeadline()
+		return line
+
+	def _updateDeadline(self):
+		timeout = self.timeoutCallback()
+		self.deadline = time.time() + timeout if timeout is not None else None
+
+
+def _setNonBlocking(fileno):
+	fcntl.fcntl(fileno, fcntl.F_SETFL, fcntl.fcntl(fileno, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+
+def _writeSome(fileno, data):
+	"""
+	Writes as much of ``data`` to the non-blocking file descriptor as it takes, returns the number of bytes written.
+	"""
+	try:
+		return os.write(fileno, data)
+	except OSError as e:
+		if e.errno in (errno.EAGAIN, errno.EINTR):
+			return 0
+		raise
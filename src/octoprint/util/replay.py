@@ -0,0 +1,246 @@
+from __future__ import absolute_import
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import collections
+import random
+import re
+import threading
+import time
+
+
+class Recording(object):
+	"""
+	Responses of a firmware, to be replayed by a :class:`ReplayTransport`.
+
+	Consists of the ``greeting`` the firmware sends once the port is opened and of the ``responses`` to the commands,
+	a dict mapping command words (``G1``, ``M105``, ...) to lists of responses, each of them a list of lines ending with
+	the "ok". Every time a command is sent the next of its responses is returned, starting over after the last one,
+	so a replay only depends on the sent commands. Commands without any recorded response are simply acknowledged.
+	"""
+
+	_regex_log = re.compile("(Send|Recv): (.*)$")
+	_regex_lineNumber = re.compile("^N\d+\s+")
+
+	# lines of the firmware that only make sense as answer to something that went wrong on the line
+	_ignoredPrefixes = ("Resend", "rs ", "Error:")
+
+	def __init__(self, greeting=None, responses=None):
+		self.greeting = list(greeting) if greeting is not None else []
+		self.responses = dict(responses) if responses is not None else dict()
+		self._counters = dict()
+
+	def respond(self, line):
+		"""
+		Returns the lines (without line breaks) the firmware answers to ``line``.
+		"""
+		command = Recording.getCommand(line)
+		responses = self.responses.get(command)
+		if not responses:
+			return ["ok"]
+		index = self._counters.get(command, 0)
+		self._counters[command] = (index + 1) % len(responses)
+		return responses[index]
+
+	def reset(self):
+		self._counters = dict()
+
+	@staticmethod
+	def getCommand(line):
+		"""
+		Returns the command word of ``line`` as sent by the host, without line number and checksum.
+		"""
+		if "*" in line:
+			line = line[:line.rfind("*")]
+		line = Recording._regex_lineNumber.sub("", line.strip())
+		words = line.split(None, 1)
+		return words[0].upper() if words else ""
+
+	@staticmethod
+	def fromLines(lines):
+		"""
+		Creates a recording from the lines of a serial log (``serial.log`` with ``serial.log`` enabled). Everything
+		received before the first sent line makes up the greeting, everything received after that belongs to the oldest
+		sent line still waiting for its "ok". Resend requests and communication errors are left out, as are lines
+		received while nothing was waiting for an "ok" (like temperature reports during heatup).
+		"""
+		greeting = []
+		responses = dict()
+		waiting = collections.deque()
+		sent = False
+
+		for line in lines:
+			match = Recording._regex_log.search(line.rstrip("\r\n"))
+			if match is None:
+				continue
+			direction, content = match.group(1), match.group(2).strip()
+
+			if direction == "Send":
+				sent = True
+				waiting.append((Recording.getCommand(content), []))
+				continue
+
+			if not content or content.startswith(Recording._ignoredPrefixes):
+				continue
+			if not sent:
+				greeting.append(content)
+			elif waiting:
+				command, received = waiting[0]
+				received.append(content)
+				if content.startswith("ok"):
+					waiting.popleft()
+					responses.setdefault(command, []).append(received)
+
+		return Recording(greeting, responses)
+
+	@staticmethod
+	def fromFile(path):
+		with open(path, "r") as f:
+			return Recording.fromLines(f)
+
+	@staticmethod
+	def default():
+		"""
+		A Marlin with one extruder, a heated bed and an SD card, idling at printing temperatures.
+		"""
+		return Recording(
+			greeting=["start", "Marlin 1.0.0", "echo: Last Updated: Jan  1 2014 00:00:00 | Author: Replay", "echo:SD card ok"],
+			responses={
+				"M105": [["ok T:210.0 /210.0 B:60.0 /60.0 @:64 B@:0"]],
+				"M114": [["X:0.00 Y:0.00 Z:0.00 E:0.00 Count X: 0.00 Y:0.00 Z:0.00", "ok"]],
+				"M115": [["FIRMWARE_NAME:Marlin V1; Sprinter/grbl mashup for gen6 FIRMWARE_URL:https://github.com/MarlinFirmware/Marlin PROTOCOL_VERSION:1.0 MACHINE_TYPE:Replay EXTRUDER_COUNT:1", "ok"]],
+				"M20": [["Begin file list", "End file list", "ok"]],
+				"M21": [["echo:SD card ok", "ok"]],
+				"M27": [["Not SD printing", "ok"]]
+			}
+		)
+
+
+class FixedLatency(object):
+	"""
+	Latency model answering every line ``latency`` seconds after it was written.
+	"""
+
+	def __init__(self, latency=0.0):
+		self._latency = latency
+
+	def __call__(self, now, line, responses):
+		return now + self._latency
+
+
+class SerialLineLatency(object):
+	"""
+	Latency model of a serial line with the given ``baudrate`` (10 bits per byte) and a firmware taking ``processing``
+	seconds per line: a line arrives once all of its bytes and those of the lines before it have passed the line, it is
+	processed once the firmware is done with the lines before it, then its responses travel back.
+	"""
+
+	def __init__(self, baudrate=115200, processing=0.001):
+		self._secondsPerByte = 10.0 / baudrate
+		self._processing = processing
+		self._linkFree = 0.0
+		self._firmwareFree = 0.0
+
+	def __call__(self, now, line, responses):
+		self._linkFree = max(now, self._linkFree) + (len(line) + 1) * self._secondsPerByte
+		self._firmwareFree = max(self._linkFree, self._firmwareFree) + self._processing
+		return self._firmwareFree + sum(len(response) + 1 for response in responses) * self._secondsPerByte
+
+
+class JitterLatency(object):
+	"""
+	Adds a random delay of up to ``jitter`` seconds to the responses of ``model``. The random numbers are seeded with
+	``seed``, so the same lines get the same delays on every run.
+	"""
+
+	def __init__(self, model, jitter, seed=0):
+		self._model = model
+		self._jitter = jitter
+		self._random = random.Random(seed)
+
+	def __call__(self, now, line, responses):
+		return self._model(now, line, responses) + self._random.uniform(0, self._jitter)
+
+
+def createLatencyModel(config):
+	"""
+	Creates the latency model described by the dict ``config``: ``model`` is either ``fixed`` (with ``latency`` in
+	seconds) or ``serial`` (with ``baudrate`` and ``processing`` in seconds), a ``jitter`` in seconds (seeded with
+	``seed``) is added to either.
+	"""
+	if config.get("model") == "serial":
+		model = SerialLineLatency(baudrate=config.get("baudrate", 115200), processing=config.get("processing", 0.001))
+	else:
+		model = FixedLatency(config.get("latency", 0.0))
+
+	if config.get("jitter"):
+		model = JitterLatency(model, config["jitter"], seed=config.get("seed", 0))
+	return model
+
+
+class ReplayTransport(object):
+	"""
+	Stands in for the serial port of a printer, answering every written line with the responses of a
+	:class:`Recording`, due at the time the ``latency`` model (``model(now, line, responses)`` returning the time the
+	responses arrive) determines. Responses are received in the order their lines were written, no matter their
+	latencies. ``readline`` blocks until the next response is due or ``timeout`` seconds have passed, in which case it
+	returns an empty string like a serial port does.
+	"""
+
+	def __init__(self, recording=None, latency=None, timeout=2.0, clock=time.time):
+		self.timeout = timeout
+		self.baudrate = None
+
+		self._recording = recording if recording is not None else Recording.default()
+		self._latency = latency if latency is not None else FixedLatency()
+		self._clock = clock
+
+		self._condition = threading.Condition()
+		self._received = collections.deque()
+		self._lastDue = 0.0
+		self._closed = False
+
+		now = self._clock()
+		for line in self._recording.greeting:
+			self._received.append((now, line + "\n"))
+
+	def __str__(self):
+		return "ReplayTransport"
+
+	def write(self, data):
+		with self._condition:
+			if self._closed:
+				return
+			now = self._clock()
+			for line in data.split("\n"):
+				if not line.strip():
+					continue
+				responses = self._recording.respond(line)
+				due = max(self._lastDue, self._latency(now, line, responses))
+				self._lastDue = due
+				for response in responses:
+					self._received.append((due, response + "\n"))
+			self._condition.notify_all()
+
+	def readline(self):
+		with self._condition:
+			deadline = self._clock() + self.timeout if self.timeout is not None else None
+			while not self._closed:
+				now = self._clock()
+				if self._received and self._received[0][0] <= now:
+					return self._received.popleft()[1]
+
+				wait = self._received[0][0] - now if self._received else None
+				if deadline is not None:
+					if now >= deadline:
+						break
+					wait = min(wait, deadline - now) if wait is not None else deadline - now
+				self._condition.wait(wait)
+			return ""
+
+	def close(self):
+		with self._condition:
+			self._closed = True
+			self._condition.notify_all()
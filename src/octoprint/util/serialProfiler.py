@@ -0,0 +1,267 @@
+from __future__ import absolute_import
+# coding=utf-8
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import collections
+import threading
+import time
+
+
+class Histogram(object):
+	"""
+	Counts values into buckets given by their upper bounds, values above the last bound go into an additional last
+	bucket.
+	"""
+
+	def __init__(self, bounds):
+		self.bounds = bounds
+		self.counts = [0] * (len(bounds) + 1)
+
+	def add(self, value, count=1):
+		for i, bound in enumerate(self.bounds):
+			if value <= bound:
+				self.counts[i] += count
+				return
+		self.counts[-1] += count
+
+	def merge(self, other):
+		for i, count in enumerate(other.counts):
+			self.counts[i] += count
+
+	def asDict(self):
+		return {
+			"bounds": list(self.bounds),
+			"counts": list(self.counts)
+		}
+
+
+class SerialProfiler(object):
+	"""
+	Profiles the communication with the printer by timestamping every line when it's about to be sent (enqueued),
+	once it has been written to the serial port and when its "ok" has been received. The firmware acknowledges lines
+	in order, so every "ok" belongs to the oldest line still waiting for one. That includes lines the firmware
+	requests to be resent, which get acknowledged together with the resend request.
+
+	From that the time of the communication is split into two parts: while lines are waiting for their "ok", the
+	host waits for the firmware. While no line is waiting for an "ok", the firmware waits for the host (reading the
+	file, processing, the serial line). Only time during a print (between :meth:`start` and :meth:`stop`) is split
+	like that, otherwise the printer is simply idle.
+
+	Everything is recorded per second, :meth:`getStatistics` returns histograms of round trip latency (write to
+	"ok"), host latency (enqueue to write), lines and bytes per second over the last ``window`` seconds. :meth:`stop`
+	returns the same for the whole print, together with the per second samples.
+	"""
+
+	# upper bounds of the buckets, in milliseconds for latencies
+	LATENCY_BOUNDS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+	LINE_RATE_BOUNDS = (5, 10, 20, 50, 100, 200, 500, 1000)
+	BYTE_RATE_BOUNDS = (100, 200, 500, 1000, 2000, 5000, 10000, 20000)
+
+	def __init__(self, window=60, clock=time.time):
+		self._window = window
+		self._clock = clock
+		self._mutex = threading.Lock()
+
+		self._slots = collections.deque()
+		self._outstanding = collections.deque()
+		self._enqueued = None
+
+		self._active = False
+		self._since = None
+		self._print = None
+
+	def start(self):
+		"""
+		Starts profiling a print, or continues after :meth:`pause`.
+		"""
+		with self._mutex:
+			now = self._clock()
+			# the seconds while paused don't count
+			self._getSlot(now)
+			self._active = True
+			self._since = now
+			if self._print is None:
+				self._print = _Slot(None)
+				self._print.start = now
+				self._print.samples = []
+
+	def pause(self):
+		"""
+		Pauses profiling a print, the time until :meth:`start` is called again is neither the host's nor the
+		firmware's.
+		"""
+		with self._mutex:
+			self._accountWaiting(self._clock())
+			self._active = False
+
+	def stop(self):
+		"""
+		Stops profiling a print, returns the statistics of the whole print or None if none was profiled.
+		"""
+		with self._mutex:
+			if self._print is None:
+				return None
+			now = self._clock()
+			self._accountWaiting(now)
+			self._active = False
+			if self._slots:
+				self._addSample(self._slots[-1])
+
+			summary = self._print
+			self._print = None
+
+			result = SerialProfiler._summarize([summary], now - summary.start)
+			lineRate = Histogram(SerialProfiler.LINE_RATE_BOUNDS)
+			byteRate = Histogram(SerialProfiler.BYTE_RATE_BOUNDS)
+			for second, lines, bytes, hostWaiting, firmwareWaiting in summary.samples:
+				lineRate.add(lines)
+				byteRate.add(bytes)
+			result["linesPerSecond"] = lineRate.asDict()
+			result["bytesPerSecond"] = byteRate.asDict()
+			result["start"] = summary.start
+			result["samples"] = summary.samples
+			return result
+
+	def enqueued(self, timestamp=None):
+		"""
+		Marks the moment (now unless ``timestamp`` is given) the host started to prepare the next line, unless that
+		already happened.
+		"""
+		with self._mutex:
+			if self._enqueued is None:
+				self._enqueued = timestamp if timestamp is not None else self._clock()
+
+	def written(self, length, lineNumber=None):
+		"""
+		Records a line of ``length`` bytes (with line number ``lineNumber``, if any) as written to the serial port.
+		"""
+		with self._mutex:
+			now = self._clock()
+			slot = self._getSlot(now)
+
+			if not self._outstanding:
+				self._accountWaiting(now)
+			self._outstanding.append((lineNumber, now))
+
+			if self._enqueued is not None:
+				slot.hostLatency.add((now - self._enqueued) * 1000)
+				self._enqueued = None
+			slot.lines += 1
+			slot.bytes += length
+
+	def acknowledged(self):
+		"""
+		Records an "ok" received from the printer.
+		"""
+		with self._mutex:
+			if not self._outstanding:
+				return
+
+			now = self._clock()
+			if len(self._outstanding) == 1:
+				self._accountWaiting(now)
+			lineNumber, written = self._outstanding.popleft()
+			self._getSlot(now).roundTrip.add((now - written) * 1000)
+
+	def getStatistics(self):
+		"""
+		Returns the statistics of the last ``window`` seconds.
+		"""
+		with self._mutex:
+			now = self._clock()
+			self._expire(now)
+			result = SerialProfiler._summarize(self._slots, self._window)
+			result["window"] = self._window
+			result["printing"] = self._active
+			result["waiting"] = len(self._outstanding)
+			return result
+
+	def _accountWaiting(self, now):
+		# the time since the last change between waiting for an "ok" and not waiting for one
+		if not self._active:
+			return
+		slot = self._getSlot(now)
+		if self._outstanding:
+			slot.hostWaiting += now - self._since
+		else:
+			slot.firmwareWaiting += now - self._since
+		self._since = now
+
+	def _getSlot(self, now):
+		second = int(now)
+		if not self._slots or self._slots[-1].second != second:
+			self._expire(now)
+			if self._active and self._slots:
+				# seconds without any traffic during a print count as well
+				for missing in range(max(self._slots[-1].second + 1, second - self._window + 1), second):
+					self._appendSlot(_Slot(missing))
+			self._appendSlot(_Slot(second))
+		return self._slots[-1]
+
+	def _appendSlot(self, slot):
+		self._slots.append(slot)
+		if self._print is not None and len(self._slots) > 1:
+			self._addSample(self._slots[-2])
+
+	def _addSample(self, slot):
+		self._print.merge(slot)
+		self._print.samples.append((slot.second, slot.lines, slot.bytes, round(slot.hostWaiting, 4), round(slot.firmwareWaiting, 4)))
+
+	def _expire(self, now):
+		while self._slots and self._slots[0].second <= now - self._window:
+			slot = self._slots.popleft()
+			if self._print is not None and not self._slots:
+				self._addSample(slot)
+
+	@staticmethod
+	def _summarize(slots, duration):
+		roundTrip = Histogram(SerialProfiler.LATENCY_BOUNDS)
+		hostLatency = Histogram(SerialProfiler.LATENCY_BOUNDS)
+		lineRate = Histogram(SerialProfiler.LINE_RATE_BOUNDS)
+		byteRate = Histogram(SerialProfiler.BYTE_RATE_BOUNDS)
+		lines = bytes = 0
+		hostWaiting = firmwareWaiting = 0.0
+
+		for slot in slots:
+			roundTrip.merge(slot.roundTrip)
+			hostLatency.merge(slot.hostLatency)
+			if slot.second is not None:
+				lineRate.add(slot.lines)
+				byteRate.add(slot.bytes)
+			lines += slot.lines
+			bytes += slot.bytes
+			hostWaiting += slot.hostWaiting
+			firmwareWaiting += slot.firmwareWaiting
+
+		return {
+			"roundTrip": roundTrip.asDict(),
+			"hostLatency": hostLatency.asDict(),
+			"linesPerSecond": lineRate.asDict(),
+			"bytesPerSecond": byteRate.asDict(),
+			"lines": lines,
+			"bytes": bytes,
+			"hostWaiting": hostWaiting,
+			"firmwareWaiting": firmwareWaiting,
+			"duration": duration
+		}
+
+
+class _Slot(object):
+	def __init__(self, second):
+		self.second = second
+		self.roundTrip = Histogram(SerialProfiler.LATENCY_BOUNDS)
+		self.hostLatency = Histogram(SerialProfiler.LATENCY_BOUNDS)
+		self.lines = 0
+		self.bytes = 0
+		self.hostWaiting = 0.0
+		self.firmwareWaiting = 0.0
+
+	def merge(self, other):
+		self.roundTrip.merge(other.roundTrip)
+		self.hostLatency.merge(other.hostLatency)
+		self.lines += other.lines
+		self.bytes += other.bytes
+		self.hostWaiting += other.hostWaiting
+		self.firmwareWaiting += other.firmwareWaiting
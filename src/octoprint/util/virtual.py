@@ -4,6 +4,7 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+import collections
 import time
 import os
 import re
@@ -12,12 +13,78 @@ import math
 
 from octoprint.settings import settings
 
+# how the emulated firmwares greet, acknowledge and request resends, selected via devel.virtualPrinter.firmware
+DIALECTS = {
+	"marlin": {
+		"greeting": ["start", "Marlin: Virtual Marlin!", "\x80", "SD init fail"], # no sd card as default startup scenario
+		"okWithLinenumber": False,
+		"repetierStyleTargetTemperature": False,
+		"lineNumberError": ["Error:Line Number is not Last Line Number+1, Last Line: %(last)d", "Resend: %(expected)d"],
+		"temperatureSuffix": " @:64",
+		"position": ["ok C: X:10.00 Y:3.20 Z:5.20 E:1.24"]
+	},
+	"repetier": {
+		"greeting": ["start", "FIRMWARE_NAME:Repetier_0.92 FIRMWARE_URL:https://github.com/repetier/Repetier-Firmware/ PROTOCOL_VERSION:1.0 MACHINE_TYPE:Virtual", "Free RAM:3000", "SD init fail"],
+		"okWithLinenumber": True,
+		"repetierStyleTargetTemperature": True,
+		"lineNumberError": ["Error:expected line %(expected)d got %(got)d", "Resend:%(expected)d"],
+		"temperatureSuffix": " @:64",
+		"position": ["X:10.00 Y:3.20 Z:5.20 E:1.24", "ok"]
+	},
+	"smoothie": {
+		"greeting": ["Smoothie", "ok"],
+		"okWithLinenumber": False,
+		"repetierStyleTargetTemperature": False,
+		"lineNumberError": ["rs N%(expected)d"],
+		"temperatureSuffix": " @0",
+		"position": ["ok C: X:10.0000 Y:3.2000 Z:5.2000"]
+	}
+}
+
 class VirtualPrinter():
+	"""
+	Emulates a printer on the ``VIRTUAL`` port.
+
+	Responses are queued together with the time they are due and handed out by ``readline`` once that time has come,
+	waiting on a condition instead of polling, so many virtual printers can run in one process. Timing is modelled on a
+	single timeline per printer: every received line takes ``processingTime`` seconds to be processed, moves then go
+	into a planner buffer of ``plannerBufferSize`` entries, each move taking ``moveTime`` seconds plus the time it
+	would take at its feedrate sped up ``moveSpeedup`` times (not at all if that's 0). A move is only acknowledged once
+	there's room for it in the buffer, ``M400`` and ``G4`` wait for the buffer to run empty. Without a planner buffer
+	(the default) all lines are acknowledged right after they were processed. Temperatures are only simulated when
+	they are needed, heatups (``M109``, ``M190``) block the firmware and report the temperature every second until
+	the target has been reached, just like the real thing.
+	"""
+
+	_regex_axis = re.compile("([XYZEF])([-+]?\d*\.?\d+)")
+
+	# how close to their targets heaters get, heatups are done once they are that close
+	_temperatureDelta = 0.5
+
 	def __init__(self):
-		self.readList = ['start\n', 'Marlin: Virtual Marlin!\n', '\x80\n', 'SD init fail\n'] # no sd card as default startup scenario
 		self.currentExtruder = 0
-		self.temp = [0.0] * settings().getInt(["devel", "virtualPrinter", "numExtruders"])
-		self.targetTemp = [0.0] * settings().getInt(["devel", "virtualPrinter", "numExtruders"])
+
+		self._numExtruders = settings().getInt(["devel", "virtualPrinter", "numExtruders"])
+		self._loadSettings()
+		settings().subscribe(["devel", "virtualPrinter"], self._onSettingsChanged)
+
+		self.timeout = 2.0
+
+		self._condition = threading.Condition()
+		self._received = collections.deque()
+		self._closed = False
+		self._lastDue = 0.0
+
+		# the time the firmware is done with everything received so far, and the times the buffered moves are done
+		self._due = time.time()
+		self._planner = collections.deque()
+
+		self._absolute = True
+		self._position = dict(X=0.0, Y=0.0, Z=0.0, E=0.0)
+		self._feedrate = 3000.0
+
+		self.temp = [0.0] * self._numExtruders
+		self.targetTemp = [0.0] * self._numExtruders
 		self.lastTempAt = time.time()
 		self.bedTemp = 1.0
 		self.bedTargetTemp = 1.0
@@ -31,26 +98,49 @@ class VirtualPrinter():
 		self._selectedSdFilePos = None
 		self._writingToSd = False
 		self._newSdFilePos = None
-		self._heatupThread = None
 
 		self.currentLine = 0
 		self.lastN = 0
 
-		waitThread = threading.Thread(target=self._sendWaitAfterTimeout)
-		waitThread.start()
+		for line in self._dialect["greeting"]:
+			self._send(line)
+
+		# firmwares in need of a kick to start talking send a "wait" after a while
+		self._waitAt = time.time() + 5
+
+	def _loadSettings(self):
+		s = settings()
+		self._dialect = DIALECTS.get(s.get(["devel", "virtualPrinter", "firmware"]), DIALECTS["marlin"])
+		self._okAfterResend = s.getBoolean(["devel", "virtualPrinter", "okAfterResend"])
+		self._forceChecksum = s.getBoolean(["devel", "virtualPrinter", "forceChecksum"])
+		self._okWithLinenumber = self._dialect["okWithLinenumber"] or s.getBoolean(["devel", "virtualPrinter", "okWithLinenumber"])
+		self._includeCurrentToolInTemps = s.getBoolean(["devel", "virtualPrinter", "includeCurrentToolInTemps"])
+		self._hasBed = s.getBoolean(["devel", "virtualPrinter", "hasBed"])
+		self._repetierStyleTargetTemperature = self._dialect["repetierStyleTargetTemperature"] or s.getBoolean(["devel", "virtualPrinter", "repetierStyleTargetTemperature"])
+		self._processingTime = s.getFloat(["devel", "virtualPrinter", "processingTime"])
+		self._plannerBufferSize = s.getInt(["devel", "virtualPrinter", "plannerBufferSize"])
+		self._moveTime = s.getFloat(["devel", "virtualPrinter", "moveTime"])
+		self._moveSpeedup = s.getFloat(["devel", "virtualPrinter", "moveSpeedup"])
+
+	def _onSettingsChanged(self, path, value):
+		# the number of extruders is structural and only taken into account on the next connect
+		self._loadSettings()
 
 	def write(self, data):
-		if self.readList is None:
-			return
-
-		data = data.strip()
+		with self._condition:
+			if self._closed:
+				return
+			self._due = max(time.time(), self._due) + self._processingTime
+			self._processLine(data.strip())
+			self._condition.notify_all()
 
+	def _processLine(self, data):
 		# strip checksum
 		if "*" in data:
 			data = data[:data.rfind("*")]
 			self.currentLine += 1
-		elif settings().getBoolean(["devel", "virtualPrinter", "forceChecksum"]):
-			self.readList.append("Error: Missing checksum")
+		elif self._forceChecksum:
+			self._send("Error: Missing checksum")
 			return
 
 		# track N = N + 1
@@ -64,18 +154,12 @@ class VirtualPrinter():
 			linenumber = int(re.search("N([0-9]+)", data).group(1))
 			expected = self.lastN + 1
 			if linenumber != expected:
-				self.readList.append("Error: expected line %d got %d" % (expected, linenumber))
-				self.readList.append("Resend:%d" % expected)
-				if settings().getBoolean(["devel", "virtualPrinter", "okAfterResend"]):
-					self.readList.append("ok")
+				self._requestResend(expected, linenumber)
 				return
 			elif self.currentLine == 100:
 				# simulate a resend at line 100 of the last 5 lines
 				self.lastN = 94
-				self.readList.append("Error: Line Number is not Last Line Number\n")
-				self.readList.append("rs %d\n" % (self.currentLine - 5))
-				if settings().getBoolean(["devel", "virtualPrinter", "okAfterResend"]):
-					self.readList.append("ok")
+				self._requestResend(self.currentLine - 5, linenumber)
 				return
 			else:
 				self.lastN = linenumber
@@ -91,6 +175,10 @@ class VirtualPrinter():
 			return
 
 		#print "Send: %s" % (data.rstrip())
+		if data.startswith("G"):
+			self._processMove(data)
+			return
+
 		if 'M104' in data or 'M109' in data:
 			self._parseHotendCommand(data)
 			return
@@ -106,7 +194,7 @@ class VirtualPrinter():
 				self._listSd()
 		elif 'M21' in data:
 			self._sdCardReady = True
-			self.readList.append("SD card ok")
+			self._send("SD card ok")
 		elif 'M22' in data:
 			self._sdCardReady = False
 		elif 'M23' in data:
@@ -139,36 +227,108 @@ class VirtualPrinter():
 				self._deleteSdFile(filename)
 		elif "M114" in data:
 			# send dummy position report
-			self.readList.append("ok C: X:10.00 Y:3.20 Z:5.20 E:1.24")
+			for line in self._dialect["position"]:
+				self._send(line)
 		elif "M117" in data:
 			# we'll just use this to echo a message, to allow playing around with pause triggers
-			self.readList.append("ok %s" % re.search("M117\s+(.*)", data).group(1))
+			self._send("ok %s" % re.search("M117\s+(.*)", data).group(1))
+		elif "M400" in data:
+			self._finishMoves()
+			self._sendOk()
 		elif "M999" in data:
 			# mirror Marlin behaviour
-			self.readList.append("Resend: 1")
+			self._send("Resend: 1")
 		elif data.startswith("T"):
 			self.currentExtruder = int(re.search("T(\d+)", data).group(1))
 			self._sendOk()
-			self.readList.append("Active Extruder: %d" % self.currentExtruder)
+			self._send("Active Extruder: %d" % self.currentExtruder)
 		elif len(data.strip()) > 0:
 			self._sendOk()
 
+	def _requestResend(self, expected, got):
+		for line in self._dialect["lineNumberError"]:
+			self._send(line % dict(expected=expected, got=got, last=expected - 1))
+		if self._okAfterResend:
+			self._send("ok")
+
+	def _processMove(self, data):
+		command = data.split(None, 1)[0]
+		if command in ("G0", "G1", "G2", "G3"):
+			self._plan(self._moveTime + self._moveDuration(data))
+		elif command == "G28":
+			for axis in ("X", "Y", "Z"):
+				self._position[axis] = 0.0
+			self._plan(self._moveTime)
+		elif command == "G4":
+			self._finishMoves()
+			dwell = re.search("([PS])(\d*\.?\d+)", data)
+			if dwell is not None:
+				self._due += float(dwell.group(2)) / (1000.0 if dwell.group(1) == "P" else 1.0)
+		elif command == "G90":
+			self._absolute = True
+		elif command == "G91":
+			self._absolute = False
+		elif command == "G92":
+			for axis, value in VirtualPrinter._regex_axis.findall(data):
+				if axis in self._position:
+					self._position[axis] = float(value)
+		self._sendOk()
+
+	def _moveDuration(self, data):
+		target = dict(self._position)
+		for axis, value in VirtualPrinter._regex_axis.findall(data):
+			if axis == "F":
+				self._feedrate = float(value)
+			elif self._absolute:
+				target[axis] = float(value)
+			else:
+				target[axis] += float(value)
+
+		distance = math.sqrt(sum((target[axis] - self._position[axis]) ** 2 for axis in ("X", "Y", "Z")))
+		if distance == 0:
+			distance = abs(target["E"] - self._position["E"])
+		self._position = target
+
+		if self._moveSpeedup <= 0 or self._feedrate <= 0:
+			return 0.0
+		return distance / (self._feedrate / 60.0) / self._moveSpeedup
+
+	def _plan(self, duration):
+		if self._plannerBufferSize <= 0:
+			return
+
+		while self._planner and self._planner[0] <= self._due:
+			self._planner.popleft()
+		if len(self._planner) >= self._plannerBufferSize:
+			# no room in the buffer, the "ok" has to wait until the oldest move is done
+			self._due = self._planner.popleft()
+		start = max(self._due, self._planner[-1]) if self._planner else self._due
+		self._planner.append(start + duration)
+
+	def _finishMoves(self):
+		if self._planner:
+			self._due = max(self._due, self._planner[-1])
+			self._planner.clear()
+
+	def _firmwareTime(self):
+		return max(self._due, time.time())
+
 	def _listSd(self):
-		self.readList.append("Begin file list")
+		self._send("Begin file list")
 		for osFile in os.listdir(self._virtualSd):
-			self.readList.append(osFile.upper())
-		self.readList.append("End file list")
+			self._send(osFile.upper())
+		self._send("End file list")
 		self._sendOk()
 
 	def _selectSdFile(self, filename):
-		file = os.path.join(self._virtualSd, filename).lower()
+		file = os.path.join(self._virtualSd, filename.lower())
 		if not os.path.exists(file) or not os.path.isfile(file):
-			self.readList.append("open failed, File: %s." % filename)
+			self._send("open failed, File: %s." % filename)
 		else:
 			self._selectedSdFile = file
 			self._selectedSdFileSize = os.stat(file).st_size
-			self.readList.append("File opened: %s  Size: %d" % (filename, self._selectedSdFileSize))
-			self.readList.append("File selected")
+			self._send("File opened: %s  Size: %d" % (filename, self._selectedSdFileSize))
+			self._send("File selected")
 
 	def _startSdPrint(self):
 		if self._selectedSdFile is not None:
@@ -187,38 +347,40 @@ class VirtualPrinter():
 
 	def _reportSdStatus(self):
 		if self._sdPrinter is not None and self._sdPrintingSemaphore.is_set:
-			self.readList.append("SD printing byte %d/%d" % (self._selectedSdFilePos, self._selectedSdFileSize))
+			self._send("SD printing byte %d/%d" % (self._selectedSdFilePos, self._selectedSdFileSize))
 		else:
-			self.readList.append("Not SD printing")
+			self._send("Not SD printing")
 
 	def _processTemperatureQuery(self):
-		includeTarget = not settings().getBoolean(["devel", "virtualPrinter", "repetierStyleTargetTemperature"])
+		self._simulateTemps()
+		includeTarget = not self._repetierStyleTargetTemperature
+		suffix = self._dialect["temperatureSuffix"]
 
 		# send simulated temperature data
-		if settings().getInt(["devel", "virtualPrinter", "numExtruders"]) > 1:
+		if self._numExtruders > 1:
 			allTemps = []
 			for i in range(len(self.temp)):
 				allTemps.append((i, self.temp[i], self.targetTemp[i]))
 			allTempsString = " ".join(map(lambda x: "T%d:%.2f /%.2f" % x if includeTarget else "T%d:%.2f" % (x[0], x[1]), allTemps))
 
-			if settings().getBoolean(["devel", "virtualPrinter", "hasBed"]):
+			if self._hasBed:
 				if includeTarget:
 					allTempsString = "B:%.2f /%.2f %s" % (self.bedTemp, self.bedTargetTemp, allTempsString)
 				else:
 					allTempsString = "B:%.2f %s" % (self.bedTemp, allTempsString)
 
-			if settings().getBoolean(["devel", "virtualPrinter", "includeCurrentToolInTemps"]):
+			if self._includeCurrentToolInTemps:
 				if includeTarget:
-					self.readList.append("ok T:%.2f /%.2f %s @:64\n" % (self.temp[self.currentExtruder], self.targetTemp[self.currentExtruder] + 1, allTempsString))
+					self._send("ok T:%.2f /%.2f %s%s" % (self.temp[self.currentExtruder], self.targetTemp[self.currentExtruder] + 1, allTempsString, suffix))
 				else:
-					self.readList.append("ok T:%.2f %s @:64\n" % (self.temp[self.currentExtruder], allTempsString))
+					self._send("ok T:%.2f %s%s" % (self.temp[self.currentExtruder], allTempsString, suffix))
 			else:
-				self.readList.append("ok %s @:64\n" % allTempsString)
+				self._send("ok %s%s" % (allTempsString, suffix))
 		else:
 			if includeTarget:
-				self.readList.append("ok T:%.2f /%.2f B:%.2f /%.2f @:64\n" % (self.temp[0], self.targetTemp[0], self.bedTemp, self.bedTargetTemp))
+				self._send("ok T:%.2f /%.2f B:%.2f /%.2f%s" % (self.temp[0], self.targetTemp[0], self.bedTemp, self.bedTargetTemp, suffix))
 			else:
-				self.readList.append("ok T:%.2f B:%.2f @:64\n" % (self.temp[0], self.bedTemp))
+				self._send("ok T:%.2f B:%.2f%s" % (self.temp[0], self.bedTemp, suffix))
 
 	def _parseHotendCommand(self, line):
 		tool = 0
@@ -229,52 +391,53 @@ class VirtualPrinter():
 			except:
 				pass
 
-		if tool >= settings().getInt(["devel", "virtualPrinter", "numExtruders"]):
+		if tool >= self._numExtruders:
 			self._sendOk()
 			return
 
+		# the new target only applies from the moment the firmware gets to it
+		self._simulateTemps(self._firmwareTime())
 		try:
 			self.targetTemp[tool] = float(re.search('S([0-9]+)', line).group(1))
 		except:
 			pass
 
 		if "M109" in line:
-			self._heatupThread = threading.Thread(target=self._waitForHeatup, args=["tool%d" % tool])
-			self._heatupThread.start()
+			self._waitForHeatup("tool%d" % tool)
 			return
 
 		self._sendOk()
 
-		if settings().getBoolean(["devel", "virtualPrinter", "repetierStyleTargetTemperature"]):
-			self.readList.append("TargetExtr%d:%d" % (tool, self.targetTemp[tool]))
+		if self._repetierStyleTargetTemperature:
+			self._send("TargetExtr%d:%d" % (tool, self.targetTemp[tool]))
 
 	def _parseBedCommand(self, line):
+		self._simulateTemps(self._firmwareTime())
 		try:
 			self.bedTargetTemp = float(re.search('S([0-9]+)', line).group(1))
 		except:
 			pass
 
 		if "M190" in line:
-			self._heatupThread = threading.Thread(target=self._waitForHeatup, args=["bed"])
-			self._heatupThread.start()
+			self._waitForHeatup("bed")
 			return
 
 		self._sendOk()
 
-		if settings().getBoolean(["devel", "virtualPrinter", "repetierStyleTargetTemperature"]):
-			self.readList.append("TargetBed:%d" % self.bedTargetTemp)
+		if self._repetierStyleTargetTemperature:
+			self._send("TargetBed:%d" % self.bedTargetTemp)
 
 	def _writeSdFile(self, filename):
-		file = os.path.join(self._virtualSd, filename).lower()
+		file = os.path.join(self._virtualSd, filename.lower())
 		if os.path.exists(file):
 			if os.path.isfile(file):
 				os.remove(file)
 			else:
-				self.readList.append("error writing to file")
+				self._send("error writing to file")
 
 		self._writingToSd = True
 		self._selectedSdFile = file
-		self.readList.append("Writing to file: %s" % filename)
+		self._send("Writing to file: %s" % filename)
 		self._sendOk()
 
 	def _finishSdFile(self):
@@ -298,33 +461,36 @@ class VirtualPrinter():
 				self._sdPrintingSemaphore.wait()
 
 				# set target temps
-				if 'M104' in line or 'M109' in line:
-					self._parseHotendCommand(line)
-				if 'M140' in line or 'M190' in line:
-					self._parseBedCommand(line)
+				with self._condition:
+					if 'M104' in line or 'M109' in line:
+						self._parseHotendCommand(line)
+					if 'M140' in line or 'M190' in line:
+						self._parseBedCommand(line)
 
 				time.sleep(0.01)
 
 		self._sdPrintingSemaphore.clear()
 		self._selectedSdFilePos = 0
 		self._sdPrinter = None
-		self.readList.append("Done printing file")
+		self._send("Done printing file", time.time())
 
 	def _waitForHeatup(self, heater):
-		delta = 0.5
-		delay = 1
+		# the firmware blocks until the heater is within delta of its target, reporting the temperature every second
+		delta = VirtualPrinter._temperatureDelta
+		self._finishMoves()
+		self._due = self._firmwareTime()
+		self._simulateTemps(self._due)
 		if heater.startswith("tool"):
 			toolNum = int(heater[len("tool"):])
-			while self.temp[toolNum] < self.targetTemp[toolNum] - delta or self.temp[toolNum] > self.targetTemp[toolNum] + delta:
-				self._simulateTemps()
-				self.readList.append("T:%0.2f /%0.2f" % (self.temp[toolNum], self.targetTemp[toolNum]))
-				time.sleep(delay)
-		elif heater == "bed":
-			while self.bedTemp < self.bedTargetTemp - delta or self.bedTemp > self.bedTargetTemp + delta:
-				self._simulateTemps()
-				self.readList.append("B:%0.2f /%0.2f" % (self.bedTemp, self.bedTargetTemp))
-				time.sleep(delay)
-		self.readList.append("ok")
+			temperature, target, report = self.temp[toolNum], self.targetTemp[toolNum], "T:%0.2f /%0.2f"
+		else:
+			temperature, target, report = self.bedTemp, self.bedTargetTemp, "B:%0.2f /%0.2f"
+
+		while temperature < target - delta or temperature > target + delta:
+			self._due += 1
+			temperature = VirtualPrinter._approach(temperature, target, 1)
+			self._send(report % (temperature, target))
+		self._send("ok")
 
 	def _deleteSdFile(self, filename):
 		f = os.path.join(self._virtualSd, filename)
@@ -332,53 +498,59 @@ class VirtualPrinter():
 			os.remove(f)
 		self._sendOk()
 
-	def _simulateTemps(self):
-		timeDiff = self.lastTempAt - time.time()
-		self.lastTempAt = time.time()
+	def _simulateTemps(self, now=None):
+		if now is None:
+			now = time.time()
+		timeDiff = now - self.lastTempAt
+		if timeDiff <= 0:
+			return
+		self.lastTempAt = now
 		for i in range(len(self.temp)):
-			if abs(self.temp[i] - self.targetTemp[i]) > 1:
-				oldVal = self.temp[i]
-				self.temp[i] += math.copysign(timeDiff * 10, self.targetTemp[i] - self.temp[i])
-				if math.copysign(1, self.targetTemp[i] - oldVal) != math.copysign(1, self.targetTemp[i] - self.temp[i]):
-					self.temp[i] = self.targetTemp[i]
-				if self.temp[i] < 0:
-					self.temp[i] = 0
-		if abs(self.bedTemp - self.bedTargetTemp) > 1:
-			oldVal = self.bedTemp
-			self.bedTemp += math.copysign(timeDiff * 10, self.bedTargetTemp - self.bedTemp)
-			if math.copysign(1, self.bedTargetTemp - oldVal) != math.copysign(1, self.bedTargetTemp - self.bedTemp):
-				self.bedTemp = self.bedTargetTemp
-			if self.bedTemp < 0:
-				self.bedTemp = 0
+			self.temp[i] = VirtualPrinter._approach(self.temp[i], self.targetTemp[i], timeDiff)
+		self.bedTemp = VirtualPrinter._approach(self.bedTemp, self.bedTargetTemp, timeDiff)
+
+	@staticmethod
+	def _approach(temperature, target, seconds):
+		# heaters change by 10°C per second until within delta of their target, same as M109/M190 wait for
+		if abs(temperature - target) <= VirtualPrinter._temperatureDelta:
+			return temperature
+		step = seconds * 10
+		if step >= abs(target - temperature):
+			return target
+		return max(0, temperature + math.copysign(step, target - temperature))
 
 	def readline(self):
-		if self.readList is None:
+		with self._condition:
+			deadline = time.time() + self.timeout if self.timeout is not None else None
+			while not self._closed:
+				now = time.time()
+				if self._received and self._received[0][0] <= now:
+					return self._received.popleft()[1]
+				if self._waitAt is not None and now >= self._waitAt:
+					self._waitAt = None
+					return "wait\n"
+				if deadline is not None and now >= deadline:
+					break
+
+				wakeups = [t for t in (self._received[0][0] if self._received else None, self._waitAt, deadline) if t is not None]
+				self._condition.wait(min(wakeups) - now if wakeups else None)
 			return ''
-		n = 0
-
-		self._simulateTemps()
-
-		while len(self.readList) < 1:
-			time.sleep(0.1)
-			n += 1
-			if n == 20:
-				return ''
-			if self.readList is None:
-				return ''
-		time.sleep(0.001)
-		return self.readList.pop(0)
 
 	def close(self):
-		self.readList = None
+		settings().unsubscribe(["devel", "virtualPrinter"], self._onSettingsChanged)
+		with self._condition:
+			self._closed = True
+			self._condition.notify_all()
+
+	def _send(self, line, due=None):
+		# responses are received in order, never before the firmware is done with what it received so far
+		with self._condition:
+			self._lastDue = max(self._lastDue, due if due is not None else self._due)
+			self._received.append((self._lastDue, line.rstrip("\n") + "\n"))
+			self._condition.notify_all()
 
 	def _sendOk(self):
-		if settings().getBoolean(["devel", "virtualPrinter", "okWithLinenumber"]):
-			self.readList.append("ok %d" % self.lastN)
+		if self._okWithLinenumber:
+			self._send("ok %d" % self.lastN)
 		else:
-			self.readList.append("ok")
-
-	def _sendWaitAfterTimeout(self, timeout=5):
-		time.sleep(timeout)
-		if self.readList is not None:
-			self.readList.append("wait")
-
+			self._send("ok")
@@ -939,8 +939,13 @@ def remove_interface_stanza(interface, lines):
 
 class WifiManager(object):
 
-    def __init__(self, printer):
-        self._printer = printer
+    def __init__(self, printerRegistry):
+        self._printerRegistry = printerRegistry
+
+
+    def _isAnyPrinterPrinting(self):
+        # changing the network under any running print would cut off its clients
+        return any(printer.isPrinting() for printer in self._printerRegistry.getAll())
 
 
     def interfaceIP(self, interface):
@@ -1082,7 +1087,7 @@ class WifiManager(object):
         settingsDict['wifiInterface'] = interface
         settingsDict['wifiEnabled'] = enabled
         settingsDict['wifiIPAddress'] = self.interfaceIP(interface)
-        settingsDict['printerIsPrinting'] = self._printer.isPrinting()
+        settingsDict['printerIsPrinting'] = self._isAnyPrinterPrinting()
         settingsDict['wifiNoneSelected'] = noneSelected
         settingsDict['wifiSelectedSSID'] = selectedSSID
         settingsDict['wifiPasskey'] = passkey
@@ -1109,7 +1114,7 @@ class WifiManager(object):
         responseDict = {
             'wifiInterface': interface,
             'wifiIPAddress': self.interfaceIP(interface),
-            'printerIsPrinting': self._printer.isPrinting(),
+            'printerIsPrinting': self._isAnyPrinterPrinting(),
             'wifiNeedsEnabled': wifiNeedsEnabled
         }
 
@@ -1172,7 +1177,7 @@ class WifiManager(object):
         responseDict = {
             'wifiInterface': interface,
             'wifiIPAddress': self.interfaceIP(interface),
-            'printerIsPrinting': self._printer.isPrinting(),
+            'printerIsPrinting': self._isAnyPrinterPrinting(),
             'wifiNeedsChangeFlags': {
                 'needsWifiDisabled': needsWifiDisabled,
                 'needsWifiConnect': needsWifiConnect,
@@ -1206,7 +1211,7 @@ class WifiManager(object):
             'wifiInterface': interface,
             'wifiEnabled': self.isInterfaceEnabled(interface),
             'wifiIPAddress': self.interfaceIP(interface),
-            'printerIsPrinting': self._printer.isPrinting()
+            'printerIsPrinting': self._isAnyPrinterPrinting()
         }
 
         print 'WifiManager.setEnabled(): response dict: {}.\n'.format(responseDict)
@@ -1282,7 +1287,7 @@ class WifiManager(object):
             'wifiInterface': interface,
             'wifiEnabled': self.isInterfaceEnabled(interface),
             'wifiIPAddress': ipAddress,
-            'printerIsPrinting': self._printer.isPrinting(),
+            'printerIsPrinting': self._isAnyPrinterPrinting(),
             'wifiSettingsChangeResultFlags': {
                 'succeeded': succeeded,
                 'invalidRequest': (not validRequest),
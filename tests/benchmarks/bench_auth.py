@@ -0,0 +1,108 @@
+# coding=utf-8
+"""
+Benchmarks API key authentication.
+
+Measures the apikey lookup in FilebasedUserManager (linear scan over all users vs. the apikey index) and a full
+request against an endpoint protected by restricted_access with a user's API key, once with the principal cache
+disabled and once with it enabled.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_auth.py
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import shutil
+import sys
+import tempfile
+import timeit
+
+basedir = tempfile.mkdtemp()
+
+from octoprint.settings import settings
+settings(init=True, basedir=basedir)
+settings().setBoolean(["server", "firstRun"], False)
+settings().setBoolean(["api", "enabled"], True)
+
+from flask.ext.login import LoginManager
+
+import octoprint.server
+from octoprint.server import app, restricted_access, load_user
+from octoprint.users import FilebasedUserManager, User
+
+ROUNDS = 2000
+REQUESTS = 500
+
+
+def _linearFindUser(userManager, apikey):
+	# the pre-index implementation
+	for user in userManager._users.values():
+		if apikey == user._apikey:
+			return user
+	return None
+
+
+class _DisabledPrincipalCache(object):
+	def get(self, apikey):
+		return None
+
+	def getGeneration(self):
+		return None
+
+	def put(self, apikey, user, identity, generation):
+		pass
+
+
+@app.route("/bench/auth")
+@restricted_access
+def _benchAuth():
+	return "ok"
+
+
+def run():
+	userManager = FilebasedUserManager()
+	octoprint.server.userManager = userManager
+
+	# same setup as in Server.run
+	app.secret_key = "benchmark"
+	loginManager = LoginManager()
+	loginManager.session_protection = "strong"
+	loginManager.user_callback = load_user
+	loginManager.init_app(app)
+
+	for userCount in (10, 100, 1000):
+		userManager._users.clear()
+		for i in range(userCount):
+			username = "user%d" % i
+			apikey = "KEY%08d" % i
+			userManager._users[username] = User(username, "", True, ["user"], apikey)
+		userManager._rebuildApikeyIndex()
+		lastKey = "KEY%08d" % (userCount - 1)
+
+		linear = timeit.timeit(lambda: _linearFindUser(userManager, lastKey), number=ROUNDS) / ROUNDS
+		indexed = timeit.timeit(lambda: userManager.findUser(apikey=lastKey), number=ROUNDS) / ROUNDS
+		print("%5d users, findUser(apikey) linear scan: %8.3f us" % (userCount, linear * 1000 * 1000))
+		print("%5d users, findUser(apikey) index:       %8.3f us" % (userCount, indexed * 1000 * 1000))
+
+	client = app.test_client()
+	url = "/bench/auth?apikey=%s" % lastKey
+	assert client.get(url).status_code == 200
+
+	# octoprint.server shadows its util submodule with octoprint.util
+	serverUtil = sys.modules["octoprint.server.util"]
+	cache = serverUtil._principalCache
+	serverUtil._principalCache = _DisabledPrincipalCache()
+	uncached = timeit.timeit(lambda: client.get(url), number=REQUESTS) / REQUESTS
+	serverUtil._principalCache = cache
+	cached = timeit.timeit(lambda: client.get(url), number=REQUESTS) / REQUESTS
+	print("request with apikey, no principal cache:   %8.3f ms" % (uncached * 1000))
+	print("request with apikey, principal cache:      %8.3f ms" % (cached * 1000))
+
+
+if __name__ == "__main__":
+	try:
+		run()
+	finally:
+		shutil.rmtree(basedir)
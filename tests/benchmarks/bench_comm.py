@@ -0,0 +1,233 @@
+# coding=utf-8
+"""
+Benchmarks printing through the communication layer, to catch performance regressions in ``comm.py``.
+
+Prints gcode corpora through a ``Printer`` and its ``MachineCom`` into a ``ReplayTransport`` (the ``REPLAY`` port),
+which answers every line from the built-in recording of a Marlin, delayed by a latency model. Unlike the virtual
+printer the replay doesn't add any delays of its own, so with no latency at all the host is the only limit. The
+corpora are generated deterministically:
+
+* perimeters: short extruding moves around circles, like slicers produce for round parts,
+* infill: long straight extruding moves back and forth with travel moves in between,
+* mixed: both of them with comments, retractions, layer changes, fan and temperature commands,
+
+any gcode files given on the command line are printed as well. Reported for every corpus are the lines per second,
+the CPU time of the whole process (all threads) per line, the growth of the peak memory usage (resident set size)
+and the latency of the push updates, the time from the first change of the printer state to the update reaching a
+registered callback. Push updates are rate limited to one every 0.5s, so their latency can't be any lower than that.
+
+The latency model is either ``fixed:<seconds>`` or ``serial:<baud rate>:<seconds of processing per line>``, optionally
+followed by ``:<seconds of jitter>``. The default of ``fixed:0`` measures the host alone.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_comm.py [number of lines] [latency model] [gcode files...]
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import math
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from mock import Mock
+
+basedir = tempfile.mkdtemp()
+
+from octoprint.settings import settings
+settings(init=True, basedir=basedir)
+
+from octoprint.events import eventManager, Events
+from octoprint.printer import Printer
+
+
+class _BenchCallback(object):
+	def sendCurrentData(self, data):
+		pass
+
+	def sendHistoryData(self, data):
+		pass
+
+	def addTemperature(self, data):
+		pass
+
+	def addLog(self, data):
+		pass
+
+	def addMessage(self, data):
+		pass
+
+	def sendEvent(self, type):
+		pass
+
+
+def _perimeters(count):
+	lines = ["G28\n", "G92 E0\n", "G1 Z0.2 F1200\n"]
+	e = 0.0
+	for i in range(count - len(lines)):
+		angle = math.radians(3 * i)
+		radius = 5 + (i // 120) % 40
+		e += 0.03
+		lines.append("G1 X%.3f Y%.3f E%.5f\n" % (100 + radius * math.cos(angle), 100 + radius * math.sin(angle), e))
+	return lines
+
+
+def _infill(count):
+	lines = ["G28\n", "G92 E0\n", "G1 Z0.2 F1200\n"]
+	e = 0.0
+	y = 50.0
+	while len(lines) < count:
+		y = 50.0 + (len(lines) // 2) % 100 * 0.4
+		e += 3.2
+		lines.append("G1 X50.000 Y%.3f F9000\n" % y)
+		lines.append("G1 X150.000 Y%.3f E%.5f F2400\n" % (y, e))
+	return lines[:count]
+
+
+def _mixed(count):
+	lines = ["; generated for benchmarking\n", "M104 S210\n", "M140 S60\n", "G28 ; home all axes\n", "G92 E0\n"]
+	e = 0.0
+	layer = 0
+	while len(lines) < count:
+		layer += 1
+		lines.extend(["; layer %d\n" % layer, "G1 E%.5f F2400 ; retract\n" % (e - 1), "G1 Z%.3f F1200\n" % (0.2 * layer), "G1 E%.5f F2400\n" % e])
+		if layer == 2:
+			lines.append("M106 S255\n")
+		for i in range(90):
+			angle = math.radians(4 * i)
+			e += 0.04
+			lines.append("G1 X%.3f Y%.3f E%.5f F1800\n" % (100 + 20 * math.cos(angle), 100 + 20 * math.sin(angle), e))
+		for i in range(40):
+			e += 1.3
+			lines.append("G1 X%.3f Y%.3f E%.5f F3600\n" % (85 if i % 2 else 115, 85 + i * 0.75, e))
+		if layer % 10 == 0:
+			lines.append("M105\n")
+	lines = lines[:count]
+	lines.append("M104 S0\n")
+	return lines
+
+
+class _PushLatency(object):
+	"""
+	Measures the time from the first change of the printer state since the last push update until the next one.
+	"""
+
+	def __init__(self, stateMonitor):
+		self.latencies = []
+		self._since = None
+
+		changed = stateMonitor._changed
+		update = stateMonitor._update
+
+		def _changed():
+			if self._since is None:
+				self._since = time.time()
+			changed()
+
+		def _update():
+			since = self._since
+			self._since = None
+			update()
+			if since is not None:
+				self.latencies.append(time.time() - since)
+
+		stateMonitor._changed = _changed
+		stateMonitor._update = _update
+
+	def reset(self):
+		self.latencies = []
+
+	def getStatistics(self):
+		if not self.latencies:
+			return 0, 0.0, 0.0
+		latencies = sorted(self.latencies)
+		return len(latencies), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def _print(printer, path, done, pushLatency):
+	with open(path) as f:
+		lines = sum(1 for _ in f)
+
+	done.clear()
+	printer.selectFile(path, False)
+	pushLatency.reset()
+
+	start = time.time()
+	usage = resource.getrusage(resource.RUSAGE_SELF)
+	printer.startPrint()
+	done.wait()
+	duration = time.time() - start
+	after = resource.getrusage(resource.RUSAGE_SELF)
+
+	cpu = (after.ru_utime - usage.ru_utime) + (after.ru_stime - usage.ru_stime)
+	return lines, duration, cpu, after.ru_maxrss - usage.ru_maxrss
+
+
+def main():
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+	model = sys.argv[2].split(":") if len(sys.argv) > 2 else ["fixed", "0"]
+	files = sys.argv[3:]
+
+	latency = {"model": model[0], "jitter": 0.0}
+	if model[0] == "serial":
+		latency.update({"baudrate": int(model[1]), "processing": float(model[2])})
+		if len(model) > 3:
+			latency["jitter"] = float(model[3])
+	else:
+		latency["latency"] = float(model[1])
+		if len(model) > 2:
+			latency["jitter"] = float(model[2])
+
+	s = settings()
+	s.setBoolean(["devel", "replay", "enabled"], True)
+	s.set(["devel", "replay", "latency"], latency)
+	s.setFloat(["serial", "timeout", "connection"], 0.1)
+	s.setBoolean(["feature", "sdSupport"], False)
+
+	corpora = []
+	for name, generate in (("perimeters", _perimeters), ("infill", _infill), ("mixed", _mixed)):
+		path = os.path.join(basedir, name + ".gcode")
+		with open(path, "w") as f:
+			f.writelines(generate(count))
+		corpora.append((name, path))
+	for path in files:
+		corpora.append((os.path.basename(path), os.path.abspath(path)))
+
+	connected = threading.Event()
+	done = threading.Event()
+	eventManager().subscribe(Events.CONNECTED, lambda event, payload: connected.set())
+	eventManager().subscribe(Events.PRINT_DONE, lambda event, payload: done.set())
+
+	gcodeManager = Mock()
+	gcodeManager.getFileData.return_value = None
+	gcodeManager.getFileMetadata.return_value = dict()
+	printer = Printer(gcodeManager)
+	callback = _BenchCallback()
+	printer.registerCallback(callback)
+	pushLatency = _PushLatency(printer._stateMonitor)
+
+	printer.connect(port="REPLAY", baudrate=115200)
+	if not connected.wait(10):
+		print("Could not connect to the replayed printer")
+		return
+
+	print("Latency model: %s" % ":".join(model))
+	print("%-16s %8s %10s %12s %12s %8s %14s %14s" % ("corpus", "lines", "seconds", "lines/s", "cpu us/line", "kB", "pushes", "push ms p50/95"))
+	try:
+		for name, path in corpora:
+			lines, duration, cpu, memory = _print(printer, path, done, pushLatency)
+			pushes, median, percentile = pushLatency.getStatistics()
+			print("%-16s %8d %10.2f %12.1f %12.1f %8d %14d %7.0f/%-6.0f" % (name, lines, duration, lines / duration, cpu / lines * 1000000, memory, pushes, median * 1000, percentile * 1000))
+	finally:
+		printer.disconnect()
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,145 @@
+# coding=utf-8
+"""
+Benchmarks downloads served by LargeResponseHandler.
+
+Downloads a large file through the previous implementation (reading 16 KB chunks and writing them all out in one go)
+and the current flow controlled one, measuring throughput and how late a timer scheduled every 10ms on the same
+IOLoop fires during the download, as a measure of how much other clients (e.g. the SockJS push) are starved.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_downloads.py [size in MB]
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import httplib
+import os
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.web import Application
+
+from octoprint.server.util import LargeResponseHandler
+
+PROBE_INTERVAL = 0.01
+
+
+class _LegacyLargeResponseHandler(LargeResponseHandler):
+	# the previous implementation of the body transfer, without flow control
+	def get(self, path, include_body=True):
+		with open(os.path.join(self.root, path), "rb") as file:
+			while True:
+				data = file.read(16 * 1024)
+				if not data:
+					break
+				self.write(data)
+				self.flush()
+
+
+class _LatencyProbe(object):
+	def __init__(self, ioloop):
+		self._ioloop = ioloop
+		self._delays = []
+		self._running = False
+
+	def start(self):
+		self._delays = []
+		self._running = True
+		self._schedule()
+
+	def stop(self):
+		self._running = False
+		return self._delays
+
+	def _schedule(self):
+		expected = time.time() + PROBE_INTERVAL
+		self._ioloop.add_timeout(expected, lambda: self._fire(expected))
+
+	def _fire(self, expected):
+		self._delays.append(time.time() - expected)
+		if self._running:
+			self._schedule()
+
+
+def _freePort():
+	s = socket.socket()
+	s.bind(("127.0.0.1", 0))
+	port = s.getsockname()[1]
+	s.close()
+	return port
+
+
+def _download(port, path):
+	connection = httplib.HTTPConnection("127.0.0.1", port)
+	connection.request("GET", path)
+	response = connection.getresponse()
+	received = 0
+	while True:
+		data = response.read(64 * 1024)
+		if not data:
+			break
+		received += len(data)
+	connection.close()
+	return received
+
+
+def run(sizeMb):
+	basedir = tempfile.mkdtemp()
+	try:
+		size = sizeMb * 1024 * 1024
+		with open(os.path.join(basedir, "large.gcode"), "wb") as f:
+			line = "G1 X100.000 Y100.000 E1.23456 F1800\n"
+			f.write(line * (size / len(line)))
+		size = os.path.getsize(os.path.join(basedir, "large.gcode"))
+
+		ioloop = IOLoop.instance()
+		application = Application([
+			(r"/legacy/(.*)", _LegacyLargeResponseHandler, {"path": basedir}),
+			(r"/current/(.*)", LargeResponseHandler, {"path": basedir})
+		])
+		port = _freePort()
+		server = HTTPServer(application)
+		server.listen(port, address="127.0.0.1")
+
+		thread = threading.Thread(target=ioloop.start)
+		thread.daemon = True
+		thread.start()
+
+		probe = _LatencyProbe(ioloop)
+		for name in ("legacy", "current"):
+			ioloop.add_callback(probe.start)
+			time.sleep(0.1)
+
+			start = time.time()
+			received = _download(port, "/%s/large.gcode" % name)
+			duration = time.time() - start
+
+			delays = []
+			ioloop.add_callback(lambda: delays.extend(probe.stop()))
+			time.sleep(0.1)
+			assert received == size, "%s: received %d of %d bytes" % (name, received, size)
+
+			print("%-8s %6.1f MB/s, timer delay avg %7.2f ms, max %8.2f ms" % (
+				name,
+				size / duration / 1024 / 1024,
+				sum(delays) / len(delays) * 1000 if delays else 0,
+				max(delays) * 1000 if delays else 0
+			))
+		print("peak RSS: %d MB (includes the legacy run buffering the whole file)" % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+		ioloop.add_callback(ioloop.stop)
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
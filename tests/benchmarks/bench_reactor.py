@@ -0,0 +1,149 @@
+# coding=utf-8
+"""
+Benchmarks monitoring many printers from one process, once with a monitor thread per connection and once with all
+connections multiplexed on the shared serial reactor.
+
+Every printer is a pseudo terminal whose other end is served by a forked process answering like a minimal firmware
+("ok" for every line, with temperatures for M105). Each printer prints the same generated gcode file, so every
+acknowledged line makes the host send the next one. Reported are the wall time, the lines per second acknowledged
+over all printers, the CPU time the host process used and the number of threads it ran.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_reactor.py [number of printers] [number of lines]
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import os
+import pty
+import resource
+import select
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+basedir = tempfile.mkdtemp()
+
+from octoprint.settings import settings
+settings(init=True, basedir=basedir)
+
+from octoprint.util.comm import MachineCom, MachineComPrintCallback
+
+
+class _BenchCallback(MachineComPrintCallback):
+	def __init__(self):
+		self.operational = threading.Event()
+		self.done = threading.Event()
+		self._printing = False
+
+	def mcStateChange(self, state):
+		if state == MachineCom.STATE_OPERATIONAL:
+			self.operational.set()
+			if self._printing:
+				self.done.set()
+		elif state == MachineCom.STATE_PRINTING:
+			self._printing = True
+
+	def mcPrintjobDone(self):
+		pass
+
+
+def _respond(masters):
+	# minimal firmware for all printers, runs in its own process
+	poller = select.poll()
+	buffers = dict()
+	for master in masters:
+		poller.register(master, select.POLLIN)
+		buffers[master] = ""
+
+	while buffers:
+		for master, mask in poller.poll():
+			try:
+				data = os.read(master, 4096)
+			except OSError:
+				data = ""
+			if not data:
+				poller.unregister(master)
+				del buffers[master]
+				continue
+
+			lines = (buffers[master] + data).split("\n")
+			buffers[master] = lines.pop()
+			response = "".join("ok T:21.0 /0.0 B:20.0 /0.0\n" if "M105" in line else "ok\n" for line in lines if line.strip())
+			if response:
+				os.write(master, response)
+	os._exit(0)
+
+
+def _bench(printerCount, path, useReactor):
+	settings().setBoolean(["serial", "reactor"], useReactor)
+
+	masters = []
+	slaves = []
+	for _ in range(printerCount):
+		master, slave = pty.openpty()
+		masters.append(master)
+		# kept open until the end, reading the master fails while no slave is open
+		slaves.append(slave)
+
+	pid = os.fork()
+	if pid == 0:
+		for slave in slaves:
+			os.close(slave)
+		_respond(masters)
+	for master in masters:
+		os.close(master)
+
+	callbacks = [_BenchCallback() for _ in range(printerCount)]
+	comms = [MachineCom(os.ttyname(slave), 115200, callback) for slave, callback in zip(slaves, callbacks)]
+	for callback in callbacks:
+		callback.operational.wait()
+
+	cpuStart = resource.getrusage(resource.RUSAGE_SELF)
+	start = time.time()
+	for comm in comms:
+		comm.selectFile(path, False)
+		comm.startPrint()
+	threads = threading.active_count()
+	for callback in callbacks:
+		callback.done.wait()
+	duration = time.time() - start
+	cpuEnd = resource.getrusage(resource.RUSAGE_SELF)
+
+	for comm in comms:
+		comm.close()
+	for slave in slaves:
+		os.close(slave)
+	os.waitpid(pid, 0)
+
+	cpu = (cpuEnd.ru_utime - cpuStart.ru_utime) + (cpuEnd.ru_stime - cpuStart.ru_stime)
+	return duration, cpu, threads
+
+
+def main():
+	printerCount = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+	lineCount = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+	# answer connection attempts quickly, the printers don't send a "start" on their own
+	settings().setFloat(["serial", "timeout", "connection"], 0.1)
+
+	path = os.path.join(basedir, "bench.gcode")
+	with open(path, "wb") as f:
+		for i in range(lineCount):
+			f.write("G1 X%.3f Y%.3f E%.5f\n" % (i % 200, (i * 7) % 200, i * 0.01))
+
+	print("%d printers, %d lines each" % (printerCount, lineCount))
+	try:
+		for name, useReactor in (("thread per connection", False), ("shared reactor", True)):
+			duration, cpu, threads = _bench(printerCount, path, useReactor)
+			print("%-22s %6.2fs  %8.0f lines/s  %6.2fs cpu  %4d threads" % (name, duration, printerCount * lineCount / duration, cpu, threads))
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,168 @@
+# coding=utf-8
+"""
+Benchmarks transferring a file to the printer's SD card (M28), once waiting for the "ok" to every line before sending
+the next one and once with windowed sending (``serial.sdTransfer.windowed``), which keeps the receive buffer of the
+firmware filled.
+
+Two printers are used. The virtual printer writes every line to its SD folder via ``VirtualPrinter._writeSdFile``
+just like before, it answers instantly but only hands out one line per ``readline``. The emulated printer is a pseudo
+terminal served by a forked process that stores the lines like the virtual printer does, but models a serial line:
+a line arrives once its bytes have passed the line at the configured baud rate, its "ok" is received a fixed latency
+(USB frame, firmware loop) after that. Reported are the duration and the throughput of each transfer. At low baud
+rates the serial line itself is the limit either way, the higher the baud rate and the latency the more the window
+pays off.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_sd_transfer.py [number of lines] [baud rate] [latency in ms]
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import heapq
+import os
+import pty
+import select
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+basedir = tempfile.mkdtemp()
+
+from octoprint.settings import settings
+settings(init=True, basedir=basedir)
+
+from octoprint.util.comm import MachineCom, MachineComPrintCallback
+
+
+class _BenchCallback(MachineComPrintCallback):
+	def __init__(self):
+		self.operational = threading.Event()
+		self.done = threading.Event()
+
+	def mcStateChange(self, state):
+		if state == MachineCom.STATE_OPERATIONAL:
+			self.operational.set()
+
+	def mcFileTransferDone(self, filename):
+		self.done.set()
+
+
+def _emulate(master, path, baudrate, latency):
+	# firmware storing everything between M28 and M29 in a file, runs in its own process
+	secondsPerByte = 10.0 / baudrate
+	linkFree = 0.0
+	responses = []
+	buffer = ""
+	sdFile = None
+
+	poller = select.poll()
+	poller.register(master, select.POLLIN)
+	while True:
+		timeout = max(0, (responses[0][0] - time.time()) * 1000) if responses else -1
+		if poller.poll(timeout):
+			try:
+				data = os.read(master, 4096)
+			except OSError:
+				data = ""
+			if not data:
+				break
+
+			now = time.time()
+			lines = (buffer + data).split("\n")
+			buffer = lines.pop()
+			for line in lines:
+				# the line has been received completely once all of its bytes have passed the serial line
+				linkFree = max(now, linkFree) + (len(line) + 1) * secondsPerByte
+
+				if "*" in line:
+					line = line[:line.rfind("*")]
+				if line.startswith("N"):
+					line = line.split(None, 1)[1] if " " in line else ""
+
+				if sdFile is not None and not "M29" in line:
+					sdFile.write(line + "\n")
+					response = "ok\n"
+				elif "M28" in line:
+					sdFile = open(path, "w")
+					response = "Writing to file: %s\nok\n" % line.split(None, 1)[1]
+				elif "M29" in line:
+					sdFile.close()
+					sdFile = None
+					response = "Done saving file.\nok\n"
+				elif "M20" in line:
+					response = "Begin file list\nEnd file list\nok\n"
+				elif "M105" in line:
+					response = "ok T:21.0 /0.0 B:20.0 /0.0\n"
+				else:
+					response = "ok\n"
+				heapq.heappush(responses, (linkFree + latency, len(responses), response))
+
+		now = time.time()
+		while responses and responses[0][0] <= now:
+			os.write(master, heapq.heappop(responses)[2])
+	os._exit(0)
+
+
+def _transfer(port, path, windowed):
+	settings().setBoolean(["serial", "sdTransfer", "windowed"], windowed)
+
+	callback = _BenchCallback()
+	comm = MachineCom(port, 115200, callback)
+	callback.operational.wait()
+	comm.sendCommand("M21")
+	time.sleep(0.5)
+
+	start = time.time()
+	comm.startFileTransfer(path, "bench.gcode", "bench.gco")
+	callback.done.wait()
+	duration = time.time() - start
+
+	comm.close()
+	return duration
+
+
+def main():
+	lineCount = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+	baudrate = int(sys.argv[2]) if len(sys.argv) > 2 else 250000
+	latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.004
+
+	# answer connection attempts quickly, the printers don't send a "start" on their own
+	settings().setFloat(["serial", "timeout", "connection"], 0.1)
+	settings().setBoolean(["feature", "sdSupport"], True)
+	# the virtual printer requests a resend at line 100, answer that like Marlin does
+	settings().setBoolean(["devel", "virtualPrinter", "okAfterResend"], True)
+
+	path = os.path.join(basedir, "bench.gcode")
+	with open(path, "wb") as f:
+		for i in range(lineCount):
+			f.write("G1 X%.3f Y%.3f E%.5f ; move %d\n" % (i % 200, (i * 7) % 200, i * 0.01, i))
+	size = os.path.getsize(path)
+
+	print("%d lines, %d bytes, emulated printer at %d baud with %.1fms latency" % (lineCount, size, baudrate, latency * 1000))
+	try:
+		master, slave = pty.openpty()
+		tty.setraw(slave)
+		pid = os.fork()
+		if pid == 0:
+			os.close(slave)
+			_emulate(master, os.path.join(basedir, "emulated.gco"), baudrate, latency)
+		os.close(master)
+
+		for printer, port in (("virtual", "VIRTUAL"), ("emulated", os.ttyname(slave))):
+			for name, windowed in (("line by line", False), ("windowed", True)):
+				duration = _transfer(port, path, windowed)
+				print("%-9s %-13s %7.2fs  %8.0f bytes/s  %7.0f lines/s" % (printer, name, duration, size / duration, lineCount / duration))
+
+		os.close(slave)
+		os.waitpid(pid, 0)
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
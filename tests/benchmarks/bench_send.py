@@ -0,0 +1,114 @@
+# coding=utf-8
+"""
+Benchmarks the host CPU time spent on sending lines of a print job to the printer.
+
+Runs the lines of a generated gcode file through the send path of MachineCom (gcode handlers, line numbering, framing
+with checksum, line history, logging) into a serial port that discards everything, once through the previous
+implementation (checksum calculated via reduce and a lambda per character, line framed twice) and once through the
+current one. Also measures the checksum calculation alone.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_send.py [number of lines]
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import logging
+import re
+import sys
+import threading
+import time
+
+from octoprint.settings import settings
+settings(init=True)
+
+from octoprint.util.comm import MachineCom, MachineComPrintCallback, LineHistory, ResendStatistics, checksum
+
+
+class _NullSerial(object):
+	def write(self, data):
+		pass
+
+
+class _BenchMachineCom(MachineCom):
+	def __del__(self):
+		# never opened anything that would need to be closed
+		pass
+
+
+class _LegacyMachineCom(_BenchMachineCom):
+	# the previous implementation of framing lines
+	def _doSend(self, cmd, sendChecksum=False):
+		if sendChecksum or self._alwaysSendChecksum:
+			lineNumber = self._currentLine
+			self._lineHistory.append(lineNumber, cmd)
+			self._currentLine += 1
+			self._doSendWithChecksum(cmd, lineNumber)
+		else:
+			self._doSendWithoutChecksum(cmd)
+
+	def _doSendWithChecksum(self, cmd, lineNumber):
+		self._logger.debug("Sending cmd '%s' with lineNumber %r" % (cmd, lineNumber))
+
+		commandToSend = "N%d %s" % (lineNumber, cmd)
+		checksum = reduce(lambda x,y:x^y, map(ord, commandToSend))
+		commandToSend = "%s*%d" % (commandToSend, checksum)
+		self._doSendWithoutChecksum(commandToSend)
+
+	def _doSendWithoutChecksum(self, cmd):
+		self._log("Send: %s" % cmd)
+		self._serial.write(cmd + '\n')
+
+
+def _createComm(clazz):
+	# bypasses the constructor, which would open the serial port and start monitoring it
+	comm = clazz.__new__(clazz)
+	comm._logger = logging.getLogger("bench")
+	comm._serialLogger = logging.getLogger("bench.serial")
+	comm._callback = MachineComPrintCallback()
+	comm._serial = _NullSerial()
+	comm._state = MachineCom.STATE_PRINTING
+	comm._currentFile = None
+	comm._currentLine = 1
+	comm._alwaysSendChecksum = False
+	comm._lineHistory = LineHistory()
+	comm._resendStatistics = ResendStatistics()
+	comm._sendingLock = threading.Lock()
+	comm._regex_command = re.compile("^\s*([GM]\d+|T)")
+	return comm
+
+
+def _lines(count):
+	lines = []
+	for i in range(count):
+		lines.append("G1 X%.3f Y%.3f E%.5f F1800" % (100 + (i % 200) * 0.1, 100 - (i % 150) * 0.1, i * 0.01))
+	return lines
+
+
+def run(count):
+	lines = _lines(count)
+
+	start = time.time()
+	for line in lines:
+		reduce(lambda x,y:x^y, map(ord, line))
+	legacy = time.time() - start
+
+	start = time.time()
+	for line in lines:
+		checksum(line)
+	current = time.time() - start
+	print("checksum  legacy %9.0f lines/s, current %9.0f lines/s" % (count / legacy, count / current))
+
+	for name, clazz in (("legacy", _LegacyMachineCom), ("current", _BenchMachineCom)):
+		comm = _createComm(clazz)
+		start = time.clock()
+		for line in lines:
+			comm._sendCommand(line, True)
+		duration = time.clock() - start
+		print("send path %-7s %9.0f lines/s (%.1f us per line)" % (name, count / duration, duration / count * 1000000))
+
+
+if __name__ == "__main__":
+	run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,89 @@
+# coding=utf-8
+"""
+Benchmarks the overhead of persisting config.yaml.
+
+Compares the old save path (plain write followed by reloading the whole file) with the atomic write that keeps the
+in-memory configuration authoritative, and a settings request applying a couple of changes with one save per change
+with the same changes applied in one batch.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_settings.py
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import os
+import shutil
+import tempfile
+import timeit
+
+import yaml
+
+from octoprint.settings import Settings
+
+ROUNDS = 20
+
+
+def _populate(s):
+	# make the config about as big as a typical one with some controls and event subscriptions configured
+	s.set(["controls"], [{"name": "Control %d" % i, "type": "section", "children": [
+		{"name": "Command %d" % j, "type": "command", "command": "M%d" % j} for j in range(10)
+	]} for i in range(10)])
+	s.set(["events", "subscriptions"], [{"event": "PrintDone", "type": "system", "command": "echo %d" % i} for i in range(20)])
+	s.save(force=True)
+
+
+def _legacySave(s):
+	# the pre-atomic implementation: dump into the config file directly and read it back in
+	with open(s._configfile, "wb") as configFile:
+		yaml.safe_dump(s._config, configFile, default_flow_style=False, indent="    ", allow_unicode=True)
+	s._dirty = False
+	s.load()
+
+
+def _applyRequest(s, saveEach):
+	for key in ["name", "color"]:
+		s.set(["appearance", key], "%s%d" % (key, timeit.default_timer()))
+		if saveEach:
+			s.save()
+	for axis in ["x", "y", "z", "e"]:
+		s.setInt(["printerParameters", "movementSpeed", axis], int(timeit.default_timer() * 1000) % 10000)
+		if saveEach:
+			s.save()
+	s.save()
+
+
+def main():
+	basedir = tempfile.mkdtemp()
+	try:
+		s = Settings(basedir=basedir)
+		_populate(s)
+		print "config.yaml size: %d bytes" % os.stat(os.path.join(basedir, "config.yaml")).st_size
+
+		def legacy():
+			s.set(["appearance", "name"], str(timeit.default_timer()))
+			_legacySave(s)
+
+		def atomic():
+			s.set(["appearance", "name"], str(timeit.default_timer()))
+			s.save()
+
+		def unbatched():
+			_applyRequest(s, True)
+
+		def batched():
+			with s.batch():
+				_applyRequest(s, True)
+
+		for name, func in [("save + reload (legacy)", legacy), ("atomic save, no reload", atomic),
+						   ("request, save per change", unbatched), ("request, batched", batched)]:
+			duration = min(timeit.repeat(func, number=ROUNDS, repeat=3)) / ROUNDS
+			print "%-28s %8.3f ms" % (name, duration * 1000)
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
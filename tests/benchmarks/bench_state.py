@@ -0,0 +1,133 @@
+# coding=utf-8
+"""
+Benchmarks polling the read-only state endpoints.
+
+Polls GET /api/job over a keep-alive connection, once through the WSGI container and Flask like before and once
+served by the native StateSnapshotHandler, both for full responses and with If-None-Match yielding a 304.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_state.py
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import httplib
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import timeit
+
+from mock import Mock
+
+basedir = tempfile.mkdtemp()
+
+from octoprint.settings import settings
+settings(init=True, basedir=basedir)
+
+from octoprint.printer import StateMonitor
+
+stateMonitor = StateMonitor(0.5, Mock(), Mock(), Mock(), Mock(), snapshotCallback=lambda data: {
+	"job": (200, {"job": data["job"], "progress": data["progress"], "state": data["state"]["stateString"]})
+})
+stateMonitor.reset(
+	state={"state": 5, "stateString": "Printing", "flags": {"operational": True, "printing": True}},
+	jobData={
+		"file": {"name": "benchmark.gcode", "size": 1234567, "origin": "local", "date": 1400000000},
+		"estimatedPrintTime": 3600,
+		"filament": {"length": 1234, "volume": 12}
+	},
+	progress={"completion": 12.3, "filepos": 151234, "printTime": 443, "printTimeLeft": 3157},
+	currentZ=1.2
+)
+
+printer = Mock()
+printer.getCurrentData.side_effect = stateMonitor.getCurrentData
+printer.getStateSnapshot.side_effect = stateMonitor.getSnapshot
+
+# the api views bind the printer on import
+import octoprint.server
+octoprint.server.printer = printer
+
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.web import Application, FallbackHandler
+from tornado.wsgi import WSGIContainer
+
+from octoprint.server import app
+from octoprint.server.api import api
+from octoprint.server.util import StateSnapshotHandler, ReverseProxied
+
+REQUESTS = 2000
+
+
+def _serve(port):
+	app.secret_key = "benchmark"
+	app.register_blueprint(api, url_prefix="/api")
+	app.wsgi_app = ReverseProxied(app.wsgi_app)
+	wsgiContainer = WSGIContainer(app.wsgi_app)
+
+	tornadoApp = Application([
+		(r"/native/api/job", StateSnapshotHandler, {"printer": printer, "snapshot": "job", "fallback": wsgiContainer}),
+		(r".*", FallbackHandler, {"fallback": wsgiContainer})
+	])
+	server = HTTPServer(tornadoApp)
+	server.listen(port, address="127.0.0.1")
+	IOLoop.instance().start()
+
+
+def _freePort():
+	s = socket.socket()
+	s.bind(("127.0.0.1", 0))
+	port = s.getsockname()[1]
+	s.close()
+	return port
+
+
+def _poll(connection, path, headers=None):
+	if headers is None:
+		headers = {}
+
+	def request():
+		connection.request("GET", path, headers=headers)
+		response = connection.getresponse()
+		response.read()
+		return response.status
+	return request
+
+
+def run():
+	port = _freePort()
+	thread = threading.Thread(target=_serve, args=(port,))
+	thread.daemon = True
+	thread.start()
+	time.sleep(0.5)
+
+	connection = httplib.HTTPConnection("127.0.0.1", port)
+	etag = None
+	for path in ("/api/job", "/native/api/job"):
+		connection.request("GET", path)
+		response = connection.getresponse()
+		response.read()
+		assert response.status == 200
+		etag = response.getheader("etag", etag)
+
+	wsgi = timeit.timeit(_poll(connection, "/api/job"), number=REQUESTS) / REQUESTS
+	native = timeit.timeit(_poll(connection, "/native/api/job"), number=REQUESTS) / REQUESTS
+	notModified = timeit.timeit(_poll(connection, "/native/api/job", {"If-None-Match": etag}), number=REQUESTS) / REQUESTS
+
+	print("GET /api/job via WSGI:               %8.3f ms" % (wsgi * 1000))
+	print("GET /api/job via snapshot:           %8.3f ms" % (native * 1000))
+	print("GET /api/job via snapshot, 304:      %8.3f ms" % (notModified * 1000))
+
+	IOLoop.instance().add_callback(IOLoop.instance().stop)
+
+
+if __name__ == "__main__":
+	try:
+		run()
+	finally:
+		shutil.rmtree(basedir)
@@ -0,0 +1,116 @@
+# coding=utf-8
+"""
+Benchmarks running many virtual printers in one process, as done for scale testing the host.
+
+Connects the given number of ``MachineCom`` instances to the ``VIRTUAL`` port and prints the same generated file on
+all of them at once, with the virtual printers answering instantly and again with a per line processing time and a
+planner buffer (``devel.virtualPrinter.processingTime``, ``plannerBufferSize``, ``moveTime``). Reported are the total
+duration, the lines per second over all printers, the CPU time of the whole process per line and the number of
+threads. The virtual printers answer lines as soon as their responses are due instead of polling for them, so with
+instant answers the host is the limit.
+
+Run from the repository root via
+
+    PYTHONPATH=src python tests/benchmarks/bench_virtual.py [number of printers] [number of lines] [firmware]
+"""
+
+__author__ = "Gina Häußge <osd@foosel.net>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import math
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+basedir = tempfile.mkdtemp()
+
+from octoprint.settings import settings
+settings(init=True, basedir=basedir)
+
+from octoprint.util.comm import MachineCom, MachineComPrintCallback
+
+
+class _BenchCallback(MachineComPrintCallback):
+	def __init__(self):
+		self.operational = threading.Event()
+		self.done = threading.Event()
+
+	def mcStateChange(self, state):
+		if state == MachineCom.STATE_OPERATIONAL:
+			self.operational.set()
+
+	def mcPrintjobDone(self):
+		self.done.set()
+
+
+def _generate(path, count):
+	with open(path, "w") as f:
+		f.write("G28\nG92 E0\nG1 Z0.2 F1200\n")
+		e = 0.0
+		for i in range(count - 3):
+			angle = math.radians(3 * i)
+			e += 0.03
+			f.write("G1 X%.3f Y%.3f E%.5f F1800\n" % (100 + 20 * math.cos(angle), 100 + 20 * math.sin(angle), e))
+
+
+def _run(printers, path, lines):
+	callbacks = [_BenchCallback() for _ in range(printers)]
+	comms = [MachineCom(port="VIRTUAL", baudrate=115200, callbackObject=callback) for callback in callbacks]
+	for callback in callbacks:
+		callback.operational.wait(30)
+	threads = threading.active_count()
+
+	start = time.time()
+	usage = resource.getrusage(resource.RUSAGE_SELF)
+	for comm in comms:
+		comm.selectFile(path, False)
+		comm.startPrint()
+	for callback in callbacks:
+		callback.done.wait()
+	duration = time.time() - start
+	after = resource.getrusage(resource.RUSAGE_SELF)
+
+	for comm in comms:
+		comm.close()
+	for comm in comms:
+		comm.thread.join(5)
+
+	total = printers * lines
+	cpu = (after.ru_utime - usage.ru_utime) + (after.ru_stime - usage.ru_stime)
+	return duration, total / duration, cpu / total * 1000000, threads
+
+
+def main():
+	printers = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+	lines = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+	firmware = sys.argv[3] if len(sys.argv) > 3 else "marlin"
+
+	s = settings()
+	s.setFloat(["serial", "timeout", "connection"], 0.1)
+	s.setBoolean(["feature", "sdSupport"], False)
+	s.set(["devel", "virtualPrinter", "firmware"], firmware)
+	# the virtual printer requests a resend at line 100, answer that like Marlin does
+	s.setBoolean(["devel", "virtualPrinter", "okAfterResend"], True)
+
+	path = os.path.join(basedir, "benchmark.gcode")
+	_generate(path, lines)
+
+	print("%d printers (%s) printing %d lines each" % (printers, firmware, lines))
+	print("%-36s %10s %12s %12s %8s" % ("timing", "seconds", "lines/s", "cpu us/line", "threads"))
+	try:
+		for name, processingTime, plannerBufferSize, moveTime in (("instant", 0.0, 0, 0.0), ("1ms per line, 16 moves of 2ms buffered", 0.001, 16, 0.002)):
+			s.setFloat(["devel", "virtualPrinter", "processingTime"], processingTime)
+			s.setInt(["devel", "virtualPrinter", "plannerBufferSize"], plannerBufferSize)
+			s.setFloat(["devel", "virtualPrinter", "moveTime"], moveTime)
+			duration, linesPerSecond, cpuPerLine, threads = _run(printers, path, lines)
+			print("%-36s %10.2f %12.1f %12.1f %8d" % (name, duration, linesPerSecond, cpuPerLine, threads))
+	finally:
+		shutil.rmtree(basedir)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,117 @@
+import unittest
+import tempfile
+import shutil
+import os
+import math
+
+from octoprint.util.arcFitter import ArcFitter, fitFile, validate
+from octoprint.util.gcodeInterpreter import gcode, getArcPoints
+
+
+def _circle(count, start=0, step=2, radius=10, center=(50, 50), e=None, clockwise=False):
+	lines = []
+	for i in range(start + 1, start + count + 1):
+		angle = math.radians(-step * i if clockwise else step * i)
+		line = "G1 X%.3f Y%.3f" % (center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle))
+		if e is not None:
+			e += 0.0349
+			line += " E%.5f" % e
+		lines.append(line + "\n")
+	return lines
+
+
+class ArcFitterTestCase(unittest.TestCase):
+
+	def _fit(self, lines, **kwargs):
+		fitter = ArcFitter(**kwargs)
+		return list(fitter.process(lines)), fitter.getStatistics()
+
+	def test_arc(self):
+		lines, statistics = self._fit(["G28\n", "G92 E0\n", "G1 X60 Y50 F1800\n"] + _circle(45, e=0.0))
+
+		self.assertEquals(["G28\n", "G92 E0\n", "G1 X60 Y50 F1800\n", "G3 X50.000 Y60.000 I-10.0000 J0.0000 E1.57050\n"], lines)
+		self.assertEquals((48, 4, 1), (statistics["lines"], statistics["fittedLines"], statistics["arcs"]))
+
+	def test_clockwise_relative_extrusion(self):
+		lines, _ = self._fit(["G28\n", "M83\n", "G1 X60 Y50\n", "G1 F1200\n"] + [line.replace("\n", " E0.01 ; perimeter\n") for line in _circle(10, clockwise=True)])
+
+		self.assertEquals(5, len(lines))
+		self.assertTrue(lines[-1].startswith("G2 X59.397 Y46.580 I-10.0"))
+		self.assertTrue(lines[-1].endswith(" E0.10\n"))
+
+	def test_no_arcs(self):
+		lines = [
+			"G1 X60 Y50\n",
+			# position unknown
+			"G1 X61 Y51\n", "G1 X62 Y51\n", "G1 X63 Y52\n", "G1 X64 Y52\n",
+			"G28\n", "G1 X60 Y50\n",
+			# straight
+			"G1 X61 Y50\n", "G1 X62 Y50\n", "G1 X63 Y50\n", "G1 X64 Y50\n",
+			# too short
+			"G1 X65 Y51\n", "G1 X65.5 Y52\n",
+			# Z or feedrate changing
+		] + [line.replace("\n", " Z1\n") for line in _circle(10)] + [line.replace("\n", " F%d\n" % i) for i, line in enumerate(_circle(10))] + ["G91\n"] + _circle(10)
+		self.assertEquals(lines, self._fit(lines)[0])
+
+	def test_tolerance(self):
+		lines = ["G28\n", "G1 X60 Y50\n"] + _circle(10)
+		# 0.05mm off the circle
+		lines[6] = "G1 X59.952 Y51.399\n"
+
+		self.assertTrue(len(self._fit(lines, tolerance=0.01)[0]) > 3)
+		self.assertEquals(3, len(self._fit(lines, tolerance=0.1)[0]))
+
+
+class ArcFileTestCase(unittest.TestCase):
+
+	def setUp(self):
+		from octoprint.settings import settings
+		settings(True)
+
+		self.basedir = tempfile.mkdtemp()
+		self.path = os.path.join(self.basedir, "test.gcode")
+		self.fittedPath = os.path.join(self.basedir, "fitted.gcode")
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_fit_and_validate(self):
+		with open(self.path, "wb") as f:
+			f.write("; sliced\nG21\nG90\nM82\nG28 ; home\nG92 E0\n")
+			e = 0.0
+			for layer in range(3):
+				f.write("G1 Z%.3f F1200.000\nG1 X60.000 Y50.000 F6000.000\nG1 F1800\n" % (0.2 * (layer + 1)))
+				f.writelines(_circle(180, e=e))
+				e += 180 * 0.0349
+				f.write("G1 E%.5f F2400.000 ; retract\nG1 E%.5f F2400.000\nG92 E0\n" % (e - 1, e))
+				e = 0.0
+
+		statistics = fitFile(self.path, self.fittedPath)
+		self.assertEquals(6, statistics["arcs"])
+		self.assertTrue(statistics["reduction"] > 0.9)
+
+		original = gcode()
+		original.load(self.path)
+		fitted = gcode()
+		fitted.load(self.fittedPath)
+		result = validate(original, fitted)
+		self.assertTrue(result["valid"])
+		self.assertEquals([], result["differences"])
+		self.assertTrue(abs(result["timeDifference"]) < 0.01)
+
+		# a lost extrusion has to be noticed
+		with open(self.fittedPath, "ab") as f:
+			f.write("G1 X50 Y50 E1\n")
+		fitted = gcode()
+		fitted.load(self.fittedPath)
+		self.assertEquals(["filament"], validate(original, fitted)["differences"])
+
+	def test_arc_points(self):
+		points = getArcPoints([10.0, 0.0, 0.0], [0.0, 10.0, 1.0], (0.0, 0.0), False)
+		self.assertEquals(16, len(points))
+		for x, y, z in points:
+			self.assertAlmostEquals(10.0, math.hypot(x, y))
+		self.assertEquals([0.0, 10.0, 1.0], points[-1])
+
+		# clockwise the long way around
+		self.assertEquals(48, len(getArcPoints([10.0, 0.0, 0.0], [0.0, 10.0, 0.0], (0.0, 0.0), True)))
@@ -0,0 +1,104 @@
+import unittest
+import tempfile
+import shutil
+
+from mock import Mock
+
+from octoprint.settings import settings
+from octoprint.events import Events, CommandTrigger, eventPayload, getEventPrinter
+from octoprint.timelapse import Timelapse
+
+
+class EventPayloadTestCase(unittest.TestCase):
+
+	def test_payload(self):
+		self.assertEquals({"printer": "left"}, eventPayload(None, "left"))
+		payload = {"file": "a.gcode"}
+		self.assertEquals({"file": "a.gcode", "printer": "left"}, eventPayload(payload, "left"))
+		self.assertEquals({"file": "a.gcode"}, payload)
+		self.assertIs(payload, eventPayload(payload, None))
+
+		self.assertEquals("left", getEventPrinter({"printer": "left"}))
+		self.assertIsNone(getEventPrinter(None))
+
+
+class CommandTriggerTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		s = settings(init=True, basedir=self.basedir)
+		s.set(["events", "enabled"], True)
+		s.set(["events", "subscriptions"], [{"event": Events.PRINT_DONE, "command": "M117 {file} done", "type": "gcode"}])
+
+		self.printers = dict(default=Mock(), right=Mock())
+		for printer in self.printers.values():
+			printer.getCurrentData.return_value = dict()
+		registry = Mock()
+		registry.get.side_effect = lambda id: self.printers.get(id)
+		registry.getDefault.return_value = self.printers["default"]
+		self.trigger = CommandTrigger(registry)
+
+	def tearDown(self):
+		self.trigger.unsubscribe([Events.PRINT_DONE])
+		settings().set(["events", "subscriptions"], [])
+		shutil.rmtree(self.basedir)
+
+	def test_printer_of_event(self):
+		self.trigger.eventCallback(Events.PRINT_DONE, {"file": "a.gcode", "printer": "right"})
+		self.printers["right"].commands.assert_called_once_with(["M117 a.gcode done"])
+		self.assertFalse(self.printers["default"].commands.called)
+
+	def test_default_printer(self):
+		self.trigger.eventCallback(Events.PRINT_DONE, {"file": "a.gcode"})
+		self.printers["default"].commands.assert_called_once_with(["M117 a.gcode done"])
+
+
+class _Timelapse(Timelapse):
+	def __init__(self):
+		self.captured = []
+		Timelapse.__init__(self)
+
+	def eventSubscriptions(self):
+		return [(Events.Z_CHANGE, self._onZChange)]
+
+	def startTimelapse(self, gcodeFile):
+		self._inTimelapse = True
+
+	def stopTimelapse(self, doCreateMovie=True, success=True):
+		self._inTimelapse = False
+
+	def _onZChange(self, event, payload):
+		self.captured.append(payload["printer"])
+
+
+class TimelapsePrinterTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+		self.timelapse = _Timelapse()
+
+	def tearDown(self):
+		self.timelapse.unload()
+		shutil.rmtree(self.basedir)
+
+	def _fire(self, event, printer):
+		for subscribed, callback in self.timelapse._subscriptions:
+			if subscribed == event:
+				callback(event, {"file": "a.gcode", "printer": printer})
+
+	def test_follows_printer(self):
+		self._fire(Events.PRINT_STARTED, "left")
+		self._fire(Events.PRINT_STARTED, "right")
+		self._fire(Events.Z_CHANGE, "right")
+		self._fire(Events.Z_CHANGE, "left")
+		self._fire(Events.PRINT_DONE, "right")
+		self.assertTrue(self.timelapse._inTimelapse)
+
+		self._fire(Events.PRINT_DONE, "left")
+		self.assertFalse(self.timelapse._inTimelapse)
+		self.assertEquals(["left"], self.timelapse.captured)
+
+		self._fire(Events.PRINT_STARTED, "right")
+		self._fire(Events.Z_CHANGE, "right")
+		self.assertEquals(["left", "right"], self.timelapse.captured)
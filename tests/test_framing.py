@@ -0,0 +1,15 @@
+import unittest
+
+from octoprint.util.comm import checksum, frameLine
+
+
+class FramingTestCase(unittest.TestCase):
+
+	def test_checksum(self):
+		line = "N12345 G1 X100.123 Y100.456 E1.23456 F1800 ; with a comment"
+		for length in range(len(line) + 1):
+			self.assertEquals(reduce(lambda x, y: x ^ y, map(ord, line[:length]), 0), checksum(line[:length]))
+
+	def test_frame_line(self):
+		self.assertEquals("N0 M110 N0*125\n", frameLine("M110 N0", 0))
+		self.assertEquals("N23 G1 X10*96\n", frameLine("G1 X10", 23))
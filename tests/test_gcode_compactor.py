@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import shutil
+import os
+import math
+
+from octoprint.settings import settings
+from octoprint.util.gcodeCompactor import GcodeCompactor, verify
+
+
+class GcodeCompactorTestCase(unittest.TestCase):
+
+	def _compact(self, lines):
+		compactor = GcodeCompactor()
+		return [compactor.compact(line) for line in lines]
+
+	def test_numbers(self):
+		self.assertEquals(
+			["G1 X10 Y.5 Z-.25 E0 F1800", "G1 X-1.05 Y7"],
+			self._compact(["G1  X10.000 Y0.500 Z-0.250 E-0.000 F1800.0", "G01 X-1.0500 Y007"])
+		)
+
+	def test_redundant_words(self):
+		self.assertEquals(
+			["G1 X10 Y10 Z.2 F1800", "G1 X20", None, "G0 Y20 F6000", "G1 X10 F1800", "G1 Y10 E1"],
+			self._compact([
+				"G1 X10 Y10 Z0.2 F1800",
+				"G1 X20 Y10 Z0.2 F1800",
+				"G1 X20 Y10",
+				"G0 Y20 F6000",
+				# G0 and G1 might have their own feedrates
+				"G1 X10 F1800",
+				"G1 Y10 Z0.2 E1"
+			])
+		)
+
+	def test_modes(self):
+		self.assertEquals(
+			["G1 X10 E1", "G91", "G1 Y1 E0", "G90", "M83", "G1 X20", "G1 E1", "M82", "G92 E0", None, "G1 E1"],
+			self._compact([
+				"G1 X10 E1",
+				"G91",
+				# relative moves by zero are dropped, E is left alone since firmwares disagree on G91 and E
+				"G1 X0 Y1 E0",
+				"G90",
+				"M83",
+				"G1 X20 E0",
+				"G1 E1",
+				"M82",
+				"G92 E0",
+				"G1 E0",
+				"G1 E1"
+			])
+		)
+
+	def test_unknown_state(self):
+		self.assertEquals(
+			["G1 X10 F1800", "G28", "G1 X10 F1800", "T1", "G1 X10 F1800", "M117 Hello  World", "G1 X10 Y1x", "G1 X10"],
+			self._compact([
+				"G1 X10 F1800",
+				"G28",
+				"G1 X10 F1800",
+				"T1",
+				"G1 X10 F1800",
+				"M117 Hello  World",
+				"G1 X10 Y1x",
+				"G1 X10"
+			])
+		)
+
+	def test_reset(self):
+		compactor = GcodeCompactor()
+		compactor.compact("G1 X10")
+		compactor.reset()
+		self.assertEquals("G1 X10", compactor.compact("G1 X10"))
+
+	def test_reset_keeps_modes(self):
+		# commands sent in between by the user or on resume don't switch the printer out of the file's modes
+		for before, after, expected in (
+			(["M83", "G1 X10 E0.5 F1200", "G1 X20 E0.5"], ["G1 X30 E0.5", "G1 X40 E0.5"], ["G1 X30 E.5", "G1 X40 E.5"]),
+			(["G91", "G1 X10 F1200", "G1 X10"], ["G1 X10", "G1 X10"], ["G1 X10", "G1 X10"])
+		):
+			compactor = GcodeCompactor()
+			for line in before:
+				compactor.compact(line)
+			compactor.reset()
+			self.assertEquals(expected, [compactor.compact(line) for line in after])
+
+	def test_statistics(self):
+		compactor = GcodeCompactor()
+		compactor.compact("G1 X10.000")
+		compactor.compact("G1 X10.000")
+
+		statistics = compactor.getStatistics()
+		self.assertEquals((2, 1, 20, 6), (statistics["lines"], statistics["dropped"], statistics["bytes"], statistics["compactedBytes"]))
+		self.assertAlmostEquals(0.7, statistics["saved"])
+
+
+class VerifyTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+		self.path = os.path.join(self.basedir, "test.gcode")
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_verify(self):
+		with open(self.path, "wb") as f:
+			f.write("; sliced\nG21\nG90\nM82\nG28 ; home\nG92 E0\n")
+			e = 0.0
+			for layer in range(3):
+				z = 0.2 * (layer + 1)
+				f.write("G1 Z%.3f F1200.000\nG1 X60.000 Y50.000 F6000.000\n" % z)
+				for i in range(1, 181):
+					e += 0.05
+					f.write("G1 X%.3f Y%.3f Z%.3f E%.5f F1800.000\n" % (50 + 10 * math.cos(math.radians(2 * i)), 50 + 10 * math.sin(math.radians(2 * i)), z, e))
+				f.write("G1 E%.5f F2400.000 ; retract\nG1 E%.5f F2400.000\n" % (e - 1, e))
+
+		result = verify(self.path)
+		self.assertTrue(result["identical"])
+		self.assertEquals([], result["differences"])
+		self.assertTrue(result["saved"] > 0.3)
@@ -0,0 +1,188 @@
+import unittest
+import tempfile
+import shutil
+import os
+import time
+
+from mock import Mock, patch
+
+from octoprint.jobqueue import JobQueue, JobScheduler
+
+
+class JobQueueTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.queue = JobQueue(path=os.path.join(self.basedir, "queue.db"))
+
+	def tearDown(self):
+		self.queue.close()
+		shutil.rmtree(self.basedir)
+
+	def test_shortest_first(self):
+		self.queue.add("long.gcode", estimatedPrintTime=3600)
+		short = self.queue.add("short.gcode", estimatedPrintTime=600)
+		self.queue.add("unknown.gcode")
+
+		self.assertIs(short, self.queue.next("default"))
+
+	def test_priority(self):
+		self.queue.add("short.gcode", estimatedPrintTime=600)
+		urgent = self.queue.add("long.gcode", estimatedPrintTime=3600, priority=1)
+
+		self.assertIs(urgent, self.queue.next("default"))
+
+	def test_best_fit_before_shift_end(self):
+		self.queue.add("short.gcode", estimatedPrintTime=600)
+		fitting = self.queue.add("medium.gcode", estimatedPrintTime=1800)
+		longest = self.queue.add("long.gcode", estimatedPrintTime=7200)
+
+		self.assertIs(fitting, self.queue.next("default", remaining=2000))
+		# nothing fits, so use the time nobody is around for the longest job
+		self.assertIs(longest, self.queue.next("default", remaining=300))
+
+	def test_filament(self):
+		self.queue.add("heavy.gcode", estimatedPrintTime=600, filament=5000.0)
+		light = self.queue.add("light.gcode", estimatedPrintTime=1200, filament=1000.0)
+
+		self.assertIs(light, self.queue.next("default", filament=2000.0))
+		self.queue.remove(light.id)
+		self.assertIsNone(self.queue.next("default", filament=2000.0))
+
+	def test_pinned_printer(self):
+		pinned = self.queue.add("a.gcode", printer="left", estimatedPrintTime=600)
+		other = self.queue.add("b.gcode", estimatedPrintTime=1200)
+
+		self.assertIs(pinned, self.queue.next("left"))
+		self.assertIs(other, self.queue.next("right"))
+		self.assertEquals([other], self.queue.getJobs(printer="right"))
+
+	def test_update_estimates(self):
+		first = self.queue.add("a.gcode")
+		second = self.queue.add("a.gcode")
+		short = self.queue.add("b.gcode", estimatedPrintTime=600)
+
+		self.queue.updateEstimates("a.gcode", 300, 100.0)
+
+		self.assertEquals((300, 100.0), (second.estimatedPrintTime, second.filament))
+		self.assertIs(first, self.queue.next("default"))
+		self.queue.remove(first.id)
+		self.assertIs(second, self.queue.next("default"))
+		self.queue.remove(second.id)
+		self.assertIs(short, self.queue.next("default"))
+
+	def test_persistent(self):
+		job = self.queue.add("a.gcode", printer="left", priority=2, estimatedPrintTime=600, filament=100.0)
+		self.queue.add("b.gcode")
+		self.queue.remove(job.id + 1)
+		self.queue.close()
+
+		self.queue = JobQueue(path=os.path.join(self.basedir, "queue.db"))
+		self.assertEquals([job.asDict()], [queued.asDict() for queued in self.queue.getJobs()])
+		self.assertEquals(job.id, self.queue.next("left").id)
+
+
+class JobSchedulerTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.queue = Mock()
+		self.gcodeManager = Mock()
+		self.gcodeManager.getAbsolutePath.side_effect = lambda filename: "/uploads/" + filename
+
+		self.printer = Mock()
+		self.printer.getId.return_value = "default"
+		self.printer.isReady.return_value = True
+		self.printer.isPrinting.return_value = False
+		self.printer.isPaused.return_value = False
+		def selectFile(path, sd, printAfterSelect):
+			self.printer.isPrinting.return_value = printAfterSelect
+		self.printer.selectFile.side_effect = selectFile
+		registry = Mock()
+		registry.getAll.return_value = [self.printer]
+
+		self.settingsPatcher = patch("octoprint.jobqueue.settings")
+		self.settings = self.settingsPatcher.start()
+		self.settings.return_value.get.return_value = None
+
+		# schedule explicitly instead of from the worker thread
+		with patch.object(JobScheduler, "_work"):
+			self.scheduler = JobScheduler(self.queue, registry, self.gcodeManager)
+
+	def tearDown(self):
+		self.settingsPatcher.stop()
+
+	def test_starts_on_ready_printer_only(self):
+		job = Mock(id=1, filename="a.gcode", filament=None)
+		self.queue.next.return_value = job
+
+		self.assertEquals([], self.scheduler.schedule())
+
+		self.scheduler.setPrinterReady("default")
+		self.assertEquals([("default", job)], self.scheduler.schedule())
+		self.printer.selectFile.assert_called_once_with("/uploads/a.gcode", False, True)
+		self.queue.remove.assert_called_once_with(1)
+
+		# needs to be marked ready again before the next job
+		self.assertFalse(self.scheduler.getPrinterState("default")["ready"])
+
+	def test_job_kept_if_not_started(self):
+		job = Mock(id=1, filename="a.gcode", filament=1500.0)
+		self.queue.next.return_value = job
+		self.printer.selectFile.side_effect = None
+		self.scheduler.setPrinterReady("default", filament=2000.0)
+
+		self.assertEquals([], self.scheduler.schedule())
+		self.printer.selectFile.assert_called_once_with("/uploads/a.gcode", False, True)
+		self.assertFalse(self.queue.remove.called)
+		self.assertEquals({"ready": True, "filament": 2000.0}, self.scheduler.getPrinterState("default"))
+
+	def test_filament_used_up(self):
+		self.queue.next.return_value = Mock(id=1, filename="a.gcode", filament=1500.0)
+		self.scheduler.setPrinterReady("default", filament=2000.0)
+
+		self.scheduler.schedule()
+
+		self.queue.next.assert_called_once_with("default", remaining=None, filament=2000.0)
+		self.assertEquals(500.0, self.scheduler.getPrinterState("default")["filament"])
+
+	def test_remaining_shift_time(self):
+		self.settings.return_value.get.return_value = "18:00"
+		now = time.mktime((2014, 9, 1, 16, 30, 0, 0, 0, -1))
+
+		self.assertEquals(5400, self.scheduler.getRemainingShiftTime(now))
+		self.assertEquals(23.5 * 3600, self.scheduler.getRemainingShiftTime(now + 7200))
+
+	def test_shift_fitted_by_printer_ratio(self):
+		self.settings.return_value.get.return_value = "18:00"
+		now = time.mktime((2014, 9, 1, 16, 30, 0, 0, 0, -1))
+		# the printer takes twice as long as estimated, all printers together 1.5 times
+		ratios = {"default": 2.0, None: 1.5}
+		self.gcodeManager.getHistory.return_value.getEstimateRatio.side_effect = lambda filename=None, printer=None: ratios[printer]
+		self.queue.next.return_value = None
+		self.scheduler.setPrinterReady("default")
+
+		self.scheduler.schedule(now)
+		self.queue.next.assert_called_once_with("default", remaining=4050.0, filament=None)
+
+		# no history yet
+		ratios["default"] = ratios[None] = None
+		self.queue.next.reset_mock()
+		self.scheduler.schedule(now)
+		self.queue.next.assert_called_once_with("default", remaining=5400, filament=None)
+
+	def test_prestage_near_end_of_print(self):
+		self.settings.return_value.getFloat.return_value = 300
+		job = Mock(id=1, filename="a.gcode", filament=None)
+		self.queue.next.return_value = job
+		self.printer.isPrinting.return_value = True
+
+		self.printer.getPrintTimeLeft.return_value = 1200
+		self.assertEquals([], self.scheduler.prestage())
+
+		self.printer.getPrintTimeLeft.return_value = 120
+		self.assertEquals([("default", job)], self.scheduler.prestage())
+		self.printer.prestageFile.assert_called_once_with("/uploads/a.gcode")
+
+		# only once per job
+		self.assertEquals([], self.scheduler.prestage())
+		self.assertEquals(1, self.printer.prestageFile.call_count)
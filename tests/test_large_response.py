@@ -0,0 +1,160 @@
+import tempfile
+import shutil
+import os
+
+from mock import patch
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+
+from octoprint.server.util import LargeResponseHandler
+
+
+class LargeResponseHandlerTestCase(AsyncHTTPTestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.content = "".join(chr(i % 251) for i in range(3 * LargeResponseHandler.CHUNK_SIZE + 123))
+		with open(os.path.join(self.basedir, "test.gcode"), "wb") as f:
+			f.write(self.content)
+		open(os.path.join(self.basedir, "empty.gcode"), "wb").close()
+
+		AsyncHTTPTestCase.setUp(self)
+
+	def tearDown(self):
+		AsyncHTTPTestCase.tearDown(self)
+		shutil.rmtree(self.basedir)
+
+	def get_app(self):
+		return Application([
+			(r"/downloads/(.*)", LargeResponseHandler, {"path": self.basedir, "as_attachment": True})
+		])
+
+	def test_download(self):
+		response = self.fetch("/downloads/test.gcode")
+
+		self.assertEquals(200, response.code)
+		self.assertEquals(self.content, response.body)
+		self.assertEquals(str(len(self.content)), response.headers["Content-Length"])
+		self.assertEquals("attachment", response.headers["Content-Disposition"])
+		self.assertEquals("bytes", response.headers["Accept-Ranges"])
+
+	def test_download_without_mmap(self):
+		with patch("mmap.mmap", side_effect=EnvironmentError("not mappable")):
+			response = self.fetch("/downloads/test.gcode")
+
+		self.assertEquals(200, response.code)
+		self.assertEquals(self.content, response.body)
+
+	def test_empty_file(self):
+		response = self.fetch("/downloads/empty.gcode")
+
+		self.assertEquals(200, response.code)
+		self.assertEquals("", response.body)
+
+	def test_head(self):
+		response = self.fetch("/downloads/test.gcode", method="HEAD")
+
+		self.assertEquals(200, response.code)
+		self.assertEquals(str(len(self.content)), response.headers["Content-Length"])
+
+	def test_not_found(self):
+		response = self.fetch("/downloads/unknown.gcode")
+
+		self.assertEquals(404, response.code)
+
+	def test_if_none_match(self):
+		etag = self.fetch("/downloads/test.gcode").headers["Etag"]
+
+		response = self.fetch("/downloads/test.gcode", headers={"If-None-Match": etag})
+
+		self.assertEquals(304, response.code)
+		self.assertEquals("", response.body)
+
+	def test_if_none_match_changed(self):
+		response = self.fetch("/downloads/test.gcode", headers={"If-None-Match": '"outdated"'})
+
+		self.assertEquals(200, response.code)
+
+	def test_range(self):
+		start = LargeResponseHandler.CHUNK_SIZE - 10
+		end = 2 * LargeResponseHandler.CHUNK_SIZE + 10
+
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=%d-%d" % (start, end)})
+
+		self.assertEquals(206, response.code)
+		self.assertEquals(self.content[start:end + 1], response.body)
+		self.assertEquals("bytes %d-%d/%d" % (start, end, len(self.content)), response.headers["Content-Range"])
+
+	def test_open_range(self):
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=100-"})
+
+		self.assertEquals(206, response.code)
+		self.assertEquals(self.content[100:], response.body)
+
+	def test_suffix_range(self):
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=-100"})
+
+		self.assertEquals(206, response.code)
+		self.assertEquals(self.content[-100:], response.body)
+
+	def test_unsatisfiable_range(self):
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=%d-" % (len(self.content) + 1)})
+
+		self.assertEquals(416, response.code)
+		self.assertEquals("bytes */%d" % len(self.content), response.headers["Content-Range"])
+
+	def test_invalid_range_ignored(self):
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=abc"})
+
+		self.assertEquals(200, response.code)
+		self.assertEquals(self.content, response.body)
+
+	def test_multiple_ranges(self):
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=0-9,-10"})
+
+		self.assertEquals(206, response.code)
+		contentType = response.headers["Content-Type"]
+		self.assertTrue(contentType.startswith("multipart/byteranges; boundary="))
+		boundary = contentType[len("multipart/byteranges; boundary="):]
+
+		size = len(self.content)
+		expected = "\r\n--%s\r\nContent-Range: bytes 0-9/%d\r\n\r\n%s" % (boundary, size, self.content[:10]) \
+			+ "\r\n--%s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n%s" % (boundary, size - 10, size - 1, size, self.content[-10:]) \
+			+ "\r\n--%s--\r\n" % boundary
+		self.assertEquals(expected, response.body)
+		self.assertEquals(str(len(expected)), response.headers["Content-Length"])
+
+	def test_overlapping_ranges_merged(self):
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=10-19,0-14"})
+
+		self.assertEquals(206, response.code)
+		self.assertEquals(self.content[0:20], response.body)
+		self.assertEquals("bytes 0-19/%d" % len(self.content), response.headers["Content-Range"])
+
+	def test_unsatisfiable_ranges_skipped(self):
+		size = len(self.content)
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=%d-,0-9" % (size + 10)})
+
+		self.assertEquals(206, response.code)
+		self.assertEquals(self.content[0:10], response.body)
+
+	def test_if_range_etag(self):
+		etag = self.fetch("/downloads/test.gcode", method="HEAD").headers["Etag"]
+
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=100-", "If-Range": etag})
+		self.assertEquals(206, response.code)
+		self.assertEquals(self.content[100:], response.body)
+
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=100-", "If-Range": '"outdated"'})
+		self.assertEquals(200, response.code)
+		self.assertEquals(self.content, response.body)
+
+	def test_if_range_date(self):
+		lastModified = self.fetch("/downloads/test.gcode", method="HEAD").headers["Last-Modified"]
+
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=100-", "If-Range": lastModified})
+		self.assertEquals(206, response.code)
+
+		response = self.fetch("/downloads/test.gcode", headers={"Range": "bytes=100-", "If-Range": "Thu, 01 Jan 1970 00:00:00 GMT"})
+		self.assertEquals(200, response.code)
+		self.assertEquals(self.content, response.body)
@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+import shutil
+import os
+
+from octoprint.settings import settings
+from octoprint.gcodefiles import LayerIndex
+from octoprint.util.gcodeInterpreter import gcode
+
+
+GCODE = [
+	"G28\n",
+	"G1 Z5 F5000\n",
+	"G1 X10 Y10 Z0.3\n",
+	"G1 X20 Y10 E1\n",
+	"G1 X20 Y20 E2\n",
+	"G1 Z0.8\n",            # z hop
+	"G1 X50 Y50\n",
+	"G1 Z0.3\n",
+	"G1 X60 Y50 E3\n",      # still first layer
+	"G1 Z0.6\n",            # next layer starts here
+	"G1 X10 Y10\n",
+	"G1 X20 Y10 E4\n",
+	"G1 Z10\n",
+	"M84"
+]
+
+
+class LayerIndexTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+		self.path = os.path.join(self.basedir, "test.gcode")
+		self.content = "".join(GCODE)
+		with open(self.path, "wb") as f:
+			f.write(self.content)
+
+		self.gcode = gcode()
+		self.gcode.load(self.path)
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_interpreter_layers(self):
+		self.assertEquals([(0, 0, 0.3), (len("".join(GCODE[:9])), 9, 0.6)], self.gcode.layerList)
+		self.assertEquals(len(self.content), self.gcode.totalBytes)
+		self.assertEquals(len(GCODE), self.gcode.totalLines)
+
+	def test_interpreter_layers_from_lines(self):
+		analysis = gcode()
+		analysis.loadLines(GCODE)
+
+		self.assertEquals(self.gcode.layerList, analysis.layerList)
+
+	def test_from_gcode(self):
+		layerIndex = LayerIndex.fromGcode(self.gcode)
+
+		secondLayerOffset = len("".join(GCODE[:9]))
+		self.assertEquals([
+			(0, secondLayerOffset, 0, 9, 0.3),
+			(secondLayerOffset, len(self.content) - secondLayerOffset, 9, len(GCODE) - 9, 0.6)
+		], layerIndex.getLayers())
+
+	def test_write_and_read(self):
+		indexPath = LayerIndex.getPath(self.path)
+		LayerIndex.fromGcode(self.gcode).write(indexPath, self.path)
+
+		self.assertEquals(os.path.join(self.basedir, ".test.gcode.layers"), indexPath)
+
+		layerIndex = LayerIndex.read(indexPath, self.path)
+		self.assertEquals(2, layerIndex.getLayerCount())
+		offset, length, line, lines, z = layerIndex.getLayers()[1]
+		self.assertEquals("".join(GCODE[9:]), self.content[offset:offset + length])
+		self.assertAlmostEquals(0.6, z, places=5)
+
+	def test_stale_index_ignored(self):
+		indexPath = LayerIndex.getPath(self.path)
+		LayerIndex.fromGcode(self.gcode).write(indexPath, self.path)
+
+		with open(self.path, "ab") as f:
+			f.write("\nM84\n")
+
+		self.assertIsNone(LayerIndex.read(indexPath, self.path))
+
+	def test_byte_range(self):
+		layerIndex = LayerIndex.fromGcode(self.gcode)
+
+		self.assertEquals((0, len(self.content)), layerIndex.getByteRange(0, 2))
+		self.assertEquals((0, len(self.content)), layerIndex.getByteRange(0, 100))
+		self.assertIsNone(layerIndex.getByteRange(2))
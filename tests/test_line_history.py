@@ -0,0 +1,99 @@
+import unittest
+
+from octoprint.settings import default_settings
+from octoprint.util.comm import LineHistory, ResendStatistics
+
+
+class LineHistoryTestCase(unittest.TestCase):
+
+	def test_lookup(self):
+		history = LineHistory(size=10)
+		for lineNumber in range(1, 26):
+			history.append(lineNumber, "G1 X%d" % lineNumber)
+
+		self.assertEquals(10, len(history))
+		self.assertEquals("G1 X16", history[16])
+		self.assertEquals("G1 X25", history[25])
+		self.assertFalse(15 in history)
+		self.assertFalse(26 in history)
+		self.assertRaises(KeyError, history.__getitem__, 15)
+
+	def test_non_consecutive_line_numbers(self):
+		history = LineHistory(size=10)
+		history.append(1, "G1 X1")
+		history.append(2, "G1 X2")
+		history.append(10, "G1 X10")
+
+		self.assertEquals(1, len(history))
+		self.assertFalse(2 in history)
+		self.assertEquals("G1 X10", history[10])
+
+	def test_clear(self):
+		history = LineHistory(size=10)
+		history.append(1, "G1 X1")
+		history.clear()
+
+		self.assertEquals(0, len(history))
+		self.assertFalse(1 in history)
+
+	def test_grows_on_distant_resends(self):
+		history = LineHistory(size=10, maxSize=30)
+		for lineNumber in range(1, 101):
+			history.append(lineNumber, "G1 X%d" % lineNumber)
+
+		# resend of a recent line doesn't change anything
+		history.resendRequested(98)
+		self.assertEquals(10, history.getSize())
+
+		history.resendRequested(93)
+		self.assertEquals(16, history.getSize())
+		self.assertEquals(10, len(history))
+		self.assertEquals("G1 X91", history[91])
+
+		for lineNumber in range(101, 121):
+			history.append(lineNumber, "G1 X%d" % lineNumber)
+		self.assertEquals(16, len(history))
+		self.assertEquals("G1 X105", history[105])
+
+		# limited to maxSize
+		history.resendRequested(1)
+		self.assertEquals(30, history.getSize())
+		self.assertEquals("G1 X105", history[105])
+
+	def test_default_size(self):
+		config = default_settings["serial"]["lineHistory"]
+		history = LineHistory(size=config["size"], maxSize=config["maxSize"])
+		for lineNumber in range(1, 1001):
+			history.append(lineNumber, "G1 X%d" % lineNumber)
+
+		# the very first request reaching far back can already be served
+		history.resendRequested(101)
+		self.assertEquals("G1 X101", history[101])
+
+
+class ResendStatisticsTestCase(unittest.TestCase):
+
+	def test_statistics(self):
+		statistics = ResendStatistics()
+		for i in range(100):
+			statistics.lineSent()
+
+		# first burst: two requests, the second while still resending
+		statistics.resendRequested(3, False)
+		statistics.lineResent()
+		statistics.resendRequested(4, True)
+		for i in range(4):
+			statistics.lineResent()
+		statistics.resendFinished()
+
+		# second burst
+		statistics.resendRequested(1, False)
+		statistics.lineResent()
+		statistics.resendFinished()
+
+		result = statistics.asDict()
+		self.assertEquals((100, 3, 6), (result["sent"], result["requests"], result["resent"]))
+		self.assertAlmostEquals(0.03, result["rate"])
+		self.assertEquals({"average": 8 / 3.0, "max": 4}, result["distance"])
+		self.assertEquals({"count": 2, "averageLines": 3.0, "maxLines": 5}, result["bursts"])
+
@@ -0,0 +1,39 @@
+import unittest
+
+from octoprint.util.positionTracker import PositionTracker
+
+
+class PositionTrackerTestCase(unittest.TestCase):
+
+	def _track(self, lines):
+		tracker = PositionTracker()
+		for line in lines:
+			tracker.update(line.split())
+		return tracker
+
+	def test_absolute(self):
+		tracker = self._track(["G1 X10.000 Y5 F1800", "G0 Z.2 F6000", "G92 E0"])
+		self.assertEquals(dict(X=10.0, Y=5.0, Z=0.2, E=0.0), tracker.position)
+		self.assertEquals(dict(X="10.000", Y="5", Z=".2", E="0"), tracker.text)
+		self.assertEquals((6000.0, "G0"), (tracker.feedrate, tracker.feedrateCommand))
+
+	def test_relative(self):
+		tracker = self._track(["G1 X10 Y10 E1", "G91", "G1 X1 E1", "G90", "M83", "G1 E2"])
+		self.assertEquals(dict(X=11.0, Y=10.0, Z=None, E=None), tracker.position)
+		self.assertEquals(dict(X=None, Y="10", Z=None, E=None), tracker.text)
+		# firmwares disagree on E in G91 with absolute extrusion
+		self.assertIsNone(self._track(["G91"]).isRelative("E"))
+		self.assertTrue(self._track(["M83"]).isRelative("E"))
+
+	def test_unknown_state(self):
+		tracker = self._track(["G91", "G1 X10 F1800", "G28"])
+		self.assertEquals((None, None), (tracker.position["X"], tracker.feedrate))
+		# homing doesn't change the positioning mode
+		self.assertTrue(tracker.isRelative("X"))
+
+		tracker = self._track(["G1 X10 F1800", "M206 X5"])
+		self.assertEquals((None, 1800.0), (tracker.position["X"], tracker.feedrate))
+
+		for line in ("T1", "G92", "G92 A1", "G1 X1x"):
+			tracker = self._track(["G1 X10 F1800", "G4 P100", "M117 Hello", line])
+			self.assertEquals(dict(X=None, Y=None, Z=None, E=None), tracker.position)
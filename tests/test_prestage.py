@@ -0,0 +1,70 @@
+import unittest
+import tempfile
+import shutil
+import os
+
+from octoprint.util.comm import PrestagedGcodeFile, PrintingGcodeFileInformation
+from octoprint.util.gcodeCompactor import GcodeCompactor
+
+
+class PrestagedGcodeFileTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.path = os.path.join(self.basedir, "test.gcode")
+		with open(self.path, "wb") as f:
+			f.write("; generated\n")
+			for i in range(1000):
+				f.write("G1 X%d Y%d ; move\n" % (i, i))
+			f.write("M104 S200\n")
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def _print(self, prestaged=None, compactor=None):
+		fileInformation = PrintingGcodeFileInformation(self.path, lambda: ({0: 5}, 0), prestaged=prestaged, compactor=compactor)
+		fileInformation.start()
+		lines = []
+		positions = []
+		while True:
+			line = fileInformation.getNext()
+			if line is None:
+				break
+			lines.append(line)
+			positions.append(fileInformation.getFilepos())
+		return lines, positions
+
+	def test_same_lines_as_unprestaged(self):
+		prestaged = PrestagedGcodeFile(self.path, 1024)
+		self.assertTrue(prestaged.load())
+
+		lines, positions = prestaged.getLines()
+		self.assertEquals("G1 X0 Y0", lines[0])
+		self.assertTrue(0 < prestaged.getEnd() < os.path.getsize(self.path))
+
+		expected = self._print()
+		self.assertEquals(expected, self._print(prestaged=prestaged))
+		self.assertEquals("M104 S205.000000", expected[0][-1])
+
+	def test_changed_file(self):
+		prestaged = PrestagedGcodeFile(self.path, 1024)
+		self.assertTrue(prestaged.load())
+
+		with open(self.path, "r+b") as f:
+			f.write("G28")
+		os.utime(self.path, (0, 0))
+
+		lines, _ = self._print(prestaged=prestaged)
+		self.assertEquals("G28enerated", lines[1])
+		self.assertEquals("G1 X0 Y0", lines[2])
+
+	def test_compacted_lines_dropped(self):
+		with open(self.path, "wb") as f:
+			f.write("G28\nG1 X10 Y10 F1500\nG1 X10 Y10\nG1 X20 Y10\nG1 X30\n")
+		prestaged = PrestagedGcodeFile(self.path, 1024)
+		self.assertTrue(prestaged.load())
+
+		# the move to where the head already is gets dropped, that must not end the print
+		lines, _ = self._print(prestaged=prestaged, compactor=GcodeCompactor())
+		self.assertEquals(["M110 N0", "G28", "G1 X10 Y10 F1500", "G1 X20", "G1 X30"], lines)
+		self.assertEquals(lines, self._print(compactor=GcodeCompactor())[0])
@@ -0,0 +1,72 @@
+import unittest
+import sys
+import tempfile
+import shutil
+import os
+
+from flask.ext.login import LoginManager
+
+import octoprint.server
+from octoprint.server import app, restricted_access, admin_permission, load_user
+from octoprint.settings import settings
+from octoprint.users import FilebasedUserManager
+
+
+@app.route("/test/principalCache")
+@restricted_access
+@admin_permission.require(403)
+def _principalCacheTest():
+	return "ok"
+
+
+class PrincipalCacheTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		s = settings(init=True, basedir=self.basedir)
+		s.setBoolean(["server", "firstRun"], False)
+		s.setBoolean(["api", "enabled"], True)
+		s.set(["accessControl", "userfile"], os.path.join(self.basedir, "users.yaml"))
+
+		self.userManager = FilebasedUserManager()
+		self.userManager.addUser("alice", "secret", active=True, roles=["user", "admin"], apikey="ALICEKEY")
+		self.previousUserManager = octoprint.server.userManager
+		octoprint.server.userManager = self.userManager
+
+		if not hasattr(app, "login_manager"):
+			app.secret_key = "test"
+			loginManager = LoginManager()
+			loginManager.user_callback = load_user
+			loginManager.init_app(app)
+
+		# octoprint.server shadows its util submodule with octoprint.util
+		self.cache = sys.modules["octoprint.server.util"]._principalCache
+		self.cache.invalidate()
+
+	def tearDown(self):
+		octoprint.server.userManager = self.previousUserManager
+		settings().set(["accessControl", "userfile"], None)
+		shutil.rmtree(self.basedir)
+
+	def _get(self):
+		# without any session, like API clients
+		return app.test_client().get("/test/principalCache?apikey=ALICEKEY").status_code
+
+	def test_revoked_role(self):
+		self.assertEquals(200, self._get())
+		self.assertIsNotNone(self.cache.get("ALICEKEY"))
+
+		self.userManager.removeRolesFromUser("alice", ["admin"])
+		self.assertEquals(403, self._get())
+
+	def test_deactivated_user(self):
+		self.assertEquals(200, self._get())
+
+		self.userManager.changeUserActivation("alice", False)
+		self.assertEquals(401, self._get())
+
+	def test_changed_apikey(self):
+		self.assertEquals(200, self._get())
+
+		self.userManager.generateApiKey("alice")
+		self.assertEquals(401, self._get())
@@ -0,0 +1,134 @@
+import unittest
+import tempfile
+import shutil
+import os
+import sqlite3
+import time
+
+from octoprint.history import PrintHistory
+
+
+class PrintHistoryTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.history = PrintHistory(path=os.path.join(self.basedir, "history.db"), ratioJobs=2)
+
+		self.day1 = time.mktime((2014, 9, 1, 12, 0, 0, 0, 0, -1))
+		self.day2 = time.mktime((2014, 9, 2, 12, 0, 0, 0, 0, -1))
+
+	def tearDown(self):
+		self.history.close()
+		shutil.rmtree(self.basedir)
+
+	def test_jobs(self):
+		self.history.record("a.gcode", True, printTime=100.0, estimatedPrintTime=80.0, filament=1000.0, end=self.day1)
+		self.history.record("b.gcode", False, printTime=50.0, end=self.day1 + 60)
+		self.history.record("a.gcode", True, printTime=110.0, estimatedPrintTime=80.0, end=self.day2)
+
+		jobs = self.history.getJobs()
+		self.assertEquals(["a.gcode", "b.gcode", "a.gcode"], [job["file"] for job in jobs])
+		self.assertEquals(self.day2 - 110.0, jobs[0]["start"])
+		self.assertFalse(jobs[1]["success"])
+
+		jobs = self.history.getJobs(before=jobs[1]["end"], limit=1)
+		self.assertEquals([(self.day1, 1000.0)], [(job["end"], job["filament"]) for job in jobs])
+
+	def test_statistics(self):
+		self.history.record("a.gcode", True, printTime=100.0, filament=1000.0, end=self.day1)
+		self.history.record("b.gcode", False, printTime=50.0, filament=200.0, end=self.day1 + 60)
+		self.history.record("a.gcode", True, printTime=110.0, filament=1000.0, end=self.day2)
+
+		total = self.history.getStatistics()[None]
+		self.assertEquals((3, 2, 260.0, 2200.0), (total["count"], total["success"], total["printTime"], total["filament"]))
+
+		byFile = self.history.getStatistics(groupBy="file")
+		self.assertEquals({"a.gcode": 2, "b.gcode": 1}, dict((key, value["count"]) for key, value in byFile.items()))
+
+		byDay = self.history.getStatistics(groupBy="day")
+		self.assertEquals({"2014-09-01": 150.0, "2014-09-02": 110.0}, dict((key, value["printTime"]) for key, value in byDay.items()))
+
+		byOutcome = self.history.getStatistics(groupBy="outcome", since=self.day1, until=self.day2)
+		self.assertEquals({"success": 1, "failure": 1}, dict((key, value["count"]) for key, value in byOutcome.items()))
+
+		self.assertEquals({}, self.history.getStatistics(filename="c.gcode"))
+		self.assertRaises(ValueError, self.history.getStatistics, groupBy="unknown")
+
+	def test_estimate_ratio(self):
+		self.assertIsNone(self.history.getEstimateRatio())
+
+		self.history.record("a.gcode", True, printTime=120.0, estimatedPrintTime=100.0, end=self.day1)
+		self.history.record("b.gcode", True, printTime=300.0, estimatedPrintTime=100.0, end=self.day1 + 60)
+		self.history.record("c.gcode", True, printTime=100.0, estimatedPrintTime=100.0, end=self.day1 + 120)
+		# failed jobs don't count
+		self.history.record("c.gcode", False, printTime=10.0, estimatedPrintTime=100.0, end=self.day1 + 180)
+
+		# per file if printed before
+		self.assertAlmostEquals(1.2, self.history.getEstimateRatio("a.gcode"))
+		# otherwise from the last two successful jobs
+		self.assertAlmostEquals(2.0, self.history.getEstimateRatio("d.gcode"))
+		self.assertAlmostEquals(2.0, self.history.getEstimateRatio())
+
+		self.history.record("d.gcode", True, printTime=150.0, estimatedPrintTime=100.0, end=self.day2)
+		self.assertAlmostEquals(1.5, self.history.getEstimateRatio("d.gcode"))
+
+	def test_estimate_ratio_per_printer(self):
+		self.history.record("a.gcode", True, printTime=200.0, estimatedPrintTime=100.0, end=self.day1, printer="slow")
+		self.history.record("b.gcode", True, printTime=100.0, estimatedPrintTime=100.0, end=self.day1 + 60, printer="fast")
+
+		self.assertAlmostEquals(2.0, self.history.getEstimateRatio("a.gcode", "slow"))
+		self.assertAlmostEquals(2.0, self.history.getEstimateRatio("b.gcode", "slow"))
+		self.assertAlmostEquals(1.0, self.history.getEstimateRatio(printer="fast"))
+		# printers without jobs of their own use the jobs of all printers
+		self.assertAlmostEquals(1.5, self.history.getEstimateRatio(printer="new"))
+		self.assertAlmostEquals(2.0, self.history.getEstimateRatio("a.gcode", "new"))
+
+		self.history.record("b.gcode", True, printTime=300.0, estimatedPrintTime=100.0, end=self.day2, printer="slow")
+		self.assertAlmostEquals(3.0, self.history.getEstimateRatio("b.gcode", "slow"))
+		self.assertAlmostEquals(1.0, self.history.getEstimateRatio("b.gcode", "fast"))
+
+	def test_change_last_outcome(self):
+		self.history.record("a.gcode", True, printTime=100.0, end=self.day1)
+		self.history.record("a.gcode", True, printTime=100.0, end=self.day2)
+
+		self.history.changeLastOutcome("a.gcode", False)
+
+		self.assertEquals([False, True], [job["success"] for job in self.history.getJobs()])
+
+	def test_persistent(self):
+		self.history.record("a.gcode", True, printTime=100.0, end=self.day1)
+		self.history.close()
+
+		self.history = PrintHistory(path=os.path.join(self.basedir, "history.db"))
+		self.assertEquals(1, len(self.history.getJobs()))
+
+	def test_printer(self):
+		self.history.record("a.gcode", True, printTime=100.0, end=self.day1, printer="left")
+		self.history.record("a.gcode", False, printTime=50.0, end=self.day1 + 60, printer="right")
+		self.history.record("b.gcode", True, printTime=110.0, end=self.day2, printer="left")
+
+		jobs = self.history.getJobs(printer="left")
+		self.assertEquals([("b.gcode", "left"), ("a.gcode", "left")], [(job["file"], job["printer"]) for job in jobs])
+
+		byPrinter = self.history.getStatistics(groupBy="printer")
+		self.assertEquals({"left": 210.0, "right": 50.0}, dict((key, value["printTime"]) for key, value in byPrinter.items()))
+
+		total = self.history.getStatistics(filename="a.gcode", printer="right")[None]
+		self.assertEquals((1, 0), (total["count"], total["success"]))
+
+	def test_migrate_without_printer(self):
+		self.history.close()
+		path = os.path.join(self.basedir, "old.db")
+		connection = sqlite3.connect(path)
+		connection.execute(
+			"CREATE TABLE jobs (id INTEGER PRIMARY KEY, filename TEXT NOT NULL, origin TEXT, start REAL, end REAL NOT NULL, "
+			"day TEXT NOT NULL, success INTEGER NOT NULL, printTime REAL, estimatedPrintTime REAL, filament REAL)"
+		)
+		connection.execute("INSERT INTO jobs (filename, end, day, success) VALUES ('a.gcode', ?, '2014-09-01', 1)", (self.day1,))
+		connection.execute("PRAGMA user_version = 1")
+		connection.commit()
+		connection.close()
+
+		self.history = PrintHistory(path=path)
+		self.history.record("b.gcode", True, printTime=100.0, end=self.day2, printer="left")
+		self.assertEquals([("b.gcode", "left"), ("a.gcode", None)], [(job["file"], job["printer"]) for job in self.history.getJobs()])
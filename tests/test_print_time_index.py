@@ -0,0 +1,123 @@
+import unittest
+import tempfile
+import shutil
+import os
+
+from octoprint.settings import settings
+from octoprint.gcodefiles import PrintTimeIndex
+from octoprint.util.comm import RemainingTimeEstimator
+from octoprint.util.gcodeInterpreter import gcode, Timeline
+
+
+class TimelineTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_downsampling(self):
+		timeline = Timeline(maxSamples=16, resolution=10)
+		for offset in range(1, 1001):
+			timeline.add(offset, offset / 10.0)
+		samples = timeline.finish(1000, 100.0)
+
+		self.assertTrue(len(samples) <= 16)
+		self.assertEquals((0, 0.0), samples[0])
+		self.assertEquals((1000, 100.0), samples[-1])
+		offsets = [offset for offset, _ in samples]
+		self.assertEquals(sorted(offsets), offsets)
+
+	def test_interpreter_timeline(self):
+		lines = ["G28\n", "G1 X100 F6000\n", "G4 S10\n", "G1 X0 F6000\n"]
+		analysis = gcode()
+		analysis.loadLines(lines)
+
+		self.assertEquals((0, 0.0), analysis.timeline[0])
+		self.assertEquals(len("".join(lines)), analysis.timeline[-1][0])
+		self.assertAlmostEquals(analysis.totalMoveTimeMinute * 60, analysis.timeline[-1][1], places=3)
+
+
+class PrintTimeIndexTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.path = os.path.join(self.basedir, "test.gcode")
+		with open(self.path, "wb") as f:
+			f.write("G1 X10\n" * 100)
+
+		self.timeIndex = PrintTimeIndex([(0, 0.0), (100, 10.0), (700, 100.0)])
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_lookup(self):
+		self.assertEquals(0.0, self.timeIndex.getTimeAt(0))
+		self.assertAlmostEquals(5.0, self.timeIndex.getTimeAt(50))
+		self.assertAlmostEquals(10.0, self.timeIndex.getTimeAt(100))
+		self.assertAlmostEquals(55.0, self.timeIndex.getTimeAt(400))
+		self.assertEquals(100.0, self.timeIndex.getTimeAt(1000))
+		self.assertEquals(100.0, self.timeIndex.getTotalTime())
+
+	def test_write_and_read(self):
+		indexPath = PrintTimeIndex.getPath(self.path)
+		self.timeIndex.write(indexPath, self.path)
+
+		self.assertEquals(os.path.join(self.basedir, ".test.gcode.times"), indexPath)
+
+		timeIndex = PrintTimeIndex.read(indexPath, self.path)
+		self.assertEquals(3, timeIndex.getSampleCount())
+		self.assertAlmostEquals(55.0, timeIndex.getTimeAt(400), places=5)
+
+	def test_stale_index_ignored(self):
+		indexPath = PrintTimeIndex.getPath(self.path)
+		self.timeIndex.write(indexPath, self.path)
+
+		with open(self.path, "ab") as f:
+			f.write("M84\n")
+
+		self.assertIsNone(PrintTimeIndex.read(indexPath, self.path))
+
+
+class RemainingTimeEstimatorTestCase(unittest.TestCase):
+
+	def setUp(self):
+		# 1000s in total, the second half of the file takes three times as long as the first one
+		self.timeIndex = PrintTimeIndex([(0, 0.0), (1000, 250.0), (2000, 1000.0)])
+
+	def test_prediction(self):
+		estimator = RemainingTimeEstimator(self.timeIndex)
+
+		self.assertEquals(1000.0, estimator.estimate(0, 0.0, 0.0))
+		# printing exactly as predicted
+		self.assertAlmostEquals(750.0, estimator.estimate(1000, 250.0, 0.0))
+		self.assertAlmostEquals(375.0, estimator.estimate(1500, 625.0, 0.0))
+
+	def test_correction(self):
+		estimator = RemainingTimeEstimator(self.timeIndex, warmup=100.0)
+
+		estimator.estimate(0, 0.0, 0.0)
+		# printing takes twice as long as predicted
+		self.assertAlmostEquals(1500.0, estimator.estimate(1000, 500.0, 0.0))
+
+	def test_correction_warmup(self):
+		estimator = RemainingTimeEstimator(self.timeIndex, warmup=500.0)
+
+		estimator.estimate(0, 0.0, 0.0)
+		# only half of the warmup passed, so only half of the correction is applied
+		self.assertAlmostEquals(750.0 * 1.5, estimator.estimate(1000, 500.0, 0.0))
+
+	def test_heatup_excluded(self):
+		estimator = RemainingTimeEstimator(self.timeIndex, warmup=100.0)
+
+		estimator.estimate(0, 0.0, 30.0)
+		self.assertAlmostEquals(750.0, estimator.estimate(1000, 550.0, 330.0))
+
+	def test_baseline(self):
+		estimator = RemainingTimeEstimator(self.timeIndex, warmup=100.0)
+
+		# print time is only measured starting somewhere into the file
+		estimator.estimate(1000, 0.0, 0.0)
+		self.assertAlmostEquals(375.0 * 0.5, estimator.estimate(1500, 187.5, 0.0))
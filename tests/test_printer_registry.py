@@ -0,0 +1,139 @@
+import unittest
+import threading
+import tempfile
+import shutil
+
+from mock import Mock, patch
+
+from octoprint.settings import settings
+
+from octoprint.printer import Printer, PrinterRegistry, PrinterTaskWorker, StateMonitor, StateMonitorDispatcher, getConnectionPreferences
+
+
+class PrinterRegistryTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.config = {
+			"printers": [
+				{"id": "left", "name": "Left", "port": "/dev/ttyUSB0", "baudrate": "115200", "autoconnect": True},
+				{"id": "right"},
+				{"id": "in valid"}
+			]
+		}
+
+		self.settingsPatcher = patch("octoprint.printer.settings")
+		settingsMock = self.settingsPatcher.start()
+		settingsMock.return_value.get.side_effect = lambda path: self.config.get(path[0])
+		settingsMock.return_value.getInt.return_value = None
+		settingsMock.return_value.getBoolean.return_value = False
+
+		self.gcodeManager = Mock()
+
+	def tearDown(self):
+		self.settingsPatcher.stop()
+
+	def test_from_settings(self):
+		registry = PrinterRegistry.fromSettings(self.gcodeManager)
+
+		self.assertEquals(["default", "left", "right"], [printer.getId() for printer in registry.getAll()])
+		self.assertEquals("Left", registry.get("left").getName())
+		self.assertEquals("right", registry.get("right").getName())
+		self.assertIs(registry.get("default"), registry.getDefault())
+		self.assertIsNone(registry.get("in valid"))
+		self.assertEquals(3, self.gcodeManager.registerCallback.call_count)
+
+	def test_duplicate_id(self):
+		registry = PrinterRegistry(self.gcodeManager)
+		registry.add("left")
+
+		self.assertRaises(ValueError, registry.add, "left")
+		self.assertRaises(ValueError, registry.add, "../left")
+
+	def test_connection_preferences(self):
+		self.assertEquals({"port": "/dev/ttyUSB0", "baudrate": 115200, "autoconnect": True}, getConnectionPreferences("left"))
+		self.assertEquals({"port": None, "baudrate": None, "autoconnect": False}, getConnectionPreferences("right"))
+
+	def test_autoconnect(self):
+		registry = PrinterRegistry.fromSettings(self.gcodeManager)
+		for printer in registry.getAll():
+			printer.connect = Mock()
+
+		with patch("octoprint.printer.comm.serialList", return_value=["/dev/ttyUSB0"]):
+			registry.autoconnect()
+
+		registry.get("left").connect.assert_called_once_with("/dev/ttyUSB0", 115200)
+		self.assertFalse(registry.get("right").connect.called)
+		self.assertFalse(registry.getDefault().connect.called)
+
+
+class StateMonitorDispatcherTestCase(unittest.TestCase):
+
+	def test_updates_all_monitors(self):
+		dispatcher = StateMonitorDispatcher()
+		updated = [threading.Event(), threading.Event()]
+		monitors = [StateMonitor(0.0, Mock(side_effect=lambda data, event=event: event.set()), Mock(), Mock(), Mock(), dispatcher=dispatcher) for event in updated]
+
+		for monitor in monitors:
+			monitor.setCurrentZ(1.0)
+
+		for event in updated:
+			event.wait(5.0)
+			self.assertTrue(event.is_set())
+
+	def test_schedule_keeps_earlier_slot(self):
+		dispatcher = StateMonitorDispatcher()
+		monitor = Mock()
+		monitor._update.side_effect = Exception("must not be called yet")
+
+		dispatcher.schedule(monitor, 1e12)
+		dispatcher.schedule(monitor, 0)
+
+		self.assertEquals({monitor: 1e12}, dispatcher._due)
+
+		with dispatcher._condition:
+			dispatcher._due.clear()
+			dispatcher._condition.notify()
+
+
+
+class PrinterTaskWorkerTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_tasks_in_order(self):
+		worker = PrinterTaskWorker()
+		done = []
+		worker.submit(Mock(side_effect=Exception("failing tasks don't stop the worker")))
+		for i in range(3):
+			worker.submit(done.append, i)
+		worker.join()
+
+		self.assertEquals([0, 1, 2], done)
+
+	def test_print_recorded_off_the_comm_thread(self):
+		release = threading.Event()
+		gcodeManager = Mock()
+		gcodeManager.printSucceeded.side_effect = lambda *args, **kwargs: release.wait(5)
+		with patch("octoprint.printer.StateMonitorDispatcher.instance"):
+			printer = Printer(gcodeManager, id="left")
+
+		printer._comm = Mock()
+		printer._comm.STATE_PRINTING = 5
+		printer._comm.STATE_OPERATIONAL = 3
+		printer._comm.getPrintTime.return_value = 100.0
+		printer._state = 5
+		printer._selectedFile = {"filename": "a.gcode"}
+		printer._printCancelled = False
+
+		# a slow disk doesn't hold up the processing of the received lines
+		printer.mcStateChange(3)
+		self.assertFalse(release.is_set())
+
+		release.set()
+		PrinterTaskWorker.instance().join()
+		gcodeManager.printSucceeded.assert_called_once_with("a.gcode", printTime=100.0, printer="left")
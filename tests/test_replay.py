@@ -0,0 +1,91 @@
+import unittest
+
+from octoprint.util.replay import Recording, ReplayTransport, FixedLatency, SerialLineLatency, JitterLatency, createLatencyModel
+
+
+class Clock(object):
+	def __init__(self, now=1000.0):
+		self.now = now
+
+	def __call__(self):
+		return self.now
+
+
+class RecordingTestCase(unittest.TestCase):
+
+	def test_from_lines(self):
+		recording = Recording.fromLines([
+			"2014-05-01 12:00:00,000 - Connecting to: /dev/ttyACM0\n",
+			"2014-05-01 12:00:00,100 - Recv: start\n",
+			"2014-05-01 12:00:00,200 - Send: M105\n",
+			"2014-05-01 12:00:00,300 - Recv: ok T:20.0 /0.0 B:21.0 /0.0 @:0\n",
+			"2014-05-01 12:00:01,000 - Send: N1 M20*23\n",
+			"2014-05-01 12:00:01,001 - Send: N2 G28*12\n",
+			"2014-05-01 12:00:01,100 - Recv: Begin file list\n",
+			"2014-05-01 12:00:01,100 - Recv: TEST.GCO\n",
+			"2014-05-01 12:00:01,100 - Recv: End file list\n",
+			"2014-05-01 12:00:01,100 - Recv: ok\n",
+			"2014-05-01 12:00:01,100 - Recv: Error:checksum mismatch, Last Line: 1\n",
+			"2014-05-01 12:00:01,100 - Recv: Resend: 2\n",
+			"2014-05-01 12:00:01,100 - Recv: ok\n",
+			"2014-05-01 12:00:02,000 - Send: M105\n",
+			"2014-05-01 12:00:02,100 - Recv: ok T:21.0 /0.0 B:21.0 /0.0 @:0\n"
+		])
+
+		self.assertEquals(["start"], recording.greeting)
+		self.assertEquals([["Begin file list", "TEST.GCO", "End file list", "ok"]], recording.responses["M20"])
+		self.assertEquals([["ok"]], recording.responses["G28"])
+
+		# responses of a command are cycled through
+		self.assertEquals(["ok T:20.0 /0.0 B:21.0 /0.0 @:0"], recording.respond("N3 M105*37"))
+		self.assertEquals(["ok T:21.0 /0.0 B:21.0 /0.0 @:0"], recording.respond("M105"))
+		self.assertEquals(["ok T:20.0 /0.0 B:21.0 /0.0 @:0"], recording.respond("m105"))
+		self.assertEquals(["ok"], recording.respond("G1 X10"))
+
+
+class LatencyTestCase(unittest.TestCase):
+
+	def test_serial_line(self):
+		model = SerialLineLatency(baudrate=10000, processing=0.01)
+		# 10 bytes in 10ms, processed in another 10ms, 3 bytes back in 3ms
+		self.assertAlmostEquals(1000.023, model(1000.0, "G1 X10 Y1", ["ok"]))
+		# the second line has to wait for the first one on the line and in the firmware
+		self.assertAlmostEquals(1000.033, model(1000.0, "G1 X10 Y1", ["ok"]))
+
+	def test_jitter(self):
+		first = JitterLatency(FixedLatency(0.1), 0.05, seed=1)
+		second = createLatencyModel({"model": "fixed", "latency": 0.1, "jitter": 0.05, "seed": 1})
+		for _ in range(10):
+			due = first(0.0, "G1 X10", ["ok"])
+			self.assertTrue(0.1 <= due <= 0.15)
+			self.assertEquals(due, second(0.0, "G1 X10", ["ok"]))
+
+
+class ReplayTransportTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.clock = Clock()
+		self.transport = ReplayTransport(Recording(["start"], {"M20": [["Begin file list", "End file list", "ok"]]}), FixedLatency(0.5), timeout=0, clock=self.clock)
+
+	def test_replay(self):
+		self.assertEquals("start\n", self.transport.readline())
+		self.assertEquals("", self.transport.readline())
+
+		self.transport.write("N1 M20*20\n")
+		self.assertEquals("", self.transport.readline())
+
+		self.clock.now += 0.5
+		self.assertEquals(["Begin file list\n", "End file list\n", "ok\n", ""], [self.transport.readline() for _ in range(4)])
+
+	def test_order(self):
+		self.transport.readline()
+		self.transport._latency = createLatencyModel({"model": "fixed", "latency": 0.5, "jitter": 1.0})
+		self.transport.write("G1 X1\nG1 X2\nG1 X3\n")
+
+		self.clock.now += 1.5
+		self.assertEquals(["ok\n"] * 3 + [""], [self.transport.readline() for _ in range(4)])
+
+	def test_close(self):
+		self.transport.timeout = None
+		self.transport.close()
+		self.assertEquals("", self.transport.readline())
@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import shutil
+import os
+import threading
+import time
+
+from mock import patch
+
+from octoprint.settings import settings
+from octoprint.util.comm import MachineCom, MachineComPrintCallback, checksum
+from octoprint.util.replay import ReplayTransport, Recording
+
+
+class _Firmware(ReplayTransport):
+	"""
+	Accepts lines in order like Marlin does, rejecting everything else with a resend request and an "ok". Lines in
+	``failing`` are rejected once for every time they are listed, like after a transmission error.
+	"""
+
+	failing = []
+
+	def __init__(self, recording, latency, timeout=2.0):
+		ReplayTransport.__init__(self, Recording(greeting=["start"]), timeout=timeout)
+		self.accepted = []
+		self.requests = 0
+		self._expected = None
+		self._failing = list(_Firmware.failing)
+		_Firmware.instance = self
+
+	def write(self, data):
+		line = data.strip()
+		responses = ["ok"]
+		if line.startswith("N") and "*" in line:
+			lineNumber = int(line[1:line.find(" ")])
+			command = line[line.find(" ") + 1:line.rfind("*")]
+			if command.startswith("M110"):
+				self._expected = lineNumber + 1
+			elif lineNumber in self._failing or lineNumber != self._expected or checksum(line[:line.rfind("*")]) != int(line[line.rfind("*") + 1:]):
+				if lineNumber in self._failing:
+					self._failing.remove(lineNumber)
+				self.requests += 1
+				responses = ["Error:checksum mismatch, Last Line: %d" % (self._expected - 1), "Resend: %d" % self._expected, "ok"]
+			else:
+				self._expected += 1
+				self.accepted.append(command)
+
+		with self._condition:
+			now = self._clock()
+			for response in responses:
+				self._received.append((now, response + "\n"))
+			self._condition.notify_all()
+
+
+class _Callback(MachineComPrintCallback):
+	def __init__(self):
+		self.operational = threading.Event()
+		self.done = threading.Event()
+
+	def mcStateChange(self, state):
+		if state == MachineCom.STATE_OPERATIONAL:
+			self.operational.set()
+
+	def mcPrintjobDone(self):
+		self.done.set()
+
+
+class ResendRequestTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		s = settings(init=True, basedir=self.basedir)
+		s.setBoolean(["feature", "sdSupport"], False)
+		s.setBoolean(["feature", "alwaysSendChecksum"], False)
+		s.setBoolean(["gcodeCompaction", "enabled"], False)
+		s.setBoolean(["serial", "reactor"], False)
+
+		self.path = os.path.join(self.basedir, "test.gcode")
+		self.lines = ["G1 X%d" % i for i in range(1, 21)]
+		with open(self.path, "wb") as f:
+			f.write("\n".join(self.lines) + "\n")
+
+		self.patcher = patch("octoprint.util.comm.ReplayTransport", _Firmware)
+		self.patcher.start()
+		self.comm = None
+
+	def tearDown(self):
+		if self.comm is not None:
+			self.comm.close()
+			self.comm.thread.join(5)
+		self.patcher.stop()
+		_Firmware.failing = []
+		shutil.rmtree(self.basedir)
+
+	def _print(self, swallowOkAfterResend):
+		settings().setBoolean(["feature", "swallowOkAfterResend"], swallowOkAfterResend)
+
+		callback = _Callback()
+		self.comm = MachineCom(port="REPLAY", baudrate=115200, callbackObject=callback)
+		self.assertTrue(callback.operational.wait(5))
+
+		start = time.time()
+		self.comm.selectFile(self.path, False)
+		self.comm.startPrint()
+		self.assertTrue(callback.done.wait(10))
+		# no waiting for the communication timeout to force things along
+		self.assertTrue(time.time() - start < 2.0)
+		return _Firmware.instance
+
+	def test_same_line_failing_twice(self):
+		_Firmware.failing = [6, 6]
+
+		firmware = self._print(True)
+		self.assertEquals(self.lines, firmware.accepted)
+		self.assertEquals(2, firmware.requests)
+
+	def test_same_line_failing_twice_ok_after_resend(self):
+		_Firmware.failing = [6, 6]
+
+		# the "ok" after the resend request sends the next line while the resent one is still on its way, the
+		# second request for line 6 is followed by one for that line as well which must not cause another resend
+		firmware = self._print(False)
+		self.assertEquals(self.lines, firmware.accepted)
+		self.assertEquals(3, firmware.requests)
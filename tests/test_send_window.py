@@ -0,0 +1,207 @@
+import unittest
+import tempfile
+import shutil
+import os
+import threading
+import time
+import collections
+
+from mock import patch
+
+from octoprint.settings import settings
+from octoprint.util.comm import MachineCom, MachineComPrintCallback, SendWindow, checksum
+from octoprint.util.replay import ReplayTransport, Recording
+
+
+class SendWindowTestCase(unittest.TestCase):
+
+	def test_window(self):
+		window = SendWindow(64)
+		self.assertTrue(window.fits(100))
+
+		window.sent(1, 30)
+		window.sent(2, 30)
+		self.assertFalse(window.fits(5))
+
+		self.assertEquals(1, window.acknowledged())
+		self.assertTrue(window.fits(34))
+		self.assertFalse(window.fits(35))
+
+		self.assertEquals(2, window.acknowledged())
+		self.assertEquals(0, len(window))
+		self.assertIsNone(window.acknowledged())
+
+	def test_count_sent_after(self):
+		window = SendWindow(127)
+		for lineNumber in (5, 6, 7, 5, 6):
+			window.sent(lineNumber, 10)
+
+		# counted from the last time the line was sent
+		self.assertEquals(1, window.countSentAfter(5))
+		self.assertEquals(2, window.countSentAfter(7))
+		self.assertEquals(0, window.countSentAfter(8))
+
+
+class _Firmware(ReplayTransport):
+	"""
+	Saves the lines sent between ``M28`` and ``M29`` in order like Marlin does, rejecting everything else with a
+	resend request and an "ok". Lines in ``failing`` are rejected once for every time they are listed, like after a
+	transmission error. Keeps track of the bytes of the lines sent but not yet acknowledged by an "ok" read by the
+	host.
+	"""
+
+	failing = []
+
+	def __init__(self, recording, latency, timeout=2.0):
+		ReplayTransport.__init__(self, Recording(greeting=["start"]), timeout=timeout)
+		self.saved = []
+		self.savedAtClose = None
+		self.received = collections.defaultdict(int)
+		self.requests = 0
+		self.maxInFlight = 0
+		self._inFlight = collections.deque()
+		self._expected = 1
+		self._writing = False
+		self._failing = list(_Firmware.failing)
+		_Firmware.instance = self
+
+	def write(self, data):
+		line = data.strip()
+		responses = ["ok"]
+		if line.startswith("N") and "*" in line:
+			lineNumber = int(line[1:line.find(" ")])
+			command = line[line.find(" ") + 1:line.rfind("*")]
+			self.received[lineNumber] += 1
+			if command.startswith("M110"):
+				self._expected = lineNumber + 1
+			elif lineNumber in self._failing or lineNumber != self._expected or checksum(line[:line.rfind("*")]) != int(line[line.rfind("*") + 1:]):
+				if lineNumber in self._failing:
+					self._failing.remove(lineNumber)
+				self.requests += 1
+				responses = ["Error:checksum mismatch, Last Line: %d" % (self._expected - 1), "Resend: %d" % self._expected, "ok"]
+			else:
+				self._expected += 1
+				if self._writing:
+					self.saved.append(command)
+		elif line.startswith("M28"):
+			self._writing = True
+			responses = ["Writing to file: %s" % line[4:], "ok"]
+		elif line.startswith("M29"):
+			self._writing = False
+			self.savedAtClose = list(self.saved)
+			responses = ["Done saving file.", "ok"]
+		elif line.startswith("M20"):
+			responses = ["Begin file list", "End file list", "ok"]
+
+		with self._condition:
+			if line.startswith("N"):
+				self._inFlight.append(len(data))
+				self.maxInFlight = max(self.maxInFlight, sum(self._inFlight))
+			now = self._clock()
+			for response in responses:
+				self._received.append((now, response + "\n"))
+			self._condition.notify_all()
+
+	def readline(self):
+		line = ReplayTransport.readline(self)
+		with self._condition:
+			if line.strip() == "ok" and self._inFlight:
+				self._inFlight.popleft()
+		return line
+
+
+class _Callback(MachineComPrintCallback):
+	def __init__(self):
+		self.operational = threading.Event()
+		self.done = threading.Event()
+
+	def mcStateChange(self, state):
+		if state == MachineCom.STATE_OPERATIONAL:
+			self.operational.set()
+
+	def mcFileTransferDone(self, filename):
+		self.done.set()
+
+
+class WindowedTransferTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		s = settings(init=True, basedir=self.basedir)
+		s.setBoolean(["feature", "sdSupport"], False)
+		s.setBoolean(["feature", "alwaysSendChecksum"], False)
+		s.setBoolean(["gcodeCompaction", "enabled"], False)
+		s.setBoolean(["serial", "reactor"], False)
+		s.setBoolean(["serial", "sdTransfer", "windowed"], True)
+		s.setInt(["serial", "sdTransfer", "bufferSize"], 127)
+
+		self.path = os.path.join(self.basedir, "test.gcode")
+		self.lines = ["G1 X%d Y%d" % (i, i) for i in range(1, 41)]
+		with open(self.path, "wb") as f:
+			f.write("\n".join(self.lines) + "\n")
+
+		self.patcher = patch("octoprint.util.comm.ReplayTransport", _Firmware)
+		self.patcher.start()
+		self.comm = None
+
+	def tearDown(self):
+		if self.comm is not None:
+			self.comm.close()
+			self.comm.thread.join(5)
+		self.patcher.stop()
+		_Firmware.failing = []
+		shutil.rmtree(self.basedir)
+
+	def _transfer(self, swallowOkAfterResend=True):
+		settings().setBoolean(["feature", "swallowOkAfterResend"], swallowOkAfterResend)
+
+		callback = _Callback()
+		self.comm = MachineCom(port="REPLAY", baudrate=115200, callbackObject=callback)
+		self.assertTrue(callback.operational.wait(5))
+
+		start = time.time()
+		self.comm.startFileTransfer(self.path, "test.gcode", "test.gco")
+		self.assertTrue(callback.done.wait(10))
+		# no waiting for the communication timeout to force things along
+		self.assertTrue(time.time() - start < 2.0)
+
+		firmware = _Firmware.instance
+		# closed only once every line has been acknowledged
+		self.assertEquals(self.lines, firmware.savedAtClose)
+		# never more sent than fits into the receive buffer
+		self.assertTrue(firmware.maxInFlight <= 127)
+		return firmware
+
+	def test_lines_sent_ahead(self):
+		firmware = self._transfer()
+		self.assertEquals(0, firmware.requests)
+		self.assertTrue(firmware.maxInFlight > 100)
+		# N1 is the M110 starting the transfer
+		self.assertEquals([1] * (len(self.lines) + 1), firmware.received.values())
+
+	def test_resend_within_window(self):
+		_Firmware.failing = [6]
+
+		firmware = self._transfer()
+		# the lines sent ahead after line 6 were rejected with requests for line 6 as well, each line is resent once
+		self.assertTrue(firmware.requests > 1)
+		self.assertEquals(2, firmware.received[6])
+		self.assertEquals(2, max(firmware.received.values()))
+
+	def test_same_line_failing_twice(self):
+		_Firmware.failing = [6, 6]
+
+		firmware = self._transfer()
+		self.assertEquals(3, firmware.received[6])
+
+	def test_same_line_failing_twice_ok_after_resend(self):
+		_Firmware.failing = [6, 6]
+
+		firmware = self._transfer(False)
+		self.assertEquals(3, firmware.received[6])
+
+	def test_last_line_failing(self):
+		_Firmware.failing = [len(self.lines) + 1]
+
+		firmware = self._transfer()
+		self.assertEquals(2, firmware.received[len(self.lines) + 1])
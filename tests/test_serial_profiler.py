@@ -0,0 +1,91 @@
+import unittest
+
+from octoprint.util.serialProfiler import SerialProfiler, Histogram
+
+
+class Clock(object):
+	def __init__(self, now=1000.0):
+		self.now = now
+
+	def __call__(self):
+		return self.now
+
+
+class HistogramTestCase(unittest.TestCase):
+
+	def test_add(self):
+		histogram = Histogram((1, 10))
+		for value in (0.5, 1, 5, 11, 100):
+			histogram.add(value)
+		self.assertEquals({"bounds": [1, 10], "counts": [2, 1, 2]}, histogram.asDict())
+
+
+class SerialProfilerTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.clock = Clock()
+		self.profiler = SerialProfiler(window=10, clock=self.clock)
+
+	def _send(self, enqueued, written, acknowledged, length=20):
+		self.clock.now = enqueued
+		self.profiler.enqueued()
+		self.clock.now = written
+		self.profiler.written(length)
+		self.clock.now = acknowledged
+		self.profiler.acknowledged()
+
+	def test_latencies(self):
+		self._send(1000.0, 1000.0015, 1000.0115)
+		self._send(1000.1, 1000.1, 1000.3)
+
+		statistics = self.profiler.getStatistics()
+		self.assertEquals((2, 40), (statistics["lines"], statistics["bytes"]))
+		# 10ms and 200ms round trip
+		self.assertEquals([0, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 0, 0], statistics["roundTrip"]["counts"])
+		# 1.5ms and none at all on the host
+		self.assertEquals([1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0], statistics["hostLatency"]["counts"])
+		# waiting is only accounted while printing
+		self.assertEquals((0.0, 0.0), (statistics["hostWaiting"], statistics["firmwareWaiting"]))
+
+	def test_window(self):
+		self._send(1000.0, 1000.0, 1000.01)
+		self._send(1005.0, 1005.0, 1005.01)
+		self.assertEquals(2, self.profiler.getStatistics()["lines"])
+
+		self.clock.now = 1010.5
+		self.assertEquals(1, self.profiler.getStatistics()["lines"])
+
+	def test_print(self):
+		self.profiler.start()
+		# the firmware waits 0.1s for the first line, the host 0.4s for its "ok"
+		self._send(1000.0, 1000.1, 1000.5)
+		# nothing at all during the next two seconds, then the firmware waited 2.5s in total
+		self._send(1003.0, 1003.0, 1003.25)
+
+		self.clock.now = 1004.0
+		self.profiler.pause()
+		self.clock.now = 1010.0
+		self.profiler.start()
+		self.clock.now = 1010.5
+		profile = self.profiler.stop()
+
+		self.assertEquals(1000.0, profile["start"])
+		self.assertEquals(10.5, profile["duration"])
+		self.assertEquals(2, profile["lines"])
+		self.assertAlmostEquals(0.65, profile["hostWaiting"])
+		self.assertAlmostEquals(0.1 + 2.5 + 0.75 + 0.5, profile["firmwareWaiting"])
+		self.assertEquals([1000, 1001, 1002, 1003, 1004, 1010], [sample[0] for sample in profile["samples"]])
+		self.assertEquals([1, 0, 0, 1, 0, 0], [sample[1] for sample in profile["samples"]])
+		self.assertEquals([6, 0, 0, 0, 0, 0, 0, 0, 0], profile["linesPerSecond"]["counts"])
+
+		self.assertEquals(None, self.profiler.stop())
+		self.assertFalse(self.profiler.getStatistics()["printing"])
+
+	def test_unexpected_ok(self):
+		self.profiler.written(20, 1)
+		self.profiler.acknowledged()
+		self.profiler.acknowledged()
+
+		statistics = self.profiler.getStatistics()
+		self.assertEquals(0, statistics["waiting"])
+		self.assertEquals(1, sum(statistics["roundTrip"]["counts"]))
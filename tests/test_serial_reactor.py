@@ -0,0 +1,93 @@
+import unittest
+import os
+import pty
+import tty
+import select
+import time
+import Queue
+
+from octoprint.util.reactor import SerialReactor
+
+
+class SerialReactorTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.reactor = SerialReactor()
+		self.master, self.slave = pty.openpty()
+		tty.setraw(self.slave)
+		self.lines = Queue.Queue()
+		self.errors = Queue.Queue()
+		self.timeout = None
+
+	def tearDown(self):
+		self.reactor.unregister(self.slave)
+		for fileno in (self.master, self.slave):
+			try:
+				os.close(fileno)
+			except OSError:
+				pass
+
+	def _register(self):
+		self.reactor.register(self.slave, self.lines.put, self.errors.put, lambda: self.timeout)
+
+	def test_lines(self):
+		self._register()
+
+		os.write(self.master, "ok T:21.0 B:20.0\nstart\nwa")
+		self.assertEquals("ok T:21.0 B:20.0\n", self.lines.get(timeout=5))
+		self.assertEquals("start\n", self.lines.get(timeout=5))
+
+		os.write(self.master, "it\n")
+		self.assertEquals("wait\n", self.lines.get(timeout=5))
+		self.assertEquals(1, self.reactor.getConnectionCount())
+
+	def test_timeout(self):
+		self.timeout = 0.05
+		self._register()
+
+		self.assertEquals("", self.lines.get(timeout=5))
+
+		os.write(self.master, "partial")
+		lines = [self.lines.get(timeout=5) for _ in range(3)]
+		self.assertTrue("partial" in lines)
+
+	def test_unregister(self):
+		self._register()
+		self.reactor.unregister(self.slave)
+
+		os.write(self.master, "ok\n")
+		self.assertRaises(Queue.Empty, self.lines.get, timeout=0.2)
+		self.assertEquals(0, self.reactor.getConnectionCount())
+
+	def test_port_gone(self):
+		self._register()
+		os.close(self.master)
+
+		self.errors.get(timeout=5)
+		self.assertEquals(0, self.reactor.getConnectionCount())
+
+	def test_write_never_blocks(self):
+		self._register()
+
+		# way more than the pseudo terminal buffers while nobody reads the other end
+		data = "".join("N%d G1 X%d\n" % (i, i % 200) for i in range(100000))
+		start = time.time()
+		self.reactor.write(self.slave, data[:500000])
+		self.reactor.write(self.slave, data[500000:])
+		self.assertTrue(time.time() - start < 1.0)
+
+		received = []
+		length = 0
+		while length < len(data):
+			select.select([self.master], [], [], 5)
+			chunk = os.read(self.master, 65536)
+			received.append(chunk)
+			length += len(chunk)
+		self.assertEquals(data, "".join(received))
+
+	def test_write_unregistered(self):
+		self._register()
+		self.reactor.unregister(self.slave)
+
+		self.reactor.write(self.slave, "M105\n")
+		self.assertEquals(([], [], []), select.select([self.master], [], [], 0.2))
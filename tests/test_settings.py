@@ -0,0 +1,165 @@
+import unittest
+import tempfile
+import shutil
+import os
+import threading
+
+from mock import Mock, patch
+
+from octoprint.settings import Settings
+
+
+class SettingsSubscriptionTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.settings = Settings(basedir=self.basedir)
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_subscriber_notified_on_set(self):
+		callback = Mock()
+		self.settings.subscribe(["devel", "virtualPrinter", "forceChecksum"], callback)
+
+		self.settings.setBoolean(["devel", "virtualPrinter", "forceChecksum"], True)
+
+		callback.assert_called_once_with(["devel", "virtualPrinter", "forceChecksum"], True)
+
+	def test_subscriber_not_notified_without_change(self):
+		callback = Mock()
+		self.settings.subscribe(["devel", "virtualPrinter", "forceChecksum"], callback)
+
+		self.settings.setBoolean(["devel", "virtualPrinter", "forceChecksum"], False)
+
+		self.assertFalse(callback.called)
+
+	def test_parent_subscriber_notified_on_child_change(self):
+		callback = Mock()
+		self.settings.subscribe(["devel", "virtualPrinter"], callback)
+
+		self.settings.setBoolean(["devel", "virtualPrinter", "okAfterResend"], True)
+
+		self.assertTrue(callback.called)
+		path, value = callback.call_args[0]
+		self.assertEquals(["devel", "virtualPrinter"], path)
+		self.assertTrue(value["okAfterResend"])
+
+	def test_child_subscriber_notified_on_parent_change(self):
+		callback = Mock()
+		self.settings.subscribe(["webcam", "timelapse", "type"], callback)
+
+		self.settings.set(["webcam", "timelapse"], {"type": "zchange", "options": {}, "postRoll": 0})
+
+		callback.assert_called_once_with(["webcam", "timelapse", "type"], "zchange")
+
+	def test_unrelated_subscriber_not_notified(self):
+		callback = Mock()
+		self.settings.subscribe(["serial", "timeout"], callback)
+
+		self.settings.setBoolean(["feature", "sdSupport"], False)
+
+		self.assertFalse(callback.called)
+
+	def test_unsubscribe(self):
+		callback = Mock()
+		self.settings.subscribe(["feature"], callback)
+		self.settings.unsubscribe(["feature"], callback)
+
+		self.settings.setBoolean(["feature", "sdSupport"], False)
+
+		self.assertFalse(callback.called)
+
+	def test_failing_subscriber_does_not_break_set(self):
+		failing = Mock(side_effect=RuntimeError("boom"))
+		callback = Mock()
+		self.settings.subscribe(["feature"], failing)
+		self.settings.subscribe(["feature", "sdSupport"], callback)
+
+		self.settings.setBoolean(["feature", "sdSupport"], False)
+
+		self.assertTrue(failing.called)
+		self.assertTrue(callback.called)
+		self.assertFalse(self.settings.getBoolean(["feature", "sdSupport"]))
+
+
+class SettingsPersistenceTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.settings = Settings(basedir=self.basedir)
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_save_writes_config(self):
+		self.settings.set(["appearance", "name"], "Test Printer")
+		self.settings.save()
+
+		reloaded = Settings(basedir=self.basedir)
+		self.assertEquals("Test Printer", reloaded.get(["appearance", "name"]))
+		self.assertEquals([], filter(lambda x: x.endswith(".tmp"), os.listdir(self.basedir)))
+
+	def test_save_does_not_reload(self):
+		self.settings.set(["appearance", "name"], "Test Printer")
+		with patch.object(self.settings, "load") as load:
+			self.settings.save()
+			self.assertFalse(load.called)
+
+	def test_failed_save_keeps_old_config(self):
+		self.settings.set(["appearance", "name"], "Test Printer")
+		self.settings.save()
+
+		self.settings.set(["appearance", "name"], "Other Printer")
+		with patch("yaml.safe_dump", side_effect=IOError("disk full")):
+			self.assertRaises(IOError, self.settings.save)
+
+		reloaded = Settings(basedir=self.basedir)
+		self.assertEquals("Test Printer", reloaded.get(["appearance", "name"]))
+		self.assertEquals([], filter(lambda x: x.endswith(".tmp"), os.listdir(self.basedir)))
+
+	def test_batch_writes_once(self):
+		callback = Mock()
+		self.settings.subscribe(["appearance"], callback)
+
+		with patch("yaml.safe_dump") as dump:
+			with self.settings.batch():
+				self.settings.set(["appearance", "name"], "Test Printer")
+				self.settings.save()
+				self.settings.set(["appearance", "color"], "red")
+				self.settings.save()
+
+				self.assertFalse(dump.called)
+				self.assertFalse(callback.called)
+
+			self.assertEquals(1, dump.call_count)
+		self.assertEquals(2, callback.call_count)
+
+	def test_nested_batch(self):
+		with patch("yaml.safe_dump") as dump:
+			with self.settings.batch():
+				with self.settings.batch():
+					self.settings.set(["appearance", "name"], "Test Printer")
+					self.settings.save()
+				self.assertFalse(dump.called)
+			self.assertEquals(1, dump.call_count)
+
+	def test_batch_only_defers_own_thread(self):
+		callback = Mock()
+		self.settings.subscribe(["appearance", "color"], callback)
+
+		def change():
+			self.settings.set(["appearance", "color"], "red")
+			self.settings.save()
+
+		with patch("yaml.safe_dump") as dump:
+			with self.settings.batch():
+				thread = threading.Thread(target=change)
+				thread.start()
+				thread.join()
+
+				self.assertEquals(1, dump.call_count)
+				callback.assert_called_once_with(["appearance", "color"], "red")
+			# nothing of the other thread is left to save or notify
+			self.assertEquals(1, dump.call_count)
+		self.assertEquals(1, callback.call_count)
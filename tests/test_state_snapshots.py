@@ -0,0 +1,156 @@
+import unittest
+import json
+import tempfile
+import shutil
+
+from mock import Mock, patch
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+from tornado.httpserver import HTTPRequest
+
+from octoprint.settings import settings
+from octoprint.printer import Printer, StateMonitor
+from octoprint.server.util import StateSnapshotHandler
+
+
+class StateMonitorSnapshotTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.snapshotCallback = Mock(return_value={
+			"job": (200, {"state": "Operational"}),
+			"printer": (409, "Printer is not operational")
+		})
+		self.stateMonitor = StateMonitor(0.5, Mock(), Mock(), Mock(), Mock(), snapshotCallback=self.snapshotCallback)
+
+	def test_snapshot_is_serialized(self):
+		status, body, etag = self.stateMonitor.getSnapshot("job")
+
+		self.assertEquals(200, status)
+		self.assertEquals({"state": "Operational"}, json.loads(body))
+
+	def test_error_snapshot_is_not_serialized(self):
+		status, body, etag = self.stateMonitor.getSnapshot("printer")
+
+		self.assertEquals(409, status)
+		self.assertEquals("Printer is not operational", body)
+
+	def test_etag_changes_with_content(self):
+		_, _, etag = self.stateMonitor.getSnapshot("job")
+		self.assertEquals(etag, self.stateMonitor.getSnapshot("job")[2])
+
+		self.snapshotCallback.return_value = {"job": (200, {"state": "Printing"})}
+		self.stateMonitor._updateSnapshots(self.stateMonitor.getCurrentData())
+		self.assertNotEquals(etag, self.stateMonitor.getSnapshot("job")[2])
+
+	def test_unknown_snapshot(self):
+		self.assertIsNone(self.stateMonitor.getSnapshot("unknown"))
+
+
+class PrinterSnapshotTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+
+		self.serialListPatcher = patch("octoprint.printer.comm.serialList", return_value=["/dev/ttyUSB0"])
+		self.serialList = self.serialListPatcher.start()
+		# no pushing of state updates
+		with patch("octoprint.printer.StateMonitorDispatcher.instance"):
+			self.printer = Printer(Mock())
+
+	def tearDown(self):
+		self.serialListPatcher.stop()
+		shutil.rmtree(self.basedir)
+
+	def _snapshot(self):
+		snapshots = self.printer._getStateSnapshots(self.printer._stateMonitor.getCurrentData())
+		return snapshots["connection"][1]["options"]["ports"]
+
+	def test_serial_ports_cached(self):
+		for _ in range(3):
+			self.assertEquals(["/dev/ttyUSB0"], self._snapshot())
+		self.assertEquals(1, self.serialList.call_count)
+
+		# looked up again after disconnecting ...
+		self.serialList.return_value = ["/dev/ttyUSB0", "/dev/ttyACM0"]
+		self.printer.disconnect()
+		self.assertEquals(["/dev/ttyUSB0", "/dev/ttyACM0"], self._snapshot())
+		self.assertEquals(2, self.serialList.call_count)
+
+		# ... and once they are too old
+		self.printer._serialPortsTimestamp -= 60
+		self._snapshot()
+		self.assertEquals(3, self.serialList.call_count)
+
+
+class StateSnapshotHandlerTestCase(AsyncHTTPTestCase):
+
+	def setUp(self):
+		self.printer = Mock()
+		self.printer.getStateSnapshot.return_value = (200, '{"state": "Operational"}', '"etag"')
+		self.fallback = Mock()
+
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir).setBoolean(["api", "enabled"], False)
+
+		AsyncHTTPTestCase.setUp(self)
+
+	def tearDown(self):
+		AsyncHTTPTestCase.tearDown(self)
+		shutil.rmtree(self.basedir)
+
+	def get_app(self):
+		return Application([
+			(r"/api/job", StateSnapshotHandler, {"printer": self.printer, "snapshot": "job", "fallback": self.fallback})
+		])
+
+	def test_get(self):
+		response = self.fetch("/api/job")
+
+		self.assertEquals(200, response.code)
+		self.assertEquals('{"state": "Operational"}', response.body)
+		self.assertEquals('"etag"', response.headers["Etag"])
+		self.printer.getStateSnapshot.assert_called_once_with("job")
+		self.assertFalse(self.fallback.called)
+
+	def test_not_modified(self):
+		response = self.fetch("/api/job", headers={"If-None-Match": '"etag"'})
+
+		self.assertEquals(304, response.code)
+
+	def test_error_status(self):
+		self.printer.getStateSnapshot.return_value = (409, "Printer is not operational", '"etag"')
+
+		response = self.fetch("/api/job", headers={"If-None-Match": '"etag"'})
+
+		self.assertEquals(409, response.code)
+		self.assertEquals("Printer is not operational", response.body)
+
+	def test_query_parameters_use_fallback(self):
+		fallback = Mock()
+		handler = self._createHandler("GET", "/api/job?history=true", fallback)
+
+		handler.prepare()
+
+		fallback.assert_called_once_with(handler.request)
+		self.assertFalse(self.printer.getStateSnapshot.called)
+
+	def test_apikey_does_not_use_fallback(self):
+		fallback = Mock()
+		handler = self._createHandler("GET", "/api/job?apikey=key", fallback)
+
+		handler.prepare()
+
+		self.assertFalse(fallback.called)
+
+	def test_post_uses_fallback(self):
+		fallback = Mock()
+		handler = self._createHandler("POST", "/api/job", fallback)
+
+		handler.prepare()
+
+		fallback.assert_called_once_with(handler.request)
+
+	def _createHandler(self, method, uri, fallback):
+		request = HTTPRequest(method, uri)
+		return StateSnapshotHandler(Application(), request, printer=self.printer, snapshot="job", fallback=fallback)
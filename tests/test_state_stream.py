@@ -0,0 +1,144 @@
+import unittest
+import json
+import tempfile
+import shutil
+
+from mock import Mock
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+
+from octoprint.settings import settings
+from octoprint.server.util import PrinterStateStream, PrinterStateLongPollHandler, PrinterStateEventSourceHandler
+
+
+class PrinterStateStreamTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.printer = Mock()
+		self.printer.getId.return_value = "left"
+		self.eventManager = Mock()
+		self.ioloop = Mock()
+		self.stream = PrinterStateStream(self.printer, self.eventManager, ioloop=self.ioloop)
+
+	def test_registers_with_printer_and_events(self):
+		self.printer.registerCallback.assert_called_once_with(self.stream)
+		self.assertTrue(self.eventManager.subscribe.called)
+
+	def test_messages_since(self):
+		self.stream.addTemperature({"time": 1})
+		self.stream.sendEvent("PrintStarted", {"file": "test.gcode"})
+
+		messages, complete = self.stream.getMessagesSince(0)
+
+		self.assertTrue(complete)
+		self.assertEquals([1, 2], [message[0] for message in messages])
+		self.assertEquals("event", messages[1][1])
+		self.assertEquals({"type": "PrintStarted", "payload": {"file": "test.gcode"}}, json.loads(messages[1][2]))
+
+		self.assertEquals(([], True), self.stream.getMessagesSince(2))
+
+	def test_events_of_other_printers(self):
+		self.stream._onEvent("PrintStarted", {"file": "a.gcode", "printer": "right"})
+		self.stream._onEvent("PrintStarted", {"file": "b.gcode", "printer": "left"})
+		self.stream._onEvent("UpdatedFiles", {"type": "gcode"})
+
+		messages, _ = self.stream.getMessagesSince(0)
+		self.assertEquals(["PrintStarted", "UpdatedFiles"], [json.loads(message[2])["type"] for message in messages])
+		self.assertEquals("b.gcode", json.loads(messages[0][2])["payload"]["file"])
+
+	def test_messages_dropped_from_backlog(self):
+		for i in range(PrinterStateStream.BACKLOG + 10):
+			self.stream.addTemperature({"time": i})
+
+		messages, complete = self.stream.getMessagesSince(5)
+
+		self.assertFalse(complete)
+		self.assertEquals(PrinterStateStream.BACKLOG, len(messages))
+		self.assertEquals(11, messages[0][0])
+
+	def test_unknown_sequence(self):
+		self.stream.addTemperature({"time": 1})
+
+		self.assertEquals(([], False), self.stream.getMessagesSince(1000))
+
+	def test_listener_called_on_ioloop(self):
+		listener = Mock()
+		self.stream.addListener(listener)
+
+		self.stream.addTemperature({"time": 1})
+
+		self.ioloop.add_callback.assert_called_once_with(listener, 1, "temperature", '{"time": 1}')
+
+		self.stream.removeListener(listener)
+		self.stream.addTemperature({"time": 2})
+		self.assertEquals(1, self.ioloop.add_callback.call_count)
+
+
+class PrinterStateStreamHandlerTestCase(AsyncHTTPTestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir).setBoolean(["api", "enabled"], False)
+
+		AsyncHTTPTestCase.setUp(self)
+
+	def tearDown(self):
+		AsyncHTTPTestCase.tearDown(self)
+		shutil.rmtree(self.basedir)
+
+	def get_app(self):
+		self.stream = PrinterStateStream(Mock(), Mock(), ioloop=self.io_loop)
+		return Application([
+			(r"/api/state/poll", PrinterStateLongPollHandler, {"stream": self.stream}),
+			(r"/api/state/stream", PrinterStateEventSourceHandler, {"stream": self.stream})
+		])
+
+	def test_poll_without_sequence(self):
+		self.stream.addTemperature({"time": 1})
+
+		response = self.fetch("/api/state/poll")
+
+		self.assertEquals({"sequence": 1, "complete": True, "messages": []}, json.loads(response.body))
+
+	def test_poll_returns_backlog(self):
+		self.stream.addTemperature({"time": 1})
+		self.stream.addTemperature({"time": 2})
+
+		response = self.fetch("/api/state/poll?since=1")
+
+		result = json.loads(response.body)
+		self.assertEquals(2, result["sequence"])
+		self.assertEquals([{"sequence": 2, "type": "temperature", "payload": {"time": 2}}], result["messages"])
+
+	def test_poll_waits_for_message(self):
+		self.io_loop.add_timeout(self.io_loop.time() + 0.1, lambda: self.stream.addTemperature({"time": 1}))
+
+		response = self.fetch("/api/state/poll?since=0&timeout=5")
+
+		result = json.loads(response.body)
+		self.assertEquals(1, result["sequence"])
+		self.assertEquals(1, len(result["messages"]))
+
+	def test_poll_timeout(self):
+		response = self.fetch("/api/state/poll?since=0&timeout=0.1")
+
+		self.assertEquals({"sequence": 0, "complete": True, "messages": []}, json.loads(response.body))
+
+	def test_event_stream_resumes(self):
+		self.stream.addTemperature({"time": 1})
+		self.stream.addTemperature({"time": 2})
+
+		chunks = []
+		def onChunk(chunk):
+			chunks.append(chunk)
+			if "id: 3" in "".join(chunks):
+				self.stop()
+
+		self.http_client.fetch(self.get_url("/api/state/stream"), headers={"Last-Event-ID": "1"}, streaming_callback=onChunk)
+		self.io_loop.add_timeout(self.io_loop.time() + 0.1, lambda: self.stream.addTemperature({"time": 3}))
+		self.wait()
+
+		data = "".join(chunks)
+		self.assertFalse("id: 1\n" in data)
+		self.assertTrue('id: 2\nevent: temperature\ndata: {"time": 2}\n\n' in data)
+		self.assertTrue('id: 3\nevent: temperature\ndata: {"time": 3}\n\n' in data)
@@ -0,0 +1,192 @@
+import unittest
+import tempfile
+import shutil
+import os
+import hashlib
+import json
+import threading
+
+from mock import Mock
+from flask import Flask, jsonify, make_response, request, abort
+from flask.ext.login import LoginManager
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+from tornado.httpserver import HTTPRequest
+
+from octoprint.settings import settings
+from octoprint.gcodefiles import StreamingUpload, IncrementalAnalysis
+from octoprint.server.util import UploadHandler
+from octoprint.util.gcodeInterpreter import gcode
+
+
+class StreamingUploadTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+		self.path = os.path.join(self.basedir, "test.gcode")
+		self.content = "G28\n" + "".join("G1 X%d Y%d E%d F1800\n" % (i % 100, i % 50, i) for i in range(1000)) + "G1 Z10"
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_upload_written_hashed_and_analysed(self):
+		upload = StreamingUpload(self.path)
+		# chunks deliberately don't line up with the line endings
+		for offset in range(0, len(self.content), 1000):
+			upload.write(self.content[offset:offset + 1000])
+
+		self.assertFalse(os.path.exists(self.path))
+
+		analysed = threading.Event()
+		result = []
+		def callback(gcode):
+			result.append(gcode)
+			analysed.set()
+		upload.finish(analysisCallback=callback)
+		analysed.wait(10)
+
+		with open(self.path, "rb") as f:
+			self.assertEquals(self.content, f.read())
+		self.assertEquals(hashlib.sha1(self.content).hexdigest(), upload.getHash())
+		self.assertEquals(len(self.content), upload.getSize())
+		self.assertEquals([self.path], [os.path.join(self.basedir, name) for name in os.listdir(self.basedir)])
+
+		expected = gcode()
+		expected.load(self.path)
+		self.assertEquals(1, len(result))
+		self.assertEquals(expected.extrusionAmount, result[0].extrusionAmount)
+		self.assertEquals(expected.totalMoveTimeMinute, result[0].totalMoveTimeMinute)
+
+	def test_upload_without_analysis(self):
+		upload = StreamingUpload(self.path, analyze=False)
+		upload.write(self.content)
+		upload.finish()
+
+		self.assertFalse(upload.isAnalyzing())
+		self.assertTrue(os.path.exists(self.path))
+
+	def test_abort(self):
+		upload = StreamingUpload(self.path)
+		upload.write(self.content)
+		upload.abort()
+
+		self.assertEquals([], os.listdir(self.basedir))
+
+	def test_upload_of_views(self):
+		upload = StreamingUpload(self.path)
+		for offset in range(0, len(self.content), 1000):
+			upload.write(buffer(self.content, offset, 1000))
+		upload.finish()
+
+		with open(self.path, "rb") as f:
+			self.assertEquals(self.content, f.read())
+		self.assertEquals(hashlib.sha1(self.content).hexdigest(), upload.getHash())
+
+
+class IncrementalAnalysisTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+		self.content = "G28\n" + "".join("G1 X%d Y%d E%d F1800\n" % (i % 100, i % 50, i) for i in range(1000))
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_bounded_queue(self):
+		analysis = IncrementalAnalysis(queueSize=1)
+		result = []
+		for offset in range(0, len(self.content), 100):
+			analysis.feed(self.content[offset:offset + 100])
+		analysis.finish(result.append)
+		analysis.join(10)
+
+		self.assertEquals(1, len(result))
+		self.assertAlmostEquals(999.0, result[0].extrusionAmount[0])
+
+	def test_feed_after_abort(self):
+		analysis = IncrementalAnalysis(queueSize=1)
+		analysis.abort()
+		analysis.join(10)
+
+		# nothing takes the chunks anymore, feeding doesn't block
+		for i in range(3):
+			analysis.feed(self.content)
+
+
+class UploadHandlerTestCase(AsyncHTTPTestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		s = settings(init=True, basedir=self.basedir)
+		s.set(["server", "baseUrl"], "")
+		s.set(["server", "scheme"], "")
+
+		AsyncHTTPTestCase.setUp(self)
+
+	def tearDown(self):
+		AsyncHTTPTestCase.tearDown(self)
+		shutil.rmtree(self.basedir)
+
+	def get_app(self):
+		self.flaskApp = Flask(__name__)
+		self.flaskApp.secret_key = "test"
+		LoginManager().init_app(self.flaskApp)
+		self.flaskApp.add_url_rule("/api/files/<string:target>", "upload", lambda target: None, methods=["POST"])
+
+		def upload(target, filename, data, selectAfterUpload, printAfterSelect):
+			self.uploadThread = threading.current_thread()
+			if self.uploadError is not None:
+				abort(self.uploadError)
+			self.uploaded = (target, filename, data, selectAfterUpload, printAfterSelect, request.headers.get("X-Api-Key"))
+			return make_response(jsonify(done=True, url=request.url_root), 201)
+		self.uploaded = None
+		self.uploadError = None
+
+		return Application([
+			(r"/api/files/(local)", UploadHandler, {"app": self.flaskApp, "upload": upload, "fallback": Mock()})
+		])
+
+	def _post(self, filename, fields=None, headers=None):
+		if fields is None:
+			fields = {}
+		if headers is None:
+			headers = {}
+
+		parts = []
+		for name, value in fields.items():
+			parts.append("--boundary\r\nContent-Disposition: form-data; name=\"%s\"\r\n\r\n%s\r\n" % (name, value))
+		parts.append("--boundary\r\nContent-Disposition: form-data; name=\"file\"; filename=\"%s\"\r\n"
+			"Content-Type: application/octet-stream\r\n\r\nG28\nG1 X10\r\n--boundary--\r\n" % filename)
+
+		headers["Content-Type"] = "multipart/form-data; boundary=boundary"
+		return self.fetch("/api/files/local", method="POST", body="".join(parts), headers=headers)
+
+	def test_upload(self):
+		response = self._post("test.gcode", {"select": "true", "apikey": "secret"}, {"X-Script-Name": "/octoprint"})
+
+		self.assertEquals(201, response.code)
+		self.assertEquals("application/json", response.headers["Content-Type"])
+		self.assertEquals({"done": True, "url": "http://localhost:%d/octoprint/" % self.get_http_port()}, json.loads(response.body))
+		self.assertEquals(("local", "test.gcode", "G28\nG1 X10", True, False, "secret"), self.uploaded)
+		# not processed on the IOLoop
+		self.assertNotEquals(threading.current_thread(), self.uploadThread)
+
+	def test_http_exception(self):
+		self.uploadError = 401
+
+		response = self._post("test.gcode")
+
+		self.assertEquals(401, response.code)
+		self.assertIsNone(self.uploaded)
+
+	def test_stl_handed_to_fallback(self):
+		fallback = Mock()
+		request = HTTPRequest("POST", "/api/files/local")
+		request.files = {"file": [{"filename": "test.stl", "body": "solid test", "content_type": "application/octet-stream"}]}
+		handler = UploadHandler(Application(), request, app=self.flaskApp, upload=Mock(), fallback=fallback)
+
+		handler.prepare()
+
+		fallback.assert_called_once_with(request)
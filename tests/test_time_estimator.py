@@ -0,0 +1,93 @@
+import unittest
+
+from octoprint.util.gcodeInterpreter import PlannerTimeEstimator, SimpleTimeEstimator
+
+
+class SimpleTimeEstimatorTestCase(unittest.TestCase):
+
+	def test_move(self):
+		estimator = SimpleTimeEstimator()
+		estimator.move(30.0, 40.0, 0.0, 1.0, 3000.0)
+		estimator.move(0.0, 0.0, 0.0, -5.0, 1500.0)
+		estimator.dwell(2.0)
+
+		self.assertAlmostEquals(1.0 + 0.2 + 2.0, estimator.finish())
+
+
+class PlannerTimeEstimatorTestCase(unittest.TestCase):
+
+	def test_long_move(self):
+		# accelerates to and decelerates from 50mm/s over 1.25mm each, cruising over the remaining 97.5mm
+		estimator = PlannerTimeEstimator(acceleration=1000.0)
+		estimator.move(100.0, 0.0, 0.0, 1.0, 3000.0)
+
+		self.assertAlmostEquals(0.05 + 0.05 + 97.5 / 50.0, estimator.finish())
+
+	def test_short_move_never_reaches_feedrate(self):
+		estimator = PlannerTimeEstimator(acceleration=1000.0)
+		estimator.move(1.0, 0.0, 0.0, 0.1, 6000.0)
+
+		# triangular profile, peaking at sqrt(1000mm/s^2*1mm)
+		self.assertAlmostEquals(2 * (1000.0 ** 0.5) / 1000.0, estimator.finish())
+
+	def test_straight_line_keeps_speed(self):
+		single = PlannerTimeEstimator()
+		single.move(100.0, 0.0, 0.0, 1.0, 3000.0)
+
+		split = PlannerTimeEstimator(bufferSize=4)
+		for i in range(100):
+			split.move(1.0, 0.0, 0.0, 0.01, 3000.0)
+
+		self.assertAlmostEquals(single.finish(), split.finish())
+
+	def test_corners_slow_down(self):
+		straight = PlannerTimeEstimator()
+		zigzag = PlannerTimeEstimator()
+		for i in range(100):
+			straight.move(10.0, 0.0, 0.0, 0.0, 6000.0)
+			zigzag.move(10.0 if i % 2 else -10.0, 0.0, 0.0, 0.0, 6000.0)
+
+		# reversing requires a full stop, every move accelerates to 100mm/s over 5mm and decelerates again
+		self.assertAlmostEquals(100 * 0.2, zigzag.finish())
+		self.assertTrue(straight.finish() < zigzag.finish())
+
+	def test_axis_limits(self):
+		estimator = PlannerTimeEstimator(maxFeedrate=dict(z=5.0), maxAcceleration=dict(z=100.0))
+		estimator.move(0.0, 0.0, 10.0, 0.0, 6000.0)
+
+		# limited to 5mm/s and 100mm/s^2, accelerating and decelerating over 0.125mm each
+		self.assertAlmostEquals(0.05 + 0.05 + 9.75 / 5.0, estimator.finish())
+
+	def test_m203_changes_limits(self):
+		estimator = PlannerTimeEstimator()
+		estimator.setMaxFeedrate(z=10.0)
+		estimator.move(0.0, 0.0, 10.0, 0.0, 6000.0)
+
+		self.assertAlmostEquals(0.1 + 0.1 + 9.0 / 10.0, estimator.finish())
+
+	def test_retract_acceleration(self):
+		estimator = PlannerTimeEstimator(retractAcceleration=1000.0)
+		estimator.setAcceleration(retractAcceleration=2000.0)
+		estimator.move(0.0, 0.0, 0.0, -5.0, 1200.0)
+
+		# 20mm/s reached after 0.1mm
+		self.assertAlmostEquals(0.01 + 0.01 + 4.8 / 20.0, estimator.finish())
+
+	def test_dwell_flushes_buffer(self):
+		estimator = PlannerTimeEstimator()
+		estimator.move(100.0, 0.0, 0.0, 1.0, 3000.0)
+		self.assertEquals(0.0, estimator.getTime())
+
+		estimator.dwell(5.0)
+		self.assertAlmostEquals(2.05 + 5.0, estimator.getTime())
+
+		# the move after the dwell starts from standstill
+		estimator.move(100.0, 0.0, 0.0, 1.0, 3000.0)
+		self.assertAlmostEquals(2 * 2.05 + 5.0, estimator.finish())
+
+	def test_bounded_buffer(self):
+		estimator = PlannerTimeEstimator(bufferSize=8)
+		for i in range(1000):
+			estimator.move(1.0, 1.0 if i % 2 else 0.0, 0.0, 0.01, 3000.0)
+			self.assertTrue(len(estimator._blocks) <= 8)
+		self.assertTrue(estimator.getTime() > 0)
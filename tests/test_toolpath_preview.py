@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+import shutil
+import os
+import struct
+import math
+
+from octoprint.settings import settings
+from octoprint.gcodefiles import ToolpathPreview
+from octoprint.util.gcodeInterpreter import gcode
+
+
+def _circle(z, e):
+	lines = ["G1 Z%.1f\n" % z, "G1 X60 Y50\n"]
+	for i in range(1, 361):
+		e += 0.1
+		lines.append("G1 X%.3f Y%.3f E%.2f\n" % (50 + 10 * math.cos(math.radians(i)), 50 + 10 * math.sin(math.radians(i)), e))
+	return lines, e
+
+
+class ToolpathPreviewTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		settings(init=True, basedir=self.basedir)
+
+		lines = ["G28\n"]
+		e = 0
+		for layer in range(3):
+			layerLines, e = _circle(0.2 * (layer + 1), e)
+			lines.extend(layerLines)
+		# a straight line made of many short segments
+		lines.append("G1 Z0.8\n")
+		lines.append("G1 X0 Y0\n")
+		for i in range(1, 101):
+			e += 0.1
+			lines.append("G1 X%d Y0 E%.2f\n" % (i, e))
+
+		self.gcode = gcode()
+		self.gcode.loadLines(lines)
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def test_toolpath_layers(self):
+		self.assertEquals(4, len(self.gcode.toolpath.layers))
+
+		xs, ys, flags = self.gcode.toolpath.layers[0]
+		# homing, travel to the start of the circle, then 360 extrusions
+		self.assertEquals([0, 0, 1], list(flags[:3]))
+		self.assertEquals(362, len(flags))
+
+		xs, ys, flags = self.gcode.toolpath.layers[1]
+		# the circle starts where the previous one ended
+		self.assertEquals(360, len(flags))
+		self.assertEquals(360, sum(flags))
+
+	def test_straight_line_simplified(self):
+		preview = ToolpathPreview.fromGcode(self.gcode)
+
+		z, vertices = preview.getLayers()[3]
+		self.assertAlmostEquals(0.8, z, places=5)
+		self.assertEquals(3, len(vertices))
+		self.assertEquals([0, 1, 1], [vertex[2] for vertex in vertices])
+
+	def test_vertex_budget(self):
+		preview = ToolpathPreview.fromGcode(self.gcode, budget=100)
+
+		self.assertTrue(preview.getVertexCount() <= 100)
+		self.assertEquals(4, preview.getLayerCount())
+		for z, vertices in preview.getLayers():
+			self.assertTrue(len(vertices) >= 2)
+
+	def test_quantization(self):
+		preview = ToolpathPreview.fromGcode(self.gcode)
+
+		minX, minY, maxX, maxY = preview.getBounds()
+		self.assertEquals((0, 0, 100, 60), (minX, minY, maxX, maxY))
+
+		xs = [vertex[0] for _, vertices in preview.getLayers() for vertex in vertices]
+		self.assertEquals(-32767, min(xs))
+		self.assertEquals(32767, max(xs))
+
+	def test_write(self):
+		preview = ToolpathPreview.fromGcode(self.gcode)
+		path = ToolpathPreview.getPath(os.path.join(self.basedir, "test.gcode"))
+		preview.write(path)
+
+		with open(path, "rb") as f:
+			data = f.read()
+
+		magic, version, minX, minY, maxX, maxY, layerCount = struct.unpack_from("<4sBffffI", data)
+		self.assertEquals(("OPTP", 1, 4), (magic, version, layerCount))
+		self.assertEquals(struct.calcsize("<4sBffffI") + 4 * struct.calcsize("<fI") + preview.getVertexCount() * struct.calcsize("<hhB"), len(data))
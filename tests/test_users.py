@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+import shutil
+import os
+
+from mock import patch
+
+from octoprint.users import FilebasedUserManager
+
+
+class FilebasedUserManagerApikeyTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.userfile = os.path.join(self.basedir, "users.yaml")
+
+		self.settingsPatcher = patch("octoprint.users.settings")
+		settingsMock = self.settingsPatcher.start()
+		settingsMock.return_value.get.return_value = self.userfile
+
+		self.userManager = FilebasedUserManager()
+		self.userManager.addUser("alice", "secret", active=True)
+		self.userManager.addUser("bob", "secret", active=True, apikey="BOBKEY")
+
+	def tearDown(self):
+		self.settingsPatcher.stop()
+		shutil.rmtree(self.basedir)
+
+	def test_find_user_by_apikey(self):
+		user = self.userManager.findUser(apikey="BOBKEY")
+		self.assertIsNotNone(user)
+		self.assertEquals("bob", user.get_id())
+
+	def test_find_user_by_unknown_apikey(self):
+		self.assertIsNone(self.userManager.findUser(apikey="UNKNOWN"))
+
+	def test_generated_apikey_replaces_old_one(self):
+		oldKey = self.userManager.findUser("bob")._apikey
+		newKey = self.userManager.generateApiKey("bob")
+
+		self.assertIsNone(self.userManager.findUser(apikey=oldKey))
+		self.assertEquals("bob", self.userManager.findUser(apikey=newKey).get_id())
+
+	def test_deleted_apikey_not_found(self):
+		self.userManager.deleteApikey("bob")
+		self.assertIsNone(self.userManager.findUser(apikey="BOBKEY"))
+
+	def test_removed_user_not_found_by_apikey(self):
+		self.userManager.removeUser("bob")
+		self.assertIsNone(self.userManager.findUser(apikey="BOBKEY"))
+
+	def test_apikey_index_loaded_from_file(self):
+		key = self.userManager.generateApiKey("alice")
+
+		reloaded = FilebasedUserManager()
+		self.assertEquals("alice", reloaded.findUser(apikey=key).get_id())
+		self.assertEquals("bob", reloaded.findUser(apikey="BOBKEY").get_id())
+
+	def test_generation_changes_with_users(self):
+		generation = self.userManager.getGeneration()
+		self.userManager.removeRolesFromUser("bob", ["user"])
+		self.assertNotEquals(generation, self.userManager.getGeneration())
+
+		generation = self.userManager.getGeneration()
+		self.userManager.changeUserActivation("bob", True)
+		self.assertEquals(generation, self.userManager.getGeneration())
+
+		self.userManager.changeUserPassword("bob", "other")
+		self.assertNotEquals(generation, self.userManager.getGeneration())
@@ -0,0 +1,89 @@
+import unittest
+import time
+
+from octoprint.settings import settings
+from octoprint.util.virtual import VirtualPrinter
+
+
+class VirtualPrinterTestCase(unittest.TestCase):
+
+	def setUp(self):
+		settings(True)
+		self.printers = []
+
+	def tearDown(self):
+		for printer in self.printers:
+			printer.close()
+
+	def _connect(self, **values):
+		# the settings outlive the test
+		config = dict(firmware="marlin", processingTime=0.0, plannerBufferSize=0, moveTime=0.0)
+		config.update(values)
+		for key, value in config.items():
+			settings().set(["devel", "virtualPrinter", key], value)
+		printer = VirtualPrinter()
+		printer.timeout = 0
+		self.printers.append(printer)
+		return printer
+
+	def _dueTimes(self, printer):
+		return [(due, line.strip()) for due, line in printer._received]
+
+	def test_greeting_and_ok(self):
+		printer = self._connect()
+		printer.write("N1 G28*18\n")
+		self.assertEquals(["start\n", "Marlin: Virtual Marlin!\n", "\x80\n", "SD init fail\n", "ok\n", ""], [printer.readline() for _ in range(6)])
+
+	def test_planner(self):
+		printer = self._connect(processingTime=0.01, plannerBufferSize=2, moveTime=1.0)
+		printer._received.clear()
+		start = printer._due = printer._lastDue = 1000.0
+		printer._processLine("G1 X10")
+		printer._processLine("G1 X20")
+		# the buffer is full, the third move has to wait for the first one to be done
+		printer._processLine("G1 X30")
+		printer._processLine("M400")
+		self.assertEquals([(start, "ok"), (start, "ok"), (start + 1.0, "ok"), (start + 3.0, "ok")], self._dueTimes(printer))
+
+	def test_heatup(self):
+		printer = self._connect()
+		printer._received.clear()
+		printer.temp = [190.0]
+		printer.targetTemp = [190.0]
+		printer.lastTempAt = time.time()
+		# still busy for a while, heating up starts after that
+		start = printer._due = printer._lastDue = printer.lastTempAt + 100.0
+
+		printer._processLine("M109 S210")
+		self.assertEquals([(start + 1.0, "T:200.00 /210.00"), (start + 2.0, "T:210.00 /210.00"), (start + 2.0, "ok")], self._dueTimes(printer))
+
+	def test_heatup_fractional_start(self):
+		printer = self._connect()
+		printer._received.clear()
+		# a temperature query while heating up left the heater just short of its target
+		printer.temp = [199.3]
+		printer.targetTemp = [200.0]
+		start = printer.lastTempAt = printer._due = printer._lastDue = time.time() + 100.0
+
+		printer._processLine("M109 S200")
+		self.assertEquals([(start + 1.0, "T:200.00 /200.00"), (start + 1.0, "ok")], self._dueTimes(printer))
+
+		# within delta of the target M109 is done right away
+		printer._received.clear()
+		printer.temp = [199.7]
+		printer._processLine("M109 S200")
+		self.assertEquals(["ok"], [line for _, line in self._dueTimes(printer)])
+
+	def test_dialects(self):
+		printer = self._connect(firmware="repetier")
+		printer._received.clear()
+		printer._processLine("N0 M110*35")
+		printer._processLine("N1 M140 S60*87")
+		printer._processLine("N3 G1 X10*90")
+		self.assertEquals(["ok 0", "ok 1", "TargetBed:60", "Error:expected line 2 got 3", "Resend:2"], [line for _, line in self._dueTimes(printer)])
+
+		printer = self._connect(firmware="smoothie")
+		printer._received.clear()
+		printer._processLine("N1 G1 X10*104")
+		printer._processLine("N3 G1 X10*106")
+		self.assertEquals(["ok", "rs N2"], [line for _, line in self._dueTimes(printer)])